@@ -0,0 +1,135 @@
+"""
+Single-pass aggregation of Cost Explorer ``ResultsByTime`` data.
+
+The report needs daily totals, per-service totals, the most expensive
+services and a few period statistics. All of them are computed in one
+streaming pass over the groups, so the cost is linear in the number of groups
+and independent of how the report is rendered afterwards.
+
+Amounts are parsed into the integer units of ``money.Money`` and summed and
+compared as plain integers; only the results are wrapped in ``Money``. The
+amounts of a day are extracted with ``itemgetter`` and parsed with
+``money.parse_many`` in one call, and each is then added to its service's
+running total in a single dict pass. Nothing is kept per day beyond its
+total, so memory stays proportional to the number of services.
+
+Every group counts towards the daily and period totals, so they match the
+Cost Explorer totals. Which services are listed on their own is decided
+once per service after the pass: services below an absolute cost or a share
+of the period total, and the services outside the top N, are collected into
+an "other" bucket instead, so the listed services and the bucket add up to
+the period total.
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from decimal import Decimal
+from operator import itemgetter
+
+from money import Money, parse_many, to_units
+
+_metrics = itemgetter("Metrics")
+_unblended = itemgetter("UnblendedCost")
+_amount = itemgetter("Amount")
+_keys = itemgetter("Keys")
+_first = itemgetter(0)
+
+# Only services with a cost above this are listed on their own
+SIGNIFICANT_COST = Decimal("0.01")
+
+TOP_SERVICES = 10
+
+
+@dataclass
+class CostSummary:
+    """Aggregated costs of a reporting period"""
+
+    daily_totals: dict = field(default_factory=dict)
+    service_totals: dict = field(default_factory=dict)
+    top_services: list = field(default_factory=list)
+    period_total: Money = Money(0)
+    peak_day: tuple = None
+    group_count: int = 0
+    # Services not in top_services, summed
+    other_total: Money = Money(0)
+    other_count: int = 0
+
+    def daily_average(self, days):
+        """Average daily cost over a period of the given length"""
+        return self.period_total / days
+
+
+def split_significant(totals, total, min_cost=SIGNIFICANT_COST, min_share=0):
+    """Split per-key totals (in money units) into listed keys and the rest
+
+    A key is listed when its total is above ``min_cost`` and at least
+    ``min_share`` of ``total`` (when positive). Returns the listed totals,
+    the sum of the others and their count. One pass, so it scales to
+    groupings with any number of keys.
+    """
+    absolute = to_units(min_cost)
+    relative = Decimal(min_share) * total if min_share and total > 0 else 0
+    listed = {}
+    other = 0
+    other_count = 0
+    for key, units in totals.items():
+        if units > absolute and units >= relative:
+            listed[key] = units
+        else:
+            other += units
+            other_count += 1
+    return listed, other, other_count
+
+
+def aggregate_costs(
+    cost_data, top_n=TOP_SERVICES, min_cost=SIGNIFICANT_COST, min_share=0
+):
+    """Aggregate Cost Explorer results in a single pass
+
+    Days are returned in date order and ``top_services`` holds the ``top_n``
+    services with the highest total, picked with a heap instead of sorting
+    every service. ``service_totals`` holds the services that pass
+    ``split_significant``. Every service not in ``top_services`` is summed
+    into ``other_total``, so ``top_services`` and the other bucket add up to
+    ``period_total``.
+    """
+    daily_totals = {}
+    service_totals = {}
+    get = service_totals.get
+    group_count = 0
+
+    for result in cost_data["ResultsByTime"]:
+        groups = result["Groups"]
+        group_count += len(groups)
+        units = parse_many(list(map(_amount, map(_unblended, map(_metrics, groups)))))
+        for service, amount in zip(map(_first, map(_keys, groups)), units):
+            service_totals[service] = get(service, 0) + amount
+
+        date = result["TimePeriod"]["Start"]
+        daily_totals[date] = daily_totals.get(date, 0) + sum(units)
+
+    period_total = sum(daily_totals.values())
+    listed, other, other_count = split_significant(
+        service_totals, period_total, min_cost, min_share
+    )
+
+    summary = CostSummary()
+    summary.daily_totals = {
+        date: Money(units) for date, units in sorted(daily_totals.items())
+    }
+    summary.service_totals = {
+        service: Money(units) for service, units in listed.items()
+    }
+    top = heapq.nlargest(top_n, listed.items(), key=lambda item: item[1])
+    other += sum(listed.values()) - sum(units for _, units in top)
+    other_count += len(listed) - len(top)
+
+    summary.period_total = Money(period_total)
+    summary.other_total = Money(other)
+    summary.other_count = other_count
+    summary.group_count = group_count
+    if daily_totals:
+        date, units = max(sorted(daily_totals.items()), key=lambda item: item[1])
+        summary.peak_day = (date, Money(units))
+    summary.top_services = [(service, Money(units)) for service, units in top]
+    return summary
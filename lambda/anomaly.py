@@ -0,0 +1,198 @@
+"""
+Cost anomaly detection against an incrementally maintained baseline.
+
+Every service has an exponentially weighted moving average (EWMA) of its
+daily cost and of the variance around it. The baseline is persisted between
+runs together with the last day it has seen, so each run only scores and
+folds in the days that are new since the previous run: O(new days x
+services) instead of re-reading the whole history.
+
+Cost Explorer still revises the most recent days, so a day is left alone
+until it is settled; it is then scored against the baseline and folded into
+it, exactly once. Anomalies are reported ``SETTLE_DAYS`` after the day, but
+never on partial costs and never twice.
+
+The baseline needs persistent storage to outlive a run. Without it, it is
+rebuilt from the settled days of the report window, which must then hold at
+least ``WARMUP_DAYS`` of them before anything can be flagged.
+"""
+
+import math
+from dataclasses import dataclass
+
+from renderers import STRINGS
+
+BASELINE_KEY = "anomaly/baseline"
+STATE_VERSION = 1
+
+# Weight of the newest day in the moving average
+EWMA_ALPHA = 0.2
+
+# Deviation, in standard deviations, at which a day is flagged
+ZSCORE_THRESHOLD = 3.0
+
+# Days a service needs in its baseline before it can be flagged
+WARMUP_DAYS = 7
+
+# Deviations smaller than this many dollars are never flagged
+MIN_DELTA = 1.0
+
+# Lower bound for the standard deviation, so that a service with a perfectly
+# flat history is not flagged for cent-level changes
+STD_FLOOR = 0.1
+
+
+@dataclass
+class Anomaly:
+    """A day/service cell that deviates from the service's baseline"""
+
+    date: str
+    service: str
+    cost: float
+    baseline: float
+    zscore: float
+
+
+class AnomalyDetector:
+    """EWMA baseline per service, updated incrementally across runs"""
+
+    def __init__(
+        self,
+        state=None,
+        alpha=EWMA_ALPHA,
+        threshold=ZSCORE_THRESHOLD,
+        warmup_days=WARMUP_DAYS,
+        min_delta=MIN_DELTA,
+    ):
+        state = state or {}
+        self.last_date = state.get("last_date")
+        self.services = state.get("services", {})
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup_days = warmup_days
+        self.min_delta = min_delta
+
+    def to_state(self):
+        """Serialize the baseline for persistence"""
+        return {
+            "version": STATE_VERSION,
+            "last_date": self.last_date,
+            "services": self.services,
+        }
+
+    def _score(self, service, cost):
+        baseline = self.services.get(service)
+        if baseline is None or baseline["count"] < self.warmup_days:
+            return None
+
+        delta = cost - baseline["mean"]
+        if abs(delta) < self.min_delta:
+            return None
+
+        zscore = delta / max(math.sqrt(baseline["var"]), STD_FLOOR)
+        if abs(zscore) < self.threshold:
+            return None
+        return zscore
+
+    def _update(self, service, cost):
+        baseline = self.services.get(service)
+        if baseline is None:
+            self.services[service] = {"mean": cost, "var": 0.0, "count": 1}
+            return
+
+        delta = cost - baseline["mean"]
+        increment = self.alpha * delta
+        baseline["mean"] += increment
+        baseline["var"] = (1 - self.alpha) * (baseline["var"] + delta * increment)
+        baseline["count"] += 1
+
+    def warmed_up(self):
+        """Whether any service has enough history to be flagged"""
+        return any(
+            baseline["count"] >= self.warmup_days for baseline in self.services.values()
+        )
+
+    def process(self, cost_data, settled_before):
+        """Score the settled days that are new since the last run
+
+        Days before ``settled_before`` (an ISO date) are scored and then
+        folded into the baseline; later days are left for a later run.
+        Returns the anomalies found.
+        """
+        daily_costs = {}
+        for result in cost_data["ResultsByTime"]:
+            date = result["TimePeriod"]["Start"]
+            if date >= settled_before or (
+                self.last_date is not None and date <= self.last_date
+            ):
+                continue
+            costs = daily_costs.setdefault(date, {})
+            for group in result["Groups"]:
+                service = group["Keys"][0]
+                amount = float(group["Metrics"]["UnblendedCost"]["Amount"])
+                costs[service] = costs.get(service, 0.0) + amount
+
+        anomalies = []
+        for date in sorted(daily_costs):
+            costs = daily_costs[date]
+
+            for service in set(self.services) | set(costs):
+                cost = costs.get(service, 0.0)
+                zscore = self._score(service, cost)
+                if zscore is not None:
+                    anomalies.append(
+                        Anomaly(
+                            date=date,
+                            service=service,
+                            cost=cost,
+                            baseline=self.services[service]["mean"],
+                            zscore=zscore,
+                        )
+                    )
+                self._update(service, cost)
+
+            self.last_date = date
+
+        anomalies.sort(key=lambda anomaly: (anomaly.date, -abs(anomaly.zscore)))
+        return anomalies
+
+
+def load_baseline(backend):
+    """Load the persisted baseline state, or None if there is none"""
+    state = backend.get(BASELINE_KEY)
+    if state is None or state.get("version") != STATE_VERSION:
+        return None
+    return state
+
+
+def save_baseline(backend, detector):
+    """Persist the detector's baseline state"""
+    backend.put(BASELINE_KEY, detector.to_state())
+
+
+def format_anomaly_section(anomalies, warmed_up=True, language="ja"):
+    """Build the anomaly report section
+
+    Without anomalies, a baseline that is not ``warmed_up`` yet is reported
+    as such rather than as "no anomalies".
+    """
+    s = STRINGS[language]
+    if not anomalies and not warmed_up:
+        return (s["anomaly_title"], [s["anomaly_learning"].format(days=WARMUP_DAYS)])
+    if not anomalies:
+        return (s["anomaly_title"], [s["anomaly_none"]])
+
+    lines = [
+        s["anomaly_line"].format(
+            date=anomaly.date,
+            service=anomaly.service,
+            cost=f"{anomaly.cost:.2f}",
+            baseline=f"{anomaly.baseline:.2f}",
+            zscore=f"{anomaly.zscore:+.1f}",
+        )
+        for anomaly in anomalies
+    ]
+    return (
+        s["anomaly_title"],
+        [s["anomaly_found"].format(count=len(anomalies))] + lines,
+    )
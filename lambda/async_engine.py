@@ -0,0 +1,622 @@
+"""
+asyncio engine for the daily cost report.
+
+Runs the same report as the synchronous handler, with every independent AWS
+call in flight at once on a single event loop instead of on thread pools:
+Cost Explorer shards and pages, the forecast, each resource collector, and
+for multi-account reports every account and account/region pair. Each step
+has a timeout, after which its calls are cancelled and the step fails the
+same way as on the synchronous path, so the report is still sent.
+
+Clients come from aiobotocore, which is optional. The engine is enabled with
+``ENABLE_ASYNC_ENGINE=true`` and the handler falls back to the synchronous
+path when aiobotocore is not installed. Paging, merging, counting and
+formatting reuse the synchronous code, so both paths produce the same report.
+Steps without an async API, such as reading CUR files and cost attribution,
+run in worker threads.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from botocore.exceptions import ClientError
+
+import cost_notifier
+import delivery
+import fan_out
+import forecast
+import instrumentation
+from deadline import Deadline
+from inventory import REGISTRY
+from renderers import Section
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+except ImportError:  # pragma: no cover - exercised only without aiobotocore
+    get_session = None
+
+# Seconds before a step is cancelled
+COST_DATA_TIMEOUT = 120.0
+FORECAST_TIMEOUT = 30.0
+NOTIFY_TIMEOUT = 30.0
+
+# Connections per client; the engine keeps many calls in flight per service
+MAX_POOL_CONNECTIONS = 32
+
+# Runs the blocking steps. Unlike the loop's default executor it is not
+# joined when the loop closes, so a step abandoned at the deadline does not
+# hold the invocation open.
+_blocking_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def _create_aiobotocore_client(service_name, region_name=None, **credentials):
+    """Create an aiobotocore client; returns an async context manager"""
+    session = _create_aiobotocore_client.session
+    if session is None:
+        session = instrumentation.instrument_session(get_session())
+        _create_aiobotocore_client.session = session
+    return session.create_client(
+        service_name,
+        region_name=region_name,
+        config=AioConfig(max_pool_connections=MAX_POOL_CONNECTIONS),
+        **credentials,
+    )
+
+
+_create_aiobotocore_client.session = None
+
+# Creates the async clients; replaced with stubs by tests and benchmarks
+create_client = _create_aiobotocore_client
+
+
+def available():
+    """Whether the engine has a client factory to run with"""
+    return get_session is not None or create_client is not _create_aiobotocore_client
+
+
+def _timeout(name, default):
+    """Read a timeout in seconds from the environment"""
+    return float(os.environ.get(name) or default)
+
+
+class ClientPool:
+    """Async clients of one run, created once per service, region and account
+
+    Used as ``async with ClientPool() as pool``; the clients are closed when
+    the block exits.
+    """
+
+    def __init__(self, factory=None):
+        self._factory = factory
+        self._clients = {}
+        self._lock = asyncio.Lock()
+        self._stack = contextlib.AsyncExitStack()
+
+    async def __aenter__(self):
+        await self._stack.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._stack.__aexit__(*exc_info)
+
+    async def client(self, service_name, region_name=None, credentials=None):
+        """Return the client of a service, creating it on first use"""
+        credentials = credentials or {}
+        key = (service_name, region_name, credentials.get("aws_access_key_id"))
+        async with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                factory = self._factory or create_client
+                client = await self._stack.enter_async_context(
+                    factory(service_name, region_name=region_name, **credentials)
+                )
+                self._clients[key] = client
+        return client
+
+
+class AsyncBackoff(cost_notifier.AdaptiveBackoff):
+    """AdaptiveBackoff for coroutines, waiting without blocking the loop"""
+
+    async def call(self, func, **kwargs):
+        """Await the call, retrying when the request is throttled"""
+        for attempt in range(self.max_attempts):
+            if self.delay:
+                await asyncio.sleep(self._jitter())
+            try:
+                result = await func(**kwargs)
+            except ClientError as e:
+                if not self._retry_throttled(e, attempt):
+                    raise
+                continue
+
+            self._succeeded()
+            return result
+
+
+async def _query_cost_pages(ce, start_date, end_date, backoff):
+    """Fetch and merge every page of the Cost Explorer query"""
+    kwargs = cost_notifier._cost_query(start_date, end_date)
+    pages = cost_notifier._CostPages()
+
+    while True:
+        token = pages.add(await backoff.call(ce.get_cost_and_usage, **kwargs))
+        if not token:
+            return pages.result()
+        kwargs["NextPageToken"] = token
+
+
+async def _fetch_cost_range(ce, start_date, end_date, backoff, shard_days):
+    """Fetch [start_date, end_date), with the date-range shards concurrently"""
+    shards = (
+        cost_notifier._shard_ranges(start_date, end_date, shard_days)
+        if shard_days
+        else []
+    )
+    if len(shards) <= 1:
+        return await _query_cost_pages(ce, start_date, end_date, backoff)
+
+    # Bounded like the thread pool of the synchronous path, to limit throttling
+    limit = asyncio.Semaphore(cost_notifier.COST_SHARD_WORKERS)
+
+    async def fetch_shard(shard_start, shard_end):
+        async with limit:
+            return await _query_cost_pages(ce, shard_start, shard_end, backoff)
+
+    responses = await asyncio.gather(*(fetch_shard(*shard) for shard in shards))
+    return cost_notifier._merge_shards(responses)
+
+
+async def _fetch_cost_data(ce, start_date, end_date, cache, shard_days, backoff):
+    if cache is None:
+        return await _fetch_cost_range(ce, start_date, end_date, backoff, shard_days)
+
+    results, missing = await asyncio.to_thread(
+        cost_notifier._read_cached_days, cache, start_date, end_date
+    )
+    responses = await asyncio.gather(
+        *(
+            _fetch_cost_range(ce, range_start, range_end, backoff, shard_days)
+            for range_start, range_end in missing
+        )
+    )
+    for response in responses:
+        await asyncio.to_thread(
+            cost_notifier._store_fetched_days, cache, results, response, end_date
+        )
+    return {"ResultsByTime": [results[key] for key in sorted(results)]}
+
+
+async def get_cost_data(
+    ce, days=7, cache=None, shard_days=None, backoff=None, timeout=None
+):
+    """Get the cost data like ``cost_notifier.get_cost_data``, or None on error"""
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+    if timeout is None:
+        timeout = _timeout("ASYNC_COST_DATA_TIMEOUT", COST_DATA_TIMEOUT)
+
+    try:
+        return await asyncio.wait_for(
+            _fetch_cost_data(
+                ce, start_date, end_date, cache, shard_days, backoff or AsyncBackoff()
+            ),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        print(f"Error getting cost data: timed out after {timeout:g}s")
+    except Exception as e:
+        print(f"Error getting cost data: {e}")
+    return None
+
+
+async def _count_resource(pool, collector, region_name, credentials):
+    client = await pool.client(collector.service, region_name, credentials)
+    counts = collector.default()
+    if collector.paginated:
+        paginator = client.get_paginator(collector.operation)
+        async for page in paginator.paginate(**collector.params):
+            collector.reducer(counts, page)
+    else:
+        response = await getattr(client, collector.operation)(**collector.params)
+        collector.reducer(counts, response)
+    return counts
+
+
+async def get_resource_counts(
+    pool, region_name=None, credentials=None, timeout=None, errors=None
+):
+    """Count the resources like ``cost_notifier.get_resource_counts``
+
+    Every collector of ``inventory.REGISTRY`` runs concurrently; one that
+    fails or runs over its timeout reports its default counts and is added
+    to the ``errors`` dict, if given. ``timeout`` overrides the collectors'
+    own timeouts.
+    """
+    if timeout is None and os.environ.get("ASYNC_RESOURCE_TIMEOUT"):
+        timeout = float(os.environ["ASYNC_RESOURCE_TIMEOUT"])
+
+    async def collect(collector):
+        limit = collector.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(
+                _count_resource(pool, collector, region_name, credentials), limit
+            )
+        except asyncio.TimeoutError:
+            error = f"timed out after {limit:g}s"
+        except Exception as e:
+            error = str(e)
+        print(f"Error getting {collector.name} data: {error}")
+        if errors is not None:
+            errors[collector.name] = error
+        return collector.default()
+
+    collectors = list(REGISTRY)
+    counts = await asyncio.gather(*(collect(collector) for collector in collectors))
+    return {collector.name: count for collector, count in zip(collectors, counts)}
+
+
+async def _fetch_forecast(ce, today):
+    month_to_date_query, forecast_query = forecast.forecast_queries(today)
+    if month_to_date_query is None:
+        month_to_date = None
+        response = await ce.get_cost_forecast(**forecast_query)
+    else:
+        month_to_date, response = await asyncio.gather(
+            ce.get_cost_and_usage(**month_to_date_query),
+            ce.get_cost_forecast(**forecast_query),
+        )
+    return forecast.parse_forecast(today, month_to_date, response)
+
+
+async def get_forecast_section(pool, today=None, backend=None, timeout=None):
+    """Build the forecast section like the synchronous path, or None"""
+    today = today or datetime.now().date()
+    if timeout is None:
+        timeout = _timeout("ASYNC_FORECAST_TIMEOUT", FORECAST_TIMEOUT)
+
+    result = await asyncio.to_thread(forecast.lookup_forecast, today, backend)
+    if result is None:
+        try:
+            ce = await pool.client("ce")
+            result = await asyncio.wait_for(_fetch_forecast(ce, today), timeout)
+        except asyncio.TimeoutError:
+            print(f"Error fetching cost forecast: timed out after {timeout:g}s")
+            return None
+        except Exception as e:
+            print(f"Error fetching cost forecast: {e}")
+            return None
+        await asyncio.to_thread(forecast.store_forecast, today, result, backend)
+
+    return Section.of(forecast.format_forecast_section, result)
+
+
+async def collect_fan_out(
+    pool,
+    role_arns,
+    regions,
+    days,
+    max_workers=fan_out.FAN_OUT_CONCURRENCY,
+    cache=None,
+    shard_days=None,
+    timeout=None,
+):
+    """Collect every account/region target like ``fan_out.collect_fan_out``
+
+    Each role is assumed once; ``max_workers`` bounds the targets in flight.
+    Targets that have not finished ``timeout`` seconds after the start are
+    cancelled and recorded as failed.
+    """
+    limit = asyncio.Semaphore(max_workers)
+    assumed = {}
+
+    async def bounded(coroutine):
+        try:
+            return await asyncio.wait_for(coroutine, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("timed out") from None
+
+    async def credentials(role_arn):
+        if role_arn not in assumed:
+            assumed[role_arn] = asyncio.ensure_future(assume_role(role_arn))
+        return await assumed[role_arn]
+
+    async def assume_role(role_arn):
+        sts = await pool.client("sts")
+        response = await sts.assume_role(
+            RoleArn=role_arn, RoleSessionName=fan_out.ROLE_SESSION_NAME
+        )
+        issued = response["Credentials"]
+        return {
+            "aws_access_key_id": issued["AccessKeyId"],
+            "aws_secret_access_key": issued["SecretAccessKey"],
+            "aws_session_token": issued["SessionToken"],
+        }
+
+    async def account_costs(role_arn):
+        async with limit:
+            ce = await pool.client(
+                "ce", fan_out.COST_EXPLORER_REGION, await credentials(role_arn)
+            )
+            account_cache = cache
+            if cache is not None:
+                account_cache = cache.namespaced(
+                    fan_out.account_id_from_role_arn(role_arn)
+                )
+            return await get_cost_data(
+                ce, days=days, cache=account_cache, shard_days=shard_days
+            )
+
+    async def region_resources(role_arn, region):
+        async with limit:
+            errors = {}
+            counts = await get_resource_counts(
+                pool, region, await credentials(role_arn), errors=errors
+            )
+            return counts, errors
+
+    targets = [(role_arn, region) for role_arn in role_arns for region in regions]
+    outcomes = await asyncio.gather(
+        *(bounded(account_costs(role_arn)) for role_arn in role_arns),
+        *(bounded(region_resources(*target)) for target in targets),
+        return_exceptions=True,
+    )
+    return fan_out.build_fan_out_result(
+        role_arns,
+        regions,
+        dict(zip(role_arns, outcomes[: len(role_arns)])),
+        dict(zip(targets, outcomes[len(role_arns) :])),
+    )
+
+
+async def _staged(name, coroutine):
+    """Await a coroutine as an instrumented stage"""
+    with instrumentation.stage(name):
+        return await coroutine
+
+
+async def _in_thread(name, func, *args):
+    """Run a blocking step in a worker thread as an instrumented stage"""
+    with instrumentation.stage(name):
+        context = contextvars.copy_context()
+        return await asyncio.wrap_future(
+            _blocking_executor.submit(context.run, func, *args)
+        )
+
+
+async def _within(deadline, name, coroutine, optional=False):
+    """Await a stage within the deadline's budget, None when it runs over
+
+    Like ``Deadline.wait``, errors of ``optional`` stages are logged and
+    give None instead of failing the report.
+    """
+    try:
+        return await asyncio.wait_for(coroutine, deadline.budget())
+    except asyncio.TimeoutError:
+        deadline.skip(name)
+        return None
+    except Exception as e:
+        if not optional:
+            raise
+        print(f"Error in stage {name}: {e}")
+        return None
+
+
+async def collect_report_data(pool, days_to_check, deadline=None):
+    """Fetch the costs, resource counts and extra sections of the report
+
+    Reads the same configuration as the synchronous handler and returns the
+    same ``(cost_data, resources, extra_sections)``. Stages still running
+    when the budget of ``deadline`` is spent are cancelled and recorded in
+    ``deadline.skipped``.
+    """
+    if deadline is None:
+        deadline = Deadline()
+    target_role_arns = cost_notifier._split_env_list("TARGET_ROLE_ARNS")
+
+    if target_role_arns:
+        regions, concurrency = cost_notifier._fan_out_settings()
+        print(
+            f"Fetching cost and resource data for {len(target_role_arns)} accounts "
+            f"in {len(regions)} regions..."
+        )
+        cache = await asyncio.to_thread(cost_notifier._get_cost_cache)
+        result = await _staged(
+            "fan_out",
+            collect_fan_out(
+                pool,
+                target_role_arns,
+                regions,
+                days_to_check,
+                max_workers=concurrency,
+                cache=cache,
+                shard_days=cost_notifier._cost_shard_days(),
+                timeout=deadline.budget(),
+            ),
+        )
+        return (
+            result.cost_data,
+            result.resources,
+            [Section.of(fan_out.format_fan_out_section, result)],
+        )
+
+    cur_path = os.environ.get("CUR_PATH")
+    cache = None
+    if not cur_path:
+        cache = await asyncio.to_thread(cost_notifier._get_cost_cache)
+    attribution_tags = cost_notifier._split_env_list("ATTRIBUTION_TAGS")
+    resource_services = cost_notifier._split_env_list("ATTRIBUTION_RESOURCE_SERVICES")
+
+    sections = []
+    if cost_notifier._env_flag("ENABLE_COST_FORECAST"):
+        print("Fetching cost forecast...")
+        backend = await asyncio.to_thread(cost_notifier._get_cache_backend)
+        sections.append(
+            _within(
+                deadline,
+                "forecast",
+                _staged("forecast", get_forecast_section(pool, backend=backend)),
+                optional=True,
+            )
+        )
+    if attribution_tags or resource_services:
+        print("Fetching cost attribution...")
+        sections.append(
+            _within(
+                deadline,
+                "attribution",
+                _in_thread(
+                    "attribution",
+                    cost_notifier._get_attribution_section,
+                    days_to_check,
+                    attribution_tags,
+                    resource_services,
+                ),
+                optional=True,
+            )
+        )
+
+    if cost_notifier._env_flag("ENABLE_WASTE_DETECTION"):
+        print("Detecting idle resources...")
+        sections.append(
+            _within(
+                deadline,
+                "waste_detection",
+                _in_thread("waste_detection", cost_notifier._get_waste_section),
+                optional=True,
+            )
+        )
+
+    print("Fetching resource information...")
+    print(f"Fetching cost data for the last {days_to_check} days...")
+    if cur_path:
+        cost_data = _in_thread(
+            "cost_data", cost_notifier._get_cur_cost_data, cur_path, days_to_check
+        )
+    else:
+        cost_data = _staged(
+            "cost_data",
+            get_cost_data(
+                await pool.client("ce"),
+                days=days_to_check,
+                cache=cache,
+                shard_days=cost_notifier._cost_shard_days(),
+            ),
+        )
+
+    cost_data, resources, *sections = await asyncio.gather(
+        _within(deadline, "cost_data", cost_data),
+        _within(deadline, "resources", _staged("resources", get_resource_counts(pool))),
+        *sections,
+    )
+    if cache is not None:
+        print(f"Cost cache: {cache.hits} hits, {cache.misses} misses")
+
+    return cost_data, resources, [section for section in sections if section]
+
+
+async def _publish_parts(sns, parts, topic_arn, backoff):
+    """Publish the parts like ``delivery.publish_parts``, on the event loop"""
+
+    async def publish(part):
+        return await backoff.call(
+            sns.publish, **delivery.publish_request(part, topic_arn)
+        )
+
+    if delivery.is_fifo(topic_arn):
+        return [(await publish(part))["MessageId"] for part in parts]
+
+    responses = await asyncio.gather(
+        *(publish(part) for part in parts), return_exceptions=True
+    )
+    for response in responses:
+        if isinstance(response, BaseException):
+            raise response
+    return [response["MessageId"] for response in responses]
+
+
+async def send_notification(
+    pool, message, topic_arn, timeout=None, deadline=None, language=None
+):
+    """Publish the report like ``cost_notifier.send_notification``
+
+    Publishing, retries included, stops at ``timeout`` or at the end of
+    ``deadline``, whichever comes first.
+    """
+    if timeout is None:
+        timeout = _timeout("ASYNC_NOTIFY_TIMEOUT", NOTIFY_TIMEOUT)
+    time_left = deadline.time_left() if deadline is not None else None
+    if time_left is not None:
+        timeout = min(timeout, time_left)
+    try:
+        link, link_expires = None, None
+        if os.environ.get("REPORT_BUCKET") and cost_notifier._upload_in_time(deadline):
+            link, link_expires = await _in_thread(
+                "report_upload", cost_notifier._upload_full_report, message
+            )
+        parts = delivery.plan_parts(
+            message,
+            cost_notifier.notification_subject(),
+            link=link,
+            max_parts=cost_notifier._delivery_max_parts(),
+            link_expires=link_expires,
+            language=language or cost_notifier._report_language(),
+        )
+        sns = await pool.client("sns")
+        message_ids = await asyncio.wait_for(
+            _publish_parts(
+                sns,
+                parts,
+                topic_arn,
+                AsyncBackoff(
+                    time_left=deadline.time_left if deadline is not None else None
+                ),
+            ),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        print(f"Error sending notification: timed out after {timeout:g}s")
+        return False
+    except Exception as e:
+        print(f"Error sending notification: {e}")
+        return False
+    print(f"Notification sent successfully. MessageId: {', '.join(message_ids)}")
+    return True
+
+
+async def _run_report(days_to_check, sns_topic_arn, deadline):
+    async with ClientPool() as pool:
+        cost_data, resources, extra_sections = await collect_report_data(
+            pool, days_to_check, deadline
+        )
+        report = cost_notifier.prepare_report(
+            cost_data, resources, days_to_check, extra_sections, deadline
+        )
+        language = cost_notifier._report_language()
+        message = cost_notifier.format_report(report, language)
+
+        print("Sending notification...")
+        sent, _ = await asyncio.gather(
+            _staged(
+                "notify",
+                send_notification(
+                    pool, message, sns_topic_arn, deadline=deadline, language=language
+                ),
+            ),
+            _in_thread("channels", cost_notifier.send_to_channels, report, language),
+        )
+        return sent
+
+
+def run_report(days_to_check, sns_topic_arn, deadline=None):
+    """Collect, format and send the report on a new event loop
+
+    Returns whether the notification was sent.
+    """
+    return asyncio.run(
+        _run_report(days_to_check, sns_topic_arn, deadline or Deadline())
+    )
@@ -0,0 +1,265 @@
+"""
+Cost attribution to cost-allocation tags and individual resources.
+
+Grouping by a tag or by RESOURCE_ID can produce many thousands of keys. The
+pages are streamed into a weighted space-saving sketch, which keeps a fixed
+number of counters however many keys there are, instead of collecting a dict
+of every key. The sketch always tracks any key whose cost exceeds
+``total / capacity``, and each reported cost is an upper bound whose maximum
+over-estimate is reported with it. Costs are exact ``money.Money`` amounts,
+like the rest of the report, so attributed costs reconcile with the service
+totals.
+
+Resource-level data comes from GetCostAndUsageWithResources, which needs the
+resource-level data opt-in in Cost Explorer, covers only the last 14 days
+and must be filtered, here to one service per query.
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from money import Money
+from renderers import STRINGS
+
+# Counters kept per sketch; the top-K list is read from these
+SKETCH_CAPACITY = 200
+
+TOP_SPENDERS = 10
+
+# GetCostAndUsageWithResources only serves this many recent days
+RESOURCE_LOOKBACK_DAYS = 14
+
+# Error bounds below this round to $0.00 and are not shown
+SHOWN_ERROR = Decimal("0.005")
+
+
+@dataclass
+class HeavyHitter:
+    """A key among the top spenders, with the sketch's over-estimate bound"""
+
+    key: str
+    cost: Money
+    error: Money = Money(0)
+
+
+class SpaceSaving:
+    """Weighted space-saving sketch of the keys with the highest total
+
+    At most ``capacity`` keys are tracked. A new key replaces the smallest
+    counter and inherits its count as its error bound. Weights are converted
+    with ``Money.of``, so they are summed exactly. Non-positive weights
+    (credits and refunds) only reduce ``total``; the sketch needs
+    non-negative weights for its guarantees.
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.total = Money(0)
+        self.keys_seen = 0
+        self._counters = {}
+        # (count, key) entries, some of them stale; rebuilt when it grows
+        self._heap = []
+
+    def add(self, key, weight):
+        """Add weight to a key"""
+        weight = Money.of(weight)
+        self.total += weight
+        if weight <= 0:
+            return
+
+        counter = self._counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self._counters) < self.capacity:
+            self.keys_seen += 1
+            counter = self._counters[key] = [weight, Money(0)]
+        else:
+            self.keys_seen += 1
+            smallest, count = self._pop_min()
+            del self._counters[smallest]
+            counter = self._counters[key] = [count + weight, count]
+
+        heapq.heappush(self._heap, (counter[0], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, (count, _) in self._counters.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        """Remove and return the key with the smallest current count"""
+        while True:
+            count, key = heapq.heappop(self._heap)
+            counter = self._counters.get(key)
+            if counter is not None and counter[0] == count:
+                return key, count
+
+    def __len__(self):
+        return len(self._counters)
+
+    def top(self, n):
+        """The ``n`` keys with the highest estimated total"""
+        ranked = sorted(self._counters.items(), key=lambda item: -item[1][0])
+        return [HeavyHitter(key, count, error) for key, (count, error) in ranked[:n]]
+
+
+@dataclass
+class Attribution:
+    """Top spenders per tag and per service's resources
+
+    ``errors`` lists ``(kind, name, error)`` of the tags (kind ``"tag"``)
+    and services (kind ``"resources"``) that could not be attributed.
+    """
+
+    tags: dict = field(default_factory=dict)
+    resources: dict = field(default_factory=dict)
+    errors: list = field(default_factory=list)
+
+
+def _stream_groups(call, backoff, **kwargs):
+    """Yield (key, cost) of every group, one Cost Explorer page at a time"""
+    while True:
+        response = backoff.call(call, **kwargs)
+        for result in response["ResultsByTime"]:
+            for group in result["Groups"]:
+                yield (
+                    group["Keys"][0],
+                    Money.parse(group["Metrics"]["UnblendedCost"]["Amount"]),
+                )
+        token = response.get("NextPageToken")
+        if not token:
+            return
+        kwargs["NextPageToken"] = token
+
+
+def _tag_value(key):
+    """Tag value of a ``tag$value`` group key, empty for untagged costs"""
+    return key.split("$", 1)[-1]
+
+
+def attribute_tag(ce, tag, start_date, end_date, backoff, capacity=SKETCH_CAPACITY):
+    """Stream the period's costs grouped by a cost-allocation tag into a sketch"""
+    sketch = SpaceSaving(capacity)
+    for key, cost in _stream_groups(
+        ce.get_cost_and_usage,
+        backoff,
+        TimePeriod={"Start": start_date.isoformat(), "End": end_date.isoformat()},
+        Granularity="MONTHLY",
+        Metrics=["UnblendedCost"],
+        GroupBy=[{"Type": "TAG", "Key": tag}],
+    ):
+        sketch.add(_tag_value(key), cost)
+    return sketch
+
+
+def attribute_resources(
+    ce, service, start_date, end_date, backoff, capacity=SKETCH_CAPACITY
+):
+    """Stream one service's costs grouped by resource ID into a sketch
+
+    The start is clamped to the 14 days that resource-level data covers.
+    """
+    start_date = max(start_date, end_date - timedelta(days=RESOURCE_LOOKBACK_DAYS))
+    sketch = SpaceSaving(capacity)
+    for key, cost in _stream_groups(
+        ce.get_cost_and_usage_with_resources,
+        backoff,
+        TimePeriod={"Start": start_date.isoformat(), "End": end_date.isoformat()},
+        Granularity="DAILY",
+        Metrics=["UnblendedCost"],
+        Filter={"Dimensions": {"Key": "SERVICE", "Values": [service]}},
+        GroupBy=[{"Type": "DIMENSION", "Key": "RESOURCE_ID"}],
+    ):
+        sketch.add(key, cost)
+    return sketch
+
+
+def collect_attribution(
+    ce,
+    start_date,
+    end_date,
+    tags=(),
+    resource_services=(),
+    top_n=TOP_SPENDERS,
+    backoff=None,
+):
+    """Collect the top spenders for each tag and each service's resources
+
+    A failing tag or service, for example because resource-level data is not
+    enabled, is recorded in ``errors`` and the others are still reported.
+    """
+    if backoff is None:
+        from cost_notifier import AdaptiveBackoff
+
+        backoff = AdaptiveBackoff()
+
+    capacity = max(SKETCH_CAPACITY, top_n * 10)
+    attribution = Attribution()
+
+    for tag in tags:
+        try:
+            sketch = attribute_tag(ce, tag, start_date, end_date, backoff, capacity)
+        except Exception as e:
+            print(f"Error attributing costs to tag {tag}: {e}")
+            attribution.errors.append(("tag", tag, str(e)))
+            continue
+        attribution.tags[tag] = sketch.top(top_n)
+
+    for service in resource_services:
+        try:
+            sketch = attribute_resources(
+                ce, service, start_date, end_date, backoff, capacity
+            )
+        except Exception as e:
+            print(f"Error attributing costs to resources of {service}: {e}")
+            attribution.errors.append(("resources", service, str(e)))
+            continue
+        attribution.resources[service] = sketch.top(top_n)
+
+    return attribution
+
+
+def _format_hitters(hitters, s):
+    lines = []
+    for hitter in hitters:
+        line = f"  {hitter.key or s['untagged']}: ${hitter.cost:.2f}"
+        if hitter.error >= SHOWN_ERROR:
+            line += s["attribution_error"].format(error=f"{hitter.error:.2f}")
+        lines.append(line)
+    return lines or [s["attribution_empty"]]
+
+
+def format_attribution_section(attribution, language="ja"):
+    """Build the cost attribution report section
+
+    Untagged costs are listed under an empty key and labelled here.
+    """
+    s = STRINGS[language]
+    lines = []
+
+    for tag, hitters in attribution.tags.items():
+        if lines:
+            lines.append("")
+        lines.append(s["attribution_tag"].format(tag=tag))
+        lines.extend(_format_hitters(hitters, s))
+
+    for service, hitters in attribution.resources.items():
+        if lines:
+            lines.append("")
+        lines.append(
+            s["attribution_resources"].format(
+                service=service, days=RESOURCE_LOOKBACK_DAYS
+            )
+        )
+        lines.extend(_format_hitters(hitters, s))
+
+    if attribution.errors:
+        if lines:
+            lines.append("")
+        lines.append(s["attribution_failed"])
+        for kind, name, error in attribution.errors:
+            if kind == "tag":
+                name = s["attribution_tag_name"].format(tag=name)
+            lines.append(f"  {name}: {error}")
+
+    return (s["attribution_title"], lines)
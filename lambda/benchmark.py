@@ -0,0 +1,345 @@
+"""
+End-to-end benchmark of lambda_handler against the simulated AWS backend.
+
+Each iteration runs the handler with instrumentation enabled while a
+background thread samples the process RSS. The report lists latency
+percentiles and peak RSS per stage, and can be stored as a baseline that
+later runs are compared against to detect regressions, without network
+access:
+
+    python benchmark.py                                # small scenario
+    python benchmark.py --scenario large --iterations 10
+    python benchmark.py --scenario large --save-baseline
+    python benchmark.py --scenario large --compare     # exit 1 on regression
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from datetime import datetime
+
+import async_engine
+import clients
+import cost_notifier
+import forecast
+import instrumentation
+from simulated_aws import SimulatedBackend, SimulationConfig
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "benchmark_baselines.json")
+
+# Allowed growth over the baseline before a stage counts as regressed
+LATENCY_TOLERANCE = 0.25
+RSS_TOLERANCE = 0.20
+
+# Growth below these is timer and allocator noise, whatever the percentage
+MIN_LATENCY_REGRESSION_MS = 5.0
+MIN_RSS_REGRESSION_MB = 5.0
+
+RSS_SAMPLE_INTERVAL = 0.002
+
+PERCENTILES = (50, 90, 99)
+
+# Environment every scenario runs with
+BASE_ENVIRONMENT = {
+    "SNS_TOPIC_ARN": "arn:aws:sns:us-east-1:123456789012:benchmark",
+    "ENABLE_INSTRUMENTATION": "true",
+    "ENABLE_COST_FORECAST": "true",
+    "ENABLE_ANOMALY_DETECTION": "true",
+    "ENABLE_TREND_ANALYTICS": "true",
+}
+
+# name: (simulated account, extra environment)
+SCENARIOS = {
+    "small": (
+        SimulationConfig(
+            services=50,
+            ec2_instances=200,
+            rds_instances=20,
+            s3_buckets=50,
+            lambda_functions=100,
+            latency=0.01,
+            latency_jitter=0.005,
+        ),
+        {"DAYS_TO_CHECK": "30"},
+    ),
+    "large": (
+        SimulationConfig(),
+        {"DAYS_TO_CHECK": "365", "COST_SHARD_DAYS": "92"},
+    ),
+    "throttled": (
+        SimulationConfig(throttle_rate=0.2),
+        {"DAYS_TO_CHECK": "365", "COST_SHARD_DAYS": "31"},
+    ),
+    "large-async": (
+        SimulationConfig(),
+        {
+            "DAYS_TO_CHECK": "365",
+            "COST_SHARD_DAYS": "92",
+            "ENABLE_ASYNC_ENGINE": "true",
+        },
+    ),
+}
+
+# Environment variables that would change what the handler does
+_CLEARED_ENVIRONMENT = (
+    "TARGET_ROLE_ARNS",
+    "COST_CACHE_BUCKET",
+    "COST_CACHE_DIR",
+    "COST_SHARD_DAYS",
+    "ENABLE_ASYNC_ENGINE",
+)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def current_rss():
+    """Resident set size of the process in bytes
+
+    Reads /proc on Linux; elsewhere falls back to the peak RSS so far.
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """Sample the process RSS on a background thread"""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append((time.perf_counter(), current_rss()))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.samples.append((time.perf_counter(), current_rss()))
+
+    def peak(self, start, end):
+        """Highest RSS sampled between two ``time.perf_counter()`` values"""
+        values = [rss for at, rss in self.samples if start <= at <= end]
+        if not values:
+            earlier = [rss for at, rss in self.samples if at <= start]
+            values = earlier[-1:] or [current_rss()]
+        return max(values)
+
+
+@contextlib.contextmanager
+def _environment(values):
+    """Temporarily replace environment variables"""
+    saved = {name: os.environ.get(name) for name in values}
+    saved.update({name: os.environ.get(name) for name in _CLEARED_ENVIRONMENT})
+    for name in _CLEARED_ENVIRONMENT:
+        os.environ.pop(name, None)
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextlib.contextmanager
+def _simulated(backend):
+    """Serve every client of the report from the simulated backend"""
+    saved = clients.registry, async_engine.create_client
+    clients.registry = backend.registry()
+    async_engine.create_client = backend.async_client
+    try:
+        yield
+    finally:
+        clients.registry, async_engine.create_client = saved
+
+
+def run_once(backend, environment):
+    """Run the handler once; returns the Recorder and the RSS sampler"""
+    recorders = []
+    instrumentation.add_hook(recorders.append)
+    # The forecast is memoized per day, which would hide it after one run
+    forecast._memo.clear()
+    try:
+        with _environment(dict(BASE_ENVIRONMENT, **environment)), _simulated(
+            backend
+        ), RssSampler() as sampler, contextlib.redirect_stdout(io.StringIO()):
+            response = cost_notifier.lambda_handler({}, None)
+    finally:
+        instrumentation.remove_hook(recorders.append)
+
+    if response["statusCode"] != 200:
+        raise RuntimeError(f"lambda_handler failed: {response}")
+    return recorders[0], sampler
+
+
+def run_scenario(name, iterations=5, warmup=1, config=None):
+    """Benchmark a scenario and summarize every stage
+
+    Returns ``{stage: {"p50_ms", "p90_ms", "p99_ms", "peak_rss_mb"}}`` with
+    an ``invocation`` entry for the whole handler. Warm-up runs are
+    discarded; they pay for one-time work such as generating the simulated
+    payloads.
+    """
+    scenario_config, environment = SCENARIOS[name]
+    backend = SimulatedBackend(config or scenario_config)
+
+    durations = {}
+    peaks = {}
+    for iteration in range(warmup + iterations):
+        recorder, sampler = run_once(backend, environment)
+        if iteration < warmup:
+            continue
+
+        run_durations = {"invocation": recorder.duration_ms}
+        run_peaks = {"invocation": max(rss for _, rss in sampler.samples)}
+        for stage, started, ended in recorder.spans:
+            run_durations[stage] = run_durations.get(stage, 0.0) + (
+                (ended - started) * 1000
+            )
+            run_peaks[stage] = max(
+                run_peaks.get(stage, 0), sampler.peak(started, ended)
+            )
+
+        for stage, duration in run_durations.items():
+            durations.setdefault(stage, []).append(duration)
+            peaks[stage] = max(peaks.get(stage, 0), run_peaks[stage])
+
+    summary = {}
+    for stage, values in durations.items():
+        summary[stage] = {
+            f"p{pct}_ms": round(percentile(values, pct), 3) for pct in PERCENTILES
+        }
+        summary[stage]["peak_rss_mb"] = round(peaks[stage] / 2**20, 1)
+    return summary
+
+
+def compare(summary, baseline, latency_tolerance=None, rss_tolerance=None):
+    """List the stages that regressed against a baseline summary
+
+    A stage regresses when its median latency or its peak RSS grows by more
+    than the tolerance and by more than the noise floor. Stages missing from
+    either side are ignored; growth from a zero baseline, e.g. of a stage
+    that was skipped when it was recorded, is flagged without a percentage.
+    """
+    if latency_tolerance is None:
+        latency_tolerance = LATENCY_TOLERANCE
+    if rss_tolerance is None:
+        rss_tolerance = RSS_TOLERANCE
+
+    regressions = []
+    for stage, expected in sorted(baseline.items()):
+        actual = summary.get(stage)
+        if actual is None:
+            continue
+        for key, tolerance, floor in (
+            ("p50_ms", latency_tolerance, MIN_LATENCY_REGRESSION_MS),
+            ("peak_rss_mb", rss_tolerance, MIN_RSS_REGRESSION_MB),
+        ):
+            growth = actual[key] - expected[key]
+            if growth <= floor or actual[key] <= expected[key] * (1 + tolerance):
+                continue
+            if expected[key] > 0:
+                change = f"+{(actual[key] / expected[key] - 1) * 100:.0f}%"
+            else:
+                change = "zero baseline"
+            regressions.append(
+                f"{stage} {key}: {actual[key]} > {expected[key]} ({change})"
+            )
+    return regressions
+
+
+def load_baselines(path=BASELINE_FILE):
+    """Load stored baselines, keyed by scenario"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(name, summary, path=BASELINE_FILE):
+    """Store a scenario summary as its baseline"""
+    baselines = load_baselines(path)
+    baselines[name] = {
+        "recorded": datetime.now().strftime("%Y-%m-%d"),
+        "python": platform.python_version(),
+        "stages": summary,
+    }
+    with open(path, "w", encoding="utf-8") as baseline_file:
+        json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write("\n")
+
+
+def format_summary(name, summary):
+    """Render a summary as a table"""
+    header = f"{'stage':<20}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'RSS MB':>10}"
+    lines = [f"scenario: {name}", header, "-" * len(header)]
+    for stage in sorted(summary, key=lambda s: (s != "invocation", s)):
+        values = summary[stage]
+        lines.append(
+            f"{stage:<20}{values['p50_ms']:>10.1f}{values['p90_ms']:>10.1f}"
+            f"{values['p99_ms']:>10.1f}{values['peak_rss_mb']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="small")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--baseline-file", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    args = parser.parse_args(argv)
+
+    summary = run_scenario(args.scenario, args.iterations, args.warmup)
+    print(format_summary(args.scenario, summary))
+
+    if args.save_baseline:
+        save_baseline(args.scenario, summary, args.baseline_file)
+        print(f"Baseline saved to {args.baseline_file}")
+
+    if args.compare:
+        baseline = load_baselines(args.baseline_file).get(args.scenario)
+        if baseline is None:
+            print(f"No baseline for scenario {args.scenario}")
+            return 1
+        regressions = compare(summary, baseline["stages"])
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
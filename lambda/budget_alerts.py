@@ -0,0 +1,168 @@
+"""
+Hourly budget alerts on today's running costs.
+
+The daily report tells about a spend spike up to a day late. Budget alerts
+run every hour on the costs of the current (partial, UTC) day and notify
+as soon as the total or a service crosses its daily budget.
+
+Each run makes one Cost Explorer request: the current day at DAILY
+granularity, grouped by service only when service budgets are configured.
+A budget crossed once is not alerted again on the same day; the names
+already alerted are kept in the cost cache backend under a single key.
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from renderers import STRINGS
+
+STATE_KEY = "budget-alerts/latest"
+
+# Name of the total budget in breaches and in the alerted state
+TOTAL = "total"
+
+
+@dataclass
+class Budgets:
+    """Daily budgets (USD) of the total and of single services"""
+
+    total: Decimal = None
+    services: dict = field(default_factory=dict)
+
+    def __bool__(self):
+        return self.total is not None or bool(self.services)
+
+
+@dataclass
+class Breach:
+    """A budget that today's cost has reached"""
+
+    name: str
+    spent: Decimal
+    budget: Decimal
+
+    @property
+    def ratio(self):
+        return self.spent / self.budget
+
+
+def _amount(value, name):
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"invalid budget for {name}: {value}")
+    if not amount.is_finite() or amount < 0:
+        raise ValueError(f"budget for {name} must not be negative: {value}")
+    return amount
+
+
+def parse_budgets(total=None, services=None):
+    """Read budgets from their environment values
+
+    ``total`` is a number and ``services`` a JSON object mapping service
+    names to numbers. Empty values and budgets of 0 mean no budget.
+    """
+    budgets = Budgets()
+    if total and total.strip():
+        amount = _amount(total, TOTAL)
+        if amount:
+            budgets.total = amount
+    if services and services.strip():
+        mapping = json.loads(services)
+        if not isinstance(mapping, dict):
+            raise ValueError("service budgets must be a JSON object")
+        for service, value in mapping.items():
+            amount = _amount(value, service)
+            if amount:
+                budgets.services[service] = amount
+    return budgets
+
+
+def fetch_today_costs(ce, today, by_service=True):
+    """Fetch the costs of today so far; returns ``(total, {service: cost})``
+
+    One GetCostAndUsage request covers the day. Pages are followed, but a
+    single day grouped by service fits one page.
+    """
+    kwargs = {
+        "TimePeriod": {
+            "Start": today.isoformat(),
+            "End": (today + timedelta(days=1)).isoformat(),
+        },
+        "Granularity": "DAILY",
+        "Metrics": ["UnblendedCost"],
+    }
+    if by_service:
+        kwargs["GroupBy"] = [{"Type": "DIMENSION", "Key": "SERVICE"}]
+
+    total = Decimal("0")
+    services = {}
+    while True:
+        response = ce.get_cost_and_usage(**kwargs)
+        for result in response["ResultsByTime"]:
+            if not by_service:
+                total += Decimal(result["Total"]["UnblendedCost"]["Amount"])
+            for group in result.get("Groups", []):
+                cost = Decimal(group["Metrics"]["UnblendedCost"]["Amount"])
+                service = group["Keys"][0]
+                services[service] = services.get(service, Decimal("0")) + cost
+                total += cost
+        token = response.get("NextPageToken")
+        if not token:
+            return total, services
+        kwargs["NextPageToken"] = token
+
+
+def check_budgets(total, services, budgets):
+    """Return the budgets reached by the costs, the total first"""
+    breaches = []
+    if budgets.total is not None and total >= budgets.total:
+        breaches.append(Breach(TOTAL, total, budgets.total))
+    for service, budget in sorted(budgets.services.items()):
+        spent = services.get(service, Decimal("0"))
+        if spent >= budget:
+            breaches.append(Breach(service, spent, budget))
+    return breaches
+
+
+def load_alerted(backend, day):
+    """Names alerted on the day according to the stored state"""
+    state = backend.get(STATE_KEY) if backend is not None else None
+    if not state or state.get("day") != day.isoformat():
+        return set()
+    return set(state.get("alerted", []))
+
+
+def save_alerted(backend, day, names):
+    """Store the names alerted on the day, replacing an earlier day's state"""
+    backend.put(STATE_KEY, {"day": day.isoformat(), "alerted": sorted(names)})
+
+
+def format_alert(breaches, day, language="ja"):
+    """Alert message listing the budgets crossed"""
+    s = STRINGS[language]
+    lines = [
+        s["alert_title"],
+        s["alert_day"].format(day=day.isoformat()),
+        "",
+        s["alert_reached"],
+    ]
+    for breach in breaches:
+        name = s["alert_total"] if breach.name == TOTAL else breach.name
+        lines.append(
+            s["alert_line"].format(
+                name=name,
+                spent=f"{breach.spent:.2f}",
+                budget=f"{breach.budget:.2f}",
+                ratio=f"{breach.ratio:.0%}",
+            )
+        )
+    lines.append("")
+    lines.append(s["alert_footer"])
+    return "\n".join(lines)
+
+
+def alert_subject(day):
+    return f"AWS Budget Alert - {day.isoformat()}"
@@ -0,0 +1,102 @@
+"""
+Lazily created, memoized boto3 clients.
+
+Creating a client loads the service's botocore model, which is a large part
+of a cold start. Clients are therefore created on first use instead of at
+import time, all from one shared session, and kept for the lifetime of the
+execution environment so warm invocations reuse their connection pools.
+"""
+
+import threading
+
+import instrumentation
+
+# Enough connections for the largest thread pool that shares a client
+MAX_POOL_CONNECTIONS = 16
+
+
+class ClientRegistry:
+    """Create each boto3 client once, from a single shared session"""
+
+    def __init__(self, session_factory=None, config=None):
+        self._session_factory = session_factory
+        self._config = config
+        self._session = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self):
+        if self._session_factory is not None:
+            return self._session_factory()
+
+        import boto3
+        from botocore.config import Config
+
+        if self._config is None:
+            self._config = Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+        return instrumentation.instrument_session(boto3.session.Session())
+
+    def client(self, service_name, region_name=None):
+        """Return the client for the service, creating it on first use"""
+        key = (service_name, region_name)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        # boto3 sessions are not thread safe, so creation is serialized
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                if self._session is None:
+                    self._session = self._create_session()
+                kwargs = {"region_name": region_name}
+                if self._config is not None:
+                    kwargs["config"] = self._config
+                client = self._session.client(service_name, **kwargs)
+                self._clients[key] = client
+        return client
+
+    def credentials(self):
+        """Credentials of the shared session, which also sign presigned URLs"""
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session()
+        return self._session.get_credentials()
+
+    def created(self):
+        """Services whose clients have been created so far"""
+        return [service_name for service_name, _ in self._clients]
+
+    def reset(self):
+        """Drop every client and the session"""
+        with self._lock:
+            self._clients.clear()
+            self._session = None
+
+
+registry = ClientRegistry()
+
+
+def get_client(service_name, region_name=None):
+    """Return the shared client for the service"""
+    return registry.client(service_name, region_name)
+
+
+def get_credentials():
+    """Return the credentials of the shared session"""
+    return registry.credentials()
+
+
+class LazyClient:
+    """Stand-in for a boto3 client that is created on first attribute access"""
+
+    def __init__(self, service_name, client_registry=None):
+        self._service_name = service_name
+        self._registry = client_registry
+
+    def __getattr__(self, name):
+        client_registry = self._registry or registry
+        return getattr(client_registry.client(self._service_name), name)
+
+    def __repr__(self):
+        return f"LazyClient({self._service_name!r})"
@@ -2,12 +2,59 @@
 Pytest configuration and fixtures for testing cost_notifier Lambda function.
 """
 
+import threading
+import time
 import pytest
+from botocore.exceptions import ClientError
+from datetime import date, timedelta
 from unittest.mock import Mock, MagicMock
 from decimal import Decimal
 from datetime import datetime
 
 
+def paginated_client(operation, pages):
+    """Build a mock client whose paginator for the operation yields the pages
+
+    Passing an exception instead of a page list makes pagination raise it.
+    """
+    paginator = Mock()
+    if isinstance(pages, Exception):
+        paginator.paginate.side_effect = pages
+    else:
+        paginator.paginate.side_effect = lambda **kwargs: iter(pages)
+
+    client = Mock()
+    client.get_paginator.side_effect = {operation: paginator}.__getitem__
+    return client
+
+
+class _EmptyAccountSession:
+    """Session whose clients page through no resources"""
+
+    def client(self, service_name, **kwargs):
+        client = MagicMock(name=service_name)
+        client.get_paginator.return_value.paginate.side_effect = lambda **kwargs: iter(
+            []
+        )
+        return client
+
+
+@pytest.fixture(autouse=True)
+def offline_client_registry(monkeypatch):
+    """Serve the clients a test does not patch from an empty account
+
+    The report collects more resource types than most tests patch clients
+    for; this keeps those collectors from reaching AWS.
+    """
+    import clients
+
+    monkeypatch.setattr(
+        clients,
+        "registry",
+        clients.ClientRegistry(session_factory=_EmptyAccountSession),
+    )
+
+
 @pytest.fixture
 def mock_cost_response():
     """Mock response from AWS Cost Explorer API"""
@@ -99,45 +146,42 @@ def mock_sns_client_exception():
 @pytest.fixture
 def mock_ec2_client():
     """Mock EC2 client"""
-    client = Mock()
-    client.describe_instances.return_value = {
-        "Reservations": [
+    return paginated_client(
+        "describe_instances",
+        [
             {
-                "Instances": [
-                    {"State": {"Name": "running"}},
-                    {"State": {"Name": "running"}},
+                "Reservations": [
+                    {
+                        "Instances": [
+                            {"State": {"Name": "running"}},
+                            {"State": {"Name": "running"}},
+                        ]
+                    }
                 ]
             },
-            {"Instances": [{"State": {"Name": "stopped"}}]},
-        ]
-    }
-    return client
+            {"Reservations": [{"Instances": [{"State": {"Name": "stopped"}}]}]},
+        ],
+    )
 
 
 @pytest.fixture
 def mock_ec2_client_exception():
     """Mock EC2 client that raises exception"""
-    client = Mock()
-    client.describe_instances.side_effect = Exception("EC2 Error")
-    return client
+    return paginated_client("describe_instances", Exception("EC2 Error"))
 
 
 @pytest.fixture
 def mock_rds_client():
     """Mock RDS client"""
-    client = Mock()
-    client.describe_db_instances.return_value = {
-        "DBInstances": [{"DBInstanceStatus": "available"}]
-    }
-    return client
+    return paginated_client(
+        "describe_db_instances", [{"DBInstances": [{"DBInstanceStatus": "available"}]}]
+    )
 
 
 @pytest.fixture
 def mock_rds_client_exception():
     """Mock RDS client that raises exception"""
-    client = Mock()
-    client.describe_db_instances.side_effect = Exception("RDS Error")
-    return client
+    return paginated_client("describe_db_instances", Exception("RDS Error"))
 
 
 @pytest.fixture
@@ -167,19 +211,19 @@ def mock_s3_client_exception():
 @pytest.fixture
 def mock_lambda_client():
     """Mock Lambda client"""
-    client = Mock()
-    client.list_functions.return_value = {
-        "Functions": [{"FunctionName": "function1"}, {"FunctionName": "function2"}]
-    }
-    return client
+    return paginated_client(
+        "list_functions",
+        [
+            {"Functions": [{"FunctionName": "function1"}]},
+            {"Functions": [{"FunctionName": "function2"}]},
+        ],
+    )
 
 
 @pytest.fixture
 def mock_lambda_client_exception():
     """Mock Lambda client that raises exception"""
-    client = Mock()
-    client.list_functions.side_effect = Exception("Lambda Error")
-    return client
+    return paginated_client("list_functions", Exception("Lambda Error"))
 
 
 @pytest.fixture
@@ -187,3 +231,143 @@ def mock_environment(monkeypatch):
     """Mock environment variables"""
     monkeypatch.setenv("SNS_TOPIC_ARN", "arn:aws:sns:us-east-1:123456789012:test-topic")
     monkeypatch.setenv("DAYS_TO_CHECK", "7")
+
+
+# Simulated round-trip time of a single resource API call
+RESOURCE_API_LATENCY = 0.1
+
+
+def _with_latency(response):
+    """Build a side effect that sleeps before returning the response"""
+
+    def call(*args, **kwargs):
+        time.sleep(RESOURCE_API_LATENCY)
+        return response
+
+    return call
+
+
+def _paginated_with_latency(operation, page):
+    """Build a paginated mock client that sleeps before yielding its page"""
+
+    def pages():
+        time.sleep(RESOURCE_API_LATENCY)
+        yield page
+
+    client = paginated_client(operation, [])
+    client.get_paginator(operation).paginate.side_effect = lambda **kwargs: pages()
+    return client
+
+
+@pytest.fixture
+def slow_resource_clients():
+    """Resource clients that inject API latency, keyed by module attribute"""
+    ec2 = _paginated_with_latency(
+        "describe_instances",
+        {"Reservations": [{"Instances": [{"State": {"Name": "running"}}]}]},
+    )
+
+    rds = _paginated_with_latency(
+        "describe_db_instances", {"DBInstances": [{"DBInstanceStatus": "available"}]}
+    )
+
+    s3 = Mock()
+    s3.list_buckets.side_effect = _with_latency({"Buckets": [{"Name": "bucket1"}]})
+
+    lambda_ = _paginated_with_latency(
+        "list_functions", {"Functions": [{"FunctionName": "function1"}]}
+    )
+
+    return {
+        "ec2_client": ec2,
+        "rds_client": rds,
+        "s3_client": s3,
+        "lambda_client": lambda_,
+    }
+
+
+class PagedCostExplorer:
+    """Fake Cost Explorer client with injected latency and page limits
+
+    Every day has one group per service. Groups are split into pages of at
+    most ``page_size``, so a day can continue on the next page, like the real
+    API. More than ``max_concurrency`` requests in flight are throttled.
+    """
+
+    def __init__(self, services=10, page_size=100, latency=0.0, max_concurrency=None):
+        self.services = [f"Service{i:03d}" for i in range(services)]
+        self.page_size = page_size
+        self.latency = latency
+        self.max_concurrency = max_concurrency
+        self.requests = []
+        self.throttled = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def amount(self, day, service):
+        """Deterministic cost of a service on a day"""
+        return f"{(day.toordinal() % 7 + int(service[-3:])) / 100:.2f}"
+
+    def _cells(self, start, end):
+        day = start
+        while day < end:
+            for service in self.services:
+                yield day, service
+            day += timedelta(days=1)
+
+    def get_cost_and_usage(self, TimePeriod, NextPageToken=None, **kwargs):
+        with self._lock:
+            self.requests.append((TimePeriod["Start"], TimePeriod["End"]))
+            self._in_flight += 1
+            throttled = (
+                self.max_concurrency is not None
+                and self._in_flight > self.max_concurrency
+            )
+            if throttled:
+                self.throttled += 1
+        try:
+            time.sleep(self.latency)
+            if throttled:
+                raise ClientError(
+                    {"Error": {"Code": "ThrottlingException", "Message": "Rate"}},
+                    "GetCostAndUsage",
+                )
+            return self._page(TimePeriod, int(NextPageToken or 0))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _page(self, time_period, offset):
+        start = date.fromisoformat(time_period["Start"])
+        end = date.fromisoformat(time_period["End"])
+        cells = list(self._cells(start, end))
+        page = cells[offset : offset + self.page_size]
+
+        results = {}
+        for day, service in page:
+            result = results.setdefault(
+                day,
+                {
+                    "TimePeriod": {
+                        "Start": day.isoformat(),
+                        "End": (day + timedelta(days=1)).isoformat(),
+                    },
+                    "Groups": [],
+                },
+            )
+            result["Groups"].append(
+                {
+                    "Keys": [service],
+                    "Metrics": {
+                        "UnblendedCost": {
+                            "Amount": self.amount(day, service),
+                            "Unit": "USD",
+                        }
+                    },
+                }
+            )
+
+        response = {"ResultsByTime": list(results.values())}
+        if offset + self.page_size < len(cells):
+            response["NextPageToken"] = str(offset + self.page_size)
+        return response
@@ -0,0 +1,262 @@
+"""
+Persistent cache of Cost Explorer results, one entry per day.
+
+Cost Explorer keeps revising the most recent days, but older days are
+settled. Settled days are served from the cache and only the recent days are
+fetched again, which saves both request charges and latency on long windows.
+Entries are stored through a small backend interface, so the same cache can
+live in a local directory or an S3 bucket.
+"""
+
+import json
+import os
+import threading
+from datetime import date, timedelta
+from urllib.parse import quote, unquote
+
+# The most recent days are still revised by Cost Explorer and never cached
+SETTLE_DAYS = 3
+
+# Entries for days older than this are evicted
+MAX_AGE_DAYS = 400
+
+# First segment of an entry key, after the namespace
+GRANULARITIES = ("DAILY", "MONTHLY", "HOURLY")
+
+
+class CacheBackend:
+    """Storage interface for cache entries
+
+    Keys are strings and values are JSON-serializable dicts. Implement this
+    interface to keep the cache somewhere else, e.g. in DynamoDB.
+    """
+
+    def get(self, key):
+        """Return the value stored under the key, or None"""
+        raise NotImplementedError
+
+    def put(self, key, value):
+        """Store the value under the key"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove the key if it exists"""
+        raise NotImplementedError
+
+    def keys(self):
+        """Return all stored keys"""
+        raise NotImplementedError
+
+
+class LocalFileCacheBackend(CacheBackend):
+    """Cache backend storing one JSON file per key in a local directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, quote(key, safe="") + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self):
+        return [
+            unquote(name[: -len(".json")])
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+
+
+class S3CacheBackend(CacheBackend):
+    """Cache backend storing one JSON object per key under an S3 prefix"""
+
+    def __init__(self, bucket, prefix="cost-cache/", client=None):
+        if client is None:
+            from clients import get_client
+
+            client = get_client("s3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response["Body"].read())
+
+    def put(self, key, value):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + key,
+            Body=json.dumps(value).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def keys(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        return [
+            item["Key"][len(self.prefix) :]
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix)
+            for item in page.get("Contents", [])
+        ]
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Cache backend keeping entries in memory, for one warm container"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, value):
+        self.entries[key] = value
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+    def keys(self):
+        return list(self.entries)
+
+
+class CacheStats:
+    """Hit and miss counters shared by a cache and its namespaced views"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+def group_by_key(group_by):
+    """Encode a Cost Explorer GroupBy list as a cache key component"""
+    return ",".join(f"{group['Type']}:{group['Key']}" for group in group_by) or "NONE"
+
+
+class CostCache:
+    """Day-level cache of Cost Explorer ``ResultsByTime`` entries
+
+    Entries are keyed by (date, granularity, group-by) within an optional
+    namespace, such as the account ID in multi-account reports.
+    """
+
+    def __init__(
+        self,
+        backend,
+        settle_days=SETTLE_DAYS,
+        max_age_days=MAX_AGE_DAYS,
+        namespace="",
+        stats=None,
+    ):
+        self.backend = backend
+        self.settle_days = settle_days
+        self.max_age_days = max_age_days
+        self.namespace = namespace
+        self.stats = stats or CacheStats()
+
+    @property
+    def hits(self):
+        return self.stats.hits
+
+    @property
+    def misses(self):
+        return self.stats.misses
+
+    def namespaced(self, namespace):
+        """Return a view of the cache that keeps its entries under a namespace"""
+        return CostCache(
+            self.backend,
+            settle_days=self.settle_days,
+            max_age_days=self.max_age_days,
+            namespace=namespace,
+            stats=self.stats,
+        )
+
+    def _key(self, day, granularity, group_by):
+        key = f"{granularity}/{group_by_key(group_by)}/{day.isoformat()}"
+        return f"{self.namespace}/{key}" if self.namespace else key
+
+    def _entry_day(self, key):
+        """Day of a key built by ``_key`` in this cache's scope, or None
+
+        The backend is shared with other state (anomaly baselines, snapshots,
+        ...), so only keys of the form ``[namespace/]granularity/group-by/day``
+        are entries. The root cache also owns the entries of its namespaced
+        views.
+        """
+        if self.namespace:
+            prefix = f"{self.namespace}/"
+            if not key.startswith(prefix):
+                return None
+            segments = key[len(prefix) :].split("/")
+        else:
+            segments = key.split("/")
+            if segments[0] not in GRANULARITIES:
+                segments = segments[1:]
+        if len(segments) < 3 or segments[0] not in GRANULARITIES:
+            return None
+        try:
+            return date.fromisoformat(segments[-1])
+        except ValueError:
+            return None
+
+    def is_settled(self, day, today):
+        """Whether Cost Explorer no longer revises the day's costs"""
+        return day < today - timedelta(days=self.settle_days)
+
+    def get(self, day, granularity, group_by):
+        """Return the cached result for the day and count the hit or miss"""
+        result = self.backend.get(self._key(day, granularity, group_by))
+        self.stats.record(result is not None)
+        return result
+
+    def put(self, day, granularity, group_by, result):
+        """Store the result for the day"""
+        self.backend.put(self._key(day, granularity, group_by), result)
+
+    def evict(self, today):
+        """Delete entries for days older than the maximum age
+
+        Only keys of this cache are considered; other state in the same
+        backend is left alone. Returns the number of evicted entries.
+        """
+        oldest = today - timedelta(days=self.max_age_days)
+        evicted = 0
+        for key in self.backend.keys():
+            day = self._entry_day(key)
+            if day is not None and day < oldest:
+                self.backend.delete(key)
+                evicted += 1
+        return evicted
@@ -0,0 +1,171 @@
+"""
+Columnar dates x services cost matrix for long-horizon trend analytics.
+
+Rolling averages, week-over-week deltas and per-service z-scores over a year
+of daily data are vectorized NumPy operations on a dense matrix instead of
+loops over nested dicts. The matrix holds float64 values, which is plenty for
+trends; the exact totals shown in the report still come from the fixed-point
+``money.Money`` aggregation in ``aggregation.aggregate_costs``.
+
+NumPy is optional. Without it ``numpy_available()`` is False and the report
+is sent without the trend section.
+"""
+
+from renderers import STRINGS
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without NumPy
+    np = None
+
+ROLLING_WINDOW = 7
+
+# Services whose latest day deviates more than this many standard deviations
+# from their own history are listed in the report
+ZSCORE_THRESHOLD = 3.0
+
+TOP_MOVERS = 5
+
+
+def numpy_available():
+    """Whether the optional NumPy dependency is installed"""
+    return np is not None
+
+
+class CostMatrix:
+    """Daily costs as a dense dates x services float64 matrix"""
+
+    def __init__(self, dates, services, values):
+        self.dates = dates
+        self.services = services
+        self.values = values
+
+    @classmethod
+    def from_cost_data(cls, cost_data):
+        """Build the matrix from a Cost Explorer ``ResultsByTime`` response
+
+        Groups are collected into flat index and amount arrays once, then
+        parsed and scattered into the matrix with vectorized operations.
+        """
+        date_index = {}
+        service_index = {}
+        rows = []
+        columns = []
+        amounts = []
+
+        for result in cost_data["ResultsByTime"]:
+            row = date_index.setdefault(result["TimePeriod"]["Start"], len(date_index))
+            for group in result["Groups"]:
+                service = group["Keys"][0]
+                rows.append(row)
+                columns.append(service_index.setdefault(service, len(service_index)))
+                amounts.append(group["Metrics"]["UnblendedCost"]["Amount"])
+
+        shape = (len(date_index), len(service_index))
+        flat_index = np.asarray(rows, dtype=np.int64) * shape[1] + np.asarray(
+            columns, dtype=np.int64
+        )
+        values = np.bincount(
+            flat_index,
+            weights=np.asarray(amounts, dtype=np.str_).astype(np.float64),
+            minlength=shape[0] * shape[1],
+        ).reshape(shape)
+
+        # Cost Explorer returns days in order, but merged responses may not be
+        dates = list(date_index)
+        order = np.argsort(np.asarray(dates, dtype=np.str_))
+        return cls([dates[i] for i in order], list(service_index), values[order])
+
+    def daily_totals(self):
+        """Total cost of each day"""
+        return self.values.sum(axis=1)
+
+    def rolling_mean(self, window=ROLLING_WINDOW):
+        """Rolling mean of daily totals, one value per complete window"""
+        totals = self.daily_totals()
+        if len(totals) < window:
+            return np.empty(0)
+        cumulative = np.concatenate(([0.0], np.cumsum(totals)))
+        return (cumulative[window:] - cumulative[:-window]) / window
+
+    def week_over_week(self):
+        """Totals of the last 7 days and the 7 days before, per service
+
+        Returns ``(current, previous)`` arrays, or None with less than two
+        weeks of data.
+        """
+        if len(self.dates) < 14:
+            return None
+        return self.values[-7:].sum(axis=0), self.values[-14:-7].sum(axis=0)
+
+    def service_zscores(self):
+        """Z-score of each service's latest day against its earlier days"""
+        if len(self.dates) < 3:
+            return np.zeros(len(self.services))
+        history = self.values[:-1]
+        mean = history.mean(axis=0)
+        std = history.std(axis=0)
+        deviation = self.values[-1] - mean
+        with np.errstate(divide="ignore", invalid="ignore"):
+            zscores = np.where(std > 0, deviation / std, 0.0)
+        return zscores
+
+
+def _format_change(current, previous):
+    """Format a relative change, or a dash when there is no baseline"""
+    if previous <= 0:
+        return "-"
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+
+def format_trend_section(
+    matrix, zscore_threshold=ZSCORE_THRESHOLD, top_movers=TOP_MOVERS, language="ja"
+):
+    """Build the trend analytics report section"""
+    s = STRINGS[language]
+    lines = []
+
+    rolling = matrix.rolling_mean()
+    if len(rolling):
+        lines.append(
+            s["trend_rolling"].format(
+                window=ROLLING_WINDOW, amount=f"{rolling[-1]:.2f}"
+            )
+        )
+
+    weekly = matrix.week_over_week()
+    if weekly is not None:
+        current, previous = weekly
+        current_total = float(current.sum())
+        previous_total = float(previous.sum())
+        lines.append(
+            s["trend_weekly"].format(
+                current=f"{current_total:.2f}",
+                previous=f"{previous_total:.2f}",
+                change=_format_change(current_total, previous_total),
+            )
+        )
+
+        deltas = current - previous
+        movers = np.argsort(-np.abs(deltas))[:top_movers]
+        movers = [i for i in movers if deltas[i] != 0]
+        if movers:
+            lines.append("")
+            lines.append(s["trend_movers"])
+            lines.extend(
+                f"  {matrix.services[i]}: {deltas[i]:+.2f} USD "
+                f"({_format_change(current[i], previous[i])})"
+                for i in movers
+            )
+
+    zscores = matrix.service_zscores()
+    outliers = np.flatnonzero(np.abs(zscores) >= zscore_threshold)
+    if len(outliers):
+        outliers = outliers[np.argsort(-np.abs(zscores[outliers]))]
+        lines.append("")
+        lines.append(s["trend_outliers"].format(threshold=f"{zscore_threshold:g}"))
+        lines.extend(f"  {matrix.services[i]}: z={zscores[i]:+.1f}" for i in outliers)
+
+    if not lines:
+        lines.append(s["trend_too_short"])
+    return (s["trend_title"], lines)
@@ -1,181 +1,863 @@
 import json
 import os
-from datetime import datetime, timedelta
-import boto3
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+from botocore.exceptions import ClientError
+import instrumentation
+from clients import LazyClient, get_credentials
+from deadline import Deadline, format_skipped_section
+from delivery import (
+    MAX_PARTS,
+    link_expiry,
+    plan_parts,
+    post_webhook,
+    publish_parts,
+    store_rendering,
+    upload_report,
+)
+from aggregation import SIGNIFICANT_COST
+from inventory import COLLECTOR_WORKERS, REGISTRY
+from renderers import LANGUAGES, RENDERERS, Section, build_report, render
 
-# Initialize AWS clients
-ce_client = boto3.client("ce")
-sns_client = boto3.client("sns")
-ec2_client = boto3.client("ec2")
-rds_client = boto3.client("rds")
-s3_client = boto3.client("s3")
-lambda_client = boto3.client("lambda")
+# AWS clients, created on first use
+ce_client = LazyClient("ce")
+sns_client = LazyClient("sns")
+ec2_client = LazyClient("ec2")
+rds_client = LazyClient("rds")
+s3_client = LazyClient("s3")
+lambda_client = LazyClient("lambda")
+elbv2_client = LazyClient("elbv2")
+eks_client = LazyClient("eks")
+dynamodb_client = LazyClient("dynamodb")
+elasticache_client = LazyClient("elasticache")
+cloudwatch_client = LazyClient("cloudwatch")
 
 
-def get_cost_data(days=7):
-    """Get AWS cost data for the specified number of days"""
+COST_GRANULARITY = "DAILY"
+COST_METRICS = ["UnblendedCost"]
+COST_GROUP_BY = [{"Type": "DIMENSION", "Key": "SERVICE"}]
+
+
+COST_SHARD_WORKERS = 4
+
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "LimitExceededException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "Throttled",
+}
+
+# Seconds the full report upload needs; with less time left before the
+# deadline the report is published without it
+REPORT_UPLOAD_SECONDS = 2.0
+
+
+class AdaptiveBackoff:
+    """Retry throttled calls with a backoff delay shared by concurrent callers
+
+    Every throttled call doubles the shared delay and every successful call
+    halves it, so concurrent shard requests slow down together while Cost
+    Explorer is throttling and speed up again once it recovers. With
+    ``time_left``, a callable returning the seconds left or None, no delay
+    runs past the end and no attempt starts once the time is spent.
+    """
+
+    def __init__(
+        self, base_delay=0.5, max_delay=20.0, max_attempts=6, sleep=None, time_left=None
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.sleep = sleep or time.sleep
+        self.time_left = time_left
+        self.delay = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def call(self, func, **kwargs):
+        """Call the function, retrying when the request is throttled"""
+        for attempt in range(self.max_attempts):
+            if self.delay:
+                self.sleep(self._jitter())
+            try:
+                result = func(**kwargs)
+            except ClientError as e:
+                if not self._retry_throttled(e, attempt):
+                    raise
+                continue
+
+            self._succeeded()
+            return result
+
+    def _jitter(self):
+        """Delay before the next attempt, capped by the time left"""
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        delay = random.uniform(0, self.delay)  # nosec B311
+        time_left = self.time_left() if self.time_left else None
+        return delay if time_left is None else min(delay, time_left)
+
+    def _retry_throttled(self, error, attempt):
+        """Back off after a throttled attempt; False if the error is final"""
+        code = error.response.get("Error", {}).get("Code")
+        if code not in THROTTLING_ERROR_CODES or attempt == self.max_attempts - 1:
+            return False
+        if self.time_left and self.time_left() == 0:
+            return False
+        instrumentation.record_retry()
+        with self._lock:
+            self.throttled += 1
+            self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+        return True
+
+    def _succeeded(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.base_delay else 0.0
+
+
+def _cost_query(start_date, end_date):
+    """Arguments of the Cost Explorer query for [start_date, end_date)"""
+    return {
+        "TimePeriod": {
+            "Start": start_date.strftime("%Y-%m-%d"),
+            "End": end_date.strftime("%Y-%m-%d"),
+        },
+        "Granularity": COST_GRANULARITY,
+        "Metrics": COST_METRICS,
+        "GroupBy": COST_GROUP_BY,
+    }
+
+
+class _CostPages:
+    """Merge the pages of one Cost Explorer query into a single response
+
+    Cost Explorer splits long grouped results with NextPageToken, and a day
+    can continue on the next page, so groups of the same day are merged.
+    """
+
+    def __init__(self):
+        self._merged = None
+        self._by_date = {}
+
+    def add(self, response):
+        """Merge a page; returns the token of the next page, if any"""
+        if self._merged is None:
+            self._merged = dict(response)
+        by_date = self._by_date
+        for result in response["ResultsByTime"]:
+            date = result["TimePeriod"]["Start"]
+            if date in by_date:
+                by_date[date]["Groups"].extend(result["Groups"])
+            else:
+                by_date[date] = dict(result, Groups=list(result["Groups"]))
+        return response.get("NextPageToken")
+
+    def result(self):
+        merged = self._merged
+        merged.pop("NextPageToken", None)
+        merged["ResultsByTime"] = [
+            self._by_date[date] for date in sorted(self._by_date)
+        ]
+        return merged
+
+
+def _query_cost_pages(ce, start_date, end_date, backoff):
+    """Fetch every page of the Cost Explorer query for [start_date, end_date)"""
+    kwargs = _cost_query(start_date, end_date)
+    pages = _CostPages()
+
+    while True:
+        token = pages.add(backoff.call(ce.get_cost_and_usage, **kwargs))
+        if not token:
+            return pages.result()
+        kwargs["NextPageToken"] = token
+
+
+def _shard_ranges(start_date, end_date, shard_days):
+    """Split [start_date, end_date) into consecutive ranges of shard_days"""
+    ranges = []
+    shard_start = start_date
+    while shard_start < end_date:
+        shard_end = min(shard_start + timedelta(days=shard_days), end_date)
+        ranges.append((shard_start, shard_end))
+        shard_start = shard_end
+    return ranges
+
+
+def _fetch_cost_range(ce, start_date, end_date, backoff=None, shard_days=None):
+    """Fetch the Cost Explorer response for the days in [start_date, end_date)
+
+    With ``shard_days``, the window is split into date-range shards that are
+    fetched concurrently and merged back in date order.
+    """
+    if backoff is None:
+        backoff = AdaptiveBackoff()
+
+    shards = _shard_ranges(start_date, end_date, shard_days) if shard_days else []
+    if len(shards) <= 1:
+        return _query_cost_pages(ce, start_date, end_date, backoff)
+
+    with ThreadPoolExecutor(max_workers=COST_SHARD_WORKERS) as executor:
+        responses = list(
+            executor.map(
+                instrumentation.propagate(
+                    lambda shard: _query_cost_pages(ce, shard[0], shard[1], backoff)
+                ),
+                shards,
+            )
+        )
+
+    return _merge_shards(responses)
+
+
+def _merge_shards(responses):
+    """Concatenate the responses of consecutive date-range shards"""
+    merged = dict(responses[0])
+    merged["ResultsByTime"] = [
+        result for response in responses for result in response["ResultsByTime"]
+    ]
+    return merged
+
+
+def _contiguous_ranges(days):
+    """Group sorted dates into [start, end) ranges of consecutive days"""
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = day + timedelta(days=1)
+        else:
+            ranges.append([day, day + timedelta(days=1)])
+    return [tuple(day_range) for day_range in ranges]
+
+
+def _read_cached_days(cache, start_date, end_date):
+    """Cached results by ISO date, and the [start, end) ranges to fetch"""
+    days = [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days)
+    ]
+    results = {}
+    missing = []
+    for day in days:
+        cached = None
+        if cache.is_settled(day, end_date):
+            cached = cache.get(day, COST_GRANULARITY, COST_GROUP_BY)
+        if cached is None:
+            missing.append(day)
+        else:
+            results[day.isoformat()] = cached
+    return results, _contiguous_ranges(missing)
+
+
+def _store_fetched_days(cache, results, response, end_date):
+    """Add a fetched response to the results and cache its settled days"""
+    for result in response["ResultsByTime"]:
+        day = datetime.strptime(result["TimePeriod"]["Start"], "%Y-%m-%d").date()
+        results[day.isoformat()] = result
+        if cache.is_settled(day, end_date):
+            cache.put(day, COST_GRANULARITY, COST_GROUP_BY, result)
+
+
+def _get_cached_cost_data(fetch, cache, start_date, end_date):
+    """Serve settled days from the cache and fetch only the remaining days"""
+    results, missing = _read_cached_days(cache, start_date, end_date)
+    for range_start, range_end in missing:
+        _store_fetched_days(cache, results, fetch(range_start, range_end), end_date)
+    return {"ResultsByTime": [results[key] for key in sorted(results)]}
+
+
+def get_cost_data(days=7, ce=None, cache=None, shard_days=None, backoff=None):
+    """Get AWS cost data for the specified number of days
+
+    ``ce`` overrides the module Cost Explorer client, e.g. with a client for
+    an assumed role in another account. With a ``cost_cache.CostCache``,
+    settled days are read from the cache and only the others are fetched.
+    ``shard_days`` splits long windows into concurrently fetched shards,
+    which share ``backoff`` to slow down together when throttled.
+    """
+    if ce is None:
+        ce = ce_client
+
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=days)
 
+    if backoff is None:
+        backoff = AdaptiveBackoff()
+
+    def fetch(range_start, range_end):
+        return _fetch_cost_range(
+            ce, range_start, range_end, backoff=backoff, shard_days=shard_days
+        )
+
     try:
-        response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                "Start": start_date.strftime("%Y-%m-%d"),
-                "End": end_date.strftime("%Y-%m-%d"),
-            },
-            Granularity="DAILY",
-            Metrics=["UnblendedCost"],
-            GroupBy=[{"Type": "DIMENSION", "Key": "SERVICE"}],
-        )
-        return response
+        if cache is not None:
+            return _get_cached_cost_data(fetch, cache, start_date, end_date)
+        return fetch(start_date, end_date)
     except Exception as e:
         print(f"Error getting cost data: {e}")
         return None
 
 
-def get_resource_counts():
-    """Get counts of various AWS resources"""
-    resources = {}
+RESOURCE_COLLECTOR_WORKERS = COLLECTOR_WORKERS
+
+
+def _resource_clients():
+    """Module clients of the resource collectors, keyed by service name"""
+    return {
+        "ec2": ec2_client,
+        "rds": rds_client,
+        "s3": s3_client,
+        "lambda": lambda_client,
+        "elbv2": elbv2_client,
+        "eks": eks_client,
+        "dynamodb": dynamodb_client,
+        "elasticache": elasticache_client,
+    }
+
+
+def get_resource_counts(
+    max_workers=RESOURCE_COLLECTOR_WORKERS, clients=None, errors=None
+):
+    """Get counts of various AWS resources
+
+    Runs every collector of ``inventory.REGISTRY``; they are independent API
+    round-trips, so they run concurrently on a bounded thread pool and the
+    call takes as long as the slowest one. ``clients`` maps service names to
+    clients and defaults to the module clients. Failing collectors report
+    zero counts and are added to the ``errors`` dict, if given.
+    """
+    if clients is None:
+        clients = _resource_clients()
+    return REGISTRY.collect(clients, max_workers=max_workers, errors=errors)
+
+
+def format_cost_message(cost_data, resources, days, extra_sections=None):
+    """Format cost and resource data into a readable message
+
+    Costs are aggregated once into a ``renderers.Report`` and rendered as the
+    plain-text email. ``extra_sections`` is a list of ``(title, lines)`` pairs
+    rendered after the resource information, for report stages beyond costs
+    and resources. Missing cost data or resource counts (None) are reported
+    in place of their section, so that the rest of a partial report is still
+    sent.
+    """
+    return render(
+        build_report(
+            cost_data, resources, days, extra_sections, **significance_settings()
+        )
+    )
+
+
+def notification_subject():
+    """Subject line of today's report"""
+    return f"AWS Daily Report - {datetime.now().strftime('%Y-%m-%d')}"
+
+
+def _delivery_max_parts():
+    """Read the most parts an oversized report is split into"""
+    return int(os.environ.get("DELIVERY_MAX_PARTS", "0")) or MAX_PARTS
+
+
+def _report_key(extension):
+    """S3 key of today's report file in REPORT_BUCKET"""
+    prefix = os.environ.get("REPORT_PREFIX", "reports/")
+    return f"{prefix}{datetime.now().strftime('%Y-%m-%d')}.{extension}"
+
+
+def _upload_full_report(message):
+    """Store the full report in REPORT_BUCKET
+
+    Returns its link and the time the link expires, or ``(None, None)``.
+    The link is valid no longer than the credentials that sign it.
+    """
+    bucket = os.environ.get("REPORT_BUCKET")
+    if not bucket:
+        return None, None
 
     try:
-        # EC2 instances
-        ec2_response = ec2_client.describe_instances()
-        total_instances = 0
-        running_instances = 0
-        for reservation in ec2_response["Reservations"]:
-            for instance in reservation["Instances"]:
-                total_instances += 1
-                if instance["State"]["Name"] == "running":
-                    running_instances += 1
-        resources["EC2"] = {"total": total_instances, "running": running_instances}
+        expires = link_expiry(get_credentials())
+        link = upload_report(
+            s3_client, bucket, _report_key("txt.gz"), message, expires=expires
+        )
     except Exception as e:
-        print(f"Error getting EC2 data: {e}")
-        resources["EC2"] = {"total": 0, "running": 0}
+        print(f"Error uploading the full report: {e}")
+        return None, None
+    return link, datetime.now(timezone.utc) + timedelta(seconds=expires)
+
+
+def _report_language():
+    """Language of the rendered report (REPORT_LANGUAGE, default Japanese)
+
+    An unsupported language falls back to Japanese with a warning, so a
+    typo in the setting does not stop the report.
+    """
+    language = os.environ.get("REPORT_LANGUAGE", "").strip().lower() or "ja"
+    if language not in LANGUAGES:
+        print(f"WARNING: Unsupported REPORT_LANGUAGE {language!r}, using ja")
+        return "ja"
+    return language
+
+
+def send_to_channels(report, language=None):
+    """Send the report to the channels configured besides SNS
+
+    Slack and Teams get their card JSON through incoming webhooks, and the
+    formats of REPORT_FORMATS (e.g. ``html,csv``) are stored next to the full
+    report in REPORT_BUCKET. Every format is rendered from the same report,
+    and a failing channel does not stop the others.
+    """
+    language = language or _report_language()
+    webhooks = {
+        "slack": os.environ.get("SLACK_WEBHOOK_URL"),
+        "teams": os.environ.get("TEAMS_WEBHOOK_URL"),
+    }
+    for name, url in webhooks.items():
+        if not url:
+            continue
+        try:
+            post_webhook(url, render(report, name, language))
+            print(f"Report posted to {name}")
+        except Exception as e:
+            print(f"Error posting the report to {name}: {e}")
+
+    bucket = os.environ.get("REPORT_BUCKET")
+    formats = _split_env_list("REPORT_FORMATS")
+    if formats and not bucket:
+        print("WARNING: REPORT_FORMATS is set without REPORT_BUCKET, skipping")
+        return
+    for name in formats:
+        try:
+            key = _report_key(RENDERERS[name].extension)
+            store_rendering(
+                s3_client,
+                bucket,
+                key,
+                render(report, name, language),
+                RENDERERS[name].media_type,
+            )
+            print(f"Report stored as s3://{bucket}/{key}")
+        except Exception as e:
+            print(f"Error storing the {name} report: {e}")
 
+
+def _upload_in_time(deadline):
+    """Whether there is time to upload the full report before publishing"""
+    time_left = deadline.time_left() if deadline is not None else None
+    if time_left is None or time_left >= REPORT_UPLOAD_SECONDS:
+        return True
+    print("WARNING: Not enough time left to upload the full report")
+    return False
+
+
+def send_notification(
+    message,
+    topic_arn,
+    subject=None,
+    store_full_report=True,
+    deadline=None,
+    language=None,
+):
+    """Send notification via SNS
+
+    Reports over the SNS size limit are split into numbered parts, or
+    summarized with a link when the full report is stored in REPORT_BUCKET.
+    ``subject`` defaults to the daily report's; messages other than the
+    report pass ``store_full_report=False`` to leave the stored report alone.
+    Throttled publishes are retried only within the time left in
+    ``deadline``, and the upload is left out when too little time remains.
+    Delivery notices are written in ``language``, by default REPORT_LANGUAGE.
+    """
     try:
-        # RDS instances
-        rds_response = rds_client.describe_db_instances()
-        total_rds = len(rds_response["DBInstances"])
-        available_rds = sum(
-            1
-            for db in rds_response["DBInstances"]
-            if db["DBInstanceStatus"] == "available"
-        )
-        resources["RDS"] = {"total": total_rds, "available": available_rds}
+        link, link_expires = None, None
+        if store_full_report and _upload_in_time(deadline):
+            link, link_expires = _upload_full_report(message)
+        parts = plan_parts(
+            message,
+            subject or notification_subject(),
+            link=link,
+            max_parts=_delivery_max_parts(),
+            link_expires=link_expires,
+            language=language or _report_language(),
+        )
+        if len(parts) > 1:
+            print(f"Report split into {len(parts)} parts")
+        backoff = AdaptiveBackoff(
+            time_left=deadline.time_left if deadline is not None else None
+        )
+        message_ids = publish_parts(sns_client, parts, topic_arn, backoff=backoff)
+        print(f"Notification sent successfully. MessageId: {', '.join(message_ids)}")
+        return True
     except Exception as e:
-        print(f"Error getting RDS data: {e}")
-        resources["RDS"] = {"total": 0, "available": 0}
+        print(f"Error sending notification: {e}")
+        return False
+
+
+_cache_backend = None
+_cost_cache = None
+_budget_alert_backend = None
+
+
+def _get_cache_backend():
+    """Build the persistent storage backend configured by the environment
+
+    The same backend holds the Cost Explorer cache and the state of other
+    report stages. Returns None when no storage is configured.
+    """
+    global _cache_backend
+
+    if _cache_backend is None:
+        from cost_cache import LocalFileCacheBackend, S3CacheBackend
+
+        bucket = os.environ.get("COST_CACHE_BUCKET")
+        directory = os.environ.get("COST_CACHE_DIR")
+        if bucket:
+            _cache_backend = S3CacheBackend(
+                bucket, prefix=os.environ.get("COST_CACHE_PREFIX", "cost-cache/")
+            )
+        elif directory:
+            _cache_backend = LocalFileCacheBackend(directory)
+
+    return _cache_backend
+
+
+def _get_cost_cache():
+    """Build the Cost Explorer cache configured by the environment, if any
+
+    The cache is kept across warm invocations and evicts old entries when it
+    is created.
+    """
+    global _cost_cache
+
+    if _cost_cache is None:
+        from cost_cache import CostCache
+
+        backend = _get_cache_backend()
+        if backend is None:
+            return None
+
+        _cost_cache = CostCache(
+            backend, max_age_days=int(os.environ.get("COST_CACHE_MAX_AGE_DAYS", "400"))
+        )
+        try:
+            evicted = _cost_cache.evict(datetime.now().date())
+            print(f"Cost cache: evicted {evicted} expired entries")
+        except Exception as e:
+            print(f"Error evicting cost cache entries: {e}")
+
+    return _cost_cache
+
+
+def _detect_anomalies(cost_data):
+    """Run anomaly detection against the persisted baseline
+
+    Without persistent storage the baseline is rebuilt from the report window
+    on every run, so only windows with enough settled days can be scored.
+    """
+    from anomaly import (
+        AnomalyDetector,
+        format_anomaly_section,
+        load_baseline,
+        save_baseline,
+    )
+    from cost_cache import SETTLE_DAYS
+
+    backend = _get_cache_backend()
+    state = None
+    if backend is None:
+        print(
+            "WARNING: No cache backend configured, "
+            "rebuilding the anomaly baseline from the report window"
+        )
+    else:
+        try:
+            state = load_baseline(backend)
+        except Exception as e:
+            print(f"Error loading anomaly baseline: {e}")
+
+    detector = AnomalyDetector(state)
+    settled_before = datetime.now().date() - timedelta(days=SETTLE_DAYS)
+    anomalies = detector.process(cost_data, settled_before.isoformat())
+    print(f"Detected {len(anomalies)} cost anomalies")
+
+    if backend is not None:
+        try:
+            save_baseline(backend, detector)
+        except Exception as e:
+            print(f"Error saving anomaly baseline: {e}")
+
+    return Section.of(format_anomaly_section, anomalies, detector.warmed_up())
+
+
+def _diff_snapshots(cost_data, resources):
+    """Compare this run with the previous day's snapshot and store this run
+
+    Returns None without persistent storage. A run without resource counts
+    is compared but not stored, so that it does not become the baseline.
+    """
+    from snapshots import (
+        diff_snapshots,
+        format_diff_section,
+        load_previous,
+        save_snapshot,
+        take_snapshot,
+    )
+
+    backend = _get_cache_backend()
+    if backend is None:
+        print("WARNING: No cache backend configured, skipping the snapshot diff")
+        return None
+
+    snapshot = take_snapshot(cost_data, resources or {})
+    previous = None
+    try:
+        previous = load_previous(backend, snapshot.day)
+    except Exception as e:
+        print(f"Error loading the previous snapshot: {e}")
+
+    if resources is not None:
+        try:
+            save_snapshot(backend, snapshot)
+        except Exception as e:
+            print(f"Error saving the snapshot: {e}")
+
+    diff = diff_snapshots(previous, snapshot) if previous else None
+    return Section.of(format_diff_section, diff)
+
+
+def _get_forecast_section():
+    """Fetch the month-end forecast, memoized per day in the cache backend
+
+    Returns None when no forecast is available, so that the report is sent
+    without the section.
+    """
+    from forecast import format_forecast_section, get_cost_forecast
+
+    forecast = get_cost_forecast(
+        ce_client, today=datetime.now().date(), backend=_get_cache_backend()
+    )
+    return Section.of(format_forecast_section, forecast) if forecast else None
+
+
+def _get_waste_section():
+    """Find idle EC2 and RDS instances from their CloudWatch CPU utilization
+
+    Returns None when the metrics cannot be fetched, so that the report is
+    sent without the section.
+    """
+    from waste import (
+        CPU_THRESHOLD,
+        LOOKBACK_DAYS,
+        collect_waste,
+        format_waste_section,
+    )
 
     try:
-        # S3 buckets
-        s3_response = s3_client.list_buckets()
-        resources["S3"] = {"total_buckets": len(s3_response["Buckets"])}
+        report = collect_waste(
+            ec2_client,
+            rds_client,
+            cloudwatch_client,
+            days=int(os.environ.get("WASTE_LOOKBACK_DAYS") or LOOKBACK_DAYS),
+            threshold=float(os.environ.get("WASTE_CPU_THRESHOLD") or CPU_THRESHOLD),
+        )
     except Exception as e:
-        print(f"Error getting S3 data: {e}")
-        resources["S3"] = {"total_buckets": 0}
+        print(f"Error detecting idle resources: {e}")
+        return None
+    print(
+        f"Idle resources: {len(report.idle)} of {report.checked} instances "
+        f"({report.requests} GetMetricData calls)"
+    )
+    return Section.of(format_waste_section, report)
+
+
+def _get_attribution_section(days, tags, resource_services):
+    """Collect the top spenders per cost-allocation tag and per resource"""
+    from attribution import collect_attribution, format_attribution_section
+
+    end_date = datetime.now().date()
+    attribution = collect_attribution(
+        ce_client,
+        end_date - timedelta(days=days),
+        end_date,
+        tags=tags,
+        resource_services=resource_services,
+        top_n=int(os.environ.get("ATTRIBUTION_TOP_N", "10")),
+    )
+    return Section.of(format_attribution_section, attribution)
+
 
+def _get_cur_cost_data(source, days):
+    """Get cost data from CUR Parquet files, or None on error
+
+    Falls back to Cost Explorer when PyArrow is not installed.
+    """
+    from cur_source import get_cur_cost_data, pyarrow_available
+
+    if not pyarrow_available():
+        print("WARNING: PyArrow is not installed, reading costs from Cost Explorer")
+        return get_cost_data(days=days, shard_days=_cost_shard_days())
+
+    columns = {
+        name: os.environ[variable]
+        for name, variable in (
+            ("date_column", "CUR_DATE_COLUMN"),
+            ("service_column", "CUR_SERVICE_COLUMN"),
+            ("cost_column", "CUR_COST_COLUMN"),
+        )
+        if os.environ.get(variable)
+    }
     try:
-        # Lambda functions
-        lambda_response = lambda_client.list_functions()
-        resources["Lambda"] = {"total_functions": len(lambda_response["Functions"])}
+        return get_cur_cost_data(source, days=days, **columns)
     except Exception as e:
-        print(f"Error getting Lambda data: {e}")
-        resources["Lambda"] = {"total_functions": 0}
+        print(f"Error reading cost data from {source}: {e}")
+        return None
 
-    return resources
 
+def _cost_shard_days():
+    """Read the Cost Explorer shard size from the environment (0: no sharding)"""
+    return int(os.environ.get("COST_SHARD_DAYS", "0")) or None
 
-def format_cost_message(cost_data, resources, days):
-    """Format cost and resource data into a readable message"""
-    if not cost_data:
-        return "コストデータの取得に失敗しました。"
 
-    message = "=== AWS 日次レポート ===\n\n"
-    message += f"📅 期間: 過去{days}日間\n"
-    message += f"🕐 生成日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+def significance_settings():
+    """Read the thresholds of services listed on their own in the report
 
-    # Cost summary
-    message += "💰 コスト情報\n"
-    message += "=" * 50 + "\n\n"
+    MIN_SERVICE_COST is the cost (USD) a service must exceed over the period
+    (default 0.01) and MIN_SERVICE_SHARE the share of the period total it
+    must reach (e.g. 0.01 for 1%, default 0). Other services are summed
+    into one "other" line.
+    """
+    return {
+        "min_cost": Decimal(os.environ.get("MIN_SERVICE_COST") or SIGNIFICANT_COST),
+        "min_share": Decimal(os.environ.get("MIN_SERVICE_SHARE") or "0"),
+    }
 
-    daily_totals = {}
-    service_totals = {}
 
-    for result in cost_data["ResultsByTime"]:
-        date = result["TimePeriod"]["Start"]
-        total_cost = Decimal("0")
+def _build_trend_section(cost_data):
+    """Build the trend analytics section, or None without NumPy"""
+    from cost_matrix import CostMatrix, format_trend_section, numpy_available
 
-        for group in result["Groups"]:
-            service = group["Keys"][0]
-            cost = Decimal(group["Metrics"]["UnblendedCost"]["Amount"])
+    if not numpy_available():
+        print("WARNING: NumPy is not installed, skipping trend analytics")
+        return None
 
-            if cost > Decimal("0.01"):  # Only show services with significant cost
-                if service not in service_totals:
-                    service_totals[service] = Decimal("0")
-                service_totals[service] += cost
-                total_cost += cost
+    print("Computing trend analytics...")
+    return Section.of(format_trend_section, CostMatrix.from_cost_data(cost_data))
 
-        daily_totals[date] = total_cost
 
-    # Daily costs
-    message += "📊 日別コスト:\n"
-    for date, cost in sorted(daily_totals.items()):
-        message += f"  {date}: ${float(cost):.2f}\n"
+def _env_flag(name):
+    """Read a boolean flag from the environment"""
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes")
 
-    total_period_cost = sum(daily_totals.values())
-    message += f"\n合計 ({days}日間): ${float(total_period_cost):.2f}\n"
-    message += f"平均 (1日あたり): ${float(total_period_cost / days):.2f}\n\n"
 
-    # Top services by cost
-    message += "🏆 サービス別コスト (上位10件):\n"
-    sorted_services = sorted(service_totals.items(), key=lambda x: x[1], reverse=True)[
-        :10
+def _split_env_list(name):
+    """Read a comma-separated environment variable as a list"""
+    return [
+        item.strip() for item in os.environ.get(name, "").split(",") if item.strip()
     ]
-    for service, cost in sorted_services:
-        message += f"  {service}: ${float(cost):.2f}\n"
 
-    # Resource information
-    message += "\n\n🔧 リソース情報\n"
-    message += "=" * 50 + "\n\n"
 
-    message += f"📦 EC2 インスタンス:\n"
-    message += f"  総数: {resources['EC2']['total']}\n"
-    message += f"  稼働中: {resources['EC2']['running']}\n\n"
+def lambda_handler(event, context):
+    """Main Lambda handler
+
+    Events with ``"mode": "budget_alert"`` (the hourly schedule) check the
+    budgets instead of sending the report.
+    """
+    with instrumentation.invocation(_env_flag("ENABLE_INSTRUMENTATION")):
+        if isinstance(event, dict) and event.get("mode") == "budget_alert":
+            return _check_budgets()
+        return _generate_report(Deadline.from_context(context))
 
-    message += f"🗄️ RDS インスタンス:\n"
-    message += f"  総数: {resources['RDS']['total']}\n"
-    message += f"  利用可能: {resources['RDS']['available']}\n\n"
 
-    message += f"🪣 S3 バケット:\n"
-    message += f"  総数: {resources['S3']['total_buckets']}\n\n"
+def _check_budgets():
+    """Alert on the budgets crossed by today's costs, once per budget and day"""
+    from budget_alerts import (
+        alert_subject,
+        check_budgets,
+        fetch_today_costs,
+        format_alert,
+        load_alerted,
+        parse_budgets,
+        save_alerted,
+    )
 
-    message += f"λ Lambda 関数:\n"
-    message += f"  総数: {resources['Lambda']['total_functions']}\n\n"
+    global _budget_alert_backend
+
+    sns_topic_arn = os.environ.get("SNS_TOPIC_ARN")
+    if not sns_topic_arn:
+        print("ERROR: SNS_TOPIC_ARN environment variable not set")
+        return {"statusCode": 500, "body": json.dumps("SNS_TOPIC_ARN not configured")}
+
+    try:
+        budgets = parse_budgets(
+            os.environ.get("BUDGET_TOTAL"), os.environ.get("BUDGET_SERVICES")
+        )
+    except ValueError as e:
+        print(f"ERROR: Invalid budgets: {e}")
+        return {"statusCode": 500, "body": json.dumps("Invalid budgets")}
+    if not budgets:
+        return {"statusCode": 200, "body": json.dumps("No budgets configured")}
+
+    today = datetime.now().date()
+    try:
+        with instrumentation.stage("budget_costs"):
+            total, services = fetch_today_costs(
+                ce_client, today, by_service=bool(budgets.services)
+            )
+    except Exception as e:
+        print(f"Error fetching today's costs: {e}")
+        return {"statusCode": 500, "body": json.dumps("Failed to fetch costs")}
+    print(f"Cost so far today: ${total:.2f}")
 
-    message += "=" * 50 + "\n"
-    message += "このレポートは自動生成されました。\n"
+    breaches = check_budgets(total, services, budgets)
+    if not breaches:
+        return {"statusCode": 200, "body": json.dumps("Within budget")}
 
-    return message
+    backend = _get_cache_backend()
+    if backend is None:
+        # Without persistent storage, alerts are only deduplicated while the
+        # container stays warm
+        from cost_cache import MemoryCacheBackend
 
+        if _budget_alert_backend is None:
+            _budget_alert_backend = MemoryCacheBackend()
+        backend = _budget_alert_backend
 
-def send_notification(message, topic_arn):
-    """Send notification via SNS"""
     try:
-        response = sns_client.publish(
-            TopicArn=topic_arn,
-            Subject=f"AWS Daily Report - {datetime.now().strftime('%Y-%m-%d')}",
-            Message=message,
+        alerted = load_alerted(backend, today)
+    except Exception as e:
+        print(f"Error loading the alerted budgets: {e}")
+        alerted = set()
+    breaches = [breach for breach in breaches if breach.name not in alerted]
+    if not breaches:
+        return {"statusCode": 200, "body": json.dumps("Already alerted today")}
+
+    print(f"Budgets crossed: {', '.join(breach.name for breach in breaches)}")
+    language = _report_language()
+    with instrumentation.stage("notify"):
+        success = send_notification(
+            format_alert(breaches, today, language),
+            sns_topic_arn,
+            subject=alert_subject(today),
+            store_full_report=False,
+            language=language,
         )
-        print(f"Notification sent successfully. MessageId: {response['MessageId']}")
-        return True
+    if not success:
+        return {"statusCode": 500, "body": json.dumps("Failed to send alert")}
+
+    try:
+        save_alerted(backend, today, alerted | {breach.name for breach in breaches})
     except Exception as e:
-        print(f"Error sending notification: {e}")
-        return False
+        print(f"Error saving the alerted budgets: {e}")
+    return {"statusCode": 200, "body": json.dumps("Budget alert sent")}
 
 
-def lambda_handler(event, context):
-    """Main Lambda handler"""
+def _generate_report(deadline=None):
+    """Collect, format and send the report within the deadline"""
+    if deadline is None:
+        deadline = Deadline()
     print("Starting AWS daily cost and resource report generation...")
 
     # Get environment variables
@@ -186,23 +868,240 @@ def lambda_handler(event, context):
         print("ERROR: SNS_TOPIC_ARN environment variable not set")
         return {"statusCode": 500, "body": json.dumps("SNS_TOPIC_ARN not configured")}
 
-    # Get cost data
-    print(f"Fetching cost data for the last {days_to_check} days...")
-    cost_data = get_cost_data(days=days_to_check)
-
-    # Get resource counts
-    print("Fetching resource information...")
-    resources = get_resource_counts()
+    if _use_async_engine():
+        import async_engine
 
-    # Format message
-    print("Formatting message...")
-    message = format_cost_message(cost_data, resources, days_to_check)
+        print("Running the report on the asyncio engine...")
+        success = async_engine.run_report(days_to_check, sns_topic_arn, deadline)
+    else:
+        cost_data, resources, extra_sections = _collect_report_data(
+            days_to_check, deadline
+        )
+        report = prepare_report(
+            cost_data, resources, days_to_check, extra_sections, deadline
+        )
+        language = _report_language()
+        message = format_report(report, language)
 
-    # Send notification
-    print("Sending notification...")
-    success = send_notification(message, sns_topic_arn)
+        # Send notification
+        print("Sending notification...")
+        with instrumentation.stage("notify"):
+            success = send_notification(
+                message, sns_topic_arn, deadline=deadline, language=language
+            )
+        with instrumentation.stage("channels"):
+            send_to_channels(report, language)
 
     if success:
         return {"statusCode": 200, "body": json.dumps("Report sent successfully")}
     else:
         return {"statusCode": 500, "body": json.dumps("Failed to send report")}
+
+
+def _use_async_engine():
+    """Whether the asyncio engine is enabled and can run"""
+    if not _env_flag("ENABLE_ASYNC_ENGINE"):
+        return False
+
+    import async_engine
+
+    if not async_engine.available():
+        print("WARNING: aiobotocore is not installed, using the synchronous engine")
+        return False
+    return True
+
+
+def _fan_out_settings():
+    """Regions and concurrency of the multi-account report"""
+    regions = _split_env_list("TARGET_REGIONS") or [
+        os.environ.get("AWS_REGION", "us-east-1")
+    ]
+    return regions, int(os.environ.get("FAN_OUT_CONCURRENCY", "8"))
+
+
+def _collect_report_data(days_to_check, deadline=None):
+    """Fetch the costs, resource counts and extra sections of the report
+
+    Every collector runs within the budget of ``deadline``. Collectors that
+    do not finish in time are recorded in ``deadline.skipped`` and their data
+    is left out: cost data and resource counts are None, and optional
+    sections are omitted.
+    """
+    if deadline is None:
+        deadline = Deadline()
+    target_role_arns = _split_env_list("TARGET_ROLE_ARNS")
+    extra_sections = []
+
+    if target_role_arns:
+        from fan_out import collect_fan_out, format_fan_out_section
+
+        regions, concurrency = _fan_out_settings()
+
+        print(
+            f"Fetching cost and resource data for {len(target_role_arns)} accounts "
+            f"in {len(regions)} regions..."
+        )
+        with instrumentation.stage("fan_out"):
+            fan_out_result = collect_fan_out(
+                target_role_arns,
+                regions,
+                days_to_check,
+                max_workers=concurrency,
+                cache=_get_cost_cache(),
+                shard_days=_cost_shard_days(),
+                timeout=deadline.budget(),
+            )
+        cost_data = fan_out_result.cost_data
+        resources = fan_out_result.resources
+        extra_sections.append(Section.of(format_fan_out_section, fan_out_result))
+    else:
+        # The forecast, attribution and resource counts are fetched while
+        # cost data loads
+        cur_path = os.environ.get("CUR_PATH")
+        cache = None if cur_path else _get_cost_cache()
+        attribution_tags = _split_env_list("ATTRIBUTION_TAGS")
+        resource_services = _split_env_list("ATTRIBUTION_RESOURCE_SERVICES")
+        # Collectors over their budget are abandoned rather than waited for
+        executor = ThreadPoolExecutor(max_workers=5)
+        try:
+            forecast_future = None
+            if _env_flag("ENABLE_COST_FORECAST"):
+                print("Fetching cost forecast...")
+                forecast_future = executor.submit(
+                    instrumentation.stage("forecast")(_get_forecast_section)
+                )
+
+            attribution_future = None
+            if attribution_tags or resource_services:
+                print("Fetching cost attribution...")
+                attribution_future = executor.submit(
+                    instrumentation.stage("attribution")(_get_attribution_section),
+                    days_to_check,
+                    attribution_tags,
+                    resource_services,
+                )
+
+            waste_future = None
+            if _env_flag("ENABLE_WASTE_DETECTION"):
+                print("Detecting idle resources...")
+                waste_future = executor.submit(
+                    instrumentation.stage("waste_detection")(_get_waste_section)
+                )
+
+            print("Fetching resource information...")
+            resources_future = executor.submit(
+                instrumentation.stage("resources")(get_resource_counts)
+            )
+
+            # Get cost data
+            print(f"Fetching cost data for the last {days_to_check} days...")
+            if cur_path:
+                cost_future = executor.submit(
+                    instrumentation.stage("cost_data")(_get_cur_cost_data),
+                    cur_path,
+                    days_to_check,
+                )
+            else:
+                cost_future = executor.submit(
+                    instrumentation.stage("cost_data")(get_cost_data),
+                    days=days_to_check,
+                    cache=cache,
+                    shard_days=_cost_shard_days(),
+                )
+
+            cost_data = deadline.wait("cost_data", cost_future)
+            if cache is not None:
+                print(f"Cost cache: {cache.hits} hits, {cache.misses} misses")
+
+            resources = deadline.wait("resources", resources_future)
+            forecast_section = forecast_future and deadline.wait(
+                "forecast", forecast_future, optional=True
+            )
+            attribution_section = attribution_future and deadline.wait(
+                "attribution", attribution_future, optional=True
+            )
+            waste_section = waste_future and deadline.wait(
+                "waste_detection", waste_future, optional=True
+            )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if forecast_section:
+            extra_sections.append(forecast_section)
+        if attribution_section:
+            extra_sections.append(attribution_section)
+        if waste_section:
+            extra_sections.append(waste_section)
+
+    return cost_data, resources, extra_sections
+
+
+def prepare_report(cost_data, resources, days_to_check, extra_sections, deadline=None):
+    """Run the analysis stages on the collected data and aggregate the report
+
+    Analysis stages are skipped once the budget of ``deadline`` is spent,
+    and the stages it skipped are listed in their own section. Every output
+    channel is rendered from the returned ``renderers.Report``.
+    """
+    if deadline is None:
+        deadline = Deadline()
+    extra_sections = list(extra_sections)
+
+    if (
+        cost_data
+        and _env_flag("ENABLE_ANOMALY_DETECTION")
+        and deadline.allows("anomaly_detection")
+    ):
+        print("Detecting cost anomalies...")
+        with instrumentation.stage("anomaly_detection"):
+            extra_sections.append(_detect_anomalies(cost_data))
+
+    if (
+        cost_data
+        and _env_flag("ENABLE_TREND_ANALYTICS")
+        and deadline.allows("trend_analytics")
+    ):
+        with instrumentation.stage("trend_analytics"):
+            trend_section = _build_trend_section(cost_data)
+        if trend_section:
+            extra_sections.append(trend_section)
+
+    if (
+        cost_data
+        and cost_data["ResultsByTime"]
+        and _env_flag("ENABLE_SNAPSHOT_DIFF")
+        and deadline.allows("snapshot_diff")
+    ):
+        print("Comparing with the previous snapshot...")
+        with instrumentation.stage("snapshot_diff"):
+            diff_section = _diff_snapshots(cost_data, resources)
+        if diff_section:
+            extra_sections.append(diff_section)
+
+    if deadline.skipped:
+        extra_sections.append(Section.of(format_skipped_section, deadline.skipped))
+
+    with instrumentation.stage("aggregate"):
+        return build_report(
+            cost_data,
+            resources,
+            days_to_check,
+            extra_sections,
+            **significance_settings(),
+        )
+
+
+def format_report(report, language=None):
+    """Render the notification text, by default in REPORT_LANGUAGE"""
+    print("Formatting message...")
+    with instrumentation.stage("format"):
+        return render(report, "text", language or _report_language())
+
+
+def build_report_message(
+    cost_data, resources, days_to_check, extra_sections, deadline=None
+):
+    """Run the analysis stages on the collected data and format the message"""
+    return format_report(
+        prepare_report(cost_data, resources, days_to_check, extra_sections, deadline)
+    )
@@ -0,0 +1,178 @@
+"""
+Cost and Usage Report (CUR) Parquet files as an alternative cost source.
+
+For large accounts, reading the CUR is cheaper and faster than paging
+through Cost Explorer. Files are read from a local path or an
+``s3://bucket/prefix`` URI with PyArrow datasets:
+
+- only the date, service and cost columns are read
+- the date range filter is pushed down, so row groups whose statistics fall
+  outside the period are skipped
+- record batches are streamed and folded into per day and service totals,
+  so memory use does not depend on the size of the files
+- costs are cast to ``decimal128`` with ten fractional digits, the precision
+  of Cost Explorer amounts, before they are summed, so the totals carry no
+  float rounding
+
+The result has the same ``ResultsByTime`` shape as ``get_cost_data``, so the
+rest of the report does not know where the costs came from.
+
+PyArrow is optional. Without it ``pyarrow_available()`` is False and the
+report falls back to Cost Explorer.
+"""
+
+from datetime import datetime, time, timedelta, timezone
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # pragma: no cover - exercised only without PyArrow
+    pa = None
+
+# Column names of the legacy CUR Parquet export
+DATE_COLUMN = "line_item_usage_start_date"
+SERVICE_COLUMN = "product_product_name"
+COST_COLUMN = "line_item_unblended_cost"
+
+UNKNOWN_SERVICE = "Unknown"
+
+# Rows per streamed record batch
+BATCH_SIZE = 64 * 1024
+
+# Fractional digits of the summed costs, as in Cost Explorer amounts
+COST_SCALE = 10
+
+
+def pyarrow_available():
+    """Whether the optional PyArrow dependency is installed"""
+    return pa is not None
+
+
+def open_dataset(source):
+    """Open the CUR Parquet files under a local path or an S3 URI
+
+    ``year=``/``month=`` directories of the CUR export are read as hive
+    partitions.
+    """
+    return ds.dataset(source, format="parquet", partitioning="hive")
+
+
+def _date_filter(field, start_date, end_date):
+    """Filter expression for ``start_date <= date < end_date`` on a column"""
+    column = ds.field(field.name)
+    if pa.types.is_timestamp(field.type):
+        tz = timezone.utc if field.type.tz else None
+        start = pa.scalar(datetime.combine(start_date, time(), tz), type=field.type)
+        end = pa.scalar(datetime.combine(end_date, time(), tz), type=field.type)
+    elif pa.types.is_date(field.type):
+        start = pa.scalar(start_date, type=field.type)
+        end = pa.scalar(end_date, type=field.type)
+    else:
+        # ISO 8601 strings sort in time order
+        start, end = start_date.isoformat(), end_date.isoformat()
+    return (column >= start) & (column < end)
+
+
+def _days(column):
+    """``YYYY-MM-DD`` strings of a date, timestamp or ISO 8601 string column"""
+    if pa.types.is_timestamp(column.type) or pa.types.is_date(column.type):
+        return pc.cast(pc.cast(column, pa.date32()), pa.string())
+    return pc.utf8_slice_codeunits(column, 0, 10)
+
+
+def _costs(column):
+    """Exact ``decimal128`` costs of a float, decimal or string column
+
+    Each value is rounded to ``COST_SCALE`` digits on its own, so summing
+    them is exact.
+    """
+    return pc.cast(column, pa.decimal128(38, COST_SCALE), safe=False)
+
+
+def iter_daily_costs(
+    dataset,
+    start_date,
+    end_date,
+    date_column=DATE_COLUMN,
+    service_column=SERVICE_COLUMN,
+    cost_column=COST_COLUMN,
+    batch_size=BATCH_SIZE,
+):
+    """Yield ``(day, service, cost)`` partial sums, one record batch at a time"""
+    missing = {date_column, service_column, cost_column} - set(dataset.schema.names)
+    if missing:
+        raise ValueError(f"CUR files are missing columns: {', '.join(sorted(missing))}")
+
+    scanner = dataset.scanner(
+        columns=[date_column, service_column, cost_column],
+        filter=_date_filter(dataset.schema.field(date_column), start_date, end_date),
+        batch_size=batch_size,
+        batch_readahead=1,
+        fragment_readahead=1,
+    )
+    for batch in scanner.to_batches():
+        if not batch.num_rows:
+            continue
+        sums = (
+            pa.table(
+                {
+                    "day": _days(batch.column(date_column)),
+                    "service": batch.column(service_column),
+                    "cost": _costs(batch.column(cost_column)),
+                }
+            )
+            .group_by(["day", "service"])
+            .aggregate([("cost", "sum")])
+        )
+        yield from zip(
+            sums.column("day").to_pylist(),
+            sums.column("service").to_pylist(),
+            sums.column("cost_sum").to_pylist(),
+        )
+
+
+def get_cur_cost_data(source, days=7, today=None, **columns):
+    """Get daily costs per service for the last ``days`` days from CUR files
+
+    Returns the Cost Explorer ``ResultsByTime`` shape with one result per day,
+    including days without rows. ``columns`` overrides the column names of
+    ``iter_daily_costs``.
+    """
+    end_date = today or datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+
+    totals = {}
+    for day, service, cost in iter_daily_costs(
+        open_dataset(source), start_date, end_date, **columns
+    ):
+        if cost is None:
+            continue
+        key = (day, service or UNKNOWN_SERVICE)
+        totals[key] = totals.get(key, Decimal("0")) + cost
+
+    by_day = {}
+    for (day, service), cost in sorted(totals.items()):
+        by_day.setdefault(day, []).append(
+            {
+                "Keys": [service],
+                "Metrics": {"UnblendedCost": {"Amount": str(cost), "Unit": "USD"}},
+            }
+        )
+
+    results = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        results.append(
+            {
+                "TimePeriod": {
+                    "Start": day.isoformat(),
+                    "End": (day + timedelta(days=1)).isoformat(),
+                },
+                "Total": {},
+                "Groups": by_day.get(day.isoformat(), []),
+                "Estimated": False,
+            }
+        )
+    return {"ResultsByTime": results}
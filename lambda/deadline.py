@@ -0,0 +1,125 @@
+"""
+Deadline scheduling for the daily cost report.
+
+The Lambda context tells how much longer the invocation may run. A
+``Deadline`` keeps a reserve of that time for formatting and publishing the
+report and hands the rest out to the collection and analysis stages as time
+budgets. A stage that does not finish within its budget is abandoned, and a
+stage that would start after the budget is spent is skipped, so that a
+partial report listing the missing sections is still sent before the
+function times out.
+"""
+
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from renderers import STRINGS
+
+# Seconds kept for formatting and publishing the report
+FINISH_RESERVE = 5.0
+
+# Share of the invocation time the reserve may take at most, so that short
+# timeouts still leave time to collect data
+MAX_RESERVE_SHARE = 0.5
+
+# Reasons a stage is missing; the report labels them with the
+# ``skipped_<reason>`` strings and the stages with ``stage_<stage>``
+TIMED_OUT = "timed_out"
+NOT_STARTED = "not_started"
+
+
+class Deadline:
+    """Time budgets of the report stages
+
+    ``seconds`` is the time left in the invocation, or None for no limit.
+    Every stage shares the same cutoff, ``reserve`` seconds before the end,
+    so stages running concurrently do not take time from each other. Missing
+    stages are recorded in ``skipped`` as ``(stage, reason)`` pairs.
+    """
+
+    def __init__(self, seconds=None, reserve=FINISH_RESERVE, clock=time.monotonic):
+        self._clock = clock
+        self._expires = None if seconds is None else clock() + seconds
+        self.reserve = (
+            0.0 if seconds is None else min(reserve, seconds * MAX_RESERVE_SHARE)
+        )
+        self.skipped = []
+
+    @classmethod
+    def from_context(cls, context):
+        """Deadline of a Lambda invocation, unlimited without a context
+
+        The reserve can be changed with ``DEADLINE_RESERVE_SECONDS``.
+        """
+        get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+        seconds = get_remaining() / 1000 if get_remaining else None
+        reserve = float(os.environ.get("DEADLINE_RESERVE_SECONDS", FINISH_RESERVE))
+        return cls(seconds, reserve=reserve)
+
+    def time_left(self):
+        """Seconds until the invocation ends, None when unlimited"""
+        if self._expires is None:
+            return None
+        return max(0.0, self._expires - self._clock())
+
+    def budget(self, limit=None):
+        """Seconds a stage may still take, capped at ``limit``
+
+        Returns None when neither the deadline nor ``limit`` bounds it.
+        """
+        time_left = self.time_left()
+        if time_left is None:
+            return limit
+        budget = max(0.0, time_left - self.reserve)
+        return budget if limit is None else min(budget, limit)
+
+    def expired(self):
+        """Whether the time for collecting and analysing data is spent"""
+        return self.budget() == 0
+
+    def skip(self, stage, reason=TIMED_OUT):
+        """Record a stage missing from the report"""
+        print(f"WARNING: skipping stage {stage}: {reason}")
+        self.skipped.append((stage, reason))
+
+    def allows(self, stage):
+        """Whether a stage may start, recording it as skipped if not"""
+        if self.expired():
+            self.skip(stage, NOT_STARTED)
+            return False
+        return True
+
+    def wait(self, stage, future, default=None, optional=False):
+        """Wait for a stage's future within the budget
+
+        A future that is not done in time is cancelled if it has not started
+        yet, or otherwise abandoned, and ``default`` is returned instead.
+        Exceptions raised by the stage are propagated, except for
+        ``optional`` stages: their errors are logged and ``default`` is
+        returned, so that the report is sent without their section.
+        """
+        try:
+            return future.result(timeout=self.budget())
+        except FutureTimeoutError:
+            future.cancel()
+            self.skip(stage, TIMED_OUT)
+            return default
+        except Exception as e:
+            if not optional:
+                raise
+            print(f"Error in stage {stage}: {e}")
+            return default
+
+
+def format_skipped_section(skipped, language="ja"):
+    """Build the report section listing the skipped stages, or None"""
+    if not skipped:
+        return None
+    s = STRINGS[language]
+    lines = [s["skipped_intro"]]
+    lines.extend(
+        f"  {s.get(f'stage_{stage}', stage)}: {s[f'skipped_{reason}']}"
+        for stage, reason in skipped
+    )
+    return (s["skipped_title"], lines)
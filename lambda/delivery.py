@@ -0,0 +1,275 @@
+"""
+Size-aware delivery of the report through SNS.
+
+SNS rejects messages over 256 KB, counting the UTF-8 encoded message and its
+message attributes, and multi-account reports can grow past that. Reports
+that fit are published unchanged. Larger ones are split on line boundaries
+into numbered parts, each tagged with an idempotency key derived from the
+report, and published concurrently. When the full report is uploaded to S3,
+an oversized report is summarized instead: its beginning is published with a
+link to the gzip-compressed full report.
+
+A presigned link is only valid while the credentials that signed it are.
+The Lambda execution role signs with temporary session credentials, so its
+links are kept to ``SESSION_LINK_EXPIRY`` and the report says until when
+the link works; only long-term credentials get the full ``LINK_EXPIRY``.
+"""
+
+import gzip
+import hashlib
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timezone
+
+import instrumentation
+from renderers import STRINGS
+
+# SNS limits on the encoded message plus its attributes, and on the subject
+SNS_MESSAGE_LIMIT = 256 * 1024
+SUBJECT_LIMIT = 100
+
+# Parts of one report published at most; the rest is left out
+MAX_PARTS = 10
+
+PUBLISH_WORKERS = 4
+
+# Longest validity of a presigned link that SigV4 allows
+LINK_EXPIRY = 7 * 24 * 60 * 60
+
+# Validity of links signed with temporary session credentials, e.g. the
+# Lambda execution role's: their expiry is not exposed, and a link stops
+# working with the session that signed it
+SESSION_LINK_EXPIRY = 60 * 60
+
+# Seconds to wait for a chat webhook
+WEBHOOK_TIMEOUT = 10
+
+# Bytes kept free in every part for its header and the truncation notice
+PART_RESERVE = 512
+
+IDEMPOTENCY_ATTRIBUTE = "idempotency_key"
+
+# Messages of a FIFO topic are ordered within this group
+MESSAGE_GROUP_ID = "daily-report"
+
+
+@dataclass(frozen=True)
+class Part:
+    """One message of a report, numbered from 1"""
+
+    index: int
+    count: int
+    subject: str
+    message: str
+    key: str
+
+
+def _attributes(key):
+    return {IDEMPOTENCY_ATTRIBUTE: {"DataType": "String", "StringValue": key}}
+
+
+def encoded_size(message, attributes=None):
+    """Size of a message as SNS counts it against SNS_MESSAGE_LIMIT"""
+    size = len(message.encode("utf-8"))
+    for name, attribute in (attributes or {}).items():
+        size += len(name.encode("utf-8")) + len(attribute["DataType"])
+        size += len(attribute["StringValue"].encode("utf-8"))
+    return size
+
+
+def _truncate(text, limit):
+    """Cut text to at most ``limit`` encoded bytes on a character boundary"""
+    return text.encode("utf-8")[:limit].decode("utf-8", "ignore")
+
+
+def split_message(message, limit):
+    """Split a message into chunks of at most ``limit`` encoded bytes
+
+    Chunks end on line boundaries and only lines longer than the limit are
+    cut, so a message without such lines is given back by joining the chunks
+    with newlines.
+    """
+    chunks = []
+    lines = []
+    size = 0
+    for line in message.split("\n"):
+        line_size = len(line.encode("utf-8"))
+        # Every line after the first one of a chunk costs a newline
+        if lines and size + 1 + line_size > limit:
+            chunks.append("\n".join(lines))
+            lines, size = [], 0
+        while line_size > limit:
+            head = _truncate(line, limit)
+            chunks.append(head)
+            line = line[len(head) :]
+            line_size = len(line.encode("utf-8"))
+        size += line_size + (1 if lines else 0)
+        lines.append(line)
+    chunks.append("\n".join(lines))
+    return chunks
+
+
+def _report_digest(subject, message):
+    return hashlib.sha256(f"{subject}\n{message}".encode("utf-8")).hexdigest()[:32]
+
+
+def _part_subject(subject, index, count):
+    suffix = f" ({index}/{count})" if count > 1 else ""
+    return _truncate(subject, SUBJECT_LIMIT - len(suffix)) + suffix
+
+
+def _link_footer(s, link, link_expires=None):
+    if not link:
+        return ""
+    if link_expires is None:
+        return "\n\n" + s["link"].format(link=link)
+    until = link_expires.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M")
+    return "\n\n" + s["link_until"].format(link=link, until=until)
+
+
+def plan_parts(
+    message,
+    subject,
+    link=None,
+    limit=SNS_MESSAGE_LIMIT,
+    max_parts=MAX_PARTS,
+    link_expires=None,
+    language="ja",
+):
+    """Turn a report into the ordered parts to publish
+
+    A report that fits is a single part, with ``link`` to the full report
+    appended when given, along with the time ``link_expires`` when it stops
+    working. An oversized report is summarized to one part when there is a
+    link, and split into at most ``max_parts`` parts otherwise. Notices are
+    written in ``language``.
+    """
+    s = STRINGS[language]
+    digest = _report_digest(subject, message)
+    budget = limit - encoded_size("", _attributes(f"{digest}-{max_parts}"))
+    footer = _link_footer(s, link, link_expires)
+
+    if encoded_size(message + footer) <= budget:
+        chunks = [message + footer]
+    elif link:
+        notice = "\n\n" + s["summarized"]
+        head = split_message(message, budget - PART_RESERVE - encoded_size(footer))
+        chunks = [head[0] + notice + footer]
+    else:
+        chunks = split_message(message, budget - PART_RESERVE)
+        if len(chunks) > max_parts:
+            omitted = len(chunks) - max_parts
+            chunks = chunks[:max_parts]
+            chunks[-1] += "\n\n" + s["parts_omitted"].format(count=omitted)
+
+    count = len(chunks)
+    return [
+        Part(
+            index,
+            count,
+            _part_subject(subject, index, count),
+            f"[{index}/{count}]\n{chunk}" if count > 1 else chunk,
+            f"{digest}-{index}",
+        )
+        for index, chunk in enumerate(chunks, 1)
+    ]
+
+
+def is_fifo(topic_arn):
+    """Whether the topic is a FIFO topic, which keeps messages in order"""
+    return topic_arn.endswith(".fifo")
+
+
+def publish_request(part, topic_arn):
+    """Arguments of the SNS Publish call of a part
+
+    FIFO topics drop a message whose deduplication ID was seen in the last
+    five minutes; on standard topics subscribers can deduplicate by the
+    idempotency key attribute.
+    """
+    request = {
+        "TopicArn": topic_arn,
+        "Subject": part.subject,
+        "Message": part.message,
+        "MessageAttributes": _attributes(part.key),
+    }
+    if is_fifo(topic_arn):
+        request["MessageGroupId"] = MESSAGE_GROUP_ID
+        request["MessageDeduplicationId"] = part.key
+    return request
+
+
+def publish_parts(sns, parts, topic_arn, backoff=None, max_workers=PUBLISH_WORKERS):
+    """Publish the parts and return their message IDs in part order
+
+    Parts go out concurrently, except on FIFO topics where they are published
+    one after another to keep their order. Throttled publishes are retried
+    through ``backoff`` with the same idempotency key. Every part is
+    attempted; the first error is raised afterwards.
+    """
+
+    def publish(part):
+        request = publish_request(part, topic_arn)
+        if backoff is None:
+            return sns.publish(**request)
+        return backoff.call(sns.publish, **request)
+
+    if len(parts) == 1:
+        return [publish(parts[0])["MessageId"]]
+
+    if is_fifo(topic_arn):
+        max_workers = 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(instrumentation.propagate(publish), part) for part in parts
+        ]
+
+    errors = [future.exception() for future in futures if future.exception()]
+    if errors:
+        raise errors[0]
+    return [future.result()["MessageId"] for future in futures]
+
+
+def link_expiry(credentials, limit=LINK_EXPIRY):
+    """Seconds a link presigned with the credentials stays valid
+
+    Links signed with temporary credentials, which carry a session token,
+    are limited to ``SESSION_LINK_EXPIRY``.
+    """
+    if credentials is not None and credentials.token:
+        return min(limit, SESSION_LINK_EXPIRY)
+    return limit
+
+
+def upload_report(s3, bucket, key, message, expires=LINK_EXPIRY):
+    """Store the full report gzip-compressed in S3 and return a presigned link"""
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=gzip.compress(message.encode("utf-8")),
+        ContentType="text/plain; charset=utf-8",
+        ContentEncoding="gzip",
+    )
+    return s3.generate_presigned_url(
+        "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expires
+    )
+
+
+def store_rendering(s3, bucket, key, body, media_type):
+    """Store a rendered report, e.g. the HTML or CSV version, in S3"""
+    s3.put_object(
+        Bucket=bucket, Key=key, Body=body.encode("utf-8"), ContentType=media_type
+    )
+
+
+def post_webhook(url, body, timeout=WEBHOOK_TIMEOUT):
+    """POST a JSON payload to a Slack or Teams incoming webhook"""
+    request = urllib.request.Request(
+        url,
+        data=body.encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:  # nosec B310
+        return response.status
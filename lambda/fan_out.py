@@ -0,0 +1,264 @@
+"""
+Multi-account and multi-region fan-out for the daily cost report.
+
+Each target account is reached by assuming a role in it. Cost Explorer data
+is account-wide, so it is fetched once per account, while resource counts are
+collected for every account/region pair. All targets run in parallel on a
+bounded thread pool and their results are merged into a single report.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import boto3
+
+import cost_notifier
+import instrumentation
+from clients import get_client
+from inventory import REGISTRY
+from renderers import STRINGS
+
+FAN_OUT_CONCURRENCY = 8
+ROLE_SESSION_NAME = "daily-cost-monitor"
+
+# Cost Explorer is served from a single global endpoint
+COST_EXPLORER_REGION = "us-east-1"
+
+
+@dataclass
+class FanOutResult:
+    """Merged cost and resource data of every target"""
+
+    cost_data: dict
+    resources: dict
+    accounts: list
+    regions: list
+    errors: list = field(default_factory=list)
+
+
+def account_id_from_role_arn(role_arn):
+    """Extract the account ID from an IAM role ARN"""
+    return role_arn.split(":")[4]
+
+
+def assume_role_session(role_arn):
+    """Assume the role and return a boto3 session with its credentials"""
+    sts = get_client("sts")
+    credentials = sts.assume_role(RoleArn=role_arn, RoleSessionName=ROLE_SESSION_NAME)[
+        "Credentials"
+    ]
+    return instrumentation.instrument_session(
+        boto3.session.Session(
+            aws_access_key_id=credentials["AccessKeyId"],
+            aws_secret_access_key=credentials["SecretAccessKey"],
+            aws_session_token=credentials["SessionToken"],
+        )
+    )
+
+
+def merge_cost_data(responses):
+    """Merge Cost Explorer responses into one, keeping days in order"""
+    by_date = {}
+    for response in responses:
+        for result in response["ResultsByTime"]:
+            merged = by_date.setdefault(
+                result["TimePeriod"]["Start"],
+                {"TimePeriod": result["TimePeriod"], "Groups": []},
+            )
+            merged["Groups"].extend(result["Groups"])
+
+    return {"ResultsByTime": [by_date[date] for date in sorted(by_date)]}
+
+
+def merge_resource_counts(counts_list):
+    """Sum resource counts of several targets, keeping the report key order"""
+    merged = REGISTRY.defaults()
+    for counts in counts_list:
+        for name, values in counts.items():
+            totals = merged.setdefault(name, dict.fromkeys(values, 0))
+            for key, value in values.items():
+                totals[key] = totals.get(key, 0) + value
+    return merged
+
+
+class _SessionCache:
+    """Assume each role once and create its clients one at a time
+
+    boto3 sessions are not thread safe, so the clients of a role's session
+    are created under that role's lock, like ``clients.ClientRegistry``
+    does for the default session. Each ``(service, region)`` client is
+    created once per role.
+    """
+
+    def __init__(self, session_factory):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._role_locks = {}
+        self._sessions = {}
+        self._clients = {}
+
+    def client(self, role_arn, service_name, region_name):
+        """Return the client of the role's session, creating it on first use"""
+        with self._lock:
+            role_lock = self._role_locks.setdefault(role_arn, threading.Lock())
+
+        key = (role_arn, service_name, region_name)
+        with role_lock:
+            if key not in self._clients:
+                if role_arn not in self._sessions:
+                    self._sessions[role_arn] = self._session_factory(role_arn)
+                self._clients[key] = self._sessions[role_arn].client(
+                    service_name, region_name=region_name
+                )
+            return self._clients[key]
+
+
+def _collect_account_costs(sessions, role_arn, days, cache, shard_days):
+    """Fetch the Cost Explorer data of one account"""
+    ce = sessions.client(role_arn, "ce", COST_EXPLORER_REGION)
+    if cache is not None:
+        cache = cache.namespaced(account_id_from_role_arn(role_arn))
+    return cost_notifier.get_cost_data(
+        days=days, ce=ce, cache=cache, shard_days=shard_days
+    )
+
+
+def _collect_region_resources(sessions, role_arn, region):
+    """Count the resources of one account/region pair
+
+    Returns the counts and the errors of the collectors that failed.
+    """
+    clients = {
+        service: sessions.client(role_arn, service, region)
+        for service in REGISTRY.services()
+    }
+    errors = {}
+    counts = cost_notifier.get_resource_counts(clients=clients, errors=errors)
+    return counts, errors
+
+
+def collect_fan_out(
+    role_arns,
+    regions,
+    days,
+    max_workers=FAN_OUT_CONCURRENCY,
+    session_factory=None,
+    cache=None,
+    shard_days=None,
+    timeout=None,
+):
+    """Collect cost and resource data of every account/region target
+
+    ``session_factory`` turns a role ARN into a boto3-like session and
+    defaults to assuming the role through STS. A ``cost_cache.CostCache``
+    is shared by all accounts, each under its own namespace, and
+    ``shard_days`` is passed on to ``get_cost_data``. A failing target is
+    recorded in ``errors`` and left out of the merged data, so the remaining
+    targets are still reported. Targets that have not finished ``timeout``
+    seconds after the start are recorded as failed and abandoned.
+    """
+    sessions = _SessionCache(session_factory or assume_role_session)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        cost_futures = {
+            role_arn: executor.submit(
+                instrumentation.propagate(_collect_account_costs),
+                sessions,
+                role_arn,
+                days,
+                cache,
+                shard_days,
+            )
+            for role_arn in role_arns
+        }
+        resource_futures = {
+            (role_arn, region): executor.submit(
+                instrumentation.propagate(_collect_region_resources),
+                sessions,
+                role_arn,
+                region,
+            )
+            for role_arn in role_arns
+            for region in regions
+        }
+        wait([*cost_futures.values(), *resource_futures.values()], timeout)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return build_fan_out_result(
+        role_arns,
+        regions,
+        {role_arn: _outcome(future) for role_arn, future in cost_futures.items()},
+        {target: _outcome(future) for target, future in resource_futures.items()},
+    )
+
+
+def _outcome(future):
+    """The result of a finished future, or the exception that replaces it"""
+    if future.cancelled() or not future.done():
+        return TimeoutError("timed out")
+    return future.exception() or future.result()
+
+
+def build_fan_out_result(role_arns, regions, cost_outcomes, resource_outcomes):
+    """Merge the outcomes of every target into a FanOutResult
+
+    ``cost_outcomes`` maps role ARNs to a result, and ``resource_outcomes``
+    maps ``(role ARN, region)`` pairs to a ``(counts, collector errors)``
+    pair; either may be the exception that replaced it. Failed targets, and
+    the failed collectors of a target, are recorded in ``errors``.
+    """
+    errors = []
+
+    cost_responses = []
+    for role_arn, response in cost_outcomes.items():
+        account_id = account_id_from_role_arn(role_arn)
+        if isinstance(response, Exception):
+            print(f"Error getting cost data for {account_id}: {response}")
+            errors.append((account_id, str(response)))
+            continue
+        if response is None:
+            # No error message to show; the report explains it
+            errors.append((account_id, None))
+            continue
+        cost_responses.append(response)
+
+    resource_counts = []
+    for (role_arn, region), outcome in resource_outcomes.items():
+        target = f"{account_id_from_role_arn(role_arn)}/{region}"
+        if isinstance(outcome, Exception):
+            print(f"Error getting resource data for {target}: {outcome}")
+            errors.append((target, str(outcome)))
+            continue
+        counts, collector_errors = outcome
+        errors.extend(
+            (f"{target} {name}", error) for name, error in collector_errors.items()
+        )
+        resource_counts.append(counts)
+
+    return FanOutResult(
+        cost_data=merge_cost_data(cost_responses) if cost_responses else None,
+        resources=merge_resource_counts(resource_counts),
+        accounts=[account_id_from_role_arn(role_arn) for role_arn in role_arns],
+        regions=list(regions),
+        errors=errors,
+    )
+
+
+def format_fan_out_section(result, language="ja"):
+    """Build the report section describing the fan-out targets"""
+    s = STRINGS[language]
+    lines = [
+        s["fan_out_accounts"].format(count=len(result.accounts)),
+        s["fan_out_regions"].format(regions=", ".join(result.regions)),
+    ]
+    if result.errors:
+        lines.append("")
+        lines.append(s["fan_out_failed"])
+        lines.extend(
+            f"  {target}: {error or s['fan_out_no_costs']}"
+            for target, error in result.errors
+        )
+    return (s["fan_out_title"], lines)
@@ -0,0 +1,185 @@
+"""
+Month-end cost forecast from Cost Explorer's GetCostForecast.
+
+The forecast changes at most once a day, so it is memoized per day: in
+memory for warm invocations and, when persistent storage is configured, in
+the shared cache backend so that cold starts on the same day reuse it too.
+"""
+
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+
+from renderers import STRINGS
+
+FORECAST_METRIC = "UNBLENDED_COST"
+PREDICTION_INTERVAL_LEVEL = 80
+
+MEMO_KEY = "forecast/latest"
+
+# Forecast of the current day, kept across warm invocations
+_memo = {}
+
+
+@dataclass
+class CostForecast:
+    """Month-to-date cost and the forecast for the rest of the month"""
+
+    month: str
+    month_to_date: float
+    forecast: float
+    lower_bound: float
+    upper_bound: float
+    unit: str = "USD"
+
+    @property
+    def month_end_total(self):
+        """Expected total cost of the month"""
+        return self.month_to_date + self.forecast
+
+
+def _next_month(today):
+    """First day of the month after ``today``"""
+    return (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def forecast_queries(today):
+    """Arguments of the month-to-date and forecast queries
+
+    The month-to-date query is None on the first day of the month, when there
+    is no cost yet.
+    """
+    month_start = today.replace(day=1)
+    month_to_date = None
+    if today > month_start:
+        month_to_date = {
+            "TimePeriod": {"Start": month_start.isoformat(), "End": today.isoformat()},
+            "Granularity": "MONTHLY",
+            "Metrics": ["UnblendedCost"],
+        }
+    forecast = {
+        "TimePeriod": {
+            "Start": today.isoformat(),
+            "End": _next_month(today).isoformat(),
+        },
+        "Metric": FORECAST_METRIC,
+        "Granularity": "MONTHLY",
+        "PredictionIntervalLevel": PREDICTION_INTERVAL_LEVEL,
+    }
+    return month_to_date, forecast
+
+
+def parse_forecast(today, month_to_date_response, forecast_response):
+    """Build the forecast from the query responses"""
+    month_to_date = 0.0
+    if month_to_date_response is not None:
+        month_to_date = sum(
+            float(result["Total"]["UnblendedCost"]["Amount"])
+            for result in month_to_date_response["ResultsByTime"]
+        )
+
+    results = forecast_response.get("ForecastResultsByTime", [])
+    return CostForecast(
+        month=today.strftime("%Y-%m"),
+        month_to_date=month_to_date,
+        forecast=float(forecast_response["Total"]["Amount"]),
+        lower_bound=sum(
+            float(result["PredictionIntervalLowerBound"]) for result in results
+        ),
+        upper_bound=sum(
+            float(result["PredictionIntervalUpperBound"]) for result in results
+        ),
+        unit=forecast_response["Total"].get("Unit", "USD"),
+    )
+
+
+def _fetch_forecast(ce, today):
+    """Query the month-to-date cost and the forecast up to month end"""
+    month_to_date_query, forecast_query = forecast_queries(today)
+    month_to_date = None
+    if month_to_date_query is not None:
+        month_to_date = ce.get_cost_and_usage(**month_to_date_query)
+    return parse_forecast(today, month_to_date, ce.get_cost_forecast(**forecast_query))
+
+
+def _load_memo(backend, key):
+    """Return the forecast stored in the backend for the day, if any"""
+    try:
+        stored = backend.get(MEMO_KEY)
+    except Exception as e:
+        print(f"Error loading memoized cost forecast: {e}")
+        return None
+    if not stored or stored.get("date") != key:
+        return None
+    return CostForecast(**stored["forecast"])
+
+
+def lookup_forecast(today, backend=None):
+    """Return the forecast memoized for the day, in memory or in the backend"""
+    key = today.isoformat()
+    forecast = _memo.get(key)
+    if forecast is None and backend is not None:
+        forecast = _load_memo(backend, key)
+        if forecast is not None:
+            _remember(key, forecast)
+    return forecast
+
+
+def store_forecast(today, forecast, backend=None):
+    """Memoize a freshly fetched forecast for the day"""
+    key = today.isoformat()
+    if backend is not None:
+        try:
+            backend.put(MEMO_KEY, {"date": key, "forecast": asdict(forecast)})
+        except Exception as e:
+            print(f"Error memoizing cost forecast: {e}")
+    _remember(key, forecast)
+
+
+def _remember(key, forecast):
+    _memo.clear()
+    _memo[key] = forecast
+
+
+def get_cost_forecast(ce, today=None, backend=None):
+    """Return the month-end forecast, memoized per day
+
+    Returns None when the forecast cannot be fetched, for example while the
+    account has too little history for Cost Explorer to forecast.
+    Failures are not memoized.
+    """
+    today = today or date.today()
+
+    forecast = lookup_forecast(today, backend)
+    if forecast is not None:
+        return forecast
+
+    try:
+        forecast = _fetch_forecast(ce, today)
+    except Exception as e:
+        print(f"Error fetching cost forecast: {e}")
+        return None
+
+    store_forecast(today, forecast, backend)
+    return forecast
+
+
+def format_forecast_section(forecast, language="ja"):
+    """Build the month-end forecast report section"""
+    s = STRINGS[language]
+    lower = forecast.month_to_date + forecast.lower_bound
+    upper = forecast.month_to_date + forecast.upper_bound
+    return (
+        s["forecast_title"],
+        [
+            s["forecast_actual"].format(
+                month=forecast.month, amount=f"{forecast.month_to_date:.2f}"
+            ),
+            s["forecast_remaining"].format(amount=f"{forecast.forecast:.2f}"),
+            s["forecast_total"].format(amount=f"{forecast.month_end_total:.2f}"),
+            s["forecast_interval"].format(
+                level=PREDICTION_INTERVAL_LEVEL,
+                lower=f"{lower:.2f}",
+                upper=f"{upper:.2f}",
+            ),
+        ],
+    )
@@ -0,0 +1,310 @@
+"""
+Per-invocation instrumentation of report stages and AWS API calls.
+
+While an invocation is being recorded, every stage (cost data, resources,
+formatting, SNS, ...) and every AWS API call is measured for wall time,
+retries, bytes received and pages (API responses). API calls are attributed
+to the innermost stage of the code that made them; the stage is carried into
+worker threads by wrapping their tasks with ``propagate``.
+
+At the end of the invocation the measurements are handed to the registered
+hooks. The default hook prints them as one CloudWatch Embedded Metric Format
+(EMF) JSON line, which CloudWatch Logs turns into metrics.
+
+When no invocation is being recorded, ``stage`` and ``propagate`` return after
+a single global lookup and the botocore event handlers return immediately.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+NAMESPACE = "DailyCostMonitor"
+
+# CloudWatch accepts at most this many metrics per EMF directive
+MAX_METRICS_PER_DIRECTIVE = 100
+
+METRIC_UNITS = (
+    ("duration_ms", "Duration", "Milliseconds"),
+    ("pages", "Pages", "Count"),
+    ("retries", "Retries", "Count"),
+    ("bytes_received", "Bytes", "Bytes"),
+    ("errors", "Errors", "Count"),
+)
+
+_CONTEXT_KEY = "instrumentation"
+
+_recorder = None
+_stage = contextvars.ContextVar("instrumentation_stage", default=None)
+
+
+@dataclass
+class Measurement:
+    """Accumulated measurements of a stage or an API operation"""
+
+    count: int = 0
+    duration_ms: float = 0.0
+    pages: int = 0
+    retries: int = 0
+    bytes_received: int = 0
+    errors: int = 0
+
+
+class Recorder:
+    """Measurements of a single invocation, safe to update from any thread"""
+
+    def __init__(self):
+        self.timestamp = int(time.time() * 1000)
+        self.duration_ms = 0.0
+        self.stages = {}
+        self.api_calls = {}
+        self.spans = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry(table, name):
+        measurement = table.get(name)
+        if measurement is None:
+            measurement = table[name] = Measurement()
+        return measurement
+
+    def record_stage(self, name, seconds, error=False, started=None):
+        """Record one run of a stage
+
+        ``started`` is the ``time.perf_counter()`` value at which the stage
+        began; when given, the run is also kept in ``spans``.
+        """
+        with self._lock:
+            if started is not None:
+                self.spans.append((name, started, started + seconds))
+            measurement = self._entry(self.stages, name)
+            measurement.count += 1
+            measurement.duration_ms += seconds * 1000
+            measurement.errors += int(error)
+
+    def record_api_call(
+        self, stage, operation, seconds, retries=0, bytes_received=0, error=False
+    ):
+        """Record one API call, which is one page of a paginated operation"""
+        with self._lock:
+            measurement = self._entry(self.api_calls, operation)
+            measurement.count += 1
+            measurement.duration_ms += seconds * 1000
+            targets = [measurement]
+            if stage is not None:
+                targets.append(self._entry(self.stages, stage))
+            for target in targets:
+                target.pages += 1
+                target.retries += retries
+                target.bytes_received += bytes_received
+                target.errors += int(error)
+
+    def record_retry(self, stage):
+        """Record a retry made by the application rather than by botocore"""
+        if stage is None:
+            return
+        with self._lock:
+            self._entry(self.stages, stage).retries += 1
+
+    def finish(self):
+        """Stop the invocation clock"""
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+
+def to_emf(recorder, namespace=NAMESPACE):
+    """Build the CloudWatch EMF document of an invocation
+
+    Every stage and API operation gets Duration, Pages, Retries, Bytes and
+    Errors metrics named ``<stage or service.Operation>.<metric>``; the full
+    measurements are kept as properties of the log line.
+    """
+    function_name = os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local")
+    document = {
+        "FunctionName": function_name,
+        "InvocationDuration": round(recorder.duration_ms, 3),
+    }
+    definitions = [{"Name": "InvocationDuration", "Unit": "Milliseconds"}]
+
+    for table in (recorder.stages, recorder.api_calls):
+        for name, measurement in sorted(table.items()):
+            for field, metric, unit in METRIC_UNITS:
+                key = f"{name}.{metric}"
+                value = getattr(measurement, field)
+                document[key] = round(value, 3) if isinstance(value, float) else value
+                definitions.append({"Name": key, "Unit": unit})
+
+    document["Stages"] = {
+        name: asdict(measurement) for name, measurement in recorder.stages.items()
+    }
+    document["ApiCalls"] = {
+        name: asdict(measurement) for name, measurement in recorder.api_calls.items()
+    }
+    document["_aws"] = {
+        "Timestamp": recorder.timestamp,
+        "CloudWatchMetrics": [
+            {
+                "Namespace": namespace,
+                "Dimensions": [["FunctionName"]],
+                "Metrics": definitions[i : i + MAX_METRICS_PER_DIRECTIVE],
+            }
+            for i in range(0, len(definitions), MAX_METRICS_PER_DIRECTIVE)
+        ],
+    }
+    return document
+
+
+def emit_emf(recorder):
+    """Default hook: print the invocation as one EMF JSON log line"""
+    print(json.dumps(to_emf(recorder), ensure_ascii=False))
+
+
+_hooks = [emit_emf]
+
+
+def add_hook(hook):
+    """Register a callable that receives the ``Recorder`` of each invocation"""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Unregister a hook added with ``add_hook``"""
+    _hooks.remove(hook)
+
+
+@contextmanager
+def invocation(enabled=True):
+    """Record the measurements of one invocation and hand them to the hooks"""
+    global _recorder
+
+    if not enabled:
+        yield None
+        return
+
+    recorder = _recorder = Recorder()
+    try:
+        yield recorder
+    finally:
+        _recorder = None
+        recorder.finish()
+        for hook in list(_hooks):
+            try:
+                hook(recorder)
+            except Exception as e:
+                print(f"Error in instrumentation hook {hook!r}: {e}")
+
+
+@contextmanager
+def stage(name):
+    """Measure a stage; usable as a context manager or a decorator"""
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+
+    token = _stage.set(name)
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        recorder.record_stage(name, time.perf_counter() - started, error, started)
+        _stage.reset(token)
+
+
+def propagate(func):
+    """Wrap a task for a worker thread so it runs in the caller's stage"""
+    if _recorder is None:
+        return func
+
+    current = _stage.get()
+
+    def run(*args, **kwargs):
+        token = _stage.set(current)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _stage.reset(token)
+
+    return run
+
+
+def record_retry():
+    """Count an application-level retry against the current stage"""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.record_retry(_stage.get())
+
+
+def record_api_call(operation, seconds, retries=0, bytes_received=0, error=False):
+    """Record an API call made without botocore, such as a simulated one"""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.record_api_call(
+            _stage.get(), operation, seconds, retries, bytes_received, error
+        )
+
+
+def _start_call(model=None, context=None, **kwargs):
+    # before-parameter-build is used instead of before-call because it runs
+    # for every call, while before-call stops at handlers that answer the
+    # call themselves
+    if _recorder is None or context is None:
+        return
+    context[_CONTEXT_KEY] = (
+        _stage.get(),
+        f"{model.service_model.service_name}.{model.name}",
+        time.perf_counter(),
+    )
+
+
+def _after_call(http_response=None, parsed=None, context=None, **kwargs):
+    recorder = _recorder
+    started = context.pop(_CONTEXT_KEY, None) if context is not None else None
+    if recorder is None or started is None:
+        return
+
+    current, operation, start = started
+    metadata = (parsed or {}).get("ResponseMetadata", {})
+    recorder.record_api_call(
+        current,
+        operation,
+        time.perf_counter() - start,
+        retries=metadata.get("RetryAttempts", 0),
+        bytes_received=int(http_response.headers.get("content-length") or 0),
+        error=http_response.status_code >= 300,
+    )
+
+
+def _after_call_error(context=None, **kwargs):
+    recorder = _recorder
+    started = context.pop(_CONTEXT_KEY, None) if context is not None else None
+    if recorder is None or started is None:
+        return
+
+    current, operation, start = started
+    recorder.record_api_call(
+        current, operation, time.perf_counter() - start, error=True
+    )
+
+
+def instrument_session(session):
+    """Register the API call handlers on a boto3 or botocore session
+
+    Clients created from the session afterwards report their calls to the
+    invocation being recorded, if any. botocore sessions include aiobotocore
+    sessions, whose clients call the same handlers.
+    """
+    # boto3 sessions expose the event emitter, botocore sessions register
+    events = getattr(session, "events", session)
+    events.register("before-parameter-build", _start_call)
+    events.register("after-call", _after_call)
+    events.register("after-call-error", _after_call_error)
+    return session
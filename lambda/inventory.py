@@ -0,0 +1,398 @@
+"""
+Resource inventory of the daily cost report.
+
+Each resource type is counted by a ``ResourceCollector``, which declares the
+client it needs, the operation it calls (through a paginator when the
+operation is paginated) and a reducer that folds one response page into the
+counts. Collectors are kept in a ``CollectorRegistry`` that runs them
+concurrently on a bounded thread pool, hands collectors of the same service
+one shared client and stops waiting for a collector once it runs over its
+timeout. The report renders whatever the registry returns, so a new resource
+type only needs a reducer and a ``register()`` call.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Callable
+
+import instrumentation
+
+COLLECTOR_WORKERS = 8
+
+# Seconds a collector may take before its counts are given up
+COLLECTOR_TIMEOUT = 30.0
+
+
+@dataclass(frozen=True)
+class ResourceCollector:
+    """How to count one resource type
+
+    ``counts`` lists the ``(key, label)`` pairs of the counts in report
+    order, and ``reducer(counts, page)`` adds one response page to them.
+    Operations that are not paginated are called once with ``params``.
+    ``title`` and ``counts`` are Japanese; ``translations`` maps other
+    report languages to their ``(title, counts)``.
+    """
+
+    name: str
+    service: str
+    operation: str
+    reducer: Callable[[dict, dict], None]
+    title: str
+    counts: tuple
+    paginated: bool = True
+    params: dict = field(default_factory=dict)
+    timeout: float = COLLECTOR_TIMEOUT
+    translations: dict = field(default_factory=dict)
+
+    def localized(self, language="ja"):
+        """``(title, counts)`` in a language, Japanese when not translated"""
+        return self.translations.get(language, (self.title, self.counts))
+
+    def default(self):
+        """Counts reported when nothing was counted"""
+        return {key: 0 for key, _ in self.counts}
+
+    def pages(self, client):
+        """Yield the response pages one at a time
+
+        Pages are fetched lazily as the caller consumes them, so only the page
+        being counted is held in memory regardless of the account size.
+        """
+        if self.paginated:
+            yield from client.get_paginator(self.operation).paginate(**self.params)
+        else:
+            yield getattr(client, self.operation)(**self.params)
+
+    def collect(self, client, clock=time.monotonic):
+        """Count the resources, raising TimeoutError past ``timeout``
+
+        The timeout is checked between pages, so paging stops after at most
+        one more API call. A call that hangs is not interrupted here;
+        ``CollectorRegistry.collect`` stops waiting for it instead.
+        """
+        started = clock()
+        counts = self.default()
+        for page in self.pages(client):
+            self.reducer(counts, page)
+            if clock() - started > self.timeout:
+                raise TimeoutError(f"timed out after {self.timeout:g}s")
+        return counts
+
+
+class CollectorRegistry:
+    """Ordered set of resource collectors, keyed by report name"""
+
+    def __init__(self, collectors=()):
+        self._collectors = {}
+        for collector in collectors:
+            self.register(collector)
+
+    def register(self, collector):
+        """Add a collector, replacing one of the same name"""
+        self._collectors[collector.name] = collector
+        return collector
+
+    def unregister(self, name):
+        """Remove a collector"""
+        del self._collectors[name]
+
+    def __iter__(self):
+        return iter(list(self._collectors.values()))
+
+    def __len__(self):
+        return len(self._collectors)
+
+    def __contains__(self, name):
+        return name in self._collectors
+
+    def __getitem__(self, name):
+        return self._collectors[name]
+
+    def get(self, name):
+        return self._collectors.get(name)
+
+    def services(self):
+        """Client service names the collectors need, without duplicates"""
+        return list(dict.fromkeys(collector.service for collector in self))
+
+    def labels(self, language="ja"):
+        """Display names of every count, keyed by ``(collector name, key)``"""
+        return {
+            (collector.name, key): f"{collector.name} {label}"
+            for collector in self
+            for key, label in collector.localized(language)[1]
+        }
+
+    def defaults(self):
+        """Default counts of every collector in report order"""
+        return {collector.name: collector.default() for collector in self}
+
+    def collect(
+        self, clients, max_workers=COLLECTOR_WORKERS, clock=time.monotonic, errors=None
+    ):
+        """Run every collector concurrently and return their counts
+
+        ``clients`` maps service names to clients, shared by the collectors
+        of a service. A collector that fails or runs over its timeout reports
+        its default counts, and its error is added to the ``errors`` dict
+        when one is given. The timeout counts from the start of the
+        collection and is enforced on the collector's future, so a hung API
+        call cannot hold up the report; its thread is left to finish in the
+        background. The result keeps the registration order.
+        """
+        collectors = list(self)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        started = clock()
+        try:
+            futures = [
+                executor.submit(
+                    instrumentation.propagate(collector.collect),
+                    clients[collector.service],
+                )
+                for collector in collectors
+            ]
+            resources = {}
+            for collector, future in zip(collectors, futures):
+                remaining = collector.timeout - (clock() - started)
+                try:
+                    resources[collector.name] = future.result(max(remaining, 0))
+                    continue
+                except FutureTimeoutError:
+                    error = f"timed out after {collector.timeout:g}s"
+                except Exception as e:
+                    error = str(e)
+                print(f"Error getting {collector.name} data: {error}")
+                if errors is not None:
+                    errors[collector.name] = error
+                resources[collector.name] = collector.default()
+            return resources
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def tally_ec2_page(counts, page):
+    """Count the EC2 instances of a page and how many of them are running"""
+    for reservation in page["Reservations"]:
+        for instance in reservation["Instances"]:
+            counts["total"] += 1
+            if instance["State"]["Name"] == "running":
+                counts["running"] += 1
+
+
+def tally_rds_page(counts, page):
+    """Count the RDS instances of a page and how many of them are available"""
+    for db in page["DBInstances"]:
+        counts["total"] += 1
+        if db["DBInstanceStatus"] == "available":
+            counts["available"] += 1
+
+
+def tally_s3_page(counts, page):
+    """Count the S3 buckets of a ListBuckets response"""
+    counts["total_buckets"] += len(page["Buckets"])
+
+
+def tally_lambda_page(counts, page):
+    """Count the Lambda functions of a page"""
+    counts["total_functions"] += len(page["Functions"])
+
+
+def tally_ebs_page(counts, page):
+    """Count the EBS volumes of a page, unattached ones and their size"""
+    for volume in page["Volumes"]:
+        counts["total"] += 1
+        if volume["State"] == "available":
+            counts["unattached"] += 1
+        counts["size_gib"] += volume.get("Size", 0)
+
+
+def tally_elb_page(counts, page):
+    """Count the load balancers of a page by type"""
+    for load_balancer in page["LoadBalancers"]:
+        counts["total"] += 1
+        if load_balancer.get("Type") in ("application", "network"):
+            counts[load_balancer["Type"]] += 1
+
+
+def tally_nat_gateway_page(counts, page):
+    """Count the NAT gateways of a page"""
+    counts["total"] += len(page["NatGateways"])
+
+
+def tally_eks_page(counts, page):
+    """Count the EKS clusters of a page"""
+    counts["total_clusters"] += len(page["clusters"])
+
+
+def tally_dynamodb_page(counts, page):
+    """Count the DynamoDB tables of a page"""
+    counts["total_tables"] += len(page["TableNames"])
+
+
+def tally_elasticache_page(counts, page):
+    """Count the ElastiCache clusters of a page and their nodes"""
+    for cluster in page["CacheClusters"]:
+        counts["total"] += 1
+        counts["nodes"] += cluster.get("NumCacheNodes", 0)
+
+
+REGISTRY = CollectorRegistry(
+    [
+        ResourceCollector(
+            "EC2",
+            "ec2",
+            "describe_instances",
+            tally_ec2_page,
+            "📦 EC2 インスタンス:",
+            (("total", "総数"), ("running", "稼働中")),
+            translations={
+                "en": (
+                    "📦 EC2 instances:",
+                    (("total", "Total"), ("running", "Running")),
+                )
+            },
+        ),
+        ResourceCollector(
+            "RDS",
+            "rds",
+            "describe_db_instances",
+            tally_rds_page,
+            "🗄️ RDS インスタンス:",
+            (("total", "総数"), ("available", "利用可能")),
+            translations={
+                "en": (
+                    "🗄️ RDS instances:",
+                    (("total", "Total"), ("available", "Available")),
+                )
+            },
+        ),
+        ResourceCollector(
+            "S3",
+            "s3",
+            "list_buckets",
+            tally_s3_page,
+            "🪣 S3 バケット:",
+            (("total_buckets", "総数"),),
+            translations={"en": ("🪣 S3 buckets:", (("total_buckets", "Total"),))},
+            paginated=False,
+        ),
+        ResourceCollector(
+            "Lambda",
+            "lambda",
+            "list_functions",
+            tally_lambda_page,
+            "λ Lambda 関数:",
+            (("total_functions", "総数"),),
+            translations={
+                "en": ("λ Lambda functions:", (("total_functions", "Total"),))
+            },
+        ),
+        ResourceCollector(
+            "EBS",
+            "ec2",
+            "describe_volumes",
+            tally_ebs_page,
+            "💽 EBS ボリューム:",
+            (
+                ("total", "総数"),
+                ("unattached", "未アタッチ"),
+                ("size_gib", "合計容量 (GiB)"),
+            ),
+            translations={
+                "en": (
+                    "💽 EBS volumes:",
+                    (
+                        ("total", "Total"),
+                        ("unattached", "Unattached"),
+                        ("size_gib", "Total size (GiB)"),
+                    ),
+                )
+            },
+        ),
+        ResourceCollector(
+            "ELB",
+            "elbv2",
+            "describe_load_balancers",
+            tally_elb_page,
+            "⚖️ ロードバランサー:",
+            (("total", "総数"), ("application", "ALB"), ("network", "NLB")),
+            translations={
+                "en": (
+                    "⚖️ Load balancers:",
+                    (("total", "Total"), ("application", "ALB"), ("network", "NLB")),
+                )
+            },
+        ),
+        ResourceCollector(
+            "NAT",
+            "ec2",
+            "describe_nat_gateways",
+            tally_nat_gateway_page,
+            "🚪 NAT ゲートウェイ:",
+            (("total", "総数"),),
+            translations={"en": ("🚪 NAT gateways:", (("total", "Total"),))},
+            params={"Filters": [{"Name": "state", "Values": ["pending", "available"]}]},
+        ),
+        ResourceCollector(
+            "EKS",
+            "eks",
+            "list_clusters",
+            tally_eks_page,
+            "☸️ EKS クラスター:",
+            (("total_clusters", "総数"),),
+            translations={"en": ("☸️ EKS clusters:", (("total_clusters", "Total"),))},
+        ),
+        ResourceCollector(
+            "DynamoDB",
+            "dynamodb",
+            "list_tables",
+            tally_dynamodb_page,
+            "🗃️ DynamoDB テーブル:",
+            (("total_tables", "総数"),),
+            translations={"en": ("🗃️ DynamoDB tables:", (("total_tables", "Total"),))},
+        ),
+        ResourceCollector(
+            "ElastiCache",
+            "elasticache",
+            "describe_cache_clusters",
+            tally_elasticache_page,
+            "⚡ ElastiCache クラスター:",
+            (("total", "総数"), ("nodes", "ノード数")),
+            translations={
+                "en": (
+                    "⚡ ElastiCache clusters:",
+                    (("total", "Total"), ("nodes", "Nodes")),
+                )
+            },
+        ),
+    ]
+)
+
+
+def register(collector):
+    """Add a collector to the report's registry"""
+    return REGISTRY.register(collector)
+
+
+def format_resource_lines(resources, registry=None, language="ja"):
+    """Render resource counts as report lines, in the order given
+
+    Labels come from the registry in the report language; counts of unknown
+    collectors are shown with their keys.
+    """
+    if registry is None:
+        registry = REGISTRY
+    lines = []
+    for name, counts in resources.items():
+        collector = registry.get(name)
+        title, labels = collector.localized(language) if collector else (None, ())
+        labels = dict(labels)
+        lines.append(title or f"{name}:")
+        lines.extend(
+            f"  {labels.get(key, key)}: {value}" for key, value in counts.items()
+        )
+        lines.append("")
+    return lines
@@ -0,0 +1,243 @@
+"""
+Fixed-point money amounts for cost aggregation.
+
+Cost Explorer returns amounts as decimal strings with up to ten fractional
+digits. ``Money`` keeps an amount as an integer number of 1e-10 dollar units,
+so adding and comparing costs is integer arithmetic: exact like ``Decimal``,
+without its per-operation overhead, and without the rounding of ``float``.
+
+Amounts with ten fractional digits, as Cost Explorer returns them, are
+parsed with a single ``int`` conversion; other plain ``[-]digits.digits``
+strings are padded to the unit, and anything else (exponents, more than ten
+fractional digits) goes through ``Decimal`` and is rounded half-even.
+``parse_many`` checks a whole list of amounts with one regular expression
+and converts it without a Python-level step per amount. Currency strings
+are rendered from the integer, so ``f"{cost:.2f}"`` is exact.
+
+``Money`` compares equal to ``int`` and ``Decimal`` values of the same
+amount, so summaries made of it can be checked and combined like the
+``Decimal`` ones they replace.
+"""
+
+import re
+from decimal import ROUND_HALF_EVEN, Decimal, localcontext
+
+SCALE_DIGITS = 10
+SCALE = 10**SCALE_DIGITS
+
+_FIXED_FORMAT = re.compile(r"\.(\d+)f")
+# Newline-separated amounts, each with exactly SCALE_DIGITS fractional digits
+_UNIT_AMOUNTS = re.compile(
+    rf"-?[0-9]+\.[0-9]{{{SCALE_DIGITS}}}(?:\n-?[0-9]+\.[0-9]{{{SCALE_DIGITS}}})*"
+)
+
+
+def _divide(value, divisor):
+    """Integer division rounded half-even, like ``Decimal`` formatting"""
+    if divisor < 0:
+        value, divisor = -value, -divisor
+    quotient, remainder = divmod(value, divisor)
+    twice = remainder * 2
+    if twice > divisor or (twice == divisor and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def _decimal_units(value):
+    """Units of a ``Decimal``, rounded half-even"""
+    if not value.is_finite():
+        raise ValueError(f"not a finite amount: {value}")
+    with localcontext() as context:
+        context.prec = max(len(value.as_tuple().digits) + SCALE_DIGITS + 2, 28)
+        return int(value.scaleb(SCALE_DIGITS).to_integral_value(ROUND_HALF_EVEN))
+
+
+def parse_units(amount):
+    """Parse a Cost Explorer amount string into units
+
+    Amounts with exactly ten fractional digits, the usual Cost Explorer
+    form, are one ``int`` conversion of the digits.
+    """
+    if amount[-11:-10] == "." and "_" not in amount:
+        try:
+            return int(amount.replace(".", "", 1))
+        except ValueError:
+            pass
+    return _parse_other(amount)
+
+
+def parse_many(amounts):
+    """Parse a list of Cost Explorer amount strings into a list of units
+
+    When every amount has exactly ten fractional digits the list is
+    validated with one regular expression and converted with ``map``;
+    otherwise each amount goes through ``parse_units``.
+    """
+    joined = "\n".join(amounts)
+    if joined and _UNIT_AMOUNTS.fullmatch(joined):
+        return list(map(int, joined.replace(".", "").split("\n")))
+    return list(map(parse_units, amounts))
+
+
+def _parse_other(amount):
+    whole, dot, fraction = amount.partition(".")
+    try:
+        if not dot:
+            return int(whole) * SCALE
+        if fraction.isdigit() and fraction.isascii() and len(fraction) <= SCALE_DIGITS:
+            return int(whole + fraction) * 10 ** (SCALE_DIGITS - len(fraction))
+    except ValueError:
+        pass
+    try:
+        return _decimal_units(Decimal(amount))
+    except ArithmeticError:
+        raise ValueError(f"invalid amount: {amount!r}")
+
+
+def to_units(value):
+    """Units of a ``Money``, ``int``, ``Decimal`` or amount string"""
+    if isinstance(value, Money):
+        return value.units
+    if isinstance(value, int):
+        return value * SCALE
+    if isinstance(value, Decimal):
+        return _decimal_units(value)
+    if isinstance(value, str):
+        return parse_units(value)
+    raise TypeError(f"not a money amount: {value!r}")
+
+
+class Money:
+    """An exact dollar amount in integer units of 1e-10"""
+
+    __slots__ = ("units",)
+
+    def __init__(self, units=0):
+        self.units = units
+
+    @classmethod
+    def parse(cls, amount):
+        """Money of a Cost Explorer amount string"""
+        return cls(parse_units(amount))
+
+    @classmethod
+    def of(cls, value):
+        """Money of a ``Money``, ``int``, ``Decimal`` or amount string"""
+        return cls(to_units(value))
+
+    def to_decimal(self):
+        """The exact amount as a ``Decimal``"""
+        return Decimal(self.units).scaleb(-SCALE_DIGITS)
+
+    def format(self, places=2):
+        """Fixed-point string with the given fractional digits, half-even
+
+        Amounts that round to zero render without a sign: a credit of
+        -0.004 is "0.00", not the "-0.00" of ``float`` formatting.
+        """
+        if places >= SCALE_DIGITS:
+            units = self.units * 10 ** (places - SCALE_DIGITS)
+        else:
+            units = _divide(self.units, 10 ** (SCALE_DIGITS - places))
+        sign = "-" if units < 0 else ""
+        whole, fraction = divmod(abs(units), 10**places)
+        if not places:
+            return f"{sign}{whole}"
+        return f"{sign}{whole}.{fraction:0{places}d}"
+
+    def __format__(self, spec):
+        match = _FIXED_FORMAT.fullmatch(spec)
+        if match:
+            return self.format(int(match.group(1)))
+        if not spec:
+            return str(self)
+        return format(self.to_decimal(), spec)
+
+    def __str__(self):
+        text = self.format(SCALE_DIGITS).rstrip("0")
+        return text + "0" if text.endswith(".") else text
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __float__(self):
+        return self.units / SCALE
+
+    def __bool__(self):
+        return self.units != 0
+
+    def __hash__(self):
+        return hash(self.to_decimal())
+
+    def _other_units(self, other):
+        if isinstance(other, Money):
+            return other.units
+        if isinstance(other, int):
+            return other * SCALE
+        if isinstance(other, Decimal) and other.is_finite():
+            return _decimal_units(other)
+        return None
+
+    def __add__(self, other):
+        units = self._other_units(other)
+        if units is None:
+            return NotImplemented
+        return Money(self.units + units)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        units = self._other_units(other)
+        if units is None:
+            return NotImplemented
+        return Money(self.units - units)
+
+    def __rsub__(self, other):
+        units = self._other_units(other)
+        if units is None:
+            return NotImplemented
+        return Money(units - self.units)
+
+    def __neg__(self):
+        return Money(-self.units)
+
+    def __abs__(self):
+        return Money(abs(self.units))
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return Money(self.units * other)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        """Divide by a count (e.g. of days), rounding half-even to the unit"""
+        if isinstance(other, int):
+            return Money(_divide(self.units, other))
+        return NotImplemented
+
+    def _compare(self, other, op):
+        if isinstance(other, Money):
+            return op(self.units, other.units)
+        if isinstance(other, int):
+            return op(self.units, other * SCALE)
+        if isinstance(other, Decimal):
+            # Exact, even for Decimals finer than the unit
+            return op(self.to_decimal(), other)
+        return NotImplemented
+
+    def __eq__(self, other):
+        return self._compare(other, lambda a, b: a == b)
+
+    def __lt__(self, other):
+        return self._compare(other, lambda a, b: a < b)
+
+    def __le__(self, other):
+        return self._compare(other, lambda a, b: a <= b)
+
+    def __gt__(self, other):
+        return self._compare(other, lambda a, b: a > b)
+
+    def __ge__(self, other):
+        return self._compare(other, lambda a, b: a >= b)
@@ -0,0 +1,695 @@
+"""
+Report model and the renderers of each output channel.
+
+The collected data is aggregated once into a ``Report``, and every output
+format is rendered from that model: the plain-text email in Japanese or
+English, Slack Block Kit and Microsoft Teams Adaptive Card JSON, an HTML
+email and a CSV attachment. Rendering only serializes the model, so sending
+a report to several channels costs one aggregation plus one cheap pass per
+format. The layout strings of every language are built once at import time;
+``STRINGS`` also holds the strings of the other report stages, the delivery
+notices and the budget alert, so a report is in one language throughout.
+
+Renderers are kept in a registry keyed by format name; a new channel only
+needs a ``Renderer`` subclass and a ``register_renderer()`` call.
+"""
+
+import csv
+import html
+import io
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from string import Template
+
+from aggregation import SIGNIFICANT_COST, TOP_SERVICES, aggregate_costs
+from inventory import REGISTRY, format_resource_lines
+
+LANGUAGES = ("ja", "en")
+
+STRINGS = {
+    "ja": {
+        "title": "=== AWS 日次レポート ===",
+        "heading": "AWS 日次レポート",
+        "period": "📅 期間: 過去{days}日間",
+        "generated": "🕐 生成日時: {generated}",
+        "costs": "💰 コスト情報",
+        "daily": "📊 日別コスト:",
+        "total": "合計 ({days}日間): ${total}",
+        "average": "平均 (1日あたり): ${average}",
+        "top_services": f"🏆 サービス別コスト (上位{TOP_SERVICES}件):",
+        "other": "その他 ({count} サービス)",
+        "costs_failed": "コストデータの取得に失敗しました。",
+        "resources": "🔧 リソース情報",
+        "resources_failed": "リソース情報の取得に失敗しました。",
+        "footer": "このレポートは自動生成されました。",
+        "link": "📎 レポート全文: {link}",
+        "link_until": "📎 レポート全文（{until} UTC まで有効）: {link}",
+        "summarized": "…（SNS のサイズ上限を超えるため、以降は省略されました）",
+        "parts_omitted": "…（残りの {count} 部は省略されました）",
+        "fan_out_title": "🌐 対象アカウント",
+        "fan_out_accounts": "アカウント数: {count}",
+        "fan_out_regions": "リージョン: {regions}",
+        "fan_out_failed": "⚠️ 取得に失敗した対象:",
+        "fan_out_no_costs": "コストデータの取得に失敗しました",
+        "forecast_title": "🔮 月末コスト予測",
+        "forecast_actual": "今月 ({month}) の実績: ${amount}",
+        "forecast_remaining": "月末までの予測: ${amount}",
+        "forecast_total": "月末の見込み合計: ${amount}",
+        "forecast_interval": "  {level}% 予測区間: ${lower} 〜 ${upper}",
+        "anomaly_title": "🚨 コスト異常検知",
+        "anomaly_learning": (
+            "ベースラインの学習中です（確定済みの日次データが {days} 日分必要です）。"
+        ),
+        "anomaly_none": "異常は検出されませんでした。",
+        "anomaly_found": "{count} 件の異常を検出しました:",
+        "anomaly_line": "  {date} {service}: ${cost} (平常 ${baseline}, z={zscore})",
+        "attribution_title": "📌 コスト配分",
+        "attribution_tag": "🏷️ タグ {tag} 別の上位コスト:",
+        "attribution_resources": "🔎 {service} のリソース別上位コスト (直近{days}日):",
+        "attribution_failed": "⚠️ 取得できなかった配分:",
+        "attribution_tag_name": "タグ {tag}",
+        "attribution_error": " (誤差 ≤ ${error})",
+        "attribution_empty": "  データがありません",
+        "untagged": "(タグなし)",
+        "trend_title": "📉 トレンド分析",
+        "trend_rolling": "{window}日移動平均 (直近): ${amount}",
+        "trend_weekly": ("週次比較: 直近7日 ${current} / 前週 ${previous} ({change})"),
+        "trend_movers": "📈 前週比の変動が大きいサービス:",
+        "trend_outliers": "⚡ 直近日が平常値から外れたサービス (|z| ≥ {threshold}):",
+        "trend_too_short": "トレンド分析には最低7日分のデータが必要です。",
+        "diff_title": "📈 前日比",
+        "diff_first": "前回のスナップショットがないため、次回から比較します。",
+        "diff_compared": "比較対象: {previous} → {day}",
+        "diff_daily": "💰 日次コスト: {change}",
+        "diff_services": "🏆 サービス別の変化:",
+        "diff_resources": "🔧 リソースの変化:",
+        "diff_unchanged": "  変化はありません",
+        "waste_title": "💤 アイドルリソース",
+        "waste_summary": (
+            "過去{days}日間の平均 CPU 使用率が {threshold}% 未満の"
+            "インスタンス: {idle} 件 (確認 {checked} 件)"
+        ),
+        "waste_savings": "💰 推定削減額: ${amount}/月",
+        "waste_top": "🔝 削減額の大きいインスタンス (上位{count}件):",
+        "waste_monthly": "${amount}/月",
+        "waste_unknown": "削減額不明",
+        "skipped_title": "⏱️ 省略されたセクション",
+        "skipped_intro": "制限時間のため、次の項目はこのレポートに含まれていません:",
+        "skipped_timed_out": "制限時間内に完了しませんでした",
+        "skipped_not_started": "残り時間が不足したため実行しませんでした",
+        "stage_cost_data": "コスト情報",
+        "stage_resources": "リソース情報",
+        "stage_forecast": "月末コスト予測",
+        "stage_attribution": "コスト配分",
+        "stage_waste_detection": "アイドルリソース",
+        "stage_fan_out": "複数アカウントの集計",
+        "stage_anomaly_detection": "コスト異常検知",
+        "stage_trend_analytics": "トレンド分析",
+        "stage_snapshot_diff": "前日比",
+        "alert_title": "=== AWS 予算アラート ===",
+        "alert_day": "📅 {day}（UTC、集計途中）",
+        "alert_reached": "⚠️ 本日のコストが予算に達しました:",
+        "alert_total": "合計",
+        "alert_line": "  {name}: ${spent} / 予算 ${budget} ({ratio})",
+        "alert_footer": "同じ予算の通知は 1 日 1 回です。",
+    },
+    "en": {
+        "title": "=== AWS Daily Report ===",
+        "heading": "AWS Daily Report",
+        "period": "📅 Period: last {days} days",
+        "generated": "🕐 Generated: {generated}",
+        "costs": "💰 Costs",
+        "daily": "📊 Daily costs:",
+        "total": "Total ({days} days): ${total}",
+        "average": "Average (per day): ${average}",
+        "top_services": f"🏆 Costs by service (top {TOP_SERVICES}):",
+        "other": "Other services ({count})",
+        "costs_failed": "Failed to fetch the cost data.",
+        "resources": "🔧 Resources",
+        "resources_failed": "Failed to fetch the resource information.",
+        "footer": "This report was generated automatically.",
+        "link": "📎 Full report: {link}",
+        "link_until": "📎 Full report (valid until {until} UTC): {link}",
+        "summarized": "… (the rest was left out to stay within the SNS size limit)",
+        "parts_omitted": "… ({count} more parts were left out)",
+        "fan_out_title": "🌐 Target accounts",
+        "fan_out_accounts": "Accounts: {count}",
+        "fan_out_regions": "Regions: {regions}",
+        "fan_out_failed": "⚠️ Targets that could not be fetched:",
+        "fan_out_no_costs": "Failed to fetch the cost data",
+        "forecast_title": "🔮 Month-end cost forecast",
+        "forecast_actual": "This month ({month}) so far: ${amount}",
+        "forecast_remaining": "Forecast until the end of the month: ${amount}",
+        "forecast_total": "Expected month-end total: ${amount}",
+        "forecast_interval": "  {level}% prediction interval: ${lower} to ${upper}",
+        "anomaly_title": "🚨 Cost anomalies",
+        "anomaly_learning": (
+            "Still learning the baseline ({days} days of settled daily data "
+            "are needed)."
+        ),
+        "anomaly_none": "No anomalies were detected.",
+        "anomaly_found": "{count} anomalies detected:",
+        "anomaly_line": "  {date} {service}: ${cost} (usual ${baseline}, z={zscore})",
+        "attribution_title": "📌 Cost attribution",
+        "attribution_tag": "🏷️ Top costs by tag {tag}:",
+        "attribution_resources": "🔎 Top {service} costs by resource (last {days} days):",
+        "attribution_failed": "⚠️ Attributions that could not be fetched:",
+        "attribution_tag_name": "tag {tag}",
+        "attribution_error": " (error ≤ ${error})",
+        "attribution_empty": "  No data",
+        "untagged": "(untagged)",
+        "trend_title": "📉 Trends",
+        "trend_rolling": "{window}-day moving average (latest): ${amount}",
+        "trend_weekly": (
+            "Week over week: last 7 days ${current} / previous week ${previous} "
+            "({change})"
+        ),
+        "trend_movers": "📈 Largest changes from the previous week:",
+        "trend_outliers": "⚡ Services off their usual cost on the latest day (|z| ≥ {threshold}):",
+        "trend_too_short": "Trend analysis needs at least 7 days of data.",
+        "diff_title": "📈 Day over day",
+        "diff_first": "There is no earlier snapshot yet; the next report compares with this one.",
+        "diff_compared": "Compared: {previous} → {day}",
+        "diff_daily": "💰 Daily cost: {change}",
+        "diff_services": "🏆 Changes by service:",
+        "diff_resources": "🔧 Resource changes:",
+        "diff_unchanged": "  No changes",
+        "waste_title": "💤 Idle resources",
+        "waste_summary": (
+            "Instances under {threshold}% average CPU over the last {days} days: "
+            "{idle} ({checked} checked)"
+        ),
+        "waste_savings": "💰 Estimated savings: ${amount}/month",
+        "waste_top": "🔝 Instances with the largest savings (top {count}):",
+        "waste_monthly": "${amount}/month",
+        "waste_unknown": "savings unknown",
+        "skipped_title": "⏱️ Skipped sections",
+        "skipped_intro": "These parts were left out of this report to stay within the time limit:",
+        "skipped_timed_out": "did not finish in time",
+        "skipped_not_started": "not started, too little time was left",
+        "stage_cost_data": "Costs",
+        "stage_resources": "Resources",
+        "stage_forecast": "Month-end cost forecast",
+        "stage_attribution": "Cost attribution",
+        "stage_waste_detection": "Idle resources",
+        "stage_fan_out": "Multi-account collection",
+        "stage_anomaly_detection": "Cost anomalies",
+        "stage_trend_analytics": "Trends",
+        "stage_snapshot_diff": "Day over day",
+        "alert_title": "=== AWS Budget Alert ===",
+        "alert_day": "📅 {day} (UTC, still accruing)",
+        "alert_reached": "⚠️ Today's costs reached a budget:",
+        "alert_total": "Total",
+        "alert_line": "  {name}: ${spent} / budget ${budget} ({ratio})",
+        "alert_footer": "Each budget is alerted at most once a day.",
+    },
+}
+
+RULE = "=" * 50
+
+# Slack rejects messages with more blocks, and section texts longer than this
+SLACK_MAX_BLOCKS = 50
+SLACK_MAX_TEXT = 3000
+
+HTML_PAGE = Template("""<!DOCTYPE html>
+<html lang="$language">
+<head>
+<meta charset="utf-8">
+<title>$heading</title>
+<style>
+body { font-family: sans-serif; color: #222; }
+table { border-collapse: collapse; margin-bottom: 1em; }
+th, td { border: 1px solid #ccc; padding: 4px 8px; }
+td.amount { text-align: right; }
+pre { background: #f6f8fa; padding: 8px; }
+</style>
+</head>
+<body>
+<h1>$heading</h1>
+<p>$period<br>$generated</p>
+$body
+<p><small>$footer</small></p>
+</body>
+</html>
+""")
+HTML_TABLE = Template("<table>\n$rows\n</table>")
+HTML_ROW = Template('<tr><td>$label</td><td class="amount">$value</td></tr>')
+
+
+@dataclass(frozen=True)
+class Section:
+    """A report section formatted in every report language
+
+    ``Section.of(format, *args)`` calls ``format(*args, language=...)`` for
+    each of ``LANGUAGES`` while the stage that collected the data runs, and
+    renderers pick the ``(title, lines)`` of the report's language.
+    """
+
+    translations: dict
+
+    @classmethod
+    def of(cls, format_section, *args):
+        """Format a section in every language"""
+        return cls(
+            {
+                language: format_section(*args, language=language)
+                for language in LANGUAGES
+            }
+        )
+
+    def render(self, language="ja"):
+        """``(title, lines)`` of the section in a language"""
+        return self.translations[language]
+
+
+@dataclass
+class Report:
+    """Everything a renderer needs, aggregated once
+
+    ``costs`` is the ``CostSummary`` of the period and ``resources`` the
+    counts per collector; either is None when it could not be collected.
+    ``sections`` holds the other stages as ``Section`` objects, or as
+    ``(title, lines)`` pairs that are shown as they are.
+    """
+
+    days: int
+    costs: object = None
+    resources: dict = None
+    sections: list = field(default_factory=list)
+    generated_at: datetime = field(default_factory=datetime.now)
+
+    def strings(self, language):
+        """Layout strings of a language, with this report's values filled in"""
+        strings = dict(STRINGS[language])
+        strings["period"] = strings["period"].format(days=self.days)
+        strings["generated"] = strings["generated"].format(
+            generated=self.generated_at.strftime("%Y-%m-%d %H:%M:%S")
+        )
+        if self.costs is not None:
+            strings["total"] = strings["total"].format(
+                days=self.days, total=_amount(self.costs.period_total)
+            )
+            strings["average"] = strings["average"].format(
+                average=_amount(self.costs.daily_average(self.days))
+            )
+            strings["other"] = strings["other"].format(count=self.costs.other_count)
+        return strings
+
+    def localized_sections(self, language):
+        """``(title, lines)`` of every section in a language"""
+        return [
+            section.render(language) if isinstance(section, Section) else section
+            for section in self.sections
+        ]
+
+
+def _service_rows(costs, s):
+    """``(service, cost)`` of the top services, then the other bucket if any"""
+    rows = list(costs.top_services)
+    if costs.other_total:
+        rows.append((s["other"], costs.other_total))
+    return rows
+
+
+def build_report(
+    cost_data, resources, days, sections=None, min_cost=SIGNIFICANT_COST, min_share=0
+):
+    """Aggregate the collected data into the report model
+
+    Services below ``min_cost`` or ``min_share`` of the period total, and
+    those outside the top services, are reported together as one "other"
+    line.
+    """
+    return Report(
+        days,
+        (
+            aggregate_costs(cost_data, min_cost=min_cost, min_share=min_share)
+            if cost_data
+            else None
+        ),
+        resources,
+        list(sections or ()),
+    )
+
+
+def _amount(cost):
+    # Money and Decimal render exactly, without a float round-trip
+    return f"{cost:.2f}"
+
+
+def _resource_groups(resources, language):
+    """Yield ``(title, [(label, count)])`` for every collector's counts"""
+    for name, counts in resources.items():
+        collector = REGISTRY.get(name)
+        if collector is not None:
+            title, labels = collector.localized(language)
+            title, labels = title.rstrip(":"), dict(labels)
+        else:
+            title, labels = name, {}
+        yield title, [(labels.get(key, key), value) for key, value in counts.items()]
+
+
+class Renderer:
+    """Serializes a ``Report`` into one output format"""
+
+    name = None
+    media_type = "text/plain; charset=utf-8"
+    extension = "txt"
+
+    def render(self, report, language="ja"):
+        raise NotImplementedError
+
+
+class TextRenderer(Renderer):
+    """Plain-text email, the layout of the SNS notification"""
+
+    name = "text"
+
+    def render(self, report, language="ja"):
+        s = report.strings(language)
+        lines = [s["title"], "", s["period"], s["generated"], "", s["costs"]]
+        lines.extend([RULE, ""])
+
+        costs = report.costs
+        if costs is not None:
+            lines.append(s["daily"])
+            lines.extend(
+                f"  {date}: ${_amount(cost)}"
+                for date, cost in costs.daily_totals.items()
+            )
+            lines.extend(["", s["total"], s["average"], "", s["top_services"]])
+            lines.extend(
+                f"  {service}: ${_amount(cost)}"
+                for service, cost in _service_rows(costs, s)
+            )
+        else:
+            lines.append(s["costs_failed"])
+
+        lines.extend(["", "", s["resources"], RULE, ""])
+
+        if report.resources is None:
+            lines.extend([s["resources_failed"], ""])
+        else:
+            lines.extend(format_resource_lines(report.resources, language=language))
+
+        for title, section_lines in report.localized_sections(language):
+            lines.extend(["", title, RULE, ""])
+            lines.extend(section_lines)
+            lines.append("")
+
+        lines.extend([RULE, s["footer"], ""])
+
+        return "\n".join(lines)
+
+
+class SlackRenderer(Renderer):
+    """Slack Block Kit message for an incoming webhook"""
+
+    name = "slack"
+    media_type = "application/json"
+    extension = "slack.json"
+
+    def render(self, report, language="ja"):
+        s = report.strings(language)
+
+        def section(text):
+            return {
+                "type": "section",
+                "text": {"type": "mrkdwn", "text": text[:SLACK_MAX_TEXT]},
+            }
+
+        def code(title, body):
+            # Truncate the body, not the section, so the fence stays closed
+            head = f"*{title}*\n```"
+            return section(head + body[: SLACK_MAX_TEXT - len(head) - 3] + "```")
+
+        blocks = [
+            {"type": "header", "text": {"type": "plain_text", "text": s["heading"]}},
+            {
+                "type": "context",
+                "elements": [
+                    {"type": "mrkdwn", "text": s["period"]},
+                    {"type": "mrkdwn", "text": s["generated"]},
+                ],
+            },
+            {"type": "divider"},
+        ]
+
+        costs = report.costs
+        if costs is not None:
+            blocks.append(
+                {
+                    "type": "section",
+                    "fields": [
+                        {"type": "mrkdwn", "text": f"*{s['total']}*"},
+                        {"type": "mrkdwn", "text": f"*{s['average']}*"},
+                    ],
+                }
+            )
+            daily = "\n".join(
+                f"{date}: ${_amount(cost)}" for date, cost in costs.daily_totals.items()
+            )
+            blocks.append(code(s["daily"], daily))
+            services = "\n".join(
+                f"• {service}: ${_amount(cost)}"
+                for service, cost in _service_rows(costs, s)
+            )
+            blocks.append(section(f"*{s['top_services']}*\n{services}"))
+        else:
+            blocks.append(section(s["costs_failed"]))
+
+        blocks.append({"type": "divider"})
+        if report.resources is None:
+            blocks.append(section(s["resources_failed"]))
+        else:
+            text = "\n".join(
+                f"{title}: " + ", ".join(f"{label} {value}" for label, value in counts)
+                for title, counts in _resource_groups(report.resources, language)
+            )
+            blocks.append(section(f"*{s['resources']}*\n{text}"))
+
+        for title, section_lines in report.localized_sections(language):
+            blocks.append(code(title, "\n".join(section_lines)))
+
+        return json.dumps(
+            {"text": s["heading"], "blocks": blocks[:SLACK_MAX_BLOCKS]},
+            ensure_ascii=False,
+        )
+
+
+class TeamsRenderer(Renderer):
+    """Microsoft Teams Adaptive Card for an incoming webhook"""
+
+    name = "teams"
+    media_type = "application/json"
+    extension = "teams.json"
+
+    def render(self, report, language="ja"):
+        s = report.strings(language)
+
+        def text(value, **style):
+            return {"type": "TextBlock", "text": value, "wrap": True, **style}
+
+        def facts(pairs):
+            return {
+                "type": "FactSet",
+                "facts": [{"title": str(t), "value": str(v)} for t, v in pairs],
+            }
+
+        body = [
+            text(s["heading"], size="Large", weight="Bolder"),
+            text(f"{s['period']}  {s['generated']}", isSubtle=True),
+            text(s["costs"], size="Medium", weight="Bolder", separator=True),
+        ]
+
+        costs = report.costs
+        if costs is not None:
+            body.append(text(f"{s['total']}  /  {s['average']}", weight="Bolder"))
+            body.append(text(s["daily"]))
+            body.append(
+                facts(
+                    (date, f"${_amount(cost)}")
+                    for date, cost in costs.daily_totals.items()
+                )
+            )
+            body.append(text(s["top_services"]))
+            body.append(
+                facts(
+                    (service, f"${_amount(cost)}")
+                    for service, cost in _service_rows(costs, s)
+                )
+            )
+        else:
+            body.append(text(s["costs_failed"]))
+
+        body.append(
+            text(s["resources"], size="Medium", weight="Bolder", separator=True)
+        )
+        if report.resources is None:
+            body.append(text(s["resources_failed"]))
+        else:
+            for title, counts in _resource_groups(report.resources, language):
+                body.append(text(title, weight="Bolder"))
+                body.append(facts(counts))
+
+        for title, section_lines in report.localized_sections(language):
+            body.append(text(title, size="Medium", weight="Bolder", separator=True))
+            body.append(text("\n\n".join(line for line in section_lines if line)))
+
+        card = {
+            "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+            "type": "AdaptiveCard",
+            "version": "1.4",
+            "body": body,
+        }
+        return json.dumps(
+            {
+                "type": "message",
+                "attachments": [
+                    {
+                        "contentType": "application/vnd.microsoft.card.adaptive",
+                        "content": card,
+                    }
+                ],
+            },
+            ensure_ascii=False,
+        )
+
+
+class HtmlRenderer(Renderer):
+    """HTML email body"""
+
+    name = "html"
+    media_type = "text/html; charset=utf-8"
+    extension = "html"
+
+    def render(self, report, language="ja"):
+        s = {key: html.escape(value) for key, value in report.strings(language).items()}
+
+        def table(pairs):
+            rows = "\n".join(
+                HTML_ROW.substitute(
+                    label=html.escape(str(label)), value=html.escape(str(value))
+                )
+                for label, value in pairs
+            )
+            return HTML_TABLE.substitute(rows=rows)
+
+        parts = [f"<h2>{s['costs']}</h2>"]
+        costs = report.costs
+        if costs is not None:
+            parts.append(f"<h3>{s['daily']}</h3>")
+            parts.append(
+                table(
+                    (date, f"${_amount(cost)}")
+                    for date, cost in costs.daily_totals.items()
+                )
+            )
+            parts.append(f"<p><strong>{s['total']}</strong><br>{s['average']}</p>")
+            parts.append(f"<h3>{s['top_services']}</h3>")
+            parts.append(
+                table(
+                    (service, f"${_amount(cost)}")
+                    for service, cost in _service_rows(costs, s)
+                )
+            )
+        else:
+            parts.append(f"<p>{s['costs_failed']}</p>")
+
+        parts.append(f"<h2>{s['resources']}</h2>")
+        if report.resources is None:
+            parts.append(f"<p>{s['resources_failed']}</p>")
+        else:
+            for title, counts in _resource_groups(report.resources, language):
+                parts.append(f"<h3>{html.escape(title)}</h3>")
+                parts.append(table(counts))
+
+        for title, section_lines in report.localized_sections(language):
+            parts.append(f"<h2>{html.escape(title)}</h2>")
+            parts.append(f"<pre>{html.escape(chr(10).join(section_lines))}</pre>")
+
+        return HTML_PAGE.substitute(
+            language=language,
+            heading=s["heading"],
+            period=s["period"],
+            generated=s["generated"],
+            body="\n".join(parts),
+            footer=s["footer"],
+        )
+
+
+class CsvRenderer(Renderer):
+    """CSV attachment with one row per figure of the report
+
+    Columns are ``record, key, detail, value``; the records are ``daily``,
+    ``service`` (the top services), ``other`` (keyed by the number of
+    services), ``total``, ``average`` and ``resource``. The layout does not
+    depend on the language.
+    """
+
+    name = "csv"
+    media_type = "text/csv; charset=utf-8"
+    extension = "csv"
+
+    def render(self, report, language="ja"):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(["record", "key", "detail", "value"])
+
+        costs = report.costs
+        if costs is not None:
+            writer.writerows(
+                ("daily", date, "", _amount(cost))
+                for date, cost in costs.daily_totals.items()
+            )
+            writer.writerows(
+                ("service", service, "", _amount(cost))
+                for service, cost in costs.top_services
+            )
+            if costs.other_total:
+                writer.writerow(
+                    ("other", costs.other_count, "", _amount(costs.other_total))
+                )
+            writer.writerow(("total", report.days, "", _amount(costs.period_total)))
+            writer.writerow(
+                ("average", report.days, "", _amount(costs.daily_average(report.days)))
+            )
+
+        for name, counts in (report.resources or {}).items():
+            writer.writerows(
+                ("resource", name, key, value) for key, value in counts.items()
+            )
+
+        return buffer.getvalue()
+
+
+RENDERERS = {}
+
+
+def register_renderer(renderer):
+    """Add a renderer, replacing one of the same format name"""
+    RENDERERS[renderer.name] = renderer
+    return renderer
+
+
+for _renderer in (
+    TextRenderer(),
+    SlackRenderer(),
+    TeamsRenderer(),
+    HtmlRenderer(),
+    CsvRenderer(),
+):
+    register_renderer(_renderer)
+
+
+def render(report, format_name="text", language="ja"):
+    """Render the report in one format"""
+    if language not in LANGUAGES:
+        raise ValueError(f"Unsupported report language: {language}")
+    return RENDERERS[format_name].render(report, language)
+
+
+def render_all(report, formats, language="ja"):
+    """Render the report in several formats from the same model"""
+    return {name: render(report, name, language) for name in formats}
@@ -0,0 +1,283 @@
+"""
+Local HTTP server for on-demand cost views.
+
+Serves the report and its data many times an hour from a long-running
+process, with the same collection and rendering code as the Lambda handler:
+
+    python server.py --port 8080 --ttl 300
+
+    GET /report?days=7&format=html&lang=en   rendered report (any renderer)
+    GET /costs?days=30                       aggregated costs as JSON
+    GET /resources                           resource counts as JSON
+    GET /stats                               cache statistics
+    GET /healthz
+
+Clients are created once and stay warm for the lifetime of the process.
+Cost data (per window) and resource counts are kept in an in-memory TTL
+cache, and concurrent requests for the same entry share one backend fetch
+instead of each starting their own. Failed fetches are not cached.
+
+The server uses only asyncio streams and speaks just enough HTTP/1.1 for
+dashboards and curl: GET requests, one per connection.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import cost_notifier
+import renderers
+
+DEFAULT_TTL = 300.0
+
+# Longest window a request may ask for; Cost Explorer keeps 14 months
+MAX_DAYS = 400
+
+MAX_REQUEST_LINE = 8192
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    502: "Bad Gateway",
+}
+
+
+class FetchError(Exception):
+    """A backend fetch returned no data"""
+
+
+class TTLCache:
+    """In-memory cache whose entries expire, with request coalescing
+
+    While an entry is being fetched, other callers of the same key await
+    the same fetch. Only successful results are stored.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = {}
+        self._in_flight = {}
+
+    async def get(self, key, fetch):
+        """Return the cached value of the key, calling ``fetch()`` on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > self.clock():
+            self.hits += 1
+            return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.ensure_future(fetch())
+        self._in_flight[key] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            self._in_flight.pop(key, None)
+        self._entries[key] = (self.clock() + self.ttl, value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "ttl": self.ttl,
+        }
+
+
+class ReportService:
+    """Cost and resource data behind the TTL cache, fetched in worker threads"""
+
+    def __init__(self, cache=None):
+        self.cache = cache or TTLCache()
+
+    async def cost_data(self, days):
+        async def fetch():
+            cost_data = await asyncio.to_thread(
+                cost_notifier.get_cost_data,
+                days=days,
+                cache=cost_notifier._get_cost_cache(),
+                shard_days=cost_notifier._cost_shard_days(),
+            )
+            if cost_data is None:
+                raise FetchError("cost data is unavailable")
+            return cost_data
+
+        return await self.cache.get(("cost_data", days), fetch)
+
+    async def resources(self):
+        async def fetch():
+            return await asyncio.to_thread(cost_notifier.get_resource_counts)
+
+        return await self.cache.get(("resources",), fetch)
+
+    async def report(self, days):
+        """The report model of a window, built from cached data"""
+        cost_data, resources = await asyncio.gather(
+            self.cost_data(days), self.resources()
+        )
+        return renderers.build_report(
+            cost_data, resources, days, **cost_notifier.significance_settings()
+        )
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _days(query):
+    value = query.get("days", [os.environ.get("DAYS_TO_CHECK", "7")])[0]
+    try:
+        days = int(value)
+    except ValueError:
+        raise HTTPError(400, f"invalid days: {value}")
+    if not 1 <= days <= MAX_DAYS:
+        raise HTTPError(400, f"days must be between 1 and {MAX_DAYS}")
+    return days
+
+
+def _json(value):
+    return "application/json", json.dumps(value, ensure_ascii=False, default=str)
+
+
+class ReportServer:
+    """Routes GET requests to the report service"""
+
+    def __init__(self, service=None):
+        self.service = service or ReportService()
+
+    async def route(self, path, query):
+        """Return ``(media type, body)`` of a request"""
+        if path == "/healthz":
+            return "text/plain; charset=utf-8", "ok"
+
+        if path == "/stats":
+            return _json(self.service.cache.stats())
+
+        if path == "/resources":
+            return _json(await self.service.resources())
+
+        if path == "/costs":
+            days = _days(query)
+            summary = (await self.service.report(days)).costs
+            return _json(
+                {
+                    "days": days,
+                    "total": f"{summary.period_total:.2f}",
+                    "daily": {d: f"{c:.2f}" for d, c in summary.daily_totals.items()},
+                    "services": {
+                        s: f"{c:.2f}" for s, c in summary.service_totals.items()
+                    },
+                }
+            )
+
+        if path == "/report":
+            days = _days(query)
+            format_name = query.get("format", ["text"])[0]
+            language = query.get("lang", ["ja"])[0]
+            renderer = renderers.RENDERERS.get(format_name)
+            if renderer is None:
+                raise HTTPError(400, f"unknown format: {format_name}")
+            if language not in renderers.LANGUAGES:
+                raise HTTPError(400, f"unknown language: {language}")
+            report = await self.service.report(days)
+            return renderer.media_type, renderer.render(report, language)
+
+        raise HTTPError(404, f"not found: {path}")
+
+    async def respond(self, method, target):
+        """Return ``(status, media type, body)`` of a request"""
+        if method != "GET":
+            return 405, "text/plain; charset=utf-8", "only GET is supported"
+        url = urlsplit(target)
+        try:
+            media_type, body = await self.route(url.path, parse_qs(url.query))
+        except HTTPError as e:
+            return e.status, "text/plain; charset=utf-8", str(e)
+        except FetchError as e:
+            return 502, "text/plain; charset=utf-8", str(e)
+        return 200, media_type, body
+
+    async def handle(self, reader, writer):
+        """Serve one request on a connection"""
+        try:
+            request_line = await reader.readline()
+            if len(request_line) > MAX_REQUEST_LINE:
+                status, media_type, body = 400, "text/plain", "request line too long"
+            else:
+                # Headers are read and ignored
+                while (await reader.readline()).strip():
+                    pass
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    status, media_type, body = 400, "text/plain", "bad request"
+                else:
+                    status, media_type, body = await self.respond(parts[0], parts[1])
+
+            payload = body.encode("utf-8")
+            writer.write(
+                (
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: {media_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode("latin-1")
+                + payload
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Start listening; returns the ``asyncio.Server``"""
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def serve(host, port, ttl):
+    server = await ReportServer(ReportService(TTLCache(ttl))).start(host, port)
+    address = server.sockets[0].getsockname()
+    print(f"Serving cost reports on http://{address[0]}:{address[1]}/")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--ttl",
+        type=float,
+        default=float(os.environ.get("SERVER_CACHE_TTL") or DEFAULT_TTL),
+        help="seconds cost data and resource counts are cached",
+    )
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.ttl))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
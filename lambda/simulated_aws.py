@@ -0,0 +1,732 @@
+"""
+Simulated AWS backend for local benchmarks.
+
+Fake Cost Explorer, SNS and resource inventory clients that answer the
+calls the report makes with payloads of realistic shape and size: thousands
+of instances, hundreds of services and a year of daily costs. Latency,
+throttling and page sizes are configurable, and everything runs in process
+without network access or credentials.
+
+``SimulatedBackend.registry()`` returns a ``clients.ClientRegistry`` that
+hands out the simulated clients, so the report code runs unchanged when it
+is installed as ``clients.registry``. ``SimulatedBackend.async_client`` does
+the same for the asyncio engine as its ``create_client``.
+"""
+
+import asyncio
+import contextlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from botocore.exceptions import ClientError
+
+import instrumentation
+from clients import ClientRegistry
+
+SERVICE_NAMES = (
+    "Amazon Elastic Compute Cloud - Compute",
+    "Amazon Relational Database Service",
+    "Amazon Simple Storage Service",
+    "AWS Lambda",
+    "Amazon CloudFront",
+    "Amazon DynamoDB",
+    "Amazon ElastiCache",
+    "Amazon Elastic Container Service for Kubernetes",
+    "Amazon Elastic Load Balancing",
+    "Amazon Virtual Private Cloud",
+    "AmazonCloudWatch",
+    "Amazon Simple Notification Service",
+    "Amazon Simple Queue Service",
+    "AWS Key Management Service",
+    "Amazon Route 53",
+)
+
+INSTANCE_TYPES = ("t3.micro", "t3.medium", "m5.large", "m5.xlarge", "c5.2xlarge")
+INSTANCE_STATES = ("running",) * 8 + ("stopped", "pending")
+VOLUME_STATES = ("in-use",) * 6 + ("available",)
+LOAD_BALANCER_TYPES = ("application",) * 3 + ("network",)
+DB_STATUSES = ("available",) * 9 + ("stopped",)
+
+
+@dataclass
+class SimulationConfig:
+    """Size and behavior of the simulated account"""
+
+    services: int = 300
+    ec2_instances: int = 5000
+    rds_instances: int = 200
+    s3_buckets: int = 1000
+    lambda_functions: int = 2000
+    ebs_volumes: int = 6000
+    load_balancers: int = 150
+    nat_gateways: int = 12
+    eks_clusters: int = 8
+    dynamodb_tables: int = 300
+    elasticache_clusters: int = 40
+
+    # Seconds per API call, plus a uniformly distributed jitter
+    latency: float = 0.05
+    latency_jitter: float = 0.02
+
+    # Probability that a Cost Explorer call is throttled
+    throttle_rate: float = 0.0
+
+    # Items per page; the resource API sizes match the AWS maximums
+    ce_page_size: int = 5000
+    ec2_page_size: int = 1000
+    rds_page_size: int = 100
+    lambda_page_size: int = 50
+    ebs_page_size: int = 500
+    elb_page_size: int = 400
+    eks_page_size: int = 100
+    dynamodb_page_size: int = 100
+    elasticache_page_size: int = 100
+
+    # Share of instances whose CPU utilization stays low, and the datapoints
+    # GetMetricData returns per call before continuing with NextToken
+    idle_share: float = 0.1
+    metric_datapoints_per_call: int = 100800
+
+    seed: int = 0
+
+
+def _payload_size(payload):
+    """Approximate wire size of a JSON payload"""
+    return len(json.dumps(payload, default=str))
+
+
+def _paged(items, page_size):
+    """Split items into pages, always returning at least one page"""
+    return [items[i : i + page_size] for i in range(0, len(items), page_size)] or [[]]
+
+
+class _Paginator:
+    """Minimal stand-in for a botocore paginator"""
+
+    def __init__(self, method, input_token, output_token):
+        self.method = method
+        self.input_token = input_token
+        self.output_token = output_token
+
+    def paginate(self, **kwargs):
+        while True:
+            page = self.method(**kwargs)
+            yield page
+            token = page.get(self.output_token)
+            if not token:
+                return
+            kwargs = dict(kwargs, **{self.input_token: token})
+
+
+class _SimulatedClient:
+    """Common latency, throttling and instrumentation of simulated clients"""
+
+    service_name = None
+
+    # operation: (input token, output token)
+    paginators = {}
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.config = backend.config
+
+    def get_paginator(self, operation):
+        input_token, output_token = self.paginators[operation]
+        return _Paginator(getattr(self, operation), input_token, output_token)
+
+    def _respond(self, operation, response, size, throttle=False):
+        """Wait for the simulated latency, then answer or throttle the call"""
+        started = time.perf_counter()
+        time.sleep(self.backend.latency())
+        throttled = throttle and self.backend.throttled()
+        instrumentation.record_api_call(
+            f"{self.service_name}.{operation}",
+            time.perf_counter() - started,
+            bytes_received=0 if throttled else size,
+            error=throttled,
+        )
+        self.backend.count_call(self.service_name, operation)
+        if throttled:
+            raise ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+                operation,
+            )
+        return response
+
+
+class SimulatedCostExplorer(_SimulatedClient):
+    """Cost Explorer with deterministic daily costs for every service"""
+
+    service_name = "ce"
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self._days = {}
+        self._lock = threading.Lock()
+        names = list(SERVICE_NAMES[: self.config.services])
+        names += [f"Service {i}" for i in range(len(names), self.config.services)]
+        rng = random.Random(self.config.seed)  # nosec B311
+        self._services = [(name, rng.uniform(0.01, 50.0)) for name in names]
+
+    def _day(self, day):
+        """Groups, total and wire size of a day, generated once"""
+        cached = self._days.get(day)
+        if cached is not None:
+            return cached
+
+        seed = self.config.seed * 100003 + day.toordinal()
+        rng = random.Random(seed)  # nosec B311
+        groups = [
+            {
+                "Keys": [name],
+                "Metrics": {
+                    "UnblendedCost": {
+                        "Amount": f"{scale * rng.uniform(0.5, 1.5):.10f}",
+                        "Unit": "USD",
+                    }
+                },
+            }
+            for name, scale in self._services
+        ]
+        total = sum(float(g["Metrics"]["UnblendedCost"]["Amount"]) for g in groups)
+        cached = (groups, total, _payload_size(groups) // max(len(groups), 1))
+        with self._lock:
+            self._days.setdefault(day, cached)
+        return cached
+
+    def _days_in(self, time_period):
+        start = date.fromisoformat(time_period["Start"])
+        end = date.fromisoformat(time_period["End"])
+        return [start + timedelta(days=i) for i in range((end - start).days)]
+
+    def get_cost_and_usage(self, TimePeriod, Granularity, Metrics, **kwargs):
+        days = self._days_in(TimePeriod)
+
+        if not kwargs.get("GroupBy"):
+            total = sum(self._day(day)[1] for day in days)
+            response = {
+                "ResultsByTime": [
+                    {
+                        "TimePeriod": TimePeriod,
+                        "Total": {
+                            "UnblendedCost": {"Amount": f"{total:.10f}", "Unit": "USD"}
+                        },
+                        "Groups": [],
+                        "Estimated": False,
+                    }
+                ]
+            }
+            return self._respond(
+                "GetCostAndUsage", response, _payload_size(response), throttle=True
+            )
+
+        offset = int(kwargs.get("NextPageToken") or 0)
+        remaining = self.config.ce_page_size
+        results = []
+        size = 0
+        position = 0
+        for day in days:
+            groups, _, group_size = self._day(day)
+            if position + len(groups) <= offset:
+                position += len(groups)
+                continue
+            first = max(offset - position, 0)
+            last = min(len(groups), first + remaining)
+            results.append(
+                {
+                    "TimePeriod": {
+                        "Start": day.isoformat(),
+                        "End": (day + timedelta(days=1)).isoformat(),
+                    },
+                    "Total": {},
+                    "Groups": groups[first:last],
+                    "Estimated": False,
+                }
+            )
+            size += group_size * (last - first)
+            remaining -= last - first
+            position += len(groups)
+            if not remaining:
+                break
+
+        consumed = offset + self.config.ce_page_size - remaining
+        response = {
+            "GroupDefinitions": kwargs["GroupBy"],
+            "ResultsByTime": results,
+            "DimensionValueAttributes": [],
+        }
+        if consumed < len(days) * len(self._services):
+            response["NextPageToken"] = str(consumed)
+        return self._respond("GetCostAndUsage", response, size, throttle=True)
+
+    def get_cost_forecast(self, TimePeriod, Metric, Granularity, **kwargs):
+        days = self._days_in(TimePeriod)
+        mean = sum(scale for _, scale in self._services) * len(days)
+        response = {
+            "Total": {"Amount": f"{mean:.10f}", "Unit": "USD"},
+            "ForecastResultsByTime": [
+                {
+                    "TimePeriod": TimePeriod,
+                    "MeanValue": f"{mean:.10f}",
+                    "PredictionIntervalLowerBound": f"{mean * 0.9:.10f}",
+                    "PredictionIntervalUpperBound": f"{mean * 1.1:.10f}",
+                }
+            ],
+        }
+        return self._respond(
+            "GetCostForecast", response, _payload_size(response), throttle=True
+        )
+
+
+class _PagedListClient(_SimulatedClient):
+    """Client whose paginated list operation serves pre-generated pages"""
+
+    def _serve(self, operation, pages, token, output_token):
+        index = int(token or 0)
+        items, size = pages[index]
+        response = dict(items)
+        if index + 1 < len(pages):
+            response[output_token] = str(index + 1)
+        return self._respond(operation, response, size)
+
+
+def _build_pages(key, items, page_size):
+    """Pre-generate (page, wire size) pairs"""
+    pages = []
+    for chunk in _paged(items, page_size):
+        page = {key: chunk}
+        pages.append((page, _payload_size(page)))
+    return pages
+
+
+class SimulatedEC2(_PagedListClient):
+    """EC2 with one instance per reservation"""
+
+    service_name = "ec2"
+    paginators = {
+        "describe_instances": ("NextToken", "NextToken"),
+        "describe_volumes": ("NextToken", "NextToken"),
+        "describe_nat_gateways": ("NextToken", "NextToken"),
+    }
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        rng = random.Random(self.config.seed + 1)  # nosec B311
+        reservations = [
+            {
+                "ReservationId": f"r-{i:017x}",
+                "OwnerId": "123456789012",
+                "Groups": [],
+                "Instances": [
+                    {
+                        "InstanceId": f"i-{i:017x}",
+                        "ImageId": "ami-0123456789abcdef0",
+                        "InstanceType": rng.choice(INSTANCE_TYPES),
+                        "LaunchTime": "2024-01-01T00:00:00+00:00",
+                        "Placement": {"AvailabilityZone": "ap-northeast-1a"},
+                        "PrivateIpAddress": f"10.0.{i // 256 % 256}.{i % 256}",
+                        "State": {"Code": 16, "Name": rng.choice(INSTANCE_STATES)},
+                        "SubnetId": "subnet-0123456789abcdef0",
+                        "VpcId": "vpc-0123456789abcdef0",
+                        "BlockDeviceMappings": [
+                            {
+                                "DeviceName": "/dev/xvda",
+                                "Ebs": {
+                                    "VolumeId": f"vol-{i:017x}",
+                                    "Status": "attached",
+                                },
+                            }
+                        ],
+                        "SecurityGroups": [
+                            {"GroupId": "sg-0123456789abcdef0", "GroupName": "default"}
+                        ],
+                        "Tags": [
+                            {"Key": "Name", "Value": f"instance-{i}"},
+                            {"Key": "team", "Value": f"team-{i % 20}"},
+                        ],
+                    }
+                ],
+            }
+            for i in range(self.config.ec2_instances)
+        ]
+        self._pages = _build_pages(
+            "Reservations", reservations, self.config.ec2_page_size
+        )
+        volumes = [
+            {
+                "VolumeId": f"vol-{i:017x}",
+                "Size": rng.choice((8, 30, 100, 500)),
+                "VolumeType": "gp3",
+                "State": rng.choice(VOLUME_STATES),
+                "AvailabilityZone": "ap-northeast-1a",
+                "CreateTime": "2024-01-01T00:00:00+00:00",
+            }
+            for i in range(self.config.ebs_volumes)
+        ]
+        self._volume_pages = _build_pages("Volumes", volumes, self.config.ebs_page_size)
+        nat_gateways = [
+            {
+                "NatGatewayId": f"nat-{i:017x}",
+                "State": "available",
+                "SubnetId": "subnet-0123456789abcdef0",
+                "VpcId": "vpc-0123456789abcdef0",
+            }
+            for i in range(self.config.nat_gateways)
+        ]
+        self._nat_gateway_pages = _build_pages(
+            "NatGateways", nat_gateways, self.config.ec2_page_size
+        )
+
+    def describe_instances(self, NextToken=None, **kwargs):
+        return self._serve("DescribeInstances", self._pages, NextToken, "NextToken")
+
+    def describe_volumes(self, NextToken=None, **kwargs):
+        return self._serve(
+            "DescribeVolumes", self._volume_pages, NextToken, "NextToken"
+        )
+
+    def describe_nat_gateways(self, NextToken=None, **kwargs):
+        return self._serve(
+            "DescribeNatGateways", self._nat_gateway_pages, NextToken, "NextToken"
+        )
+
+
+class SimulatedRDS(_PagedListClient):
+    """RDS with Marker pagination"""
+
+    service_name = "rds"
+    paginators = {"describe_db_instances": ("Marker", "Marker")}
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        rng = random.Random(self.config.seed + 2)  # nosec B311
+        instances = [
+            {
+                "DBInstanceIdentifier": f"db-{i}",
+                "DBInstanceClass": "db.t3.medium",
+                "Engine": "postgres",
+                "DBInstanceStatus": rng.choice(DB_STATUSES),
+                "AllocatedStorage": 100,
+                "MultiAZ": bool(i % 2),
+                "Endpoint": {"Address": f"db-{i}.example.internal", "Port": 5432},
+            }
+            for i in range(self.config.rds_instances)
+        ]
+        self._pages = _build_pages("DBInstances", instances, self.config.rds_page_size)
+
+    def describe_db_instances(self, Marker=None, **kwargs):
+        return self._serve("DescribeDBInstances", self._pages, Marker, "Marker")
+
+
+class SimulatedS3(_SimulatedClient):
+    """S3 ListBuckets, answered in a single response like the real API"""
+
+    service_name = "s3"
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self._response = {
+            "Buckets": [
+                {"Name": f"bucket-{i}", "CreationDate": "2024-01-01T00:00:00+00:00"}
+                for i in range(self.config.s3_buckets)
+            ],
+            "Owner": {"ID": "0" * 64},
+        }
+        self._size = _payload_size(self._response)
+
+    def list_buckets(self, **kwargs):
+        return self._respond("ListBuckets", self._response, self._size)
+
+
+class SimulatedLambda(_PagedListClient):
+    """Lambda ListFunctions with Marker/NextMarker pagination"""
+
+    service_name = "lambda"
+    paginators = {"list_functions": ("Marker", "NextMarker")}
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        functions = [
+            {
+                "FunctionName": f"function-{i}",
+                "FunctionArn": (
+                    f"arn:aws:lambda:ap-northeast-1:123456789012:function:function-{i}"
+                ),
+                "Runtime": "python3.11",
+                "Handler": "app.handler",
+                "CodeSize": 1024 * (i % 100 + 1),
+                "MemorySize": 128,
+                "Timeout": 30,
+                "LastModified": "2024-01-01T00:00:00.000+0000",
+            }
+            for i in range(self.config.lambda_functions)
+        ]
+        self._pages = _build_pages("Functions", functions, self.config.lambda_page_size)
+
+    def list_functions(self, Marker=None, **kwargs):
+        return self._serve("ListFunctions", self._pages, Marker, "NextMarker")
+
+
+class SimulatedELBv2(_PagedListClient):
+    """Elastic Load Balancing v2 with Marker/NextMarker pagination"""
+
+    service_name = "elbv2"
+    paginators = {"describe_load_balancers": ("Marker", "NextMarker")}
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        rng = random.Random(self.config.seed + 3)  # nosec B311
+        load_balancers = [
+            {
+                "LoadBalancerName": f"lb-{i}",
+                "DNSName": f"lb-{i}.elb.amazonaws.com",
+                "Type": rng.choice(LOAD_BALANCER_TYPES),
+                "Scheme": "internet-facing",
+                "State": {"Code": "active"},
+                "VpcId": "vpc-0123456789abcdef0",
+            }
+            for i in range(self.config.load_balancers)
+        ]
+        self._pages = _build_pages(
+            "LoadBalancers", load_balancers, self.config.elb_page_size
+        )
+
+    def describe_load_balancers(self, Marker=None, **kwargs):
+        return self._serve("DescribeLoadBalancers", self._pages, Marker, "NextMarker")
+
+
+class SimulatedEKS(_PagedListClient):
+    """EKS ListClusters with nextToken pagination"""
+
+    service_name = "eks"
+    paginators = {"list_clusters": ("nextToken", "nextToken")}
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        clusters = [f"cluster-{i}" for i in range(self.config.eks_clusters)]
+        self._pages = _build_pages("clusters", clusters, self.config.eks_page_size)
+
+    def list_clusters(self, nextToken=None, **kwargs):
+        return self._serve("ListClusters", self._pages, nextToken, "nextToken")
+
+
+class SimulatedDynamoDB(_PagedListClient):
+    """DynamoDB ListTables with ExclusiveStartTableName pagination"""
+
+    service_name = "dynamodb"
+    paginators = {"list_tables": ("ExclusiveStartTableName", "LastEvaluatedTableName")}
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        tables = [f"table-{i}" for i in range(self.config.dynamodb_tables)]
+        self._pages = _build_pages("TableNames", tables, self.config.dynamodb_page_size)
+
+    def list_tables(self, ExclusiveStartTableName=None, **kwargs):
+        return self._serve(
+            "ListTables", self._pages, ExclusiveStartTableName, "LastEvaluatedTableName"
+        )
+
+
+class SimulatedElastiCache(_PagedListClient):
+    """ElastiCache DescribeCacheClusters with Marker pagination"""
+
+    service_name = "elasticache"
+    paginators = {"describe_cache_clusters": ("Marker", "Marker")}
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        clusters = [
+            {
+                "CacheClusterId": f"cache-{i}",
+                "CacheNodeType": "cache.t3.medium",
+                "Engine": "redis",
+                "CacheClusterStatus": "available",
+                "NumCacheNodes": 1 + i % 3,
+            }
+            for i in range(self.config.elasticache_clusters)
+        ]
+        self._pages = _build_pages(
+            "CacheClusters", clusters, self.config.elasticache_page_size
+        )
+
+    def describe_cache_clusters(self, Marker=None, **kwargs):
+        return self._serve("DescribeCacheClusters", self._pages, Marker, "Marker")
+
+
+class SimulatedCloudWatch(_SimulatedClient):
+    """CloudWatch GetMetricData with deterministic daily CPU utilization
+
+    Rejects requests with more than 500 queries like the real API, and
+    continues with NextToken once a response holds the configured number of
+    datapoints.
+    """
+
+    service_name = "cloudwatch"
+    max_queries = 500
+
+    def _values(self, resource_id, days):
+        rng = random.Random(f"{self.config.seed}:{resource_id}")  # nosec B311
+        if rng.random() < self.config.idle_share:
+            return [round(rng.uniform(0.2, 3.0), 2) for _ in range(days)]
+        return [round(rng.uniform(15.0, 80.0), 2) for _ in range(days)]
+
+    def get_metric_data(
+        self, MetricDataQueries, StartTime, EndTime, NextToken=None, **kwargs
+    ):
+        if len(MetricDataQueries) > self.max_queries:
+            raise ClientError(
+                {
+                    "Error": {
+                        "Code": "ValidationError",
+                        "Message": "The collection MetricDataQueries must not "
+                        f"have a size greater than {self.max_queries}.",
+                    }
+                },
+                "GetMetricData",
+            )
+
+        days = (EndTime - StartTime).days
+        timestamps = [EndTime - timedelta(days=day + 1) for day in range(days)]
+        results = []
+        datapoints = 0
+        index = int(NextToken or 0)
+        while index < len(MetricDataQueries):
+            if results and datapoints + days > self.config.metric_datapoints_per_call:
+                break
+            query = MetricDataQueries[index]
+            dimension = query["MetricStat"]["Metric"]["Dimensions"][0]
+            results.append(
+                {
+                    "Id": query["Id"],
+                    "Label": "CPUUtilization",
+                    "Timestamps": timestamps,
+                    "Values": self._values(dimension["Value"], days),
+                    "StatusCode": "Complete",
+                }
+            )
+            datapoints += days
+            index += 1
+
+        response = {"MetricDataResults": results, "Messages": []}
+        if index < len(MetricDataQueries):
+            response["NextToken"] = str(index)
+        return self._respond("GetMetricData", response, _payload_size(response))
+
+
+class SimulatedSNS(_SimulatedClient):
+    """SNS that keeps the published messages"""
+
+    service_name = "sns"
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.messages = []
+
+    def publish(self, TopicArn, Message, **kwargs):
+        self.messages.append(Message)
+        response = {"MessageId": f"simulated-{len(self.messages)}"}
+        return self._respond("Publish", response, _payload_size(response))
+
+
+class _AsyncPaginator:
+    """aiobotocore-style paginator over a simulated paginator"""
+
+    def __init__(self, paginator):
+        self._paginator = paginator
+
+    async def paginate(self, **kwargs):
+        pages = self._paginator.paginate(**kwargs)
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                return
+            yield page
+
+
+class AsyncSimulatedClient:
+    """aiobotocore-style client whose calls run the simulated client in threads
+
+    The simulated latency blocks a worker thread instead of the event loop,
+    so concurrent calls overlap as they would over the network.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def get_paginator(self, operation):
+        return _AsyncPaginator(self._client.get_paginator(operation))
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        async def call(**kwargs):
+            return await asyncio.to_thread(method, **kwargs)
+
+        return call
+
+
+SIMULATED_CLIENTS = {
+    "ce": SimulatedCostExplorer,
+    "ec2": SimulatedEC2,
+    "rds": SimulatedRDS,
+    "s3": SimulatedS3,
+    "lambda": SimulatedLambda,
+    "elbv2": SimulatedELBv2,
+    "eks": SimulatedEKS,
+    "dynamodb": SimulatedDynamoDB,
+    "elasticache": SimulatedElastiCache,
+    "cloudwatch": SimulatedCloudWatch,
+    "sns": SimulatedSNS,
+}
+
+
+class SimulatedBackend:
+    """A simulated account that creates its clients like a boto3 session"""
+
+    def __init__(self, config=None):
+        self.config = config or SimulationConfig()
+        self.calls = {}
+        self._clients = {}
+        self._rng = random.Random(self.config.seed)  # nosec B311
+        self._lock = threading.Lock()
+
+    def client(self, service_name, **kwargs):
+        """Return the simulated client of a service, like ``Session.client``"""
+        with self._lock:
+            client = self._clients.get(service_name)
+            if client is None:
+                client = SIMULATED_CLIENTS[service_name](self)
+                self._clients[service_name] = client
+        return client
+
+    @contextlib.asynccontextmanager
+    async def async_client(self, service_name, region_name=None, **credentials):
+        """Async context manager of a client, like aiobotocore ``create_client``"""
+        yield AsyncSimulatedClient(self.client(service_name))
+
+    def registry(self):
+        """A client registry serving this backend's clients"""
+        return ClientRegistry(session_factory=lambda: self)
+
+    def latency(self):
+        """Latency of one call, in seconds"""
+        with self._lock:
+            jitter = self._rng.uniform(0, self.config.latency_jitter)
+        return self.config.latency + jitter
+
+    def throttled(self):
+        """Whether the current call is throttled"""
+        if not self.config.throttle_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.config.throttle_rate
+
+    def count_call(self, service_name, operation):
+        """Count a call per service and operation"""
+        key = f"{service_name}.{operation}"
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
@@ -0,0 +1,261 @@
+"""
+Snapshots of each report and day-over-day diffing.
+
+Every run stores a compact snapshot of its most recent day of costs per
+service and of its resource counts, so that the next run can show what
+changed overnight. Snapshots are stored through the cost cache backend
+(a local directory or S3) as versioned, gzip-compressed JSON.
+
+Only two snapshots are kept, the latest and the one before it, under fixed
+keys. Loading and diffing therefore take O(services + resource types) no
+matter how long the history is. A second run on the same day replaces the
+latest snapshot and is still compared with the previous day.
+"""
+
+import base64
+import gzip
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from aggregation import SIGNIFICANT_COST
+from inventory import REGISTRY
+from renderers import STRINGS
+
+LATEST_KEY = "snapshots/latest"
+PREVIOUS_KEY = "snapshots/previous"
+SNAPSHOT_VERSION = 1
+
+# A service cost change is highlighted from this many dollars and this
+# share of the previous cost
+MIN_COST_CHANGE = Decimal("1.00")
+COST_CHANGE_RATIO = Decimal("0.2")
+
+# A resource count change is highlighted from this many resources and this
+# share of the previous count
+MIN_RESOURCE_CHANGE = 5
+RESOURCE_CHANGE_RATIO = 0.5
+
+# Service changes listed in the report at most
+TOP_CHANGES = 10
+
+
+@dataclass
+class Snapshot:
+    """Costs of one day per service and the resource counts of a run"""
+
+    day: str
+    costs: dict = field(default_factory=dict)
+    resources: dict = field(default_factory=dict)
+
+    @property
+    def total(self):
+        return sum(self.costs.values(), Decimal("0"))
+
+    def to_state(self):
+        return {
+            "day": self.day,
+            "costs": {service: str(cost) for service, cost in self.costs.items()},
+            "resources": self.resources,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(
+            state["day"],
+            {service: Decimal(cost) for service, cost in state["costs"].items()},
+            state["resources"],
+        )
+
+
+@dataclass
+class Change:
+    """Change of a cost or a resource count between two snapshots
+
+    ``name`` is the service, or ``(collector name, count key)`` for counts.
+    """
+
+    name: object
+    before: object
+    after: object
+    significant: bool
+
+    @property
+    def delta(self):
+        return self.after - self.before
+
+
+@dataclass
+class SnapshotDiff:
+    """Day-over-day changes between two snapshots"""
+
+    previous_day: str
+    day: str
+    total: Change
+    services: list
+    resources: list
+
+
+def take_snapshot(cost_data, resources):
+    """Snapshot the most recent day of the cost data and the resource counts"""
+    results = cost_data["ResultsByTime"]
+    day = max(result["TimePeriod"]["Start"] for result in results)
+    costs = {}
+    for result in results:
+        if result["TimePeriod"]["Start"] != day:
+            continue
+        for group in result["Groups"]:
+            cost = Decimal(group["Metrics"]["UnblendedCost"]["Amount"])
+            if cost > SIGNIFICANT_COST:
+                service = group["Keys"][0]
+                costs[service] = costs.get(service, Decimal("0")) + cost
+    return Snapshot(day, costs, {name: dict(c) for name, c in resources.items()})
+
+
+def _encode(snapshot):
+    payload = json.dumps(snapshot.to_state(), separators=(",", ":")).encode("utf-8")
+    return {
+        "version": SNAPSHOT_VERSION,
+        "encoding": "gzip",
+        "data": base64.b64encode(gzip.compress(payload)).decode("ascii"),
+    }
+
+
+def _decode(entry):
+    if not entry or entry.get("version") != SNAPSHOT_VERSION:
+        return None
+    state = json.loads(gzip.decompress(base64.b64decode(entry["data"])))
+    return Snapshot.from_state(state)
+
+
+def load_previous(backend, day):
+    """Load the latest snapshot of a day before ``day``, or None"""
+    for key in (LATEST_KEY, PREVIOUS_KEY):
+        snapshot = _decode(backend.get(key))
+        if snapshot is not None and snapshot.day < day:
+            return snapshot
+    return None
+
+
+def save_snapshot(backend, snapshot):
+    """Store the snapshot as the latest, keeping the last one of another day"""
+    latest = backend.get(LATEST_KEY)
+    decoded = _decode(latest)
+    if decoded is not None and decoded.day < snapshot.day:
+        backend.put(PREVIOUS_KEY, latest)
+    backend.put(LATEST_KEY, _encode(snapshot))
+
+
+def _cost_significant(before, after):
+    delta = abs(after - before)
+    return delta >= MIN_COST_CHANGE and delta >= COST_CHANGE_RATIO * before
+
+
+def _count_significant(before, after):
+    delta = abs(after - before)
+    return delta >= MIN_RESOURCE_CHANGE and delta >= RESOURCE_CHANGE_RATIO * before
+
+
+def diff_snapshots(previous, current, top_n=TOP_CHANGES):
+    """Compare two snapshots in O(services + resource types)
+
+    Service changes are sorted by their absolute size and limited to
+    ``top_n``; every changed resource count is listed.
+    """
+    zero = Decimal("0")
+    services = []
+    for service in previous.costs.keys() | current.costs.keys():
+        before = previous.costs.get(service, zero)
+        after = current.costs.get(service, zero)
+        if before != after:
+            services.append(
+                Change(service, before, after, _cost_significant(before, after))
+            )
+    services.sort(key=lambda change: (-abs(change.delta), change.name))
+
+    resources = []
+    for name, counts in current.resources.items():
+        previous_counts = previous.resources.get(name, {})
+        for key, after in counts.items():
+            before = previous_counts.get(key, 0)
+            if before != after:
+                resources.append(
+                    Change(
+                        (name, key), before, after, _count_significant(before, after)
+                    )
+                )
+
+    total_before, total_after = previous.total, current.total
+    return SnapshotDiff(
+        previous.day,
+        current.day,
+        Change(
+            "total",
+            total_before,
+            total_after,
+            _cost_significant(total_before, total_after),
+        ),
+        services[:top_n],
+        resources,
+    )
+
+
+def _marker(change):
+    return " ⚠️" if change.significant else ""
+
+
+def _dollars(delta):
+    sign = "-" if delta < 0 else "+"
+    return f"{sign}${abs(float(delta)):.2f}"
+
+
+def _percent(change):
+    if not change.before:
+        return ""
+    return f", {float(change.delta / change.before) * 100:+.1f}%"
+
+
+def format_diff_section(diff, labels=None, language="ja"):
+    """Build the day-over-day report section
+
+    ``labels`` maps ``(resource name, count key)`` to display names and
+    defaults to the registry's labels in the report language. ``diff`` is
+    None when there is no earlier snapshot to compare with.
+    """
+    s = STRINGS[language]
+    title = s["diff_title"]
+    if diff is None:
+        return (title, [s["diff_first"]])
+
+    if labels is None:
+        labels = REGISTRY.labels(language)
+    total = diff.total
+    lines = [
+        s["diff_compared"].format(previous=diff.previous_day, day=diff.day),
+        "",
+        s["diff_daily"].format(
+            change=f"${float(total.before):.2f} → ${float(total.after):.2f} "
+            f"({_dollars(total.delta)}{_percent(total)}){_marker(total)}"
+        ),
+    ]
+
+    if diff.services:
+        lines.extend(["", s["diff_services"]])
+        lines.extend(
+            f"  {change.name}: ${float(change.before):.2f} → "
+            f"${float(change.after):.2f} ({_dollars(change.delta)}"
+            f"{_percent(change)}){_marker(change)}"
+            for change in diff.services
+        )
+
+    lines.extend(["", s["diff_resources"]])
+    if diff.resources:
+        lines.extend(
+            f"  {labels.get(change.name, ' '.join(change.name))}: "
+            f"{change.before} → {change.after} ({change.delta:+d}){_marker(change)}"
+            for change in diff.resources
+        )
+    else:
+        lines.append(s["diff_unchanged"])
+
+    return (title, lines)
@@ -0,0 +1,370 @@
+"""
+Unit tests and microbenchmark for the single-pass cost aggregation engine.
+"""
+
+import gc
+import time
+import pytest
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+
+def _legacy_format_cost_message(cost_data, resources, days):
+    """The report formatter before the aggregation engine, for comparison"""
+    if not cost_data:
+        return "コストデータの取得に失敗しました。"
+
+    message = "=== AWS 日次レポート ===\n\n"
+    message += f"📅 期間: 過去{days}日間\n"
+    message += f"🕐 生成日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    message += "💰 コスト情報\n"
+    message += "=" * 50 + "\n\n"
+
+    daily_totals = {}
+    service_totals = {}
+
+    for result in cost_data["ResultsByTime"]:
+        date = result["TimePeriod"]["Start"]
+        total_cost = Decimal("0")
+
+        for group in result["Groups"]:
+            service = group["Keys"][0]
+            cost = Decimal(group["Metrics"]["UnblendedCost"]["Amount"])
+
+            if cost > Decimal("0.01"):
+                if service not in service_totals:
+                    service_totals[service] = Decimal("0")
+                service_totals[service] += cost
+                total_cost += cost
+
+        daily_totals[date] = total_cost
+
+    message += "📊 日別コスト:\n"
+    for date, cost in sorted(daily_totals.items()):
+        message += f"  {date}: ${float(cost):.2f}\n"
+
+    total_period_cost = sum(daily_totals.values())
+    message += f"\n合計 ({days}日間): ${float(total_period_cost):.2f}\n"
+    message += f"平均 (1日あたり): ${float(total_period_cost / days):.2f}\n\n"
+
+    message += "🏆 サービス別コスト (上位10件):\n"
+    sorted_services = sorted(service_totals.items(), key=lambda x: x[1], reverse=True)[
+        :10
+    ]
+    for service, cost in sorted_services:
+        message += f"  {service}: ${float(cost):.2f}\n"
+
+    message += "\n\n🔧 リソース情報\n"
+    message += "=" * 50 + "\n\n"
+    message += "📦 EC2 インスタンス:\n"
+    message += f"  総数: {resources['EC2']['total']}\n"
+    message += f"  稼働中: {resources['EC2']['running']}\n\n"
+    message += "🗄️ RDS インスタンス:\n"
+    message += f"  総数: {resources['RDS']['total']}\n"
+    message += f"  利用可能: {resources['RDS']['available']}\n\n"
+    message += "🪣 S3 バケット:\n"
+    message += f"  総数: {resources['S3']['total_buckets']}\n\n"
+    message += "λ Lambda 関数:\n"
+    message += f"  総数: {resources['Lambda']['total_functions']}\n\n"
+    message += "=" * 50 + "\n"
+    message += "このレポートは自動生成されました。\n"
+
+    return message
+
+
+def _without_timestamp(message):
+    """Drop the generation time line, which differs between two calls"""
+    return "\n".join(line for line in message.split("\n") if not line.startswith("🕐"))
+
+
+def _synthetic_cost_data(days, services):
+    """Build a wide ResultsByTime payload with one group per day and service"""
+    start = date(2024, 1, 1)
+    return {
+        "ResultsByTime": [
+            {
+                "TimePeriod": {
+                    "Start": (start + timedelta(days=offset)).isoformat(),
+                    "End": (start + timedelta(days=offset + 1)).isoformat(),
+                },
+                "Groups": [
+                    {
+                        "Keys": [f"Service{service:04d}"],
+                        "Metrics": {
+                            "UnblendedCost": {
+                                "Amount": f"{(offset * 7 + service * 13) % 997 / 97:.10f}",
+                                "Unit": "USD",
+                            }
+                        },
+                    }
+                    for service in range(services)
+                ],
+            }
+            for offset in range(days)
+        ]
+    }
+
+
+@pytest.mark.unit
+class TestAggregateCosts:
+    """Tests for aggregate_costs function"""
+
+    def test_aggregate_costs_totals(self, mock_cost_response):
+        """Test daily, service and period totals"""
+        from aggregation import aggregate_costs
+
+        summary = aggregate_costs(mock_cost_response)
+
+        assert summary.daily_totals == {
+            "2024-01-01": Decimal("16.25"),
+            "2024-01-02": Decimal("11.00"),
+        }
+        assert summary.service_totals["AmazonEC2"] == Decimal("21.50")
+        assert summary.period_total == Decimal("27.25")
+        assert summary.peak_day == ("2024-01-01", Decimal("16.25"))
+        assert summary.group_count == 4
+
+    def test_aggregate_costs_top_services(self, mock_cost_response):
+        """Test that the top services are ordered by cost and limited"""
+        from aggregation import aggregate_costs
+
+        summary = aggregate_costs(mock_cost_response, top_n=2)
+
+        assert summary.top_services == [
+            ("AmazonEC2", Decimal("21.50")),
+            ("AmazonRDS", Decimal("5.25")),
+        ]
+
+    def test_aggregate_costs_buckets_insignificant_services(self):
+        """Test that services at or below the threshold count as other"""
+        from aggregation import aggregate_costs
+
+        cost_data = _synthetic_cost_data(1, 1)
+        cost_data["ResultsByTime"][0]["Groups"][0]["Metrics"]["UnblendedCost"][
+            "Amount"
+        ] = "0.01"
+
+        summary = aggregate_costs(cost_data)
+
+        assert summary.service_totals == {}
+        assert summary.top_services == []
+        assert summary.daily_totals == {"2024-01-01": Decimal("0.01")}
+        assert summary.other_total == Decimal("0.01")
+        assert summary.other_count == 1
+
+    def test_aggregate_costs_totals_include_every_group(self):
+        """Test that listed services and the other bucket add up to the total"""
+        from aggregation import aggregate_costs
+
+        # 3,000 services, most of them below a cent a day
+        cost_data = _synthetic_cost_data(30, 3000)
+        for result in cost_data["ResultsByTime"]:
+            for group in result["Groups"][100:]:
+                group["Metrics"]["UnblendedCost"]["Amount"] = "0.0002500000"
+        expected = sum(
+            Decimal(group["Metrics"]["UnblendedCost"]["Amount"])
+            for result in cost_data["ResultsByTime"]
+            for group in result["Groups"]
+        )
+
+        summary = aggregate_costs(cost_data, min_share=Decimal("0.001"))
+
+        assert summary.period_total == expected
+        assert sum(summary.daily_totals.values()) == expected
+        listed = sum(cost for _, cost in summary.top_services)
+        assert listed + summary.other_total == expected
+        assert summary.other_count == 3000 - len(summary.top_services)
+        assert all(
+            cost > Decimal("0.01") and cost >= expected * Decimal("0.001")
+            for cost in summary.service_totals.values()
+        )
+        assert 0 < len(summary.service_totals) <= 100
+
+    def test_split_significant(self):
+        """Test the absolute and relative thresholds"""
+        from aggregation import split_significant
+        from money import SCALE
+
+        totals = {"a": 50 * SCALE, "b": 2 * SCALE, "c": SCALE // 200, "d": 0}
+
+        assert split_significant(totals, 52 * SCALE + SCALE // 200) == (
+            {"a": 50 * SCALE, "b": 2 * SCALE},
+            SCALE // 200,
+            2,
+        )
+        listed, other, count = split_significant(
+            totals, 52 * SCALE, min_cost=0, min_share=Decimal("0.05")
+        )
+        assert listed == {"a": 50 * SCALE}
+        assert (other, count) == (2 * SCALE + SCALE // 200, 3)
+
+    def test_aggregate_costs_changing_services(self):
+        """Test days whose services differ, repeat or use other amount forms"""
+        from aggregation import aggregate_costs
+
+        days = [
+            [("A", "1.0000000000"), ("B", "2.0000000000")],
+            [("B", "3.0000000000"), ("A", "4.0000000000")],
+            [("A", "5.0000000000"), ("B", "6.0000000000")],
+            [("C", "1e-0000000"), ("A", "0.5"), ("C", "7.0000000000")],
+        ]
+        cost_data = {
+            "ResultsByTime": [
+                {
+                    "TimePeriod": {"Start": f"2024-01-0{offset + 1}"},
+                    "Groups": [
+                        {
+                            "Keys": [service],
+                            "Metrics": {"UnblendedCost": {"Amount": amount}},
+                        }
+                        for service, amount in groups
+                    ],
+                }
+                for offset, groups in enumerate(days)
+            ]
+        }
+
+        summary = aggregate_costs(cost_data)
+
+        assert summary.service_totals == {"A": Decimal("10.5"), "B": 11, "C": 8}
+        assert list(summary.daily_totals.values()) == [3, 7, 11, Decimal("8.5")]
+        assert summary.group_count == 9
+
+    def test_aggregate_costs_sorts_days(self, mock_cost_response):
+        """Test that days are returned in date order"""
+        from aggregation import aggregate_costs
+
+        reversed_data = {"ResultsByTime": mock_cost_response["ResultsByTime"][::-1]}
+
+        summary = aggregate_costs(reversed_data)
+
+        assert list(summary.daily_totals) == ["2024-01-01", "2024-01-02"]
+
+    def test_aggregate_costs_empty(self, mock_empty_cost_response):
+        """Test aggregating a response without days"""
+        from aggregation import aggregate_costs
+
+        summary = aggregate_costs(mock_empty_cost_response)
+
+        assert summary.period_total == Decimal("0")
+        assert summary.peak_day is None
+        assert summary.daily_average(7) == Decimal("0")
+
+    def test_format_cost_message_matches_legacy(self, mock_resource_data):
+        """Test that the report is unchanged by the aggregation engine
+
+        Apart from the other line of the services outside the top 10, which
+        the legacy formatter left out.
+        """
+        from cost_notifier import format_cost_message
+
+        cost_data = _synthetic_cost_data(30, 40)
+
+        message = format_cost_message(cost_data, mock_resource_data, 30)
+        legacy = _legacy_format_cost_message(cost_data, mock_resource_data, 30)
+        other = [line for line in message.split("\n") if "その他 (" in line]
+
+        assert other and other[0].startswith("  その他 (30 サービス): $")
+        assert _without_timestamp(message.replace(other[0] + "\n", "")) == (
+            _without_timestamp(legacy)
+        )
+
+
+@pytest.mark.slow
+class TestAggregationPerformance:
+    """Microbenchmark of the aggregation engine against the legacy formatter"""
+
+    def _best_of(self, func, repeat=5):
+        # Like timeit, without garbage collection pauses in the timings
+        best = None
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+        finally:
+            gc.enable()
+        return best
+
+    def test_format_cost_message_benchmark(self, mock_resource_data):
+        """Test that 365 days x 500 services format no slower than before"""
+        from cost_notifier import format_cost_message
+
+        cost_data = _synthetic_cost_data(365, 500)
+
+        legacy_time = self._best_of(
+            lambda: _legacy_format_cost_message(cost_data, mock_resource_data, 365)
+        )
+        engine_time = self._best_of(
+            lambda: format_cost_message(cost_data, mock_resource_data, 365)
+        )
+
+        print(
+            f"\nformat_cost_message 182,500 groups: legacy {legacy_time:.3f}s, "
+            f"engine {engine_time:.3f}s, speedup {legacy_time / engine_time:.2f}x"
+        )
+
+        assert engine_time < legacy_time
+
+    def test_one_million_groups_benchmark(self):
+        """Test that fixed-point aggregation of 1M groups is exact and streams"""
+        import tracemalloc
+
+        from aggregation import SIGNIFICANT_COST, aggregate_costs
+
+        # 1,000 days x 1,000 services; each day lists a different window of
+        # 2,000 services, so no two days have the same service set
+        pool = _synthetic_cost_data(1, 2000)["ResultsByTime"][0]["Groups"]
+        cost_data = {
+            "ResultsByTime": [
+                {
+                    "TimePeriod": {"Start": f"day{offset:04d}"},
+                    "Groups": pool[offset : offset + 1000],
+                }
+                for offset in range(1000)
+            ]
+        }
+
+        def decimal_aggregate():
+            daily_totals = {}
+            service_totals = {}
+            for result in cost_data["ResultsByTime"]:
+                day_total = Decimal(0)
+                for group in result["Groups"]:
+                    cost = Decimal(group["Metrics"]["UnblendedCost"]["Amount"])
+                    if cost > SIGNIFICANT_COST:
+                        service = group["Keys"][0]
+                        service_totals[service] = service_totals.get(service, 0) + cost
+                        day_total += cost
+                daily_totals[result["TimePeriod"]["Start"]] = day_total
+            return daily_totals, service_totals
+
+        decimal_time = self._best_of(decimal_aggregate, repeat=3)
+        money_time = self._best_of(lambda: aggregate_costs(cost_data), repeat=3)
+
+        print(
+            f"\naggregate 1,000,000 groups: Decimal {decimal_time:.3f}s, "
+            f"fixed-point {money_time:.3f}s, "
+            f"speedup {decimal_time / money_time:.2f}x"
+        )
+
+        tracemalloc.start()
+        try:
+            summary = aggregate_costs(cost_data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        daily_totals, service_totals = decimal_aggregate()
+        assert summary.daily_totals == daily_totals
+        assert summary.service_totals == service_totals
+        assert summary.period_total == sum(daily_totals.values())
+        # One pass: besides the totals only the current day is held
+        assert peak < 5 * 1024 * 1024
+        # Both loops are bound by one C conversion per amount and run about as
+        # fast; the fixed-point pass buys exactness, not speed. Guard against
+        # a regression only.
+        assert money_time < decimal_time * 1.5
@@ -0,0 +1,261 @@
+"""
+Unit tests for cost anomaly detection against synthetic spike data.
+"""
+
+import pytest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+
+def _synthetic_costs(days, spikes=None, start=date(2024, 1, 1)):
+    """Build ResultsByTime for two services with mild noise and given spikes
+
+    ``spikes`` maps (day offset, service) to the cost on that day.
+    """
+    spikes = spikes or {}
+    results = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        costs = {
+            "AmazonEC2": 20.0 + (offset * 7 % 5) * 0.4,
+            "AmazonS3": 2.0 + (offset * 3 % 4) * 0.1,
+        }
+        for (spike_offset, service), cost in spikes.items():
+            if spike_offset == offset:
+                costs[service] = cost
+        results.append(
+            {
+                "TimePeriod": {
+                    "Start": day.isoformat(),
+                    "End": (day + timedelta(days=1)).isoformat(),
+                },
+                "Groups": [
+                    {
+                        "Keys": [service],
+                        "Metrics": {
+                            "UnblendedCost": {"Amount": f"{cost:.2f}", "Unit": "USD"}
+                        },
+                    }
+                    for service, cost in costs.items()
+                ],
+            }
+        )
+    return {"ResultsByTime": results}
+
+
+@pytest.mark.unit
+class TestAnomalyDetector:
+    """Tests for AnomalyDetector"""
+
+    def test_steady_costs_have_no_anomalies(self):
+        """Test that ordinary noise is not flagged"""
+        from anomaly import AnomalyDetector
+
+        anomalies = AnomalyDetector().process(_synthetic_costs(60), "2024-12-31")
+
+        assert anomalies == []
+
+    def test_spike_is_flagged(self):
+        """Test that a cost spike is flagged with its baseline"""
+        from anomaly import AnomalyDetector
+
+        cost_data = _synthetic_costs(30, spikes={(25, "AmazonEC2"): 95.0})
+
+        anomalies = AnomalyDetector().process(cost_data, "2024-12-31")
+
+        assert len(anomalies) == 1
+        anomaly = anomalies[0]
+        assert (anomaly.date, anomaly.service, anomaly.cost) == (
+            "2024-01-26",
+            "AmazonEC2",
+            95.0,
+        )
+        assert 19 < anomaly.baseline < 23
+        assert anomaly.zscore > 3
+
+    def test_drop_is_flagged(self):
+        """Test that a service dropping to zero is flagged as negative"""
+        from anomaly import AnomalyDetector
+
+        cost_data = _synthetic_costs(30)
+        cost_data["ResultsByTime"][-1]["Groups"] = cost_data["ResultsByTime"][-1][
+            "Groups"
+        ][1:]
+
+        anomalies = AnomalyDetector().process(cost_data, "2024-12-31")
+
+        assert [(a.service, a.cost) for a in anomalies] == [("AmazonEC2", 0.0)]
+        assert anomalies[0].zscore < -3
+
+    def test_new_expensive_service_after_warmup(self):
+        """Test that a service appearing late is learned, not flagged at once"""
+        from anomaly import AnomalyDetector
+
+        cost_data = _synthetic_costs(30, spikes={(29, "AmazonSageMaker"): 500.0})
+
+        anomalies = AnomalyDetector().process(cost_data, "2024-12-31")
+
+        assert anomalies == []
+
+    def test_small_deviations_are_ignored(self):
+        """Test that deviations below the dollar threshold are not flagged"""
+        from anomaly import AnomalyDetector
+
+        cost_data = _synthetic_costs(30, spikes={(25, "AmazonS3"): 2.9})
+
+        anomalies = AnomalyDetector().process(cost_data, "2024-12-31")
+
+        assert anomalies == []
+
+    def test_unsettled_days_are_scored_once_settled(self):
+        """Test that revisable recent days are scored once, after settling"""
+        from anomaly import AnomalyDetector
+
+        cost_data = _synthetic_costs(30, spikes={(29, "AmazonEC2"): 95.0})
+        detector = AnomalyDetector()
+
+        assert detector.process(cost_data, "2024-01-30") == []
+        assert detector.last_date == "2024-01-29"
+        assert detector.services["AmazonEC2"]["mean"] < 23
+
+        anomalies = detector.process(cost_data, "2024-02-02")
+
+        assert [a.date for a in anomalies] == ["2024-01-30"]
+        assert detector.process(cost_data, "2024-02-03") == []
+
+    def test_short_window_is_not_warmed_up(self):
+        """Test that a window without enough settled days says so"""
+        from anomaly import AnomalyDetector, format_anomaly_section
+
+        detector = AnomalyDetector()
+        anomalies = detector.process(_synthetic_costs(7), "2024-01-05")
+
+        assert anomalies == []
+        assert not detector.warmed_up()
+        _, lines = format_anomaly_section(anomalies, detector.warmed_up())
+        assert lines[0].startswith("ベースラインの学習中です")
+
+
+@pytest.mark.unit
+class TestIncrementalBaseline:
+    """Tests for the persisted, incrementally updated baseline"""
+
+    def test_second_run_processes_only_new_days(self):
+        """Test that days already in the baseline are skipped"""
+        from anomaly import AnomalyDetector
+
+        first = AnomalyDetector()
+        first.process(_synthetic_costs(30), "2024-12-31")
+        state = first.to_state()
+
+        # Old days are rewritten with huge values; only new days may count
+        cost_data = _synthetic_costs(
+            35, spikes={(offset, "AmazonEC2"): 999.0 for offset in range(30)}
+        )
+        second = AnomalyDetector(state)
+
+        anomalies = second.process(cost_data, "2024-12-31")
+
+        assert anomalies == []
+        assert second.last_date == "2024-02-04"
+        assert second.services["AmazonEC2"]["count"] == 35
+
+    def test_incremental_matches_full_history(self):
+        """Test that updating day by day equals one pass over the history"""
+        from anomaly import AnomalyDetector
+
+        cost_data = _synthetic_costs(40, spikes={(35, "AmazonEC2"): 95.0})
+        full = AnomalyDetector()
+        full_anomalies = full.process(cost_data, "2024-12-31")
+
+        state = None
+        incremental_anomalies = []
+        for days in range(10, 41, 10):
+            detector = AnomalyDetector(state)
+            incremental_anomalies += detector.process(
+                _synthetic_costs(days, spikes={(35, "AmazonEC2"): 95.0}), "2024-12-31"
+            )
+            state = detector.to_state()
+
+        assert incremental_anomalies == full_anomalies
+        assert state["services"] == full.to_state()["services"]
+
+    def test_baseline_round_trip(self, tmp_path):
+        """Test that the baseline survives persistence in a cache backend"""
+        from anomaly import AnomalyDetector, load_baseline, save_baseline
+        from cost_cache import LocalFileCacheBackend
+
+        backend = LocalFileCacheBackend(str(tmp_path))
+        detector = AnomalyDetector()
+        detector.process(_synthetic_costs(20), "2024-12-31")
+
+        save_baseline(backend, detector)
+
+        assert load_baseline(backend) == detector.to_state()
+
+    def test_load_baseline_ignores_other_versions(self, tmp_path):
+        """Test that an incompatible baseline is rebuilt"""
+        from anomaly import BASELINE_KEY, load_baseline
+        from cost_cache import LocalFileCacheBackend
+
+        backend = LocalFileCacheBackend(str(tmp_path))
+        backend.put(BASELINE_KEY, {"version": 0, "services": {}})
+
+        assert load_baseline(backend) is None
+        assert load_baseline(LocalFileCacheBackend(str(tmp_path / "empty"))) is None
+
+
+@pytest.mark.unit
+class TestAnomalyReport:
+    """Tests for the anomaly report section"""
+
+    def test_format_anomaly_section(self):
+        """Test that anomalies are listed with their baseline"""
+        from anomaly import Anomaly, format_anomaly_section
+
+        title, lines = format_anomaly_section(
+            [Anomaly("2024-01-26", "AmazonEC2", 95.0, 21.0, 12.3)]
+        )
+
+        assert title == "🚨 コスト異常検知"
+        assert lines == [
+            "1 件の異常を検出しました:",
+            "  2024-01-26 AmazonEC2: $95.00 (平常 $21.00, z=+12.3)",
+        ]
+
+    def test_format_anomaly_section_empty(self):
+        """Test the message when nothing was flagged"""
+        from anomaly import format_anomaly_section
+
+        _, lines = format_anomaly_section([])
+
+        assert lines == ["異常は検出されませんでした。"]
+
+    def test_lambda_handler_reports_anomalies(
+        self,
+        mock_environment,
+        monkeypatch,
+        tmp_path,
+        mock_sns_client,
+        mock_resource_data,
+    ):
+        """Test that anomalies reach the SNS message and the baseline is saved"""
+        import cost_notifier
+        from anomaly import BASELINE_KEY
+
+        monkeypatch.setenv("ENABLE_ANOMALY_DETECTION", "true")
+        monkeypatch.setenv("COST_CACHE_DIR", str(tmp_path))
+        monkeypatch.delenv("COST_CACHE_BUCKET", raising=False)
+        monkeypatch.setattr(cost_notifier, "_cache_backend", None)
+        monkeypatch.setattr(cost_notifier, "_cost_cache", None)
+        cost_data = _synthetic_costs(30, spikes={(25, "AmazonEC2"): 95.0})
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.get_cost_data", return_value=cost_data
+        ), patch("cost_notifier.get_resource_counts", return_value=mock_resource_data):
+            response = cost_notifier.lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        message = mock_sns_client.publish.call_args[1]["Message"]
+        assert "2024-01-26 AmazonEC2: $95.00" in message
+        assert cost_notifier._get_cache_backend().get(BASELINE_KEY) is not None
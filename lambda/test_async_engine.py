@@ -0,0 +1,314 @@
+"""
+Unit tests for the asyncio engine.
+Results are compared with the synchronous path on the same local stubs.
+"""
+
+import asyncio
+import contextlib
+import re
+import time
+import pytest
+from datetime import date
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+
+ROLE_A = "arn:aws:iam::111111111111:role/CostMonitor"
+ROLE_B = "arn:aws:iam::222222222222:role/CostMonitor"
+
+
+def _backend(**overrides):
+    """Small simulated account without latency"""
+    from simulated_aws import SimulatedBackend, SimulationConfig
+
+    settings = dict(
+        services=12,
+        ec2_instances=230,
+        rds_instances=25,
+        s3_buckets=4,
+        lambda_functions=110,
+        latency=0,
+        latency_jitter=0,
+        ce_page_size=50,
+    )
+    settings.update(overrides)
+    return SimulatedBackend(SimulationConfig(**settings))
+
+
+async def _with_pool(backend, func, *args, **kwargs):
+    """Run an engine coroutine function with a pool of the backend's clients"""
+    from async_engine import ClientPool
+
+    async with ClientPool(backend.async_client) as pool:
+        return await func(pool, *args, **kwargs)
+
+
+class _SlowClient:
+    """Async client whose paginated calls never finish in time"""
+
+    def get_paginator(self, operation):
+        return self
+
+    async def paginate(self, **kwargs):
+        await asyncio.sleep(10)
+        yield {}
+
+
+@pytest.mark.unit
+class TestAsyncBackoff:
+    """Tests for AsyncBackoff"""
+
+    def test_retries_throttled_calls(self):
+        """Test that throttled calls are retried and other errors raised"""
+        from async_engine import AsyncBackoff
+
+        attempts = []
+
+        async def flaky(**kwargs):
+            attempts.append(kwargs)
+            if len(attempts) < 3:
+                raise ClientError(
+                    {"Error": {"Code": "ThrottlingException", "Message": "slow"}},
+                    "GetCostAndUsage",
+                )
+            return "ok"
+
+        backoff = AsyncBackoff(base_delay=0.001)
+
+        assert asyncio.run(backoff.call(flaky, Key="value")) == "ok"
+        assert backoff.throttled == 2
+        assert attempts[-1] == {"Key": "value"}
+
+    def test_raises_other_errors(self):
+        """Test that non-throttling errors are not retried"""
+        from async_engine import AsyncBackoff
+
+        async def denied(**kwargs):
+            raise ClientError(
+                {"Error": {"Code": "AccessDeniedException", "Message": "no"}},
+                "GetCostAndUsage",
+            )
+
+        with pytest.raises(ClientError):
+            asyncio.run(AsyncBackoff(base_delay=0.001).call(denied))
+
+
+@pytest.mark.unit
+class TestAsyncCollection:
+    """Tests for the async collectors against the synchronous results"""
+
+    def test_cost_data_matches_sync(self):
+        """Test sharded, paginated cost data against get_cost_data"""
+        import cost_notifier
+        from async_engine import get_cost_data
+
+        backend = _backend()
+        expected = cost_notifier.get_cost_data(
+            days=40, ce=backend.client("ce"), shard_days=9
+        )
+
+        async def fetch(pool):
+            return await get_cost_data(await pool.client("ce"), days=40, shard_days=9)
+
+        result = asyncio.run(_with_pool(backend, fetch))
+
+        assert result == expected
+        assert backend.calls["ce.GetCostAndUsage"] > 2 * 5
+
+    def test_cost_data_with_cache_matches_sync(self, tmp_path):
+        """Test that cached days are read and fetched days stored"""
+        import cost_notifier
+        from async_engine import get_cost_data
+        from cost_cache import CostCache, LocalFileCacheBackend
+
+        backend = _backend()
+        expected = cost_notifier.get_cost_data(
+            days=20,
+            ce=backend.client("ce"),
+            cache=CostCache(LocalFileCacheBackend(str(tmp_path / "sync"))),
+        )
+        cache = CostCache(LocalFileCacheBackend(str(tmp_path / "async")))
+
+        async def fetch(pool):
+            ce = await pool.client("ce")
+            return [await get_cost_data(ce, days=20, cache=cache) for _ in range(2)]
+
+        first, second = asyncio.run(_with_pool(backend, fetch))
+
+        assert first == second == expected
+        assert cache.hits > 0
+
+    def test_cost_data_timeout(self, capsys):
+        """Test that a slow cost query is cancelled and reported as missing"""
+        from async_engine import get_cost_data
+
+        class SlowCostExplorer:
+            async def get_cost_and_usage(self, **kwargs):
+                await asyncio.sleep(10)
+
+        started = time.perf_counter()
+        result = asyncio.run(get_cost_data(SlowCostExplorer(), timeout=0.05))
+
+        assert result is None
+        assert time.perf_counter() - started < 5
+        assert "timed out" in capsys.readouterr().out
+
+    def test_resource_counts_match_sync(self):
+        """Test the paginated and single-call collectors"""
+        import cost_notifier
+        from async_engine import get_resource_counts
+        from inventory import REGISTRY
+
+        backend = _backend()
+        expected = cost_notifier.get_resource_counts(
+            clients={name: backend.client(name) for name in REGISTRY.services()}
+        )
+
+        result = asyncio.run(_with_pool(backend, get_resource_counts))
+
+        assert result == expected
+        assert list(result) == [collector.name for collector in REGISTRY]
+
+    def test_slow_collector_is_cancelled(self, capsys):
+        """Test that a collector over its timeout reports default counts"""
+        from async_engine import ClientPool, get_resource_counts
+
+        backend = _backend()
+
+        @contextlib.asynccontextmanager
+        async def create_client(service_name, region_name=None, **credentials):
+            if service_name == "ec2":
+                yield _SlowClient()
+            else:
+                async with backend.async_client(service_name) as client:
+                    yield client
+
+        async def collect():
+            async with ClientPool(create_client) as pool:
+                return await get_resource_counts(pool, timeout=0.2)
+
+        started = time.perf_counter()
+        result = asyncio.run(collect())
+
+        assert time.perf_counter() - started < 5
+        assert result["EC2"] == {"total": 0, "running": 0}
+        assert result["Lambda"] == {"total_functions": 110}
+        assert "Error getting EC2 data: timed out" in capsys.readouterr().out
+
+    def test_forecast_section_matches_sync(self, monkeypatch):
+        """Test the concurrent month-to-date and forecast queries"""
+        import forecast
+        from async_engine import get_forecast_section
+        from renderers import Section
+
+        backend = _backend()
+        monkeypatch.setattr(forecast, "_memo", {})
+        today = date(2024, 3, 10)
+        expected = Section.of(
+            forecast.format_forecast_section,
+            forecast.get_cost_forecast(backend.client("ce"), today=today),
+        )
+        forecast._memo.clear()
+
+        section = asyncio.run(_with_pool(backend, get_forecast_section, today=today))
+
+        assert section == expected
+        assert backend.calls["ce.GetCostForecast"] == 2
+
+
+@pytest.mark.unit
+class TestAsyncFanOut:
+    """Tests for the async multi-account fan-out"""
+
+    def test_matches_sync_fan_out(self):
+        """Test that every target is merged like fan_out.collect_fan_out"""
+        from async_engine import collect_fan_out
+        from fan_out import collect_fan_out as collect_fan_out_sync
+
+        backends = {
+            ROLE_A: _backend(seed=1, ec2_instances=40),
+            ROLE_B: _backend(seed=2, ec2_instances=70),
+        }
+        regions = ["us-east-1", "ap-northeast-1"]
+        assumed = []
+
+        class StubSTS:
+            async def assume_role(self, RoleArn, RoleSessionName):
+                assumed.append(RoleArn)
+                return {
+                    "Credentials": {
+                        "AccessKeyId": RoleArn,
+                        "SecretAccessKey": "secret",
+                        "SessionToken": "token",
+                    }
+                }
+
+        @contextlib.asynccontextmanager
+        async def create_client(service_name, region_name=None, **credentials):
+            if service_name == "sts":
+                yield StubSTS()
+            else:
+                backend = backends[credentials["aws_access_key_id"]]
+                async with backend.async_client(service_name) as client:
+                    yield client
+
+        expected = collect_fan_out_sync(
+            [ROLE_A, ROLE_B], regions, 10, session_factory=backends.get
+        )
+
+        async def collect():
+            from async_engine import ClientPool
+
+            async with ClientPool(create_client) as pool:
+                return await collect_fan_out(pool, [ROLE_A, ROLE_B], regions, 10)
+
+        result = asyncio.run(collect())
+
+        assert result == expected
+        assert result.resources["EC2"]["total"] == 2 * (40 + 70)
+        assert sorted(assumed) == [ROLE_A, ROLE_B]
+
+
+@pytest.mark.integration
+class TestAsyncEngineInHandler:
+    """Tests for ENABLE_ASYNC_ENGINE in lambda_handler"""
+
+    def _run(self, monkeypatch, backend, engine):
+        import clients
+        import forecast
+
+        monkeypatch.setenv("ENABLE_ASYNC_ENGINE", engine)
+        monkeypatch.setattr(clients, "registry", backend.registry())
+        monkeypatch.setattr(forecast, "_memo", {})
+
+        from cost_notifier import lambda_handler
+
+        response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        # The generation time is the only line allowed to differ
+        return re.sub(r"生成日時: .*", "", backend.client("sns").messages[-1])
+
+    def test_report_matches_sync(self, monkeypatch, mock_environment):
+        """Test that both engines send the same report"""
+        monkeypatch.setenv("DAYS_TO_CHECK", "30")
+        monkeypatch.setenv("COST_SHARD_DAYS", "7")
+        monkeypatch.setenv("ENABLE_COST_FORECAST", "true")
+        backend = _backend()
+        monkeypatch.setattr("async_engine.create_client", backend.async_client)
+
+        sync_message = self._run(monkeypatch, backend, "false")
+        async_message = self._run(monkeypatch, backend, "true")
+
+        assert async_message == sync_message
+        assert "🔮 月末コスト予測" in async_message
+
+    def test_falls_back_without_aiobotocore(self, monkeypatch, mock_environment):
+        """Test that the synchronous path runs when the engine is unavailable"""
+        backend = _backend()
+
+        with patch("async_engine.get_session", None), patch(
+            "async_engine.run_report"
+        ) as run_report:
+            self._run(monkeypatch, backend, "true")
+
+        run_report.assert_not_called()
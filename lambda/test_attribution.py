@@ -0,0 +1,273 @@
+"""
+Unit tests for tag and resource cost attribution.
+"""
+
+import random
+import pytest
+from datetime import date
+from decimal import Decimal
+from unittest.mock import Mock, patch
+from botocore.exceptions import ClientError
+
+
+def _page(groups, token=None):
+    """Cost Explorer response page with one result of the given groups"""
+    page = {
+        "ResultsByTime": [
+            {
+                "TimePeriod": {"Start": "2024-01-01", "End": "2024-02-01"},
+                "Total": {},
+                "Groups": [
+                    {
+                        "Keys": [key],
+                        "Metrics": {
+                            "UnblendedCost": {"Amount": str(amount), "Unit": "USD"}
+                        },
+                    }
+                    for key, amount in groups
+                ],
+            }
+        ]
+    }
+    if token:
+        page["NextPageToken"] = token
+    return page
+
+
+@pytest.fixture
+def backoff():
+    """Backoff that does not sleep"""
+    from cost_notifier import AdaptiveBackoff
+
+    return AdaptiveBackoff(base_delay=0, max_attempts=2)
+
+
+@pytest.mark.unit
+class TestSpaceSaving:
+    """Tests for the SpaceSaving sketch"""
+
+    def test_exact_below_capacity(self):
+        """Test that totals are exact while every key fits"""
+        from attribution import SpaceSaving
+
+        sketch = SpaceSaving(capacity=10)
+        for key, weight in [("a", "5.0"), ("b", "1.0"), ("a", "2.5"), ("c", "3.0")]:
+            sketch.add(key, weight)
+
+        top = sketch.top(2)
+
+        assert [(h.key, h.cost, h.error) for h in top] == [
+            ("a", Decimal("7.5"), 0),
+            ("c", 3, 0),
+        ]
+        assert sketch.total == Decimal("11.5")
+
+    def test_memory_is_bounded(self):
+        """Test that tracked keys and heap entries stay within the capacity"""
+        from attribution import SpaceSaving
+
+        sketch = SpaceSaving(capacity=50)
+        for i in range(20000):
+            sketch.add(f"key-{i}", 1 + i % 7)
+
+        assert len(sketch) == 50
+        assert len(sketch._heap) <= 4 * 50
+        assert sketch.keys_seen == 20000
+
+    def test_heavy_hitters_are_found(self):
+        """Test that skewed spenders are reported with valid error bounds"""
+        from attribution import SpaceSaving
+
+        rng = random.Random(7)
+        truth = {}
+        stream = [(f"heavy-{i}", Decimal(500 - i * 40)) for i in range(10)] * 5
+        stream += [
+            (f"tail-{rng.randrange(5000)}", Decimal(f"{rng.random():.10f}"))
+            for _ in range(20000)
+        ]
+        rng.shuffle(stream)
+
+        sketch = SpaceSaving(capacity=100)
+        for key, weight in stream:
+            truth[key] = truth.get(key, 0) + weight
+            sketch.add(key, weight)
+
+        top = sketch.top(10)
+
+        assert [h.key for h in top] == [f"heavy-{i}" for i in range(10)]
+        for hitter in top:
+            assert hitter.cost >= truth[hitter.key]
+            assert hitter.cost - hitter.error <= truth[hitter.key]
+
+    def test_costs_are_exact(self):
+        """Test that many small costs sum without float rounding"""
+        from attribution import SpaceSaving
+
+        sketch = SpaceSaving()
+        for _ in range(10):
+            sketch.add("a", "0.1000000000")
+
+        assert sketch.top(1)[0].cost == 1
+        assert sketch.total == 1
+        with pytest.raises(TypeError):
+            sketch.add("a", 0.1)
+
+    def test_credits_only_reduce_total(self):
+        """Test that non-positive amounts are not tracked as spenders"""
+        from attribution import SpaceSaving
+
+        sketch = SpaceSaving()
+        sketch.add("refund", -10)
+        sketch.add("a", 4)
+
+        assert [h.key for h in sketch.top(5)] == ["a"]
+        assert sketch.total == -6
+
+
+@pytest.mark.unit
+class TestCollectAttribution:
+    """Tests for collect_attribution function"""
+
+    def test_tag_attribution_pages(self, backoff):
+        """Test that every page of a tag query is aggregated"""
+        from attribution import collect_attribution
+
+        ce = Mock()
+        ce.get_cost_and_usage.side_effect = [
+            _page([("team$alpha", 10.0), ("team$", 3.0)], token="next"),
+            _page([("team$beta", 7.0), ("team$alpha", 5.0)]),
+        ]
+
+        result = collect_attribution(
+            ce, date(2024, 1, 1), date(2024, 2, 1), tags=["team"], backoff=backoff
+        )
+
+        assert [(h.key, h.cost) for h in result.tags["team"]] == [
+            ("alpha", 15),
+            ("beta", 7),
+            ("", 3),
+        ]
+        first, second = ce.get_cost_and_usage.call_args_list
+        assert first.kwargs["GroupBy"] == [{"Type": "TAG", "Key": "team"}]
+        assert second.kwargs["NextPageToken"] == "next"
+
+    def test_resource_attribution_is_clamped(self, backoff):
+        """Test that resource queries cover the last 14 days of one service"""
+        from attribution import collect_attribution
+
+        ce = Mock()
+        ce.get_cost_and_usage_with_resources.return_value = _page(
+            [("i-0123", 42.0), ("i-0456", 8.0)]
+        )
+        service = "Amazon Elastic Compute Cloud - Compute"
+
+        result = collect_attribution(
+            ce,
+            date(2024, 1, 1),
+            date(2024, 2, 1),
+            resource_services=[service],
+            backoff=backoff,
+        )
+
+        assert result.resources[service][0].key == "i-0123"
+        kwargs = ce.get_cost_and_usage_with_resources.call_args.kwargs
+        assert kwargs["TimePeriod"] == {"Start": "2024-01-18", "End": "2024-02-01"}
+        assert kwargs["Filter"]["Dimensions"]["Values"] == [service]
+        assert kwargs["GroupBy"] == [{"Type": "DIMENSION", "Key": "RESOURCE_ID"}]
+
+    def test_failures_are_recorded(self, backoff):
+        """Test that a service without resource-level data does not stop others"""
+        from attribution import collect_attribution
+
+        ce = Mock()
+        ce.get_cost_and_usage.return_value = _page([("team$alpha", 1.0)])
+        ce.get_cost_and_usage_with_resources.side_effect = ClientError(
+            {"Error": {"Code": "DataUnavailableException", "Message": "opt in"}},
+            "GetCostAndUsageWithResources",
+        )
+
+        result = collect_attribution(
+            ce,
+            date(2024, 1, 1),
+            date(2024, 1, 8),
+            tags=["team"],
+            resource_services=["AWS Lambda"],
+            backoff=backoff,
+        )
+
+        assert "team" in result.tags
+        assert result.resources == {}
+        assert result.errors[0][:2] == ("resources", "AWS Lambda")
+
+
+@pytest.mark.unit
+class TestFormatAttributionSection:
+    """Tests for format_attribution_section function"""
+
+    def test_section_lines(self):
+        """Test top spenders, error bounds and failures in the section"""
+        from attribution import Attribution, HeavyHitter, format_attribution_section
+        from money import Money
+
+        attribution = Attribution(
+            tags={
+                "team": [
+                    HeavyHitter("alpha", Money.of(15)),
+                    HeavyHitter("beta", Money.parse("7.5"), Money.parse("1.25")),
+                ]
+            },
+            resources={"AWS Lambda": []},
+            errors=[("tag", "project", "not activated")],
+        )
+
+        title, lines = format_attribution_section(attribution)
+
+        assert title == "📌 コスト配分"
+        assert "  alpha: $15.00" in lines
+        assert "  beta: $7.50 (誤差 ≤ $1.25)" in lines
+        assert "  データがありません" in lines
+        assert "  タグ project: not activated" in lines
+
+
+@pytest.mark.integration
+class TestAttributionInHandler:
+    """Tests for the attribution section of the report"""
+
+    def test_section_is_sent(
+        self,
+        monkeypatch,
+        mock_environment,
+        mock_sns_client,
+        mock_ec2_client,
+        mock_rds_client,
+        mock_s3_client,
+        mock_lambda_client,
+    ):
+        """Test that ATTRIBUTION_TAGS adds the section to the notification"""
+        monkeypatch.setenv("ATTRIBUTION_TAGS", "team")
+        ce = Mock()
+
+        def get_cost_and_usage(**kwargs):
+            if kwargs.get("GroupBy", [{}])[0].get("Type") == "TAG":
+                return _page([("team$alpha", 12.0)])
+            return {"ResultsByTime": []}
+
+        ce.get_cost_and_usage.side_effect = get_cost_and_usage
+
+        with patch("cost_notifier.ce_client", ce), patch(
+            "cost_notifier.sns_client", mock_sns_client
+        ), patch("cost_notifier.ec2_client", mock_ec2_client), patch(
+            "cost_notifier.rds_client", mock_rds_client
+        ), patch(
+            "cost_notifier.s3_client", mock_s3_client
+        ), patch(
+            "cost_notifier.lambda_client", mock_lambda_client
+        ):
+            from cost_notifier import lambda_handler
+
+            response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        message = mock_sns_client.publish.call_args.kwargs["Message"]
+        assert "📌 コスト配分" in message
+        assert "alpha: $12.00" in message
@@ -0,0 +1,137 @@
+"""
+Tests for the end-to-end benchmark harness.
+"""
+
+import pytest
+
+
+@pytest.mark.unit
+class TestBenchmarkHelpers:
+    """Tests for percentiles, baselines and regression detection"""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        from benchmark import percentile
+
+        values = list(range(1, 101))
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([7.0], 90) == 7.0
+
+    def test_compare_flags_regressions(self):
+        """Test that latency and RSS growth beyond tolerance is reported"""
+        from benchmark import compare
+
+        baseline = {
+            "cost_data": {"p50_ms": 100.0, "peak_rss_mb": 100.0},
+            "format": {"p50_ms": 50.0, "peak_rss_mb": 100.0},
+        }
+        summary = {
+            "cost_data": {"p50_ms": 150.0, "peak_rss_mb": 100.0},
+            "format": {"p50_ms": 55.0, "peak_rss_mb": 130.0},
+        }
+
+        regressions = compare(summary, baseline)
+
+        assert len(regressions) == 2
+        assert regressions[0].startswith("cost_data p50_ms")
+        assert regressions[1].startswith("format peak_rss_mb")
+
+    def test_compare_ignores_noise(self):
+        """Test that tiny absolute changes on fast stages are not regressions"""
+        from benchmark import compare
+
+        baseline = {"format": {"p50_ms": 1.0, "peak_rss_mb": 10.0}}
+        summary = {"format": {"p50_ms": 2.0, "peak_rss_mb": 13.0}}
+
+        assert compare(summary, baseline) == []
+
+    def test_compare_zero_baseline(self):
+        """Test that a stage recorded at zero is flagged, not divided by"""
+        from benchmark import compare
+
+        baseline = {
+            "forecast": {"p50_ms": 0.0, "peak_rss_mb": 0.0},
+            "format": {"p50_ms": 0.0, "peak_rss_mb": 10.0},
+        }
+        summary = {
+            "forecast": {"p50_ms": 40.0, "peak_rss_mb": 0.0},
+            "format": {"p50_ms": 1.0, "peak_rss_mb": 10.0},
+        }
+
+        assert compare(summary, baseline) == [
+            "forecast p50_ms: 40.0 > 0.0 (zero baseline)"
+        ]
+
+    def test_baseline_round_trip(self, tmp_path):
+        """Test that saved baselines are loaded per scenario"""
+        from benchmark import load_baselines, save_baseline
+
+        path = str(tmp_path / "baselines.json")
+        summary = {"invocation": {"p50_ms": 1.0, "peak_rss_mb": 2.0}}
+
+        save_baseline("small", summary, path)
+        save_baseline("large", summary, path)
+
+        baselines = load_baselines(path)
+        assert set(baselines) == {"small", "large"}
+        assert baselines["small"]["stages"] == summary
+
+    def test_stored_baselines_cover_scenarios(self):
+        """Test that the committed baselines belong to known scenarios"""
+        from benchmark import SCENARIOS, load_baselines
+
+        baselines = load_baselines()
+
+        assert baselines
+        assert set(baselines) <= set(SCENARIOS)
+        for baseline in baselines.values():
+            assert "invocation" in baseline["stages"]
+
+
+@pytest.mark.slow
+class TestBenchmarkRun:
+    """Runs of the harness against the simulated backend"""
+
+    def test_run_scenario(self):
+        """Test that every handler stage gets percentiles and peak RSS"""
+        import os
+        from benchmark import run_scenario
+        from simulated_aws import SimulationConfig
+
+        environment = dict(os.environ)
+        config = SimulationConfig(
+            services=20,
+            ec2_instances=100,
+            rds_instances=5,
+            s3_buckets=5,
+            lambda_functions=60,
+            latency=0.001,
+            latency_jitter=0,
+        )
+
+        summary = run_scenario("small", iterations=3, warmup=1, config=config)
+
+        assert dict(os.environ) == environment
+        assert {"invocation", "cost_data", "resources", "format", "notify"} <= set(
+            summary
+        )
+        for values in summary.values():
+            assert values["p50_ms"] <= values["p90_ms"] <= values["p99_ms"]
+            assert values["peak_rss_mb"] > 0
+
+    def test_main_save_and_compare(self, tmp_path, capsys):
+        """Test the command line baseline round trip"""
+        from benchmark import load_baselines, main
+
+        path = str(tmp_path / "baselines.json")
+
+        missing = main(["--iterations", "1", "--compare", "--baseline-file", path])
+        saved = main(["--iterations", "1", "--save-baseline", "--baseline-file", path])
+
+        assert (missing, saved) == (1, 0)
+        assert "small" in load_baselines(path)
+        output = capsys.readouterr().out
+        assert "No baseline for scenario small" in output
+        assert "Baseline saved" in output
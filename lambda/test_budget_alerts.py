@@ -0,0 +1,193 @@
+"""
+Unit tests for the hourly budget alerts.
+"""
+
+import json
+import pytest
+import time
+from datetime import date
+from decimal import Decimal
+from unittest.mock import Mock
+
+TODAY = date(2024, 3, 1)
+
+
+def _ce(services):
+    """Cost Explorer mock returning today's costs grouped by service"""
+    ce = Mock()
+    ce.get_cost_and_usage.return_value = {
+        "ResultsByTime": [
+            {
+                "TimePeriod": {"Start": "2024-03-01", "End": "2024-03-02"},
+                "Total": {
+                    "UnblendedCost": {
+                        "Amount": str(sum(Decimal(a) for a in services.values()))
+                    }
+                },
+                "Groups": [
+                    {
+                        "Keys": [service],
+                        "Metrics": {"UnblendedCost": {"Amount": amount}},
+                    }
+                    for service, amount in services.items()
+                ],
+                "Estimated": True,
+            }
+        ]
+    }
+    return ce
+
+
+@pytest.mark.unit
+class TestBudgets:
+    """Tests for reading and checking budgets"""
+
+    def test_parse_budgets(self):
+        """Test the environment values"""
+        from budget_alerts import parse_budgets
+
+        budgets = parse_budgets("100", '{"Amazon EC2": 40, "AWS Lambda": "0"}')
+
+        assert budgets.total == Decimal("100")
+        assert budgets.services == {"Amazon EC2": Decimal("40")}
+        assert not parse_budgets("0", "{}")
+        assert not parse_budgets(None, "")
+        with pytest.raises(ValueError, match="Amazon EC2"):
+            parse_budgets(None, '{"Amazon EC2": -1}')
+        with pytest.raises(ValueError):
+            parse_budgets("abc")
+
+    def test_one_request_for_today(self):
+        """Test that today is fetched with one DAILY request"""
+        from budget_alerts import fetch_today_costs
+
+        ce = _ce({"Amazon EC2": "30.50", "AWS Lambda": "1.25"})
+
+        total, services = fetch_today_costs(ce, TODAY)
+
+        assert total == Decimal("31.75")
+        assert services["Amazon EC2"] == Decimal("30.50")
+        ce.get_cost_and_usage.assert_called_once()
+        kwargs = ce.get_cost_and_usage.call_args.kwargs
+        assert kwargs["TimePeriod"] == {"Start": "2024-03-01", "End": "2024-03-02"}
+        assert kwargs["Granularity"] == "DAILY"
+
+    def test_total_only_is_not_grouped(self):
+        """Test that a total budget alone does not group by service"""
+        from budget_alerts import fetch_today_costs
+        from simulated_aws import SimulatedBackend, SimulationConfig
+
+        backend = SimulatedBackend(SimulationConfig(latency=0, latency_jitter=0))
+
+        total, services = fetch_today_costs(
+            backend.client("ce"), TODAY, by_service=False
+        )
+
+        assert total > 0
+        assert services == {}
+        assert backend.calls["ce.GetCostAndUsage"] == 1
+
+    def test_check_budgets(self):
+        """Test that reached budgets are returned, the total first"""
+        from budget_alerts import TOTAL, Budgets, check_budgets
+
+        budgets = Budgets(
+            Decimal("30"),
+            {"Amazon EC2": Decimal("20"), "AWS Lambda": Decimal("5")},
+        )
+        services = {"Amazon EC2": Decimal("30.50"), "AWS Lambda": Decimal("1.25")}
+
+        breaches = check_budgets(Decimal("31.75"), services, budgets)
+
+        assert [breach.name for breach in breaches] == [TOTAL, "Amazon EC2"]
+        assert check_budgets(Decimal("1"), {}, budgets) == []
+
+    def test_format_alert(self):
+        """Test the alert message"""
+        from budget_alerts import TOTAL, Breach, format_alert
+
+        message = format_alert(
+            [
+                Breach(TOTAL, Decimal("150"), Decimal("100")),
+                Breach("Amazon EC2", Decimal("45.5"), Decimal("40")),
+            ],
+            TODAY,
+        )
+
+        assert message.startswith("=== AWS 予算アラート ===")
+        assert "  合計: $150.00 / 予算 $100.00 (150%)" in message
+        assert "  Amazon EC2: $45.50 / 予算 $40.00 (114%)" in message
+
+
+@pytest.mark.integration
+class TestBudgetAlertMode:
+    """Tests for the budget_alert mode of lambda_handler"""
+
+    @pytest.fixture
+    def alerts(self, monkeypatch, mock_environment, tmp_path):
+        import cost_notifier
+
+        monkeypatch.setenv("BUDGET_TOTAL", "30")
+        monkeypatch.setenv("BUDGET_SERVICES", json.dumps({"Amazon EC2": 20}))
+        monkeypatch.setenv("COST_CACHE_DIR", str(tmp_path))
+        monkeypatch.delenv("COST_CACHE_BUCKET", raising=False)
+        monkeypatch.setattr(cost_notifier, "_cache_backend", None)
+        sns = Mock()
+        sns.publish.return_value = {"MessageId": "alert-message-id"}
+        monkeypatch.setattr(cost_notifier, "sns_client", sns)
+        monkeypatch.setattr(
+            cost_notifier, "ce_client", _ce({"Amazon EC2": "30.50", "AWS Lambda": "1"})
+        )
+        return cost_notifier
+
+    def test_alerts_once_per_day(self, alerts, monkeypatch):
+        """Test that a crossed budget is alerted once, and a new one again"""
+        event = {"mode": "budget_alert"}
+
+        start = time.perf_counter()
+        first = alerts.lambda_handler(event, None)
+        elapsed = time.perf_counter() - start
+        second = alerts.lambda_handler(event, None)
+
+        assert first["body"] == json.dumps("Budget alert sent")
+        assert second["body"] == json.dumps("Already alerted today")
+        assert elapsed < 1.0
+        assert alerts.ce_client.get_cost_and_usage.call_count == 2
+        publish = alerts.sns_client.publish
+        assert publish.call_count == 1
+        assert publish.call_args.kwargs["Subject"].startswith("AWS Budget Alert - ")
+        assert "Amazon EC2: $30.50" in publish.call_args.kwargs["Message"]
+
+        monkeypatch.setenv("BUDGET_SERVICES", json.dumps({"AWS Lambda": 1}))
+        third = alerts.lambda_handler(event, None)
+
+        assert third["statusCode"] == 200
+        assert publish.call_count == 2
+        message = publish.call_args.kwargs["Message"]
+        assert "AWS Lambda" in message
+        assert "合計" not in message
+
+    def test_within_budget(self, alerts, monkeypatch):
+        """Test that nothing is sent below the budgets"""
+        monkeypatch.setenv("BUDGET_TOTAL", "100")
+        monkeypatch.setenv("BUDGET_SERVICES", "")
+
+        response = alerts.lambda_handler({"mode": "budget_alert"}, None)
+
+        assert response["body"] == json.dumps("Within budget")
+        alerts.sns_client.publish.assert_not_called()
+        kwargs = alerts.ce_client.get_cost_and_usage.call_args.kwargs
+        assert "GroupBy" not in kwargs
+
+    def test_failed_alert_is_retried(self, alerts):
+        """Test that an alert that could not be sent is sent the next hour"""
+        alerts.sns_client.publish.side_effect = [
+            Exception("Throttled"),
+            {"MessageId": "alert-message-id"},
+        ]
+
+        first = alerts.lambda_handler({"mode": "budget_alert"}, None)
+        second = alerts.lambda_handler({"mode": "budget_alert"}, None)
+
+        assert first["statusCode"] == 500
+        assert second["body"] == json.dumps("Budget alert sent")
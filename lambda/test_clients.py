@@ -0,0 +1,205 @@
+"""
+Unit tests for the lazy client registry, plus a cold-start benchmark.
+"""
+
+import os
+import subprocess  # nosec B404
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+
+LAMBDA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SERVICE_CLIENTS = (
+    "ce_client",
+    "sns_client",
+    "ec2_client",
+    "rds_client",
+    "s3_client",
+    "lambda_client",
+)
+
+
+def _fake_session_factory():
+    """Session factory whose sessions hand out one MagicMock per call"""
+    factory = MagicMock()
+    factory.return_value.client.side_effect = lambda service_name, **kwargs: (
+        MagicMock(name=service_name)
+    )
+    return factory
+
+
+@pytest.mark.unit
+class TestClientRegistry:
+    """Tests for ClientRegistry"""
+
+    def test_clients_are_memoized(self):
+        """Test that each client is created once and reused"""
+        from clients import ClientRegistry
+
+        factory = _fake_session_factory()
+        registry = ClientRegistry(session_factory=factory)
+
+        first = registry.client("ce")
+        second = registry.client("ce")
+
+        assert first is second
+        factory.return_value.client.assert_called_once_with("ce", region_name=None)
+
+    def test_clients_share_one_session(self):
+        """Test that all services are created from the same session"""
+        from clients import ClientRegistry
+
+        factory = _fake_session_factory()
+        registry = ClientRegistry(session_factory=factory)
+
+        registry.client("ce")
+        registry.client("sns")
+        registry.client("ec2", region_name="ap-northeast-1")
+
+        factory.assert_called_once()
+        assert registry.created() == ["ce", "sns", "ec2"]
+
+    def test_regions_get_separate_clients(self):
+        """Test that a client is memoized per service and region"""
+        from clients import ClientRegistry
+
+        registry = ClientRegistry(session_factory=_fake_session_factory())
+
+        assert registry.client("ec2", "us-east-1") is not registry.client(
+            "ec2", "eu-west-1"
+        )
+
+    def test_concurrent_first_use_creates_one_client(self):
+        """Test that racing threads still create the client only once"""
+        from concurrent.futures import ThreadPoolExecutor
+        from clients import ClientRegistry
+
+        factory = _fake_session_factory()
+        registry = ClientRegistry(session_factory=factory)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(lambda _: registry.client("ce"), range(32)))
+
+        assert all(client is clients[0] for client in clients)
+        assert factory.return_value.client.call_count == 1
+
+    def test_reset(self):
+        """Test that reset drops the memoized clients"""
+        from clients import ClientRegistry
+
+        registry = ClientRegistry(session_factory=_fake_session_factory())
+        first = registry.client("ce")
+
+        registry.reset()
+
+        assert registry.created() == []
+        assert registry.client("ce") is not first
+
+    def test_default_session_has_connection_pool_config(self):
+        """Test that real clients get the shared connection pool settings"""
+        from clients import MAX_POOL_CONNECTIONS, ClientRegistry
+
+        registry = ClientRegistry()
+
+        client = registry.client("ce", region_name="us-east-1")
+
+        assert client.meta.config.max_pool_connections == MAX_POOL_CONNECTIONS
+
+
+@pytest.mark.unit
+class TestLazyClient:
+    """Tests for LazyClient"""
+
+    def test_no_client_until_first_use(self):
+        """Test that the client is created on first attribute access"""
+        from clients import ClientRegistry, LazyClient
+
+        factory = _fake_session_factory()
+        registry = ClientRegistry(session_factory=factory)
+        lazy = LazyClient("sns", registry)
+
+        assert registry.created() == []
+
+        lazy.publish(TopicArn="arn", Message="hi")
+
+        assert registry.created() == ["sns"]
+        registry.client("sns").publish.assert_called_once_with(
+            TopicArn="arn", Message="hi"
+        )
+
+    def test_import_creates_no_clients(self):
+        """Test that importing cost_notifier does not create any client"""
+        code = (
+            "import clients, cost_notifier\n"
+            "assert clients.registry.created() == [], clients.registry.created()\n"
+        )
+
+        subprocess.run(  # nosec B603
+            [sys.executable, "-c", code], cwd=LAMBDA_DIR, check=True
+        )
+
+    def test_lambda_handler_without_topic_creates_no_clients(
+        self, monkeypatch, mock_environment
+    ):
+        """Test that an early exit does not pay for client creation"""
+        import clients
+        from clients import ClientRegistry
+        from cost_notifier import lambda_handler
+
+        monkeypatch.delenv("SNS_TOPIC_ARN")
+        registry = ClientRegistry(session_factory=_fake_session_factory())
+
+        with patch.object(clients, "registry", registry):
+            response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 500
+        assert registry.created() == []
+
+
+_COLD_START_SCRIPT = """
+import time
+start = time.perf_counter()
+import cost_notifier
+imported = time.perf_counter()
+if {eager}:
+    for name in {clients!r}:
+        getattr(cost_notifier, name).meta
+print(imported - start, time.perf_counter() - start)
+"""
+
+
+def _cold_start(eager):
+    """Time a fresh interpreter importing cost_notifier"""
+    env = dict(os.environ, AWS_DEFAULT_REGION="us-east-1")
+    result = subprocess.run(  # nosec B603
+        [
+            sys.executable,
+            "-c",
+            _COLD_START_SCRIPT.format(eager=eager, clients=SERVICE_CLIENTS),
+        ],
+        cwd=LAMBDA_DIR,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return [float(value) for value in result.stdout.split()]
+
+
+@pytest.mark.slow
+class TestColdStartBenchmark:
+    """Cold-start benchmark of lazy against eager client construction"""
+
+    def test_lazy_import_is_faster_than_eager_clients(self):
+        """Test that import without clients beats creating all six up front"""
+        lazy = min(_cold_start(eager=False)[1] for _ in range(3))
+        eager = min(_cold_start(eager=True)[1] for _ in range(3))
+
+        print(
+            f"\ncold start: lazy import {lazy * 1000:.0f}ms, "
+            f"import + 6 clients {eager * 1000:.0f}ms, "
+            f"saved {(eager - lazy) * 1000:.0f}ms"
+        )
+
+        assert lazy < eager
@@ -0,0 +1,328 @@
+"""
+Unit tests for the Cost Explorer result cache.
+"""
+
+import io
+import json
+import pytest
+from datetime import date, datetime, timedelta
+from unittest.mock import Mock
+
+
+class DailyCostExplorer:
+    """Fake Cost Explorer client answering every requested day"""
+
+    def __init__(self):
+        self.requests = []
+
+    def get_cost_and_usage(self, TimePeriod, **kwargs):
+        self.requests.append((TimePeriod["Start"], TimePeriod["End"]))
+        start = date.fromisoformat(TimePeriod["Start"])
+        end = date.fromisoformat(TimePeriod["End"])
+        results = []
+        day = start
+        while day < end:
+            results.append(
+                {
+                    "TimePeriod": {
+                        "Start": day.isoformat(),
+                        "End": (day + timedelta(days=1)).isoformat(),
+                    },
+                    "Groups": [
+                        {
+                            "Keys": ["AmazonEC2"],
+                            "Metrics": {
+                                "UnblendedCost": {"Amount": "1.00", "Unit": "USD"}
+                            },
+                        }
+                    ],
+                }
+            )
+            day += timedelta(days=1)
+        return {"ResultsByTime": results}
+
+
+@pytest.fixture
+def cost_cache(tmp_path):
+    """Cost cache backed by a temporary directory"""
+    from cost_cache import CostCache, LocalFileCacheBackend
+
+    return CostCache(LocalFileCacheBackend(str(tmp_path / "cache")))
+
+
+@pytest.mark.unit
+class TestLocalFileCacheBackend:
+    """Tests for LocalFileCacheBackend"""
+
+    def test_round_trip(self, tmp_path):
+        """Test that stored values are read back"""
+        from cost_cache import LocalFileCacheBackend
+
+        backend = LocalFileCacheBackend(str(tmp_path))
+        backend.put("DAILY/DIMENSION:SERVICE/2024-01-01", {"Groups": []})
+
+        assert backend.get("DAILY/DIMENSION:SERVICE/2024-01-01") == {"Groups": []}
+        assert backend.keys() == ["DAILY/DIMENSION:SERVICE/2024-01-01"]
+
+    def test_missing_key(self, tmp_path):
+        """Test that a missing key reads as None"""
+        from cost_cache import LocalFileCacheBackend
+
+        backend = LocalFileCacheBackend(str(tmp_path))
+
+        assert backend.get("missing") is None
+
+    def test_delete(self, tmp_path):
+        """Test that deleted keys disappear and deleting twice is harmless"""
+        from cost_cache import LocalFileCacheBackend
+
+        backend = LocalFileCacheBackend(str(tmp_path))
+        backend.put("key", {})
+        backend.delete("key")
+        backend.delete("key")
+
+        assert backend.keys() == []
+
+
+@pytest.mark.unit
+class TestS3CacheBackend:
+    """Tests for S3CacheBackend"""
+
+    def test_put_and_get(self):
+        """Test that values are stored as JSON objects under the prefix"""
+        from cost_cache import S3CacheBackend
+
+        client = Mock()
+        client.get_object.return_value = {"Body": io.BytesIO(b'{"Groups": []}')}
+        backend = S3CacheBackend("cache-bucket", prefix="cache/", client=client)
+
+        backend.put("DAILY/NONE/2024-01-01", {"Groups": []})
+        value = backend.get("DAILY/NONE/2024-01-01")
+
+        put_args = client.put_object.call_args[1]
+        assert put_args["Bucket"] == "cache-bucket"
+        assert put_args["Key"] == "cache/DAILY/NONE/2024-01-01"
+        assert json.loads(put_args["Body"]) == {"Groups": []}
+        assert value == {"Groups": []}
+
+    def test_get_missing_key(self):
+        """Test that a missing object reads as None"""
+        from cost_cache import S3CacheBackend
+
+        client = Mock()
+        client.exceptions.NoSuchKey = KeyError
+        client.get_object.side_effect = KeyError("missing")
+        backend = S3CacheBackend("cache-bucket", client=client)
+
+        assert backend.get("missing") is None
+
+    def test_keys_strip_prefix(self):
+        """Test that listed keys are returned without the prefix"""
+        from cost_cache import S3CacheBackend
+        from conftest import paginated_client
+
+        client = paginated_client(
+            "list_objects_v2",
+            [{"Contents": [{"Key": "cache/a"}, {"Key": "cache/b"}]}, {}],
+        )
+        backend = S3CacheBackend("cache-bucket", prefix="cache/", client=client)
+
+        assert backend.keys() == ["a", "b"]
+
+
+@pytest.mark.unit
+class TestCostCache:
+    """Tests for CostCache"""
+
+    def test_settled_days(self, cost_cache):
+        """Test that only days past the settle window are settled"""
+        today = date(2024, 1, 10)
+
+        assert cost_cache.is_settled(date(2024, 1, 6), today)
+        assert not cost_cache.is_settled(date(2024, 1, 7), today)
+
+    def test_hit_and_miss_counters(self, cost_cache):
+        """Test that lookups count hits and misses"""
+        from cost_notifier import COST_GROUP_BY
+
+        day = date(2024, 1, 1)
+        cost_cache.get(day, "DAILY", COST_GROUP_BY)
+        cost_cache.put(day, "DAILY", COST_GROUP_BY, {"Groups": []})
+        cost_cache.get(day, "DAILY", COST_GROUP_BY)
+
+        assert (cost_cache.hits, cost_cache.misses) == (1, 1)
+
+    def test_key_includes_granularity_and_group_by(self, cost_cache):
+        """Test that different queries for the same day do not collide"""
+        day = date(2024, 1, 1)
+        service = [{"Type": "DIMENSION", "Key": "SERVICE"}]
+        tag = [{"Type": "TAG", "Key": "team"}]
+        cost_cache.put(day, "DAILY", service, {"Groups": ["service"]})
+
+        assert cost_cache.get(day, "DAILY", tag) is None
+        assert cost_cache.get(day, "MONTHLY", service) is None
+
+    def test_namespaces_share_counters_not_entries(self, cost_cache):
+        """Test that namespaced views keep separate entries and shared stats"""
+        day = date(2024, 1, 1)
+        account_a = cost_cache.namespaced("111111111111")
+        account_b = cost_cache.namespaced("222222222222")
+        account_a.put(day, "DAILY", [], {"Groups": []})
+
+        assert account_b.get(day, "DAILY", []) is None
+        assert account_a.get(day, "DAILY", []) == {"Groups": []}
+        assert (cost_cache.hits, cost_cache.misses) == (1, 1)
+
+    def test_evict_removes_old_entries(self, tmp_path):
+        """Test that entries older than the maximum age are evicted"""
+        from cost_cache import CostCache, LocalFileCacheBackend
+
+        cache = CostCache(LocalFileCacheBackend(str(tmp_path)), max_age_days=30)
+        cache.put(date(2024, 1, 1), "DAILY", [], {"Groups": []})
+        cache.namespaced("111111111111").put(date(2024, 1, 2), "DAILY", [], {})
+        cache.put(date(2024, 3, 1), "DAILY", [], {"Groups": []})
+
+        evicted = cache.evict(date(2024, 3, 10))
+
+        assert evicted == 2
+        assert cache.backend.keys() == ["DAILY/NONE/2024-03-01"]
+
+    def test_evict_leaves_other_state(self):
+        """Test that eviction only touches the cache's own keys"""
+        from cost_cache import CostCache, MemoryCacheBackend
+
+        backend = MemoryCacheBackend()
+        for key in (
+            "snapshots/2024-01-01",
+            "budget-alerts/2024-01-01",
+            "anomaly/baseline",
+            "111111111111/reports/2024-01-01",
+        ):
+            backend.put(key, {})
+        cache = CostCache(backend, max_age_days=30)
+        cache.put(date(2024, 1, 1), "DAILY", [], {})
+        account = cache.namespaced("111111111111")
+        account.put(date(2024, 1, 1), "MONTHLY", [], {})
+        cache.namespaced("222222222222").put(date(2024, 1, 1), "DAILY", [], {})
+
+        assert account.evict(date(2024, 3, 10)) == 1
+        assert cache.evict(date(2024, 3, 10)) == 2
+        assert sorted(backend.keys()) == [
+            "111111111111/reports/2024-01-01",
+            "anomaly/baseline",
+            "budget-alerts/2024-01-01",
+            "snapshots/2024-01-01",
+        ]
+
+
+@pytest.mark.unit
+class TestGetCostDataWithCache:
+    """Tests for get_cost_data with a cost cache"""
+
+    def test_first_run_fetches_whole_window(self, cost_cache):
+        """Test that an empty cache fetches the window in one request"""
+        from cost_notifier import get_cost_data
+
+        ce = DailyCostExplorer()
+
+        result = get_cost_data(days=30, ce=ce, cache=cost_cache)
+
+        assert len(ce.requests) == 1
+        assert len(result["ResultsByTime"]) == 30
+        assert cost_cache.misses == 27
+        assert len(cost_cache.backend.keys()) == 27
+
+    def test_second_run_fetches_only_recent_days(self, cost_cache):
+        """Test that settled days are served from the cache"""
+        from cost_notifier import get_cost_data
+
+        get_cost_data(days=30, ce=DailyCostExplorer(), cache=cost_cache)
+        ce = DailyCostExplorer()
+
+        result = get_cost_data(days=30, ce=ce, cache=cost_cache)
+
+        today = datetime.now().date()
+        assert ce.requests == [
+            ((today - timedelta(days=3)).isoformat(), today.isoformat())
+        ]
+        assert cost_cache.hits == 27
+        dates = [entry["TimePeriod"]["Start"] for entry in result["ResultsByTime"]]
+        assert dates == sorted(dates)
+        assert len(dates) == 30
+
+    def test_gaps_are_fetched_as_ranges(self, cost_cache):
+        """Test that missing settled days are fetched in contiguous ranges"""
+        from cost_notifier import get_cost_data
+
+        get_cost_data(days=30, ce=DailyCostExplorer(), cache=cost_cache)
+        today = datetime.now().date()
+        for offset in (10, 11, 20):
+            day = (today - timedelta(days=offset)).isoformat()
+            cost_cache.backend.delete(f"DAILY/DIMENSION:SERVICE/{day}")
+        ce = DailyCostExplorer()
+
+        get_cost_data(days=30, ce=ce, cache=cost_cache)
+
+        assert ce.requests == [
+            (
+                (today - timedelta(days=20)).isoformat(),
+                (today - timedelta(days=19)).isoformat(),
+            ),
+            (
+                (today - timedelta(days=11)).isoformat(),
+                (today - timedelta(days=9)).isoformat(),
+            ),
+            ((today - timedelta(days=3)).isoformat(), today.isoformat()),
+        ]
+
+    def test_cached_result_matches_uncached(self, cost_cache):
+        """Test that the cached path returns the same days as a direct fetch"""
+        from cost_notifier import get_cost_data
+
+        uncached = get_cost_data(days=14, ce=DailyCostExplorer())
+        get_cost_data(days=14, ce=DailyCostExplorer(), cache=cost_cache)
+        cached = get_cost_data(days=14, ce=DailyCostExplorer(), cache=cost_cache)
+
+        assert cached["ResultsByTime"] == uncached["ResultsByTime"]
+
+    def test_cache_errors_are_reported_as_missing_data(self):
+        """Test that a failing backend degrades like any other cost error"""
+        from cost_cache import CostCache, CacheBackend
+        from cost_notifier import get_cost_data
+
+        result = get_cost_data(
+            days=7, ce=DailyCostExplorer(), cache=CostCache(CacheBackend())
+        )
+
+        assert result is None
+
+
+@pytest.mark.unit
+class TestGetCostCache:
+    """Tests for the environment-configured cost cache"""
+
+    def test_no_cache_configured(self, monkeypatch):
+        """Test that no cache is used without configuration"""
+        import cost_notifier
+
+        monkeypatch.delenv("COST_CACHE_BUCKET", raising=False)
+        monkeypatch.delenv("COST_CACHE_DIR", raising=False)
+        monkeypatch.setattr(cost_notifier, "_cache_backend", None)
+        monkeypatch.setattr(cost_notifier, "_cost_cache", None)
+
+        assert cost_notifier._get_cost_cache() is None
+
+    def test_local_cache_configured(self, monkeypatch, tmp_path):
+        """Test that COST_CACHE_DIR selects the local file backend"""
+        import cost_notifier
+        from cost_cache import LocalFileCacheBackend
+
+        monkeypatch.delenv("COST_CACHE_BUCKET", raising=False)
+        monkeypatch.setenv("COST_CACHE_DIR", str(tmp_path))
+        monkeypatch.setattr(cost_notifier, "_cache_backend", None)
+        monkeypatch.setattr(cost_notifier, "_cost_cache", None)
+
+        cache = cost_notifier._get_cost_cache()
+
+        assert isinstance(cache.backend, LocalFileCacheBackend)
+        assert cost_notifier._get_cost_cache() is cache
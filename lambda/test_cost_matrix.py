@@ -0,0 +1,205 @@
+"""
+Unit tests for the NumPy-backed cost matrix and trend analytics.
+"""
+
+import pytest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+np = pytest.importorskip("numpy")
+
+
+def _cost_data(daily_costs):
+    """Build ResultsByTime from {service: [cost per day]}"""
+    days = len(next(iter(daily_costs.values())))
+    start = date(2024, 1, 1)
+    return {
+        "ResultsByTime": [
+            {
+                "TimePeriod": {
+                    "Start": (start + timedelta(days=offset)).isoformat(),
+                    "End": (start + timedelta(days=offset + 1)).isoformat(),
+                },
+                "Groups": [
+                    {
+                        "Keys": [service],
+                        "Metrics": {
+                            "UnblendedCost": {
+                                "Amount": f"{costs[offset]:.2f}",
+                                "Unit": "USD",
+                            }
+                        },
+                    }
+                    for service, costs in daily_costs.items()
+                ],
+            }
+            for offset in range(days)
+        ]
+    }
+
+
+@pytest.mark.unit
+class TestCostMatrix:
+    """Tests for CostMatrix"""
+
+    def test_from_cost_data(self, mock_cost_response):
+        """Test that groups land in their date and service cells"""
+        from cost_matrix import CostMatrix
+
+        matrix = CostMatrix.from_cost_data(mock_cost_response)
+
+        assert matrix.dates == ["2024-01-01", "2024-01-02"]
+        assert matrix.services == ["AmazonEC2", "AmazonRDS", "AmazonS3"]
+        np.testing.assert_allclose(
+            matrix.values, [[10.50, 5.25, 0.50], [11.00, 0.0, 0.0]]
+        )
+
+    def test_from_cost_data_sorts_dates(self, mock_cost_response):
+        """Test that days are put in date order"""
+        from cost_matrix import CostMatrix
+
+        reversed_data = {"ResultsByTime": mock_cost_response["ResultsByTime"][::-1]}
+
+        matrix = CostMatrix.from_cost_data(reversed_data)
+
+        assert matrix.dates == ["2024-01-01", "2024-01-02"]
+        np.testing.assert_allclose(matrix.daily_totals(), [16.25, 11.00])
+
+    def test_from_cost_data_empty(self, mock_empty_cost_response):
+        """Test that an empty response gives an empty matrix"""
+        from cost_matrix import CostMatrix
+
+        matrix = CostMatrix.from_cost_data(mock_empty_cost_response)
+
+        assert matrix.values.shape == (0, 0)
+        assert len(matrix.rolling_mean()) == 0
+        assert matrix.week_over_week() is None
+
+    def test_daily_totals_match_decimal_aggregation(self):
+        """Test that float totals agree with the exact Decimal aggregation"""
+        from aggregation import aggregate_costs
+        from cost_matrix import CostMatrix
+
+        cost_data = _cost_data(
+            {
+                f"Service{i}": [(i * 7 + d) % 13 + 0.37 for d in range(60)]
+                for i in range(20)
+            }
+        )
+
+        matrix = CostMatrix.from_cost_data(cost_data)
+        summary = aggregate_costs(cost_data)
+
+        np.testing.assert_allclose(
+            matrix.daily_totals(), [float(v) for v in summary.daily_totals.values()]
+        )
+
+    def test_rolling_mean(self):
+        """Test the rolling mean of daily totals"""
+        from cost_matrix import CostMatrix
+
+        matrix = CostMatrix.from_cost_data(_cost_data({"A": list(range(1, 11))}))
+
+        np.testing.assert_allclose(matrix.rolling_mean(window=3), range(2, 10))
+
+    def test_week_over_week(self):
+        """Test per-service sums of the last two weeks"""
+        from cost_matrix import CostMatrix
+
+        matrix = CostMatrix.from_cost_data(
+            _cost_data({"A": [1.0] * 7 + [2.0] * 7, "B": [3.0] * 14})
+        )
+
+        current, previous = matrix.week_over_week()
+
+        np.testing.assert_allclose(current, [14.0, 21.0])
+        np.testing.assert_allclose(previous, [7.0, 21.0])
+
+    def test_service_zscores_flag_spike(self):
+        """Test that a spike on the latest day gets a high z-score"""
+        from cost_matrix import CostMatrix
+
+        steady = [10.0, 11.0, 9.0, 10.0, 11.0, 9.0, 10.0]
+        matrix = CostMatrix.from_cost_data(
+            _cost_data({"Steady": steady + [10.0], "Spiky": steady + [40.0]})
+        )
+
+        zscores = matrix.service_zscores()
+
+        assert abs(zscores[0]) < 1
+        assert zscores[1] > 10
+
+    def test_service_zscores_constant_history(self):
+        """Test that services without variance get a zero z-score"""
+        from cost_matrix import CostMatrix
+
+        matrix = CostMatrix.from_cost_data(_cost_data({"Flat": [5.0] * 8}))
+
+        assert matrix.service_zscores().tolist() == [0.0]
+
+
+@pytest.mark.unit
+class TestFormatTrendSection:
+    """Tests for format_trend_section function"""
+
+    def test_trend_section_contents(self):
+        """Test the rolling average, weekly comparison and outliers"""
+        from cost_matrix import CostMatrix, format_trend_section
+
+        steady = [10.0, 11.0, 9.0] * 5
+        matrix = CostMatrix.from_cost_data(
+            _cost_data({"Steady": steady, "Spiky": steady[:-1] + [60.0]})
+        )
+
+        title, lines = format_trend_section(matrix)
+
+        assert title == "📉 トレンド分析"
+        assert any(line.startswith("7日移動平均") for line in lines)
+        assert any(line.startswith("週次比較") for line in lines)
+        assert any(line.startswith("  Spiky: z=+") for line in lines)
+
+    def test_trend_section_short_window(self, mock_cost_response):
+        """Test the note shown when there is too little data"""
+        from cost_matrix import CostMatrix, format_trend_section
+
+        _, lines = format_trend_section(CostMatrix.from_cost_data(mock_cost_response))
+
+        assert lines == ["トレンド分析には最低7日分のデータが必要です。"]
+
+    def test_lambda_handler_adds_trend_section(
+        self, mock_environment, monkeypatch, mock_sns_client, mock_resource_data
+    ):
+        """Test that the handler adds the section when enabled"""
+        monkeypatch.setenv("ENABLE_TREND_ANALYTICS", "true")
+        cost_data = _cost_data({"AmazonEC2": [10.0] * 14})
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.get_cost_data", return_value=cost_data
+        ), patch("cost_notifier.get_resource_counts", return_value=mock_resource_data):
+            from cost_notifier import lambda_handler
+
+            response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        assert "トレンド分析" in mock_sns_client.publish.call_args[1]["Message"]
+
+    def test_lambda_handler_without_numpy(
+        self, mock_environment, monkeypatch, mock_sns_client, mock_resource_data
+    ):
+        """Test that the report is still sent when NumPy is missing"""
+        monkeypatch.setenv("ENABLE_TREND_ANALYTICS", "true")
+        cost_data = _cost_data({"AmazonEC2": [10.0] * 14})
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.get_cost_data", return_value=cost_data
+        ), patch(
+            "cost_notifier.get_resource_counts", return_value=mock_resource_data
+        ), patch(
+            "cost_matrix.np", None
+        ):
+            from cost_notifier import lambda_handler
+
+            response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        assert "トレンド分析" not in mock_sns_client.publish.call_args[1]["Message"]
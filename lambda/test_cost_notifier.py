@@ -5,6 +5,8 @@ Tests all functions with mocked AWS services.
 
 import pytest
 import json
+import time
+import tracemalloc
 from unittest.mock import patch, Mock
 from decimal import Decimal
 
@@ -62,6 +64,205 @@ class TestGetCostData:
             assert result["ResultsByTime"] == []
 
 
+@pytest.mark.unit
+class TestGetCostDataPagination:
+    """Tests for NextPageToken handling and date-range sharding"""
+
+    def _groups_by_date(self, result):
+        return {
+            entry["TimePeriod"]["Start"]: [
+                (group["Keys"][0], group["Metrics"]["UnblendedCost"]["Amount"])
+                for group in entry["Groups"]
+            ]
+            for entry in result["ResultsByTime"]
+        }
+
+    def test_get_cost_data_follows_next_page_token(self):
+        """Test that every page is fetched and split days are merged"""
+        from conftest import PagedCostExplorer
+        from cost_notifier import get_cost_data
+
+        ce = PagedCostExplorer(services=7, page_size=5)
+
+        result = get_cost_data(days=10, ce=ce)
+
+        assert len(ce.requests) == 14
+        assert len(result["ResultsByTime"]) == 10
+        assert all(len(entry["Groups"]) == 7 for entry in result["ResultsByTime"])
+        assert "NextPageToken" not in result
+
+    def test_get_cost_data_sharded_matches_unsharded(self):
+        """Test that sharded results are merged back in date order"""
+        from conftest import PagedCostExplorer
+        from cost_notifier import get_cost_data
+
+        unsharded = get_cost_data(days=30, ce=PagedCostExplorer(page_size=25))
+        ce = PagedCostExplorer(page_size=25)
+        sharded = get_cost_data(days=30, ce=ce, shard_days=7)
+
+        shard_starts = sorted({start for start, _ in ce.requests})
+        assert len(shard_starts) == 5
+        assert self._groups_by_date(sharded) == self._groups_by_date(unsharded)
+        dates = [entry["TimePeriod"]["Start"] for entry in sharded["ResultsByTime"]]
+        assert dates == sorted(dates)
+
+    def test_shard_ranges_cover_window(self):
+        """Test that shards are consecutive and cover the whole window"""
+        from datetime import date
+        from cost_notifier import _shard_ranges
+
+        shards = _shard_ranges(date(2024, 1, 1), date(2024, 1, 11), 4)
+
+        assert shards == [
+            (date(2024, 1, 1), date(2024, 1, 5)),
+            (date(2024, 1, 5), date(2024, 1, 9)),
+            (date(2024, 1, 9), date(2024, 1, 11)),
+        ]
+
+    def test_get_cost_data_recovers_from_throttling(self):
+        """Test that throttled shard requests are retried until they succeed"""
+        from conftest import PagedCostExplorer
+        from cost_notifier import get_cost_data
+
+        ce = PagedCostExplorer(page_size=50, latency=0.01, max_concurrency=2)
+
+        from cost_notifier import AdaptiveBackoff
+
+        backoff = AdaptiveBackoff(base_delay=0.02, max_attempts=20)
+
+        result = get_cost_data(days=28, ce=ce, shard_days=7, backoff=backoff)
+
+        assert ce.throttled > 0
+        assert backoff.throttled == ce.throttled
+        assert len(result["ResultsByTime"]) == 28
+
+
+@pytest.mark.unit
+class TestAdaptiveBackoff:
+    """Tests for AdaptiveBackoff"""
+
+    def _throttling_error(self):
+        from botocore.exceptions import ClientError
+
+        return ClientError(
+            {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+            "GetCostAndUsage",
+        )
+
+    def test_retries_throttled_calls(self):
+        """Test that throttled calls are retried and the delay adapts"""
+        from cost_notifier import AdaptiveBackoff
+
+        sleeps = []
+        backoff = AdaptiveBackoff(base_delay=1.0, sleep=sleeps.append)
+        func = Mock(side_effect=[self._throttling_error()] * 2 + ["ok"])
+
+        assert backoff.call(func, Key="value") == "ok"
+        assert func.call_count == 3
+        assert backoff.throttled == 2
+        assert len(sleeps) == 2
+        assert backoff.delay == 1.0
+
+    def test_delay_decays_after_success(self):
+        """Test that successful calls shrink the shared delay back to zero"""
+        from cost_notifier import AdaptiveBackoff
+
+        backoff = AdaptiveBackoff(base_delay=1.0, sleep=lambda seconds: None)
+        backoff.delay = 4.0
+
+        for _ in range(3):
+            backoff.call(Mock(return_value="ok"))
+
+        assert backoff.delay == 0.0
+
+    def test_other_errors_are_not_retried(self):
+        """Test that non-throttling errors propagate immediately"""
+        from botocore.exceptions import ClientError
+        from cost_notifier import AdaptiveBackoff
+
+        error = ClientError(
+            {"Error": {"Code": "AccessDeniedException", "Message": "Denied"}},
+            "GetCostAndUsage",
+        )
+        func = Mock(side_effect=error)
+
+        with pytest.raises(ClientError):
+            AdaptiveBackoff(sleep=lambda seconds: None).call(func)
+        assert func.call_count == 1
+
+    def test_gives_up_after_max_attempts(self):
+        """Test that persistent throttling eventually raises"""
+        from botocore.exceptions import ClientError
+        from cost_notifier import AdaptiveBackoff
+
+        func = Mock(side_effect=self._throttling_error())
+
+        with pytest.raises(ClientError):
+            AdaptiveBackoff(max_attempts=3, sleep=lambda seconds: None).call(func)
+        assert func.call_count == 3
+
+    def test_delays_are_capped_by_time_left(self):
+        """Test that no delay runs past the time left"""
+        from cost_notifier import AdaptiveBackoff
+
+        sleeps = []
+        backoff = AdaptiveBackoff(
+            base_delay=10.0, sleep=sleeps.append, time_left=lambda: 0.25
+        )
+        func = Mock(side_effect=[self._throttling_error()] * 3 + ["ok"])
+
+        assert backoff.call(func) == "ok"
+        assert len(sleeps) == 3
+        assert max(sleeps) <= 0.25
+
+    def test_stops_retrying_when_time_is_spent(self):
+        """Test that no attempt starts once the time left is spent"""
+        from botocore.exceptions import ClientError
+        from cost_notifier import AdaptiveBackoff
+
+        # One second left after the first attempt, none after the second
+        left = [1.0]
+        func = Mock(side_effect=self._throttling_error())
+
+        with pytest.raises(ClientError):
+            AdaptiveBackoff(
+                sleep=lambda seconds: None,
+                time_left=lambda: left.pop() if left else 0.0,
+            ).call(func)
+        assert func.call_count == 2
+
+
+@pytest.mark.slow
+class TestGetCostDataPerformance:
+    """Benchmarks for paginated and sharded cost retrieval"""
+
+    def test_sharded_fetch_speedup(self):
+        """Test that concurrent shards beat walking the pages one by one"""
+        from conftest import PagedCostExplorer
+        from cost_notifier import get_cost_data
+
+        ce = PagedCostExplorer(services=40, page_size=100, latency=0.02)
+        start = time.perf_counter()
+        sequential = get_cost_data(days=90, ce=ce)
+        sequential_time = time.perf_counter() - start
+        sequential_requests = len(ce.requests)
+
+        ce = PagedCostExplorer(services=40, page_size=100, latency=0.02)
+        start = time.perf_counter()
+        sharded = get_cost_data(days=90, ce=ce, shard_days=15)
+        sharded_time = time.perf_counter() - start
+
+        print(
+            f"\nget_cost_data 90 days x 40 services: "
+            f"sequential {sequential_time:.3f}s ({sequential_requests} pages), "
+            f"sharded {sharded_time:.3f}s ({len(ce.requests)} pages), "
+            f"speedup {sequential_time / sharded_time:.1f}x"
+        )
+
+        assert sharded["ResultsByTime"] == sequential["ResultsByTime"]
+        assert sharded_time < 0.6 * sequential_time
+
+
 @pytest.mark.unit
 class TestGetResourceCounts:
     """Tests for get_resource_counts function"""
@@ -142,17 +343,15 @@ class TestGetResourceCounts:
 
     def test_get_resource_counts_empty_resources(self):
         """Test resource counts with no resources"""
-        mock_ec2 = Mock()
-        mock_ec2.describe_instances.return_value = {"Reservations": []}
+        from conftest import paginated_client
 
-        mock_rds = Mock()
-        mock_rds.describe_db_instances.return_value = {"DBInstances": []}
+        mock_ec2 = paginated_client("describe_instances", [{"Reservations": []}])
+        mock_rds = paginated_client("describe_db_instances", [{"DBInstances": []}])
 
         mock_s3 = Mock()
         mock_s3.list_buckets.return_value = {"Buckets": []}
 
-        mock_lambda = Mock()
-        mock_lambda.list_functions.return_value = {"Functions": []}
+        mock_lambda = paginated_client("list_functions", [{"Functions": []}])
 
         with patch("cost_notifier.ec2_client", mock_ec2), patch(
             "cost_notifier.rds_client", mock_rds
@@ -171,6 +370,114 @@ class TestGetResourceCounts:
             assert resources["Lambda"]["total_functions"] == 0
 
 
+@pytest.mark.slow
+class TestGetResourceCountsPerformance:
+    """Benchmarks for concurrent resource collection"""
+
+    def test_get_resource_counts_concurrent_speedup(self, slow_resource_clients):
+        """Test that collectors overlap instead of running back to back"""
+        from conftest import RESOURCE_API_LATENCY
+
+        with patch.multiple("cost_notifier", **slow_resource_clients):
+            from cost_notifier import get_resource_counts
+
+            start = time.perf_counter()
+            sequential = get_resource_counts(max_workers=1)
+            sequential_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            concurrent = get_resource_counts()
+            concurrent_time = time.perf_counter() - start
+
+        print(
+            f"\nget_resource_counts: sequential {sequential_time:.3f}s, "
+            f"concurrent {concurrent_time:.3f}s, "
+            f"speedup {sequential_time / concurrent_time:.1f}x"
+        )
+
+        assert concurrent == sequential
+        assert sequential_time >= 4 * RESOURCE_API_LATENCY
+        assert concurrent_time < 2 * RESOURCE_API_LATENCY
+
+    def test_get_resource_counts_preserves_key_order(self, slow_resource_clients):
+        """Test that the result dict keeps the report order of services"""
+        from inventory import REGISTRY
+
+        with patch.multiple("cost_notifier", **slow_resource_clients):
+            from cost_notifier import get_resource_counts
+
+            resources = get_resource_counts()
+
+        assert list(resources)[:4] == ["EC2", "RDS", "S3", "Lambda"]
+        assert list(resources) == [collector.name for collector in REGISTRY]
+
+
+@pytest.mark.slow
+class TestGetResourceCountsLargeAccount:
+    """Synthetic large-account tests for paginated resource counting"""
+
+    PAGE_SIZE = 1000
+
+    def _instance_pages(self, instance_count):
+        """Generate describe_instances pages lazily, like the real paginator"""
+        for offset in range(0, instance_count, self.PAGE_SIZE):
+            size = min(self.PAGE_SIZE, instance_count - offset)
+            yield {
+                "Reservations": [
+                    {
+                        "Instances": [
+                            {
+                                "InstanceId": f"i-{offset + i:017x}",
+                                "State": {
+                                    "Name": "running" if i % 4 else "stopped",
+                                },
+                            }
+                        ]
+                    }
+                    for i in range(size)
+                ]
+            }
+
+    def _count_with_peak_memory(self, instance_count):
+        """Count synthetic instances and return the counts with peak memory"""
+        from conftest import paginated_client
+
+        mock_ec2 = paginated_client("describe_instances", [])
+        mock_ec2.get_paginator("describe_instances").paginate.side_effect = (
+            lambda **kwargs: self._instance_pages(instance_count)
+        )
+
+        from inventory import REGISTRY
+
+        tracemalloc.start()
+        try:
+            counts = REGISTRY["EC2"].collect(mock_ec2)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return counts, peak
+
+    def test_count_50k_instances(self):
+        """Test that counts are exact across all pages of a 50k account"""
+        counts, _ = self._count_with_peak_memory(50_000)
+
+        assert counts == {"total": 50_000, "running": 37_500}
+
+    def test_count_peak_memory_stays_flat(self):
+        """Test that peak memory is bounded by one page, not the account size"""
+        _, small_peak = self._count_with_peak_memory(5_000)
+        _, large_peak = self._count_with_peak_memory(50_000)
+
+        print(
+            f"\npeak memory: 5k instances {small_peak / 1024:.0f} KiB, "
+            f"50k instances {large_peak / 1024:.0f} KiB"
+        )
+
+        assert large_peak < 2 * small_peak
+        assert large_peak < 4 * 1024 * 1024
+
+
 @pytest.mark.unit
 class TestFormatCostMessage:
     """Tests for format_cost_message function"""
@@ -242,6 +549,23 @@ class TestFormatCostMessage:
         # Check for properly formatted currency (2 decimal places)
         assert ".50" in message or ".25" in message or ".00" in message
 
+    def test_format_cost_message_extra_sections(
+        self, mock_cost_response, mock_resource_data
+    ):
+        """Test that extra sections are rendered after the resource information"""
+        from cost_notifier import format_cost_message
+
+        message = format_cost_message(
+            mock_cost_response,
+            mock_resource_data,
+            7,
+            extra_sections=[("🌐 対象アカウント", ["アカウント数: 2"])],
+        )
+
+        assert "🌐 対象アカウント" in message
+        assert message.index("リソース情報") < message.index("アカウント数: 2")
+        assert message.index("アカウント数: 2") < message.index("自動生成")
+
     def test_format_cost_message_different_days(
         self, mock_cost_response, mock_resource_data
     ):
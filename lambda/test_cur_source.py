@@ -0,0 +1,223 @@
+"""
+Unit tests for the CUR Parquet cost source.
+"""
+
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def _write_cur(path, rows, row_group_size=None, **extra_columns):
+    """Write CUR-like rows of (usage start, service, cost) as a Parquet file"""
+    starts, services, costs = zip(*rows)
+    columns = {
+        "line_item_usage_start_date": pa.array(
+            starts, type=pa.timestamp("ms", tz="UTC")
+        ),
+        "product_product_name": pa.array(services, type=pa.string()),
+        "line_item_unblended_cost": pa.array(costs, type=pa.float64()),
+    }
+    columns.update(extra_columns)
+    pq.write_table(pa.table(columns), str(path), row_group_size=row_group_size)
+
+
+def _hourly_rows(start, days, services):
+    """One row per hour, day and service costing $0.25"""
+    rows = []
+    for hour in range(days * 24):
+        at = datetime.combine(start, datetime.min.time(), timezone.utc)
+        at += timedelta(hours=hour)
+        rows += [(at, service, 0.25) for service in services]
+    return rows
+
+
+class _RecordingDataset:
+    """Dataset wrapper that records the scanner arguments"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.schema = dataset.schema
+        self.scanner_kwargs = None
+
+    def scanner(self, **kwargs):
+        self.scanner_kwargs = kwargs
+        return self.dataset.scanner(**kwargs)
+
+
+@pytest.mark.unit
+class TestGetCurCostData:
+    """Tests for get_cur_cost_data function"""
+
+    def test_results_match_cost_explorer_shape(self, tmp_path):
+        """Test that rows are summed per day and service in ResultsByTime"""
+        from aggregation import aggregate_costs
+        from cur_source import get_cur_cost_data
+
+        _write_cur(
+            tmp_path / "part-0.parquet",
+            _hourly_rows(date(2024, 1, 1), 10, ["Amazon EC2", "Amazon S3"]),
+        )
+
+        result = get_cur_cost_data(str(tmp_path), days=7, today=date(2024, 1, 10))
+
+        days = result["ResultsByTime"]
+        assert [r["TimePeriod"]["Start"] for r in days] == [
+            f"2024-01-0{d}" for d in range(3, 10)
+        ]
+        assert days[0]["TimePeriod"]["End"] == "2024-01-04"
+        assert days[0]["Groups"][0] == {
+            "Keys": ["Amazon EC2"],
+            "Metrics": {"UnblendedCost": {"Amount": "6.0000000000", "Unit": "USD"}},
+        }
+        assert aggregate_costs(result).period_total == Decimal("84.00")
+
+    def test_sums_are_exact(self, tmp_path):
+        """Test that float costs sum without float64 rounding"""
+        from cur_source import get_cur_cost_data
+
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        _write_cur(
+            tmp_path / "part-0.parquet",
+            [(start + timedelta(minutes=i), "Amazon S3", 0.1) for i in range(1000)],
+        )
+
+        result = get_cur_cost_data(str(tmp_path), days=1, today=date(2024, 1, 2))
+
+        amount = result["ResultsByTime"][0]["Groups"][0]["Metrics"]["UnblendedCost"]
+        assert sum([0.1] * 1000) != 100
+        assert Decimal(amount["Amount"]) == Decimal("100")
+
+    def test_days_without_rows_are_empty(self, tmp_path):
+        """Test that every day of the period has a result"""
+        from cur_source import get_cur_cost_data
+
+        _write_cur(
+            tmp_path / "part-0.parquet",
+            _hourly_rows(date(2024, 1, 5), 1, ["Amazon EC2"]),
+        )
+
+        result = get_cur_cost_data(str(tmp_path), days=3, today=date(2024, 1, 7))
+
+        assert [len(r["Groups"]) for r in result["ResultsByTime"]] == [0, 1, 0]
+
+    def test_streams_files_and_row_groups(self, tmp_path):
+        """Test that partial sums from many batches and files are combined"""
+        from cur_source import get_cur_cost_data
+
+        for month, days in ((1, 31), (2, 29)):
+            directory = tmp_path / "year=2024" / f"month={month}"
+            directory.mkdir(parents=True)
+            _write_cur(
+                directory / "part-0.parquet",
+                _hourly_rows(date(2024, month, 1), days, ["Amazon EC2"]),
+                row_group_size=50,
+            )
+
+        result = get_cur_cost_data(
+            str(tmp_path), days=4, today=date(2024, 2, 2), batch_size=30
+        )
+
+        amounts = [
+            r["Groups"][0]["Metrics"]["UnblendedCost"]["Amount"]
+            for r in result["ResultsByTime"]
+        ]
+        assert amounts == ["6.0000000000"] * 4
+
+    def test_string_dates_and_custom_columns(self, tmp_path):
+        """Test ISO 8601 string dates and overridden column names"""
+        from cur_source import get_cur_cost_data
+
+        table = pa.table(
+            {
+                "usage_start": ["2024-01-01T00:00:00Z", "2024-01-02T05:00:00Z"],
+                "service": ["AWS Lambda", None],
+                "cost": [1.5, 2.0],
+            }
+        )
+        pq.write_table(table, str(tmp_path / "cur.parquet"))
+
+        result = get_cur_cost_data(
+            str(tmp_path),
+            days=2,
+            today=date(2024, 1, 3),
+            date_column="usage_start",
+            service_column="service",
+            cost_column="cost",
+        )
+
+        first, second = result["ResultsByTime"]
+        assert first["Groups"][0]["Keys"] == ["AWS Lambda"]
+        assert second["Groups"][0]["Keys"] == ["Unknown"]
+
+    def test_only_needed_columns_are_read(self, tmp_path):
+        """Test column projection and the date filter on the scanner"""
+        from cur_source import iter_daily_costs, open_dataset
+
+        _write_cur(
+            tmp_path / "part-0.parquet",
+            _hourly_rows(date(2024, 1, 1), 2, ["Amazon EC2"]),
+            resource_tags=pa.array(["x" * 1000] * 48),
+        )
+        dataset = _RecordingDataset(open_dataset(str(tmp_path)))
+
+        rows = list(iter_daily_costs(dataset, date(2024, 1, 2), date(2024, 1, 3)))
+
+        assert rows == [("2024-01-02", "Amazon EC2", 6.0)]
+        assert dataset.scanner_kwargs["filter"] is not None
+        assert "resource_tags" not in dataset.scanner_kwargs["columns"]
+
+    def test_missing_columns(self, tmp_path):
+        """Test that files without the CUR columns are rejected"""
+        from cur_source import get_cur_cost_data
+
+        pq.write_table(pa.table({"a": [1]}), str(tmp_path / "other.parquet"))
+
+        with pytest.raises(ValueError, match="line_item_unblended_cost"):
+            get_cur_cost_data(str(tmp_path), days=1, today=date(2024, 1, 2))
+
+
+@pytest.mark.integration
+class TestCurInHandler:
+    """Tests for the CUR_PATH cost source of the report"""
+
+    def test_report_uses_cur(
+        self,
+        tmp_path,
+        monkeypatch,
+        mock_environment,
+        mock_ce_client,
+        mock_sns_client,
+        mock_ec2_client,
+        mock_rds_client,
+        mock_s3_client,
+        mock_lambda_client,
+    ):
+        """Test that CUR_PATH replaces the Cost Explorer query"""
+        today = datetime.now().date()
+        _write_cur(
+            tmp_path / "part-0.parquet",
+            _hourly_rows(today - timedelta(days=3), 2, ["Amazon CUR Test"]),
+        )
+        monkeypatch.setenv("CUR_PATH", str(tmp_path))
+
+        with patch("cost_notifier.ce_client", mock_ce_client), patch(
+            "cost_notifier.sns_client", mock_sns_client
+        ), patch("cost_notifier.ec2_client", mock_ec2_client), patch(
+            "cost_notifier.rds_client", mock_rds_client
+        ), patch(
+            "cost_notifier.s3_client", mock_s3_client
+        ), patch(
+            "cost_notifier.lambda_client", mock_lambda_client
+        ):
+            from cost_notifier import lambda_handler
+
+            response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        mock_ce_client.get_cost_and_usage.assert_not_called()
+        message = mock_sns_client.publish.call_args.kwargs["Message"]
+        assert "Amazon CUR Test" in message
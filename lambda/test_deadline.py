@@ -0,0 +1,363 @@
+"""
+Unit tests for the deadline scheduler.
+Slow stages are simulated with short sleeps against small budgets.
+"""
+
+import asyncio
+import contextlib
+import time
+import pytest
+from concurrent.futures import Future, ThreadPoolExecutor
+
+ROLE_A = "arn:aws:iam::111111111111:role/CostMonitor"
+ROLE_B = "arn:aws:iam::222222222222:role/CostMonitor"
+
+
+class FakeClock:
+    """Clock advanced by hand"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeContext:
+    """Lambda context with a fixed remaining time"""
+
+    def __init__(self, millis):
+        self.millis = millis
+
+    def get_remaining_time_in_millis(self):
+        return self.millis
+
+
+def _backend(**overrides):
+    """Small simulated account without latency"""
+    from simulated_aws import SimulatedBackend, SimulationConfig
+
+    settings = dict(services=5, latency=0, latency_jitter=0)
+    settings.update(overrides)
+    return SimulatedBackend(SimulationConfig(**settings))
+
+
+def _slow(seconds, result=None):
+    """Build a stage function that takes ``seconds``"""
+
+    def stage(*args, **kwargs):
+        time.sleep(seconds)
+        return result
+
+    return stage
+
+
+@pytest.mark.unit
+class TestDeadline:
+    """Tests for the Deadline class"""
+
+    def test_unlimited_without_context(self):
+        """Test that no context means no budget limit"""
+        from deadline import Deadline
+
+        deadline = Deadline.from_context(None)
+
+        assert deadline.budget() is None
+        assert deadline.budget(limit=30) == 30
+        assert deadline.time_left() is None
+        assert not deadline.expired()
+
+    def test_budget_keeps_reserve(self, monkeypatch):
+        """Test that the stages get the remaining time minus the reserve"""
+        from deadline import Deadline
+
+        monkeypatch.setenv("DEADLINE_RESERVE_SECONDS", "3")
+        deadline = Deadline.from_context(FakeContext(60000))
+
+        assert deadline.reserve == 3
+        assert 56 < deadline.budget() <= 57
+        assert deadline.budget(limit=10) == 10
+
+    def test_budget_runs_out(self):
+        """Test that the budget shrinks with the clock and never goes negative"""
+        from deadline import Deadline
+
+        clock = FakeClock()
+        deadline = Deadline(20, reserve=5, clock=clock)
+
+        clock.now += 10
+        assert deadline.budget() == 5
+        assert deadline.time_left() == 10
+
+        clock.now += 6
+        assert deadline.budget() == 0
+        assert deadline.expired()
+        assert deadline.time_left() == 4
+
+    def test_reserve_capped_for_short_timeouts(self):
+        """Test that a short invocation still leaves time to collect data"""
+        from deadline import Deadline
+
+        deadline = Deadline(4, reserve=5, clock=FakeClock())
+
+        assert deadline.reserve == 2
+        assert deadline.budget() == 2
+
+    def test_allows_records_skipped_stages(self):
+        """Test that stages are not started once the budget is spent"""
+        from deadline import NOT_STARTED, Deadline
+
+        clock = FakeClock()
+        deadline = Deadline(10, reserve=2, clock=clock)
+
+        assert deadline.allows("anomaly_detection")
+        clock.now += 9
+        assert not deadline.allows("trend_analytics")
+        assert deadline.skipped == [("trend_analytics", NOT_STARTED)]
+
+    def test_wait_abandons_slow_future(self):
+        """Test that a future over its budget is replaced by the default"""
+        from deadline import TIMED_OUT, Deadline
+
+        deadline = Deadline(0.3, reserve=0.1)
+        executor = ThreadPoolExecutor(max_workers=1)
+        slow = executor.submit(_slow(1, "late"))
+        queued = executor.submit(_slow(0, "queued"))
+
+        started = time.perf_counter()
+        assert deadline.wait("resources", slow, default={}) == {}
+        assert deadline.wait("forecast", queued) is None
+        executor.shutdown(wait=False)
+
+        assert time.perf_counter() - started < 0.9
+        assert queued.cancelled()
+        assert deadline.skipped == [("resources", TIMED_OUT), ("forecast", TIMED_OUT)]
+
+    def test_wait_returns_results_and_raises_errors(self):
+        """Test that finished futures are passed through"""
+        from deadline import Deadline
+
+        deadline = Deadline(10)
+        done = Future()
+        done.set_result("value")
+        failed = Future()
+        failed.set_exception(ValueError("boom"))
+
+        assert deadline.wait("forecast", done) == "value"
+        with pytest.raises(ValueError):
+            deadline.wait("attribution", failed)
+        assert deadline.skipped == []
+
+    def test_wait_logs_errors_of_optional_stages(self, capsys):
+        """Test that a failing optional stage gives the default"""
+        from deadline import Deadline
+
+        deadline = Deadline(10)
+        failed = Future()
+        failed.set_exception(ValueError("boom"))
+
+        assert deadline.wait("attribution", failed, optional=True) is None
+        assert "Error in stage attribution: boom" in capsys.readouterr().out
+        assert deadline.skipped == []
+
+    def test_format_skipped_section(self):
+        """Test the section listing the missing stages"""
+        from deadline import NOT_STARTED, TIMED_OUT, format_skipped_section
+
+        assert format_skipped_section([]) is None
+
+        title, lines = format_skipped_section(
+            [("resources", TIMED_OUT), ("trend_analytics", NOT_STARTED)]
+        )
+
+        assert title == "⏱️ 省略されたセクション"
+        assert "  リソース情報: 制限時間内に完了しませんでした" in lines
+        assert "  トレンド分析: 残り時間が不足したため実行しませんでした" in lines
+
+
+@pytest.mark.unit
+class TestPartialReport:
+    """Tests for formatting and analysing a partial report"""
+
+    def test_message_without_resources(self, mock_cost_response):
+        """Test that missing resource counts keep the rest of the report"""
+        from cost_notifier import format_cost_message
+
+        message = format_cost_message(mock_cost_response, None, 7)
+
+        assert "リソース情報の取得に失敗しました。" in message
+        assert "📊 日別コスト:" in message
+        assert "このレポートは自動生成されました。" in message
+
+    def test_expired_deadline_skips_analysis(self, monkeypatch, mock_cost_response):
+        """Test that analysis stages are skipped and listed once time is up"""
+        from cost_notifier import build_report_message
+        from deadline import Deadline
+
+        monkeypatch.setenv("ENABLE_ANOMALY_DETECTION", "true")
+        monkeypatch.setenv("ENABLE_TREND_ANALYTICS", "true")
+
+        message = build_report_message(
+            mock_cost_response, None, 7, [], Deadline(0, reserve=0)
+        )
+
+        assert "🚨" not in message
+        assert "  コスト異常検知: 残り時間が不足したため実行しませんでした" in message
+        assert "  トレンド分析: 残り時間が不足したため実行しませんでした" in message
+
+
+@pytest.mark.unit
+class TestFanOutTimeout:
+    """Tests for the timeout of the multi-account fan-out"""
+
+    def test_slow_target_is_recorded_as_failed(self):
+        """Test that the remaining targets are reported without the slow one"""
+        from fan_out import collect_fan_out
+
+        fast = _backend(seed=1, ec2_instances=30)
+        slow = _backend(seed=2, ec2_instances=50)
+
+        def session_factory(role_arn):
+            if role_arn == ROLE_B:
+                time.sleep(1)
+                return slow
+            return fast
+
+        started = time.perf_counter()
+        result = collect_fan_out(
+            [ROLE_A, ROLE_B],
+            ["us-east-1"],
+            7,
+            session_factory=session_factory,
+            timeout=0.3,
+        )
+
+        assert time.perf_counter() - started < 0.9
+        assert result.resources["EC2"]["total"] == 30
+        assert result.cost_data is not None
+        assert sorted(result.errors) == [
+            ("222222222222", "timed out"),
+            ("222222222222/us-east-1", "timed out"),
+        ]
+
+
+@pytest.mark.unit
+class TestAsyncDeadline:
+    """Tests for the deadline on the asyncio engine"""
+
+    def test_slow_stage_is_cancelled(self):
+        """Test that a stage over the budget is cancelled and recorded"""
+        from async_engine import ClientPool, collect_report_data
+        from deadline import TIMED_OUT, Deadline
+
+        backend = _backend()
+
+        class SlowClient:
+            def get_paginator(self, operation):
+                return self
+
+            async def paginate(self, **kwargs):
+                await asyncio.sleep(10)
+                yield {}
+
+        @contextlib.asynccontextmanager
+        async def create_client(service_name, region_name=None, **credentials):
+            if service_name == "ec2":
+                yield SlowClient()
+            else:
+                async with backend.async_client(service_name) as client:
+                    yield client
+
+        deadline = Deadline(0.5, reserve=0.1)
+
+        async def collect():
+            async with ClientPool(create_client) as pool:
+                return await collect_report_data(pool, 7, deadline)
+
+        started = time.perf_counter()
+        cost_data, resources, sections = asyncio.run(collect())
+
+        assert time.perf_counter() - started < 5
+        assert cost_data is not None
+        assert resources is None
+        assert deadline.skipped == [("resources", TIMED_OUT)]
+
+
+@pytest.mark.integration
+class TestDeadlineInHandler:
+    """Tests for the deadline of lambda_handler"""
+
+    def test_partial_report_sent_before_timeout(self, monkeypatch, mock_environment):
+        """Test that a slow collector does not hold back the report"""
+        import clients
+        import cost_notifier
+
+        backend = _backend()
+        monkeypatch.setattr(clients, "registry", backend.registry())
+        monkeypatch.setattr(cost_notifier, "get_resource_counts", _slow(3))
+        monkeypatch.setenv("DEADLINE_RESERVE_SECONDS", "0.3")
+
+        started = time.perf_counter()
+        response = cost_notifier.lambda_handler({}, FakeContext(1000))
+
+        assert time.perf_counter() - started < 1
+        assert response["statusCode"] == 200
+        message = backend.client("sns").messages[-1]
+        assert "📊 日別コスト:" in message
+        assert "リソース情報の取得に失敗しました。" in message
+        assert "  リソース情報: 制限時間内に完了しませんでした" in message
+
+    def test_partial_report_in_english(self, monkeypatch, mock_environment):
+        """Test that the skipped section follows REPORT_LANGUAGE"""
+        import re
+
+        import clients
+        import cost_notifier
+
+        backend = _backend()
+        monkeypatch.setattr(clients, "registry", backend.registry())
+        monkeypatch.setattr(cost_notifier, "get_resource_counts", _slow(3))
+        monkeypatch.setenv("DEADLINE_RESERVE_SECONDS", "0.3")
+        monkeypatch.setenv("REPORT_LANGUAGE", "en")
+
+        response = cost_notifier.lambda_handler({}, FakeContext(1000))
+
+        assert response["statusCode"] == 200
+        message = backend.client("sns").messages[-1]
+        assert "⏱️ Skipped sections" in message
+        assert "  Resources: did not finish in time" in message
+        assert not re.search("[\u3040-\u30ff\u4e00-\u9fff]", message)
+
+    def test_failing_optional_stage_is_left_out(self, monkeypatch, mock_environment):
+        """Test that an error in an optional section does not stop the report"""
+        import clients
+        import cost_notifier
+
+        backend = _backend()
+        monkeypatch.setattr(clients, "registry", backend.registry())
+        monkeypatch.setenv("ATTRIBUTION_TAGS", "team")
+        monkeypatch.setenv("ATTRIBUTION_TOP_N", "ten")
+
+        response = cost_notifier.lambda_handler({}, FakeContext(60000))
+
+        assert response["statusCode"] == 200
+        message = backend.client("sns").messages[-1]
+        assert "📊 日別コスト:" in message
+        assert "📦 EC2 インスタンス:" in message
+
+    def test_complete_report_has_no_skipped_section(
+        self, monkeypatch, mock_environment
+    ):
+        """Test that a report finished in time is unchanged"""
+        import clients
+        import cost_notifier
+
+        backend = _backend()
+        monkeypatch.setattr(clients, "registry", backend.registry())
+
+        response = cost_notifier.lambda_handler({}, FakeContext(60000))
+
+        assert response["statusCode"] == 200
+        message = backend.client("sns").messages[-1]
+        assert "⏱️ 省略されたセクション" not in message
+        assert "📦 EC2 インスタンス:" in message
@@ -0,0 +1,352 @@
+"""
+Unit tests for the size-aware delivery of the report.
+"""
+
+import asyncio
+import gzip
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from botocore.exceptions import ClientError
+
+TOPIC_ARN = "arn:aws:sns:us-east-1:123456789012:test-topic"
+FIFO_TOPIC_ARN = "arn:aws:sns:us-east-1:123456789012:test-topic.fifo"
+SUBJECT = "AWS Daily Report - 2024-01-01"
+
+
+def _report(lines=8000):
+    """Report of about 600 KB, mostly multi-byte characters"""
+    return "\n".join(
+        f"  アカウント {i:05d}: サービス別コスト $12.34 (前日比 +1.2%)"
+        for i in range(lines)
+    )
+
+
+def _body(part):
+    """Message of a part without its [i/n] header"""
+    header, _, body = part.message.partition("\n")
+    assert header == f"[{part.index}/{part.count}]"
+    return body
+
+
+class RecordingSNS:
+    """SNS that answers later parts first and records every request"""
+
+    def __init__(self, fail=()):
+        self.requests = []
+        self.fail = set(fail)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def publish(self, **request):
+        with self._lock:
+            self.requests.append(request)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        index = int(request["Subject"].rsplit("(", 1)[1].split("/")[0])
+        time.sleep(0.05 / index)
+        with self._lock:
+            self.in_flight -= 1
+        if index in self.fail:
+            raise Exception(f"part {index} failed")
+        return {"MessageId": f"id-{index}"}
+
+
+@pytest.mark.unit
+class TestPlanParts:
+    """Tests for splitting a report into parts"""
+
+    def test_small_report_unchanged(self):
+        """Test that a report within the limit is a single, unchanged part"""
+        from delivery import plan_parts
+
+        parts = plan_parts("短いレポート", SUBJECT)
+
+        assert len(parts) == 1
+        assert parts[0].message == "短いレポート"
+        assert parts[0].subject == SUBJECT
+
+    def test_parts_within_sns_limits(self):
+        """Test the encoded size of every part, attributes included"""
+        from delivery import (
+            SNS_MESSAGE_LIMIT,
+            SUBJECT_LIMIT,
+            encoded_size,
+            plan_parts,
+            publish_request,
+        )
+
+        report = _report()
+        assert encoded_size(report) > 2 * SNS_MESSAGE_LIMIT
+
+        parts = plan_parts(report, "件名" * 60)
+
+        assert len(parts) == 3
+        for part in parts:
+            request = publish_request(part, TOPIC_ARN)
+            size = encoded_size(request["Message"], request["MessageAttributes"])
+            assert size <= SNS_MESSAGE_LIMIT
+            assert len(part.subject.encode("utf-8")) <= SUBJECT_LIMIT
+            assert part.subject.endswith(f" ({part.index}/3)")
+
+    def test_parts_rebuild_report_in_order(self):
+        """Test that the parts are numbered and split on line boundaries"""
+        from delivery import plan_parts
+
+        report = _report()
+
+        parts = plan_parts(report, SUBJECT)
+
+        assert [part.index for part in parts] == [1, 2, 3]
+        assert "\n".join(_body(part) for part in parts) == report
+        assert len({part.key for part in parts}) == 3
+
+    def test_long_line_cut_on_character_boundary(self):
+        """Test that a line over the limit is cut without breaking characters"""
+        from delivery import encoded_size, split_message
+
+        chunks = split_message("あ" * 100, 31)
+
+        assert all(encoded_size(chunk) <= 31 for chunk in chunks)
+        assert "".join(chunks) == "あ" * 100
+
+    def test_parts_capped(self):
+        """Test that parts beyond max_parts are left out with a notice"""
+        from delivery import plan_parts
+
+        parts = plan_parts(_report(), SUBJECT, max_parts=2)
+
+        assert len(parts) == 2
+        assert parts[-1].message.endswith("…（残りの 1 部は省略されました）")
+
+    def test_summarized_with_link(self):
+        """Test that an oversized report becomes one part linking to S3"""
+        from delivery import SNS_MESSAGE_LIMIT, encoded_size, plan_parts
+
+        link = "https://bucket.s3.amazonaws.com/reports/2024-01-01.txt.gz?X=1"
+
+        parts = plan_parts(_report(), SUBJECT, link=link)
+
+        assert len(parts) == 1
+        assert parts[0].subject == SUBJECT
+        assert parts[0].message.startswith("  アカウント 00000:")
+        assert parts[0].message.endswith(f"📎 レポート全文: {link}")
+        assert encoded_size(parts[0].message) <= SNS_MESSAGE_LIMIT
+
+    def test_idempotency_keys_are_stable(self):
+        """Test that the same report gets the same keys on every run"""
+        from delivery import plan_parts
+
+        report = _report()
+
+        first = [part.key for part in plan_parts(report, SUBJECT)]
+        second = [part.key for part in plan_parts(report, SUBJECT)]
+        other = [part.key for part in plan_parts(report + "!", SUBJECT)]
+
+        assert first == second
+        assert not set(first) & set(other)
+
+
+@pytest.mark.unit
+class TestPublishParts:
+    """Tests for publishing the parts"""
+
+    def test_concurrent_results_in_part_order(self):
+        """Test that parts answered out of order are returned in order"""
+        from delivery import plan_parts, publish_parts
+
+        sns = RecordingSNS()
+        parts = plan_parts(_report(), SUBJECT)
+
+        message_ids = publish_parts(sns, parts, TOPIC_ARN)
+
+        assert message_ids == ["id-1", "id-2", "id-3"]
+        assert sns.max_in_flight > 1
+        assert all(
+            request["MessageAttributes"]["idempotency_key"]["StringValue"] == part.key
+            for request, part in zip(
+                sorted(sns.requests, key=lambda r: r["Subject"]), parts
+            )
+        )
+
+    def test_fifo_topic_published_in_order(self):
+        """Test that FIFO parts are sent one by one with deduplication IDs"""
+        from delivery import MESSAGE_GROUP_ID, plan_parts, publish_parts
+
+        sns = RecordingSNS()
+        parts = plan_parts(_report(), SUBJECT)
+
+        publish_parts(sns, parts, FIFO_TOPIC_ARN)
+
+        assert sns.max_in_flight == 1
+        assert [r["MessageDeduplicationId"] for r in sns.requests] == [
+            part.key for part in parts
+        ]
+        assert {r["MessageGroupId"] for r in sns.requests} == {MESSAGE_GROUP_ID}
+
+    def test_throttled_part_retried_with_same_key(self):
+        """Test that a throttled publish is retried as the same message"""
+        from cost_notifier import AdaptiveBackoff
+        from delivery import plan_parts, publish_parts
+
+        sns = Mock()
+        throttled = ClientError({"Error": {"Code": "Throttled"}}, "Publish")
+        sns.publish.side_effect = [throttled, {"MessageId": "id-1"}]
+        parts = plan_parts("report", SUBJECT)
+
+        message_ids = publish_parts(
+            sns, parts, TOPIC_ARN, backoff=AdaptiveBackoff(sleep=lambda _: None)
+        )
+
+        assert message_ids == ["id-1"]
+        first, second = sns.publish.call_args_list
+        assert first == second
+
+    def test_failed_part_does_not_stop_others(self):
+        """Test that every part is attempted before the error is raised"""
+        from delivery import plan_parts, publish_parts
+
+        sns = RecordingSNS(fail={2})
+        parts = plan_parts(_report(), SUBJECT)
+
+        with pytest.raises(Exception, match="part 2 failed"):
+            publish_parts(sns, parts, TOPIC_ARN)
+
+        assert len(sns.requests) == 3
+
+
+@pytest.mark.unit
+class TestFullReportUpload:
+    """Tests for storing the full report in S3"""
+
+    def test_upload_report(self):
+        """Test that the report is stored gzip-compressed behind a link"""
+        from delivery import LINK_EXPIRY, upload_report
+
+        s3 = Mock()
+        s3.generate_presigned_url.return_value = "https://example.com/report"
+
+        link = upload_report(s3, "bucket", "reports/2024-01-01.txt.gz", "レポート")
+
+        assert link == "https://example.com/report"
+        stored = s3.put_object.call_args.kwargs
+        assert gzip.decompress(stored["Body"]).decode("utf-8") == "レポート"
+        assert stored["ContentEncoding"] == "gzip"
+        s3.generate_presigned_url.assert_called_once_with(
+            "get_object",
+            Params={"Bucket": "bucket", "Key": "reports/2024-01-01.txt.gz"},
+            ExpiresIn=LINK_EXPIRY,
+        )
+
+    def test_link_expiry_of_session_credentials(self):
+        """Test that links signed with session credentials expire with them"""
+        from delivery import LINK_EXPIRY, SESSION_LINK_EXPIRY, link_expiry
+
+        assert link_expiry(Mock(token="session-token")) == SESSION_LINK_EXPIRY
+        assert link_expiry(Mock(token=None)) == LINK_EXPIRY
+        assert link_expiry(None) == LINK_EXPIRY
+
+    def test_link_notice_states_expiry(self):
+        """Test that the link is appended with the time it stops working"""
+        from datetime import datetime, timedelta, timezone
+
+        from delivery import plan_parts
+
+        expires = datetime(2024, 1, 1, 19, 30, tzinfo=timezone(timedelta(hours=9)))
+
+        parts = plan_parts(
+            "レポート", SUBJECT, link="https://example.com/r", link_expires=expires
+        )
+
+        assert parts[0].message.endswith(
+            "📎 レポート全文（2024-01-01 10:30 UTC まで有効）: https://example.com/r"
+        )
+
+    def test_send_notification_links_full_report(self, monkeypatch, mock_sns_client):
+        """Test send_notification with REPORT_BUCKET and an oversized report"""
+        from cost_notifier import send_notification
+
+        monkeypatch.setenv("REPORT_BUCKET", "report-bucket")
+        s3 = Mock()
+        s3.generate_presigned_url.return_value = "https://example.com/report"
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.s3_client", s3
+        ), patch(
+            "cost_notifier.get_credentials", return_value=Mock(token="session-token")
+        ):
+            assert send_notification(_report(), TOPIC_ARN) is True
+
+        assert s3.put_object.call_args.kwargs["Bucket"] == "report-bucket"
+        assert s3.put_object.call_args.kwargs["Key"].startswith("reports/")
+        assert s3.generate_presigned_url.call_args.kwargs["ExpiresIn"] == 3600
+        message = mock_sns_client.publish.call_args.kwargs["Message"]
+        assert "UTC まで有効）: https://example.com/report" in message
+
+    def test_publish_stays_within_deadline(self, monkeypatch):
+        """Test that retries and the upload do not run past the deadline"""
+        from cost_notifier import send_notification
+        from deadline import Deadline
+
+        monkeypatch.setenv("REPORT_BUCKET", "report-bucket")
+        s3 = Mock()
+        sns = Mock()
+        sns.publish.side_effect = ClientError(
+            {"Error": {"Code": "Throttled", "Message": "Rate exceeded"}}, "Publish"
+        )
+
+        started = time.perf_counter()
+        with patch("cost_notifier.sns_client", sns), patch(
+            "cost_notifier.s3_client", s3
+        ):
+            sent = send_notification(
+                "レポート", TOPIC_ARN, deadline=Deadline(1.0, reserve=0)
+            )
+
+        assert sent is False
+        assert time.perf_counter() - started < 1.5
+        s3.put_object.assert_not_called()
+
+    def test_failed_upload_falls_back_to_parts(self, monkeypatch, mock_sns_client):
+        """Test that the report is still split and sent without S3"""
+        from cost_notifier import send_notification
+
+        monkeypatch.setenv("REPORT_BUCKET", "report-bucket")
+        s3 = Mock()
+        s3.put_object.side_effect = Exception("AccessDenied")
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.s3_client", s3
+        ):
+            assert send_notification(_report(), TOPIC_ARN) is True
+
+        assert mock_sns_client.publish.call_count == 3
+
+
+@pytest.mark.unit
+class TestAsyncDelivery:
+    """Tests for delivery on the asyncio engine"""
+
+    def test_parts_published_on_event_loop(self):
+        """Test that the asyncio engine splits and orders parts the same way"""
+        from async_engine import ClientPool, send_notification
+        from simulated_aws import SimulatedBackend, SimulationConfig
+
+        backend = SimulatedBackend(SimulationConfig(latency=0, latency_jitter=0))
+        report = _report()
+
+        async def send():
+            async with ClientPool(backend.async_client) as pool:
+                return await send_notification(pool, report, TOPIC_ARN)
+
+        assert asyncio.run(send()) is True
+
+        messages = sorted(
+            backend.client("sns").messages,
+            key=lambda message: message.split("]", 1)[0],
+        )
+        assert len(messages) == 3
+        assert "\n".join(m.partition("\n")[2] for m in messages) == report
@@ -0,0 +1,363 @@
+"""
+Unit tests for the multi-account and multi-region fan-out.
+Targets are served by local stub sessions instead of assumed roles.
+"""
+
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+ROLE_A = "arn:aws:iam::111111111111:role/CostMonitor"
+ROLE_B = "arn:aws:iam::222222222222:role/CostMonitor"
+ROLE_BROKEN = "arn:aws:iam::333333333333:role/CostMonitor"
+
+
+def _cost_response(amount):
+    """Build a one-day Cost Explorer response with a single EC2 group"""
+    return {
+        "ResultsByTime": [
+            {
+                "TimePeriod": {"Start": "2024-01-01", "End": "2024-01-02"},
+                "Groups": [
+                    {
+                        "Keys": ["AmazonEC2"],
+                        "Metrics": {"UnblendedCost": {"Amount": amount, "Unit": "USD"}},
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def _paged_client(pages_by_operation):
+    """Mock client paging through the given pages, and no others"""
+
+    def get_paginator(operation):
+        paginator = Mock()
+        paginator.paginate.side_effect = lambda **kwargs: iter(
+            pages_by_operation.get(operation, [])
+        )
+        return paginator
+
+    client = Mock()
+    client.get_paginator.side_effect = get_paginator
+    return client
+
+
+class StubSession:
+    """Session stand-in that hands out stub clients for one account
+
+    Services in ``failing`` get clients whose paginators raise.
+    """
+
+    def __init__(self, amount, instances_per_region, latency=0, failing=()):
+        self.amount = amount
+        self.instances_per_region = instances_per_region
+        self.latency = latency
+        self.failing = failing
+        self.client_calls = []
+
+    def client(self, service_name, region_name=None):
+        self.client_calls.append((service_name, region_name))
+        time.sleep(self.latency)
+
+        if service_name in self.failing:
+            client = Mock()
+            client.get_paginator.side_effect = Exception("AccessDenied")
+            return client
+        if service_name == "ce":
+            client = Mock()
+            client.get_cost_and_usage.return_value = _cost_response(self.amount)
+            return client
+        if service_name == "ec2":
+            instances = [{"State": {"Name": "running"}}] * self.instances_per_region
+            return _paged_client(
+                {"describe_instances": [{"Reservations": [{"Instances": instances}]}]}
+            )
+        if service_name == "s3":
+            client = Mock()
+            client.list_buckets.return_value = {"Buckets": [{"Name": "bucket"}]}
+            return client
+        return _paged_client({})
+
+
+def _session_factory(sessions):
+    """Build a session factory that fails for unknown roles"""
+
+    def factory(role_arn):
+        if role_arn not in sessions:
+            raise Exception("AccessDenied")
+        return sessions[role_arn]
+
+    return factory
+
+
+@pytest.mark.unit
+class TestMergeCostData:
+    """Tests for merge_cost_data function"""
+
+    def test_merge_cost_data_combines_groups_by_date(self, mock_cost_response):
+        """Test that groups of the same day from several accounts are combined"""
+        from fan_out import merge_cost_data
+
+        merged = merge_cost_data([mock_cost_response, _cost_response("1.00")])
+
+        dates = [result["TimePeriod"]["Start"] for result in merged["ResultsByTime"]]
+        assert dates == ["2024-01-01", "2024-01-02"]
+        assert len(merged["ResultsByTime"][0]["Groups"]) == 4
+
+    def test_merge_cost_data_empty(self):
+        """Test merging no responses"""
+        from fan_out import merge_cost_data
+
+        assert merge_cost_data([]) == {"ResultsByTime": []}
+
+
+@pytest.mark.unit
+class TestMergeResourceCounts:
+    """Tests for merge_resource_counts function"""
+
+    def test_merge_resource_counts_sums_counts(self, mock_resource_data):
+        """Test that counts of several targets are summed"""
+        from fan_out import merge_resource_counts
+        from inventory import REGISTRY
+
+        merged = merge_resource_counts([mock_resource_data, mock_resource_data])
+
+        assert merged["EC2"] == {"total": 6, "running": 4}
+        assert merged["S3"] == {"total_buckets": 10}
+        assert merged["EBS"] == {"total": 0, "unattached": 0, "size_gib": 0}
+        assert list(merged) == [collector.name for collector in REGISTRY]
+
+    def test_merge_resource_counts_no_targets(self):
+        """Test that the report keys exist even when every target failed"""
+        from fan_out import merge_resource_counts
+
+        merged = merge_resource_counts([])
+
+        assert merged["EC2"] == {"total": 0, "running": 0}
+        assert merged["Lambda"] == {"total_functions": 0}
+
+
+@pytest.mark.unit
+class TestCollectFanOut:
+    """Tests for collect_fan_out function"""
+
+    def test_collect_fan_out_merges_all_targets(self):
+        """Test that every account/region pair is collected and merged"""
+        from fan_out import collect_fan_out
+
+        sessions = {ROLE_A: StubSession("10.00", 2), ROLE_B: StubSession("5.00", 3)}
+
+        result = collect_fan_out(
+            [ROLE_A, ROLE_B],
+            ["us-east-1", "ap-northeast-1"],
+            7,
+            session_factory=_session_factory(sessions),
+        )
+
+        assert result.errors == []
+        assert result.accounts == ["111111111111", "222222222222"]
+        assert len(result.cost_data["ResultsByTime"][0]["Groups"]) == 2
+        assert result.resources["EC2"] == {"total": 10, "running": 10}
+        assert result.resources["S3"] == {"total_buckets": 4}
+
+    def test_collect_fan_out_fetches_costs_once_per_account(self):
+        """Test that account-wide cost data is not duplicated per region"""
+        from fan_out import collect_fan_out
+
+        session = StubSession("10.00", 1)
+
+        collect_fan_out(
+            [ROLE_A],
+            ["us-east-1", "eu-west-1", "ap-northeast-1"],
+            7,
+            session_factory=_session_factory({ROLE_A: session}),
+        )
+
+        ce_calls = [call for call in session.client_calls if call[0] == "ce"]
+        assert ce_calls == [("ce", "us-east-1")]
+
+    def test_collect_fan_out_isolates_failing_account(self):
+        """Test that a failing account does not block the others"""
+        from fan_out import collect_fan_out
+
+        sessions = {ROLE_A: StubSession("10.00", 2)}
+
+        result = collect_fan_out(
+            [ROLE_A, ROLE_BROKEN],
+            ["us-east-1"],
+            7,
+            session_factory=_session_factory(sessions),
+        )
+
+        assert result.resources["EC2"]["total"] == 2
+        assert len(result.cost_data["ResultsByTime"][0]["Groups"]) == 1
+        failed = [target for target, _ in result.errors]
+        assert failed == ["333333333333", "333333333333/us-east-1"]
+
+    def test_collect_fan_out_reports_failing_collectors(self):
+        """Test that a collector failing in one target is listed, not zero"""
+        from fan_out import collect_fan_out
+
+        sessions = {
+            ROLE_A: StubSession("10.00", 2),
+            ROLE_B: StubSession("5.00", 3, failing=("rds",)),
+        }
+
+        result = collect_fan_out(
+            [ROLE_A, ROLE_B],
+            ["us-east-1"],
+            7,
+            session_factory=_session_factory(sessions),
+        )
+
+        assert result.errors == [("222222222222/us-east-1 RDS", "AccessDenied")]
+        assert result.resources["EC2"]["total"] == 5
+
+    def test_collect_fan_out_all_accounts_failing(self):
+        """Test that cost data is None when no account could be read"""
+        from fan_out import collect_fan_out
+
+        result = collect_fan_out(
+            [ROLE_BROKEN], ["us-east-1"], 7, session_factory=_session_factory({})
+        )
+
+        assert result.cost_data is None
+        assert result.resources["EC2"] == {"total": 0, "running": 0}
+
+    def test_collect_fan_out_assumes_each_role_once(self):
+        """Test that concurrent regions share one assumed-role session"""
+        from fan_out import collect_fan_out
+
+        calls = []
+        lock = threading.Lock()
+
+        def factory(role_arn):
+            with lock:
+                calls.append(role_arn)
+            time.sleep(0.05)
+            return StubSession("1.00", 1)
+
+        collect_fan_out(
+            [ROLE_A, ROLE_B],
+            ["us-east-1", "eu-west-1", "ap-northeast-1"],
+            7,
+            session_factory=factory,
+        )
+
+        assert sorted(calls) == [ROLE_A, ROLE_B]
+
+    def test_collect_fan_out_respects_concurrency_limit(self):
+        """Test that no more targets run at once than the configured limit"""
+        import fan_out
+        from fan_out import collect_fan_out
+
+        active = 0
+        peak = 0
+        lock = threading.Lock()
+        collect = fan_out._collect_region_resources
+
+        def counting_collect(*args):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            try:
+                time.sleep(0.01)
+                return collect(*args)
+            finally:
+                with lock:
+                    active -= 1
+
+        with patch.object(fan_out, "_collect_region_resources", counting_collect):
+            collect_fan_out(
+                [ROLE_A],
+                [f"region-{i}" for i in range(6)],
+                7,
+                max_workers=2,
+                session_factory=lambda role_arn: StubSession("1.00", 1),
+            )
+
+        assert peak <= 2
+
+    def test_collect_fan_out_creates_clients_one_at_a_time(self):
+        """Test that regions never create clients on a shared session at once"""
+        from fan_out import collect_fan_out
+
+        active = 0
+        peak = 0
+        lock = threading.Lock()
+
+        class CountingSession(StubSession):
+            def client(self, service_name, region_name=None):
+                nonlocal active, peak
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                try:
+                    return super().client(service_name, region_name)
+                finally:
+                    with lock:
+                        active -= 1
+
+        session = CountingSession("1.00", 1, latency=0.001)
+        regions = [f"region-{i}" for i in range(6)]
+
+        collect_fan_out(
+            [ROLE_A],
+            regions,
+            7,
+            max_workers=8,
+            session_factory=lambda role_arn: session,
+        )
+
+        assert peak == 1
+        assert len(session.client_calls) == len(set(session.client_calls))
+
+
+@pytest.mark.unit
+class TestFanOutReport:
+    """Tests for the consolidated fan-out report"""
+
+    def test_format_fan_out_section_lists_failures(self):
+        """Test that failed targets are listed in the report section"""
+        from fan_out import FanOutResult, format_fan_out_section
+
+        result = FanOutResult(
+            cost_data=None,
+            resources={},
+            accounts=["111111111111", "333333333333"],
+            regions=["us-east-1"],
+            errors=[("333333333333", "AccessDenied")],
+        )
+
+        title, lines = format_fan_out_section(result)
+
+        assert title == "🌐 対象アカウント"
+        assert "アカウント数: 2" in lines
+        assert "  333333333333: AccessDenied" in lines
+
+    def test_lambda_handler_fan_out_mode(self, monkeypatch, mock_sns_client):
+        """Test that the handler sends one consolidated report for all targets"""
+        monkeypatch.setenv(
+            "SNS_TOPIC_ARN", "arn:aws:sns:us-east-1:123456789012:test-topic"
+        )
+        monkeypatch.setenv("TARGET_ROLE_ARNS", f"{ROLE_A}, {ROLE_B}")
+        monkeypatch.setenv("TARGET_REGIONS", "us-east-1,ap-northeast-1")
+
+        sessions = {ROLE_A: StubSession("10.00", 2), ROLE_B: StubSession("5.00", 3)}
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "fan_out.assume_role_session", _session_factory(sessions)
+        ):
+            from cost_notifier import lambda_handler
+
+            response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        message = mock_sns_client.publish.call_args[1]["Message"]
+        assert "アカウント数: 2" in message
+        assert "AmazonEC2: $15.00" in message
+        assert "総数: 10" in message
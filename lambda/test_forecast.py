@@ -0,0 +1,248 @@
+"""
+Unit tests for the month-end cost forecast.
+"""
+
+import time
+import pytest
+from datetime import date
+from unittest.mock import Mock, patch
+from botocore.exceptions import ClientError
+
+
+@pytest.fixture(autouse=True)
+def reset_forecast_memo(monkeypatch):
+    """Start every test without an in-memory forecast"""
+    import forecast
+
+    monkeypatch.setattr(forecast, "_memo", {})
+
+
+@pytest.fixture
+def forecast_ce_client():
+    """Mock Cost Explorer client answering month-to-date and forecast queries"""
+    client = Mock()
+    client.get_cost_and_usage.return_value = {
+        "ResultsByTime": [
+            {
+                "TimePeriod": {"Start": "2024-01-01", "End": "2024-01-15"},
+                "Total": {"UnblendedCost": {"Amount": "140.00", "Unit": "USD"}},
+                "Groups": [],
+            }
+        ]
+    }
+    client.get_cost_forecast.return_value = {
+        "Total": {"Amount": "170.50", "Unit": "USD"},
+        "ForecastResultsByTime": [
+            {
+                "TimePeriod": {"Start": "2024-01-15", "End": "2024-02-01"},
+                "MeanValue": "170.50",
+                "PredictionIntervalLowerBound": "150.00",
+                "PredictionIntervalUpperBound": "190.00",
+            }
+        ],
+    }
+    return client
+
+
+@pytest.mark.unit
+class TestGetCostForecast:
+    """Tests for get_cost_forecast function"""
+
+    def test_forecast_values(self, forecast_ce_client):
+        """Test that actuals and forecast are combined into the month total"""
+        from forecast import get_cost_forecast
+
+        result = get_cost_forecast(forecast_ce_client, today=date(2024, 1, 15))
+
+        assert result.month == "2024-01"
+        assert result.month_to_date == 140.0
+        assert result.forecast == 170.5
+        assert result.month_end_total == 310.5
+        assert (result.lower_bound, result.upper_bound) == (150.0, 190.0)
+
+    def test_forecast_time_periods(self, forecast_ce_client):
+        """Test that actuals end today and the forecast runs to month end"""
+        from forecast import get_cost_forecast
+
+        get_cost_forecast(forecast_ce_client, today=date(2024, 12, 15))
+
+        actual_kwargs = forecast_ce_client.get_cost_and_usage.call_args[1]
+        forecast_kwargs = forecast_ce_client.get_cost_forecast.call_args[1]
+        assert actual_kwargs["TimePeriod"] == {
+            "Start": "2024-12-01",
+            "End": "2024-12-15",
+        }
+        assert forecast_kwargs["TimePeriod"] == {
+            "Start": "2024-12-15",
+            "End": "2025-01-01",
+        }
+        assert forecast_kwargs["Metric"] == "UNBLENDED_COST"
+
+    def test_first_day_of_month_has_no_actuals(self, forecast_ce_client):
+        """Test that no month-to-date query is made on the 1st"""
+        from forecast import get_cost_forecast
+
+        result = get_cost_forecast(forecast_ce_client, today=date(2024, 1, 1))
+
+        forecast_ce_client.get_cost_and_usage.assert_not_called()
+        assert result.month_to_date == 0.0
+        assert result.month_end_total == 170.5
+
+    def test_memoized_per_day(self, forecast_ce_client):
+        """Test that the forecast is fetched once per day"""
+        from forecast import get_cost_forecast
+
+        first = get_cost_forecast(forecast_ce_client, today=date(2024, 1, 15))
+        second = get_cost_forecast(forecast_ce_client, today=date(2024, 1, 15))
+        get_cost_forecast(forecast_ce_client, today=date(2024, 1, 16))
+
+        assert first is second
+        assert forecast_ce_client.get_cost_forecast.call_count == 2
+
+    def test_memoized_in_backend(self, forecast_ce_client, tmp_path, monkeypatch):
+        """Test that a cold start on the same day reuses the stored forecast"""
+        import forecast
+        from cost_cache import LocalFileCacheBackend
+
+        backend = LocalFileCacheBackend(str(tmp_path))
+        first = forecast.get_cost_forecast(
+            forecast_ce_client, today=date(2024, 1, 15), backend=backend
+        )
+        monkeypatch.setattr(forecast, "_memo", {})
+
+        second = forecast.get_cost_forecast(
+            forecast_ce_client, today=date(2024, 1, 15), backend=backend
+        )
+
+        assert second == first
+        assert forecast_ce_client.get_cost_forecast.call_count == 1
+
+    def test_failure_returns_none_and_is_not_memoized(self, forecast_ce_client):
+        """Test that errors degrade to None and are retried next time"""
+        from forecast import get_cost_forecast
+
+        forecast_ce_client.get_cost_forecast.side_effect = ClientError(
+            {"Error": {"Code": "DataUnavailableException", "Message": "no data"}},
+            "GetCostForecast",
+        )
+
+        assert get_cost_forecast(forecast_ce_client, today=date(2024, 1, 15)) is None
+        assert get_cost_forecast(forecast_ce_client, today=date(2024, 1, 15)) is None
+        assert forecast_ce_client.get_cost_forecast.call_count == 2
+
+
+@pytest.mark.unit
+class TestForecastReport:
+    """Tests for the forecast report section"""
+
+    def test_format_forecast_section(self):
+        """Test the forecast section lines"""
+        from forecast import CostForecast, format_forecast_section
+
+        title, lines = format_forecast_section(
+            CostForecast("2024-01", 140.0, 170.5, 150.0, 190.0)
+        )
+
+        assert title == "🔮 月末コスト予測"
+        assert lines == [
+            "今月 (2024-01) の実績: $140.00",
+            "月末までの予測: $170.50",
+            "月末の見込み合計: $310.50",
+            "  80% 予測区間: $290.00 〜 $330.00",
+        ]
+
+    def test_lambda_handler_adds_forecast_section(
+        self,
+        mock_environment,
+        monkeypatch,
+        mock_sns_client,
+        mock_cost_response,
+        mock_resource_data,
+        forecast_ce_client,
+    ):
+        """Test that the handler adds the forecast when enabled"""
+        monkeypatch.setenv("ENABLE_COST_FORECAST", "true")
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.ce_client", forecast_ce_client
+        ), patch("cost_notifier.get_cost_data", return_value=mock_cost_response), patch(
+            "cost_notifier.get_resource_counts", return_value=mock_resource_data
+        ):
+            from cost_notifier import lambda_handler
+
+            response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        message = mock_sns_client.publish.call_args[1]["Message"]
+        assert "🔮 月末コスト予測" in message
+        assert "月末までの予測: $170.50" in message
+
+    def test_lambda_handler_forecast_failure(
+        self,
+        mock_environment,
+        monkeypatch,
+        mock_sns_client,
+        mock_cost_response,
+        mock_resource_data,
+        forecast_ce_client,
+    ):
+        """Test that a failed forecast leaves the rest of the report intact"""
+        monkeypatch.setenv("ENABLE_COST_FORECAST", "true")
+        forecast_ce_client.get_cost_forecast.side_effect = Exception("API Error")
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.ce_client", forecast_ce_client
+        ), patch("cost_notifier.get_cost_data", return_value=mock_cost_response), patch(
+            "cost_notifier.get_resource_counts", return_value=mock_resource_data
+        ):
+            from cost_notifier import lambda_handler
+
+            response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        message = mock_sns_client.publish.call_args[1]["Message"]
+        assert "月末コスト予測" not in message
+        assert "AmazonEC2: $21.50" in message
+
+
+@pytest.mark.slow
+class TestForecastConcurrency:
+    """Tests that the forecast stays off the critical path"""
+
+    def test_forecast_runs_alongside_cost_and_resources(
+        self,
+        mock_environment,
+        monkeypatch,
+        mock_sns_client,
+        mock_cost_response,
+        mock_resource_data,
+        forecast_ce_client,
+    ):
+        """Test that forecast, costs and resources are fetched concurrently"""
+        latency = 0.3
+        monkeypatch.setenv("ENABLE_COST_FORECAST", "true")
+        forecast_response = forecast_ce_client.get_cost_forecast.return_value
+        forecast_ce_client.get_cost_and_usage.side_effect = None
+        forecast_ce_client.get_cost_forecast.side_effect = lambda **kwargs: (
+            time.sleep(latency) or forecast_response
+        )
+
+        def slow(value):
+            return lambda *args, **kwargs: time.sleep(latency) or value
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.ce_client", forecast_ce_client
+        ), patch(
+            "cost_notifier.get_cost_data", side_effect=slow(mock_cost_response)
+        ), patch(
+            "cost_notifier.get_resource_counts", side_effect=slow(mock_resource_data)
+        ):
+            from cost_notifier import lambda_handler
+
+            start = time.perf_counter()
+            response = lambda_handler({}, None)
+            elapsed = time.perf_counter() - start
+
+        assert response["statusCode"] == 200
+        assert "🔮 月末コスト予測" in mock_sns_client.publish.call_args[1]["Message"]
+        assert elapsed < 2 * latency
@@ -0,0 +1,312 @@
+"""
+Unit tests for stage and API call instrumentation.
+"""
+
+import json
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+
+@pytest.fixture
+def instrumented_ce_client():
+    """Real Cost Explorer client on an instrumented session, with a Stubber"""
+    import boto3
+    from botocore.stub import Stubber
+    from instrumentation import instrument_session
+
+    session = instrument_session(
+        boto3.session.Session(
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+            region_name="us-east-1",
+        )
+    )
+    client = session.client("ce")
+    with Stubber(client) as stubber:
+        yield client, stubber
+
+
+COST_QUERY = {
+    "TimePeriod": {"Start": "2024-01-01", "End": "2024-01-08"},
+    "Granularity": "DAILY",
+    "Metrics": ["UnblendedCost"],
+}
+
+
+def _cost_page(token=None):
+    """Minimal GetCostAndUsage page"""
+    page = {"ResultsByTime": []}
+    if token:
+        page["NextPageToken"] = token
+    return page
+
+
+@pytest.mark.unit
+class TestStages:
+    """Tests for stage and propagate"""
+
+    def test_stage_records_duration(self):
+        """Test that a stage's wall time and run count are recorded"""
+        import instrumentation
+
+        with instrumentation.invocation() as recorder:
+            with instrumentation.stage("format"):
+                time.sleep(0.01)
+            with instrumentation.stage("format"):
+                pass
+
+        assert recorder.stages["format"].count == 2
+        assert recorder.stages["format"].duration_ms >= 10
+        assert recorder.duration_ms >= recorder.stages["format"].duration_ms
+
+    def test_stage_as_decorator(self):
+        """Test that a stage can wrap a function"""
+        import instrumentation
+
+        with instrumentation.invocation() as recorder:
+            result = instrumentation.stage("resources")(lambda: 42)()
+
+        assert result == 42
+        assert recorder.stages["resources"].count == 1
+
+    def test_stage_records_errors(self):
+        """Test that a failing stage is counted and the error propagates"""
+        import instrumentation
+
+        with instrumentation.invocation() as recorder:
+            with pytest.raises(ValueError):
+                with instrumentation.stage("notify"):
+                    raise ValueError("boom")
+
+        assert recorder.stages["notify"].errors == 1
+
+    def test_propagate_carries_stage_into_threads(self):
+        """Test that worker threads report to the caller's stage"""
+        import instrumentation
+
+        with instrumentation.invocation() as recorder:
+            with instrumentation.stage("cost_data"):
+                with ThreadPoolExecutor(max_workers=4) as executor:
+                    list(
+                        executor.map(
+                            instrumentation.propagate(
+                                lambda _: instrumentation.record_retry()
+                            ),
+                            range(8),
+                        )
+                    )
+
+        assert recorder.stages["cost_data"].retries == 8
+
+    def test_disabled_is_a_no_op(self):
+        """Test that nothing is recorded outside an invocation"""
+        import instrumentation
+
+        def func():
+            return 1
+
+        with instrumentation.invocation(enabled=False) as recorder:
+            with instrumentation.stage("format"):
+                instrumentation.record_retry()
+            assert instrumentation.propagate(func) is func
+
+        assert recorder is None
+
+    def test_disabled_overhead_is_negligible(self):
+        """Test that a disabled stage costs microseconds"""
+        import instrumentation
+
+        iterations = 10000
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with instrumentation.stage("format"):
+                pass
+        per_call = (time.perf_counter() - start) / iterations
+
+        assert per_call < 20e-6
+
+
+@pytest.mark.unit
+class TestApiCalls:
+    """Tests for the botocore API call handlers"""
+
+    def test_pages_are_counted_per_operation_and_stage(self, instrumented_ce_client):
+        """Test that every page of a paginated call is recorded"""
+        import instrumentation
+
+        client, stubber = instrumented_ce_client
+        stubber.add_response("get_cost_and_usage", _cost_page("next"))
+        stubber.add_response("get_cost_and_usage", _cost_page())
+
+        with instrumentation.invocation() as recorder:
+            with instrumentation.stage("cost_data"):
+                client.get_cost_and_usage(**COST_QUERY)
+                client.get_cost_and_usage(**COST_QUERY, NextPageToken="next")
+
+        api = recorder.api_calls["ce.GetCostAndUsage"]
+        assert (api.count, api.pages, api.errors) == (2, 2, 0)
+        assert recorder.stages["cost_data"].pages == 2
+
+    def test_failed_calls_are_counted(self, instrumented_ce_client):
+        """Test that error responses count as errors"""
+        import instrumentation
+        from botocore.exceptions import ClientError
+
+        client, stubber = instrumented_ce_client
+        stubber.add_client_error(
+            "get_cost_forecast", "DataUnavailableException", http_status_code=400
+        )
+
+        with instrumentation.invocation() as recorder:
+            with instrumentation.stage("forecast"):
+                with pytest.raises(ClientError):
+                    client.get_cost_forecast(
+                        TimePeriod=COST_QUERY["TimePeriod"],
+                        Metric="UNBLENDED_COST",
+                        Granularity="MONTHLY",
+                    )
+
+        assert recorder.api_calls["ce.GetCostForecast"].errors == 1
+        assert recorder.stages["forecast"].errors == 1
+
+    def test_calls_outside_invocation_are_ignored(self, instrumented_ce_client):
+        """Test that an instrumented client works without a recorder"""
+        client, stubber = instrumented_ce_client
+        stubber.add_response("get_cost_and_usage", _cost_page())
+
+        response = client.get_cost_and_usage(**COST_QUERY)
+
+        assert response["ResultsByTime"] == []
+
+    def test_bytes_and_retries(self):
+        """Test that response size and botocore retries are recorded"""
+        import instrumentation
+
+        model = SimpleNamespace(
+            name="DescribeInstances", service_model=SimpleNamespace(service_name="ec2")
+        )
+        http_response = SimpleNamespace(
+            status_code=200, headers={"content-length": "2048"}
+        )
+        context = {}
+
+        with instrumentation.invocation() as recorder:
+            with instrumentation.stage("resources"):
+                instrumentation._start_call(model=model, context=context)
+                instrumentation._after_call(
+                    http_response=http_response,
+                    parsed={"ResponseMetadata": {"RetryAttempts": 2}},
+                    context=context,
+                )
+
+        api = recorder.api_calls["ec2.DescribeInstances"]
+        assert (api.bytes_received, api.retries) == (2048, 2)
+        assert recorder.stages["resources"].bytes_received == 2048
+
+
+@pytest.mark.unit
+class TestEmf:
+    """Tests for the EMF document and hooks"""
+
+    def test_to_emf(self):
+        """Test that measurements become EMF metrics and properties"""
+        from instrumentation import Recorder, to_emf
+
+        recorder = Recorder()
+        recorder.record_stage("cost_data", 0.5)
+        recorder.record_api_call("cost_data", "ce.GetCostAndUsage", 0.25, 1, 100)
+        recorder.finish()
+
+        document = to_emf(recorder)
+
+        directive = document["_aws"]["CloudWatchMetrics"][0]
+        names = {metric["Name"] for metric in directive["Metrics"]}
+        assert directive["Namespace"] == "DailyCostMonitor"
+        assert directive["Dimensions"] == [["FunctionName"]]
+        assert {"cost_data.Duration", "ce.GetCostAndUsage.Bytes"} <= names
+        assert document["cost_data.Duration"] == 500.0
+        assert document["cost_data.Pages"] == 1
+        assert document["ce.GetCostAndUsage.Retries"] == 1
+        assert document["ApiCalls"]["ce.GetCostAndUsage"]["bytes_received"] == 100
+        assert json.loads(json.dumps(document)) == document
+
+    def test_to_emf_splits_directives(self):
+        """Test that no directive exceeds the CloudWatch metric limit"""
+        from instrumentation import MAX_METRICS_PER_DIRECTIVE, Recorder, to_emf
+
+        recorder = Recorder()
+        for i in range(30):
+            recorder.record_api_call(None, f"svc.Operation{i}", 0.01)
+
+        directives = to_emf(recorder)["_aws"]["CloudWatchMetrics"]
+
+        assert len(directives) == 2
+        assert all(len(d["Metrics"]) <= MAX_METRICS_PER_DIRECTIVE for d in directives)
+
+    def test_hooks_receive_recorder(self):
+        """Test that custom hooks are called and failing hooks are contained"""
+        import instrumentation
+
+        received = []
+
+        def failing(recorder):
+            raise RuntimeError("sink down")
+
+        with patch.object(instrumentation, "_hooks", []):
+            instrumentation.add_hook(failing)
+            instrumentation.add_hook(received.append)
+            with instrumentation.invocation() as recorder:
+                pass
+            instrumentation.remove_hook(failing)
+
+            assert instrumentation._hooks == [received.append]
+
+        assert received == [recorder]
+
+    def test_lambda_handler_emits_one_emf_line(
+        self,
+        mock_environment,
+        monkeypatch,
+        capsys,
+        mock_sns_client,
+        mock_ce_client,
+        mock_resource_data,
+    ):
+        """Test that an instrumented invocation logs one EMF line"""
+        monkeypatch.setenv("ENABLE_INSTRUMENTATION", "true")
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.ce_client", mock_ce_client
+        ), patch("cost_notifier.get_resource_counts", return_value=mock_resource_data):
+            from cost_notifier import lambda_handler
+
+            response = lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        emf_lines = [
+            json.loads(line)
+            for line in capsys.readouterr().out.splitlines()
+            if line.startswith("{") and '"_aws"' in line
+        ]
+        assert len(emf_lines) == 1
+        assert {"cost_data", "resources", "format", "notify"} <= set(
+            emf_lines[0]["Stages"]
+        )
+
+    def test_lambda_handler_without_instrumentation(
+        self, mock_environment, capsys, mock_sns_client, mock_ce_client
+    ):
+        """Test that no EMF line is logged by default"""
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.ce_client", mock_ce_client
+        ), patch("cost_notifier.get_resource_counts", return_value={}), patch(
+            "cost_notifier.format_cost_message", return_value="report"
+        ):
+            from cost_notifier import lambda_handler
+
+            lambda_handler({}, None)
+
+        assert '"_aws"' not in capsys.readouterr().out
@@ -0,0 +1,247 @@
+"""
+Unit tests for the resource collector registry.
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from conftest import paginated_client
+
+
+def _backend(**overrides):
+    """Small simulated account without latency"""
+    from simulated_aws import SimulatedBackend, SimulationConfig
+
+    settings = dict(
+        services=5,
+        ebs_volumes=1200,
+        load_balancers=450,
+        dynamodb_tables=250,
+        latency=0,
+        latency_jitter=0,
+    )
+    settings.update(overrides)
+    return SimulatedBackend(SimulationConfig(**settings))
+
+
+def _counter(name="ECS", service="ecs", **kwargs):
+    """Collector counting the items of list_clusters pages"""
+    from inventory import ResourceCollector
+
+    def tally(counts, page):
+        counts["total_clusters"] += len(page["clusterArns"])
+
+    return ResourceCollector(
+        name,
+        service,
+        "list_clusters",
+        tally,
+        "🐳 ECS クラスター:",
+        (("total_clusters", "総数"),),
+        **kwargs,
+    )
+
+
+@pytest.mark.unit
+class TestBuiltinCollectors:
+    """Tests for the collectors of the report"""
+
+    def test_counts_match_simulated_account(self):
+        """Test every collector against a paginated simulated account"""
+        from inventory import REGISTRY
+
+        backend = _backend()
+        clients = {name: backend.client(name) for name in REGISTRY.services()}
+
+        resources = REGISTRY.collect(clients)
+
+        assert resources["EBS"]["total"] == 1200
+        assert 0 < resources["EBS"]["unattached"] < 1200
+        assert resources["EBS"]["size_gib"] >= 8 * 1200
+        assert resources["ELB"]["total"] == 450
+        assert resources["ELB"]["application"] + resources["ELB"]["network"] == 450
+        assert resources["NAT"] == {"total": 12}
+        assert resources["EKS"] == {"total_clusters": 8}
+        assert resources["DynamoDB"] == {"total_tables": 250}
+        assert resources["ElastiCache"]["total"] == 40
+        assert backend.calls["ec2.DescribeVolumes"] == 3
+        assert backend.calls["elbv2.DescribeLoadBalancers"] == 2
+        assert backend.calls["dynamodb.ListTables"] == 3
+
+    def test_collectors_share_service_clients(self):
+        """Test that EC2, EBS and NAT are counted with one EC2 client"""
+        from inventory import REGISTRY
+
+        assert REGISTRY.services().count("ec2") == 1
+        assert [c.name for c in REGISTRY if c.service == "ec2"] == [
+            "EC2",
+            "EBS",
+            "NAT",
+        ]
+
+    def test_nat_gateways_exclude_deleted(self):
+        """Test that only pending and available NAT gateways are listed"""
+        from inventory import REGISTRY
+
+        ec2 = paginated_client("describe_nat_gateways", [{"NatGateways": [{}]}])
+
+        assert REGISTRY["NAT"].collect(ec2) == {"total": 1}
+        ec2.get_paginator("describe_nat_gateways").paginate.assert_called_once_with(
+            Filters=[{"Name": "state", "Values": ["pending", "available"]}]
+        )
+
+
+@pytest.mark.unit
+class TestCollectorRegistry:
+    """Tests for CollectorRegistry"""
+
+    def test_registered_collector_is_reported(self):
+        """Test that a new collector is collected and rendered"""
+        from inventory import CollectorRegistry, format_resource_lines
+
+        registry = CollectorRegistry([_counter()])
+        ecs = paginated_client(
+            "list_clusters", [{"clusterArns": ["a", "b"]}, {"clusterArns": ["c"]}]
+        )
+
+        resources = registry.collect({"ecs": ecs})
+
+        assert resources == {"ECS": {"total_clusters": 3}}
+        assert format_resource_lines(resources, registry) == [
+            "🐳 ECS クラスター:",
+            "  総数: 3",
+            "",
+        ]
+
+    def test_register_replaces_and_unregister_removes(self):
+        """Test that collectors are keyed by name"""
+        from inventory import CollectorRegistry
+
+        registry = CollectorRegistry([_counter()])
+        replacement = registry.register(_counter(timeout=5))
+
+        assert len(registry) == 1
+        assert registry["ECS"] is replacement
+        registry.unregister("ECS")
+        assert "ECS" not in registry
+
+    def test_failures_are_isolated(self, capsys):
+        """Test that a failing collector reports its default counts"""
+        from inventory import CollectorRegistry
+
+        registry = CollectorRegistry([_counter(), _counter("Broken", "broken")])
+        ecs = paginated_client("list_clusters", [{"clusterArns": ["a"]}])
+        broken = paginated_client("list_clusters", Exception("AccessDenied"))
+
+        resources = registry.collect({"ecs": ecs, "broken": broken})
+
+        assert resources == {
+            "ECS": {"total_clusters": 1},
+            "Broken": {"total_clusters": 0},
+        }
+        assert "Error getting Broken data: AccessDenied" in capsys.readouterr().out
+
+    def test_collector_timeout(self):
+        """Test that paging stops once the collector runs over its timeout"""
+        collector = _counter(timeout=10)
+        pages = [{"clusterArns": ["a"]}] * 5
+        client = paginated_client("list_clusters", pages)
+        ticks = iter([0, 4, 8, 12, 16])
+
+        with pytest.raises(TimeoutError, match="timed out after 10s"):
+            collector.collect(client, clock=lambda: next(ticks))
+
+    def test_hung_call_is_abandoned(self, capsys):
+        """Test that a call that never returns does not hold up the others"""
+        import threading
+        import time
+        from inventory import CollectorRegistry
+
+        release = threading.Event()
+        hung = Mock()
+        hung.get_paginator.return_value.paginate.side_effect = lambda: iter(
+            [release.wait(5) and {"clusterArns": []}]
+        )
+        registry = CollectorRegistry(
+            [_counter(), _counter("Hung", "hung", timeout=0.2)]
+        )
+        ecs = paginated_client("list_clusters", [{"clusterArns": ["a"]}])
+
+        started = time.monotonic()
+        try:
+            resources = registry.collect({"ecs": ecs, "hung": hung})
+        finally:
+            release.set()
+
+        assert time.monotonic() - started < 2
+        assert resources == {
+            "ECS": {"total_clusters": 1},
+            "Hung": {"total_clusters": 0},
+        }
+        assert (
+            "Error getting Hung data: timed out after 0.2s" in capsys.readouterr().out
+        )
+
+    def test_single_call_operation(self):
+        """Test a collector of an operation without a paginator"""
+        from inventory import REGISTRY
+
+        s3 = Mock()
+        s3.list_buckets.return_value = {"Buckets": [{}, {}]}
+
+        assert REGISTRY["S3"].collect(s3) == {"total_buckets": 2}
+        s3.get_paginator.assert_not_called()
+
+
+@pytest.mark.unit
+class TestFormatResourceLines:
+    """Tests for rendering the registry's counts"""
+
+    def test_existing_sections_unchanged(self, mock_resource_data):
+        """Test that the original four sections render as before"""
+        from inventory import format_resource_lines
+
+        lines = format_resource_lines(mock_resource_data)
+
+        assert lines == [
+            "📦 EC2 インスタンス:",
+            "  総数: 3",
+            "  稼働中: 2",
+            "",
+            "🗄️ RDS インスタンス:",
+            "  総数: 1",
+            "  利用可能: 1",
+            "",
+            "🪣 S3 バケット:",
+            "  総数: 5",
+            "",
+            "λ Lambda 関数:",
+            "  総数: 2",
+            "",
+        ]
+
+    def test_unknown_collector_uses_keys(self):
+        """Test counts of a collector the registry does not know"""
+        from inventory import format_resource_lines
+
+        assert format_resource_lines({"ECS": {"total_clusters": 4}}) == [
+            "ECS:",
+            "  total_clusters: 4",
+            "",
+        ]
+
+    def test_report_renders_new_resources(self, mock_cost_response):
+        """Test that the report shows every collected resource type"""
+        from cost_notifier import format_cost_message
+        from inventory import REGISTRY
+
+        resources = REGISTRY.defaults()
+        resources["EBS"] = {"total": 7, "unattached": 2, "size_gib": 340}
+
+        message = format_cost_message(mock_cost_response, resources, 7)
+
+        assert (
+            "💽 EBS ボリューム:\n  総数: 7\n  未アタッチ: 2\n  合計容量 (GiB): 340"
+            in message
+        )
+        assert "⚡ ElastiCache クラスター:" in message
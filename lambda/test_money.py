@@ -0,0 +1,160 @@
+"""
+Unit and property tests for the fixed-point money type.
+Random amounts are drawn from seeded generators and checked against Decimal.
+"""
+
+import random
+import pytest
+from decimal import ROUND_HALF_EVEN, Decimal
+
+CASES = 20000
+
+
+def _amount(rng):
+    """Random Cost Explorer amount string"""
+    digits = rng.choice([10, 10, 10, 0, 1, 2, 4, 7])
+    whole = rng.choice([0, 0, rng.randrange(100), rng.randrange(10**9)])
+    sign = "-" if rng.random() < 0.05 else ""
+    if not digits:
+        return f"{sign}{whole}"
+    return f"{sign}{whole}.{rng.randrange(10**digits):0{digits}d}"
+
+
+@pytest.mark.unit
+class TestMoneyProperties:
+    """Properties that must hold for any amounts"""
+
+    def test_parse_matches_decimal(self):
+        """Test that parsed amounts equal their Decimal"""
+        from money import Money
+
+        rng = random.Random(1)
+        for _ in range(CASES):
+            amount = _amount(rng)
+            money = Money.parse(amount)
+            assert money == Decimal(amount), amount
+            assert money.to_decimal() == Decimal(amount), amount
+            assert Decimal(str(money)) == Decimal(amount), amount
+
+    def test_sums_match_decimal(self):
+        """Test that sums of many amounts are exact"""
+        from money import Money
+
+        rng = random.Random(2)
+        for _ in range(200):
+            amounts = [_amount(rng) for _ in range(rng.randrange(1, 500))]
+            total = sum((Money.parse(a) for a in amounts), Money())
+            assert total.to_decimal() == sum(Decimal(a) for a in amounts)
+
+    def test_order_matches_decimal(self):
+        """Test that comparisons agree with Decimal"""
+        from money import Money
+
+        rng = random.Random(3)
+        for _ in range(CASES):
+            a, b = _amount(rng), _amount(rng)
+            assert (Money.parse(a) < Money.parse(b)) == (Decimal(a) < Decimal(b))
+            assert (Money.parse(a) > Decimal(b)) == (Decimal(a) > Decimal(b))
+            assert (Money.parse(a) == Money.parse(b)) == (Decimal(a) == Decimal(b))
+
+    def test_currency_strings_match_decimal(self):
+        """Test that rounding to cents is Decimal's half-even rounding"""
+        from money import Money
+
+        rng = random.Random(4)
+        for _ in range(CASES):
+            amount = _amount(rng)
+            places = rng.choice([0, 2, 4])
+            expected = Decimal(amount).quantize(
+                Decimal(1).scaleb(-places), rounding=ROUND_HALF_EVEN
+            )
+            text = Money.parse(amount).format(places)
+            assert Decimal(text) == expected, amount
+            assert len(text.partition(".")[2]) == places
+
+    def test_parse_many_matches_parse(self):
+        """Test that parsing a list equals parsing each amount"""
+        from money import parse_many, parse_units
+
+        rng = random.Random(6)
+        for _ in range(500):
+            amounts = [_amount(rng) for _ in range(rng.randrange(0, 50))]
+            assert parse_many(amounts) == [parse_units(a) for a in amounts]
+
+    def test_division_matches_decimal(self):
+        """Test that division by a count rounds half-even to the unit"""
+        from money import Money
+
+        rng = random.Random(5)
+        for _ in range(CASES):
+            amount = _amount(rng)
+            days = rng.randrange(1, 400)
+            expected = (Decimal(amount) / days).quantize(
+                Decimal("1e-10"), rounding=ROUND_HALF_EVEN
+            )
+            assert Money.parse(amount) / days == expected, (amount, days)
+
+
+@pytest.mark.unit
+class TestMoney:
+    """Tests for parsing and rendering amounts"""
+
+    def test_parse_forms(self):
+        """Test the forms of amount strings"""
+        from money import Money
+
+        assert Money.parse("21.5000000000").units == 215000000000
+        assert Money.parse("21.5") == Decimal("21.5")
+        assert Money.parse("-0.0000000001").units == -1
+        assert Money.parse("7") == 7
+        assert Money.parse("1.2E-7") == Decimal("0.00000012")
+        assert Money.parse("0.00000000005").units == 0
+        assert Money.parse("0.00000000015").units == 2
+        assert Money.parse("1e-0000000") == 1
+        for invalid in ("", ".", "abc", "NaN", "1.2.3"):
+            with pytest.raises(ValueError):
+                Money.parse(invalid)
+
+    def test_parse_many_forms(self):
+        """Test that lists with other forms fall back to parse_units"""
+        from money import parse_many
+
+        assert parse_many([]) == []
+        assert parse_many(["1.0000000000", "-0.0000000001"]) == [10**10, -1]
+        assert parse_many(["1.0000000000", "1e-0000000"]) == [10**10, 10**10]
+        assert parse_many(["1.0000000000", "2.5"]) == [10**10, 25 * 10**9]
+        with pytest.raises(ValueError):
+            parse_many(["1.0000000000", "abcdefghijklm"])
+
+    def test_rounding_to_zero_has_no_sign(self):
+        """Test that amounts rounding to zero render as an unsigned zero"""
+        from money import Money
+
+        assert f"{Money.parse('-0.004'):.2f}" == "0.00"
+        assert Money.parse("-0.005").format(2) == "0.00"
+        assert Money.parse("-0.006").format(2) == "-0.01"
+        assert Money.parse("-0.4").format(0) == "0"
+
+    def test_exact_rendering(self):
+        """Test that amounts render without a float round-trip"""
+        from money import Money
+
+        assert f"{Money.parse('2.675'):.2f}" == "2.68"
+        assert f"{float(Decimal('2.675')):.2f}" == "2.67"
+        assert f"{Money.parse('12345678901234567.891'):.2f}" == "12345678901234567.89"
+        assert str(Money.parse("3.10")) == "3.1"
+        assert repr(Money.parse("3")) == "Money('3.0')"
+
+    def test_interoperates_with_decimal(self):
+        """Test arithmetic and hashing with Decimal and int"""
+        from money import Money
+
+        cost = Money.parse("1.25")
+
+        assert cost + Decimal("0.75") == 2
+        assert 1 - cost == Decimal("-0.25")
+        assert sum([cost, cost]) == Decimal("2.5")
+        assert -cost < 0 < cost
+        assert cost * 3 == Decimal("3.75")
+        assert hash(cost) == hash(Decimal("1.25"))
+        assert not Money()
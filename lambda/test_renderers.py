@@ -0,0 +1,478 @@
+"""
+Unit tests for the report model and the output renderers.
+"""
+
+import csv
+import io
+import json
+import re
+import pytest
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+# Kana, kanji and full-width punctuation
+JAPANESE = re.compile("[\u3000-\u30ff\u4e00-\u9fff\uff00-\uffef]")
+
+
+def _report(mock_cost_response, mock_resource_data, sections=None):
+    from renderers import build_report
+
+    return build_report(mock_cost_response, mock_resource_data, 7, sections)
+
+
+def _every_section(cost_data):
+    """One Section of every report stage, with something to show in each"""
+    from anomaly import Anomaly, format_anomaly_section
+    from attribution import Attribution, HeavyHitter, format_attribution_section
+    from cost_matrix import CostMatrix, format_trend_section
+    from deadline import NOT_STARTED, TIMED_OUT, format_skipped_section
+    from fan_out import FanOutResult, format_fan_out_section
+    from forecast import CostForecast, format_forecast_section
+    from money import Money
+    from renderers import Section
+    from snapshots import Change, SnapshotDiff, format_diff_section
+    from waste import IdleInstance, Instance, WasteReport, format_waste_section
+
+    fan_out = FanOutResult(
+        None,
+        {},
+        ["111111111111"],
+        ["us-east-1"],
+        [("111111111111", None), ("111111111111/us-east-1 EC2", "AccessDenied")],
+    )
+    attribution = Attribution(
+        tags={"team": [HeavyHitter("", Money.parse("3.00"), Money.parse("1.00"))]},
+        resources={"Amazon EC2": []},
+        errors=[("tag", "team", "AccessDenied")],
+    )
+    diff = SnapshotDiff(
+        "2024-01-01",
+        "2024-01-02",
+        Change("total", Decimal("10"), Decimal("20"), True),
+        [Change("Amazon EC2", Decimal("5"), Decimal("15"), True)],
+        [Change(("EC2", "running"), 1, 2, False)],
+    )
+    waste = WasteReport(
+        14,
+        5.0,
+        checked=2,
+        idle=[
+            IdleInstance(Instance("EC2", "i-1", "t3.micro"), 1.0),
+            IdleInstance(Instance("EC2", "i-2", "unknown.type"), 2.0),
+        ],
+    )
+    return [
+        Section.of(format_fan_out_section, fan_out),
+        Section.of(
+            format_forecast_section, CostForecast("2024-01", 10.0, 20.0, -1.0, 1.0)
+        ),
+        Section.of(format_anomaly_section, [], False),
+        Section.of(
+            format_anomaly_section, [Anomaly("2024-01-02", "Amazon EC2", 9.0, 1.0, 4.0)]
+        ),
+        Section.of(format_attribution_section, attribution),
+        Section.of(format_trend_section, CostMatrix.from_cost_data(cost_data)),
+        Section.of(format_diff_section, None),
+        Section.of(format_diff_section, diff),
+        Section.of(format_waste_section, waste),
+        Section.of(
+            format_skipped_section,
+            [("forecast", TIMED_OUT), ("snapshot_diff", NOT_STARTED)],
+        ),
+    ]
+
+
+@pytest.mark.unit
+class TestReportModel:
+    """Tests for aggregating once and rendering many times"""
+
+    def test_one_aggregation_for_every_format(
+        self, mock_cost_response, mock_resource_data
+    ):
+        """Test that rendering every format does not aggregate again"""
+        import renderers
+        from aggregation import aggregate_costs
+
+        with patch("renderers.aggregate_costs", wraps=aggregate_costs) as aggregate:
+            report = _report(mock_cost_response, mock_resource_data)
+            outputs = renderers.render_all(report, list(renderers.RENDERERS))
+
+        assert aggregate.call_count == 1
+        assert set(outputs) == {"text", "slack", "teams", "html", "csv"}
+
+    def test_text_matches_format_cost_message(
+        self, mock_cost_response, mock_resource_data
+    ):
+        """Test that the Japanese text is the notification message"""
+        from cost_notifier import format_cost_message
+        from renderers import render
+
+        report = _report(mock_cost_response, mock_resource_data)
+        expected = format_cost_message(mock_cost_response, mock_resource_data, 7)
+
+        assert render(report).split("\n")[4:] == expected.split("\n")[4:]
+
+    def test_english_text(self, mock_cost_response, mock_resource_data):
+        """Test the English variant of the text"""
+        from renderers import render
+
+        message = render(_report(mock_cost_response, mock_resource_data), "text", "en")
+
+        assert "=== AWS Daily Report ===" in message
+        assert "📅 Period: last 7 days" in message
+        assert "Total (7 days): $" in message
+        assert "📦 EC2 instances:\n  Total: 3\n  Running: 2" in message
+        assert "日次" not in message
+
+    def test_other_bucket(self, monkeypatch, mock_cost_response, mock_resource_data):
+        """Test that services below MIN_SERVICE_SHARE are reported as one line"""
+        from cost_notifier import format_cost_message
+        from renderers import build_report, render
+
+        monkeypatch.setenv("MIN_SERVICE_SHARE", "0.1")
+
+        message = format_cost_message(mock_cost_response, mock_resource_data, 7)
+        report = build_report(
+            mock_cost_response, mock_resource_data, 7, min_share=Decimal("0.1")
+        )
+        rows = list(csv.reader(io.StringIO(render(report, "csv"))))
+
+        # AmazonS3 ($0.50) is below 10% of $27.25
+        assert "  AmazonS3: $0.50" not in message
+        assert "  その他 (1 サービス): $0.50" in message
+        assert "合計 (7日間): $27.25" in message
+        assert ["other", "1", "", "0.50"] in rows
+        assert "Other services (1): $0.50" in render(report, "text", "en")
+
+    def test_service_rows_add_up_to_total(self, mock_resource_data):
+        """Test that services outside the top ones are in the other line"""
+        from renderers import build_report, render
+
+        costs = [f"{cost}.00" for cost in range(1, 16)] + ["0.001"]
+        cost_data = {
+            "ResultsByTime": [
+                {
+                    "TimePeriod": {"Start": "2024-01-01", "End": "2024-01-02"},
+                    "Groups": [
+                        {
+                            "Keys": [f"S{i}"],
+                            "Metrics": {"UnblendedCost": {"Amount": amount}},
+                        }
+                        for i, amount in enumerate(costs)
+                    ],
+                }
+            ]
+        }
+        report = build_report(cost_data, mock_resource_data, 1)
+        message = render(report)
+        rows = list(csv.reader(io.StringIO(render(report, "csv"))))
+
+        listed = sum(cost for _, cost in report.costs.top_services)
+        assert listed + report.costs.other_total == report.costs.period_total
+        assert report.costs.other_count == 6
+        assert "  その他 (6 サービス): $15.00" in message
+        assert "合計 (1日間): $120.00" in message
+        assert sum(
+            Decimal(row[3]) for row in rows if row[0] in ("service", "other")
+        ) == Decimal("120.00")
+
+    def test_unsupported_language(self, mock_cost_response, mock_resource_data):
+        """Test that unknown languages are rejected"""
+        from renderers import render
+
+        with pytest.raises(ValueError, match="fr"):
+            render(_report(mock_cost_response, mock_resource_data), "text", "fr")
+
+    def test_registered_renderer(self, mock_cost_response, mock_resource_data):
+        """Test that a new format renders from the same model"""
+        import renderers
+
+        class TotalRenderer(renderers.Renderer):
+            name = "total"
+
+            def render(self, report, language="ja"):
+                return f"{float(report.costs.period_total):.2f}"
+
+        renderers.register_renderer(TotalRenderer())
+        try:
+            report = _report(mock_cost_response, mock_resource_data)
+            assert renderers.render(report, "total") == "27.25"
+        finally:
+            del renderers.RENDERERS["total"]
+
+
+@pytest.mark.unit
+class TestEnglishReport:
+    """Tests that an English report has no Japanese left in it"""
+
+    def test_every_language_has_every_string(self):
+        """Test that no layout string is missing from a language"""
+        from renderers import LANGUAGES, STRINGS
+
+        for language in LANGUAGES:
+            assert set(STRINGS[language]) == set(STRINGS["ja"])
+
+    def test_every_collector_has_english_labels(self):
+        """Test that resource counts are never shown with their raw keys"""
+        from inventory import REGISTRY
+
+        for collector in REGISTRY:
+            title, counts = collector.localized("en")
+            assert not JAPANESE.search(title)
+            assert [key for key, _ in counts] == [key for key, _ in collector.counts]
+            assert not any(JAPANESE.search(label) for _, label in counts)
+
+    def test_every_section_in_english(self, mock_cost_response):
+        """Test the sections of every stage in every format"""
+        from inventory import REGISTRY
+        from renderers import build_report, render
+
+        pytest.importorskip("numpy")
+        report = build_report(
+            mock_cost_response,
+            REGISTRY.defaults(),
+            7,
+            _every_section(mock_cost_response),
+        )
+
+        for name in ("text", "slack", "teams", "html"):
+            message = render(report, name, "en")
+            assert not JAPANESE.search(message), (name, JAPANESE.findall(message))
+
+        message = render(report, "text", "en")
+        assert "🌐 Target accounts" in message
+        assert "  111111111111: Failed to fetch the cost data" in message
+        assert "  (untagged): $3.00 (error ≤ $1.00)" in message
+        assert "  tag team: AccessDenied" in message
+        assert "💽 EBS volumes:\n  Total: 0\n  Unattached: 0" in message
+        assert "  Month-end cost forecast: did not finish in time" in message
+
+    def test_sections_follow_the_rendered_language(self, mock_cost_response):
+        """Test that the same report renders its sections in either language"""
+        from renderers import build_report, render
+
+        pytest.importorskip("numpy")
+        report = build_report(
+            mock_cost_response, None, 7, _every_section(mock_cost_response)
+        )
+
+        assert "🌐 対象アカウント" in render(report, "text", "ja")
+        assert "  (タグなし): $3.00 (誤差 ≤ $1.00)" in render(report, "text", "ja")
+        assert "🌐 Target accounts" in render(report, "text", "en")
+
+    def test_delivery_notices_in_english(self):
+        """Test the link and truncation notices and the budget alert"""
+        from datetime import date, datetime, timezone
+
+        from budget_alerts import TOTAL, Breach, format_alert
+        from delivery import plan_parts
+
+        message = "\n".join(["line"] * 80000)
+        summarized = plan_parts(
+            message,
+            "AWS Daily Report",
+            link="https://example.com/r",
+            link_expires=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            language="en",
+        )
+        split = plan_parts(message, "AWS Daily Report", max_parts=1, language="en")
+        alert = format_alert(
+            [Breach(TOTAL, Decimal("120"), Decimal("100"))], date(2024, 1, 1), "en"
+        )
+
+        assert summarized[0].message.endswith(
+            "📎 Full report (valid until 2024-01-01 00:00 UTC): https://example.com/r"
+        )
+        assert "… (the rest was left out" in summarized[0].message
+        assert split[0].message.endswith("more parts were left out)")
+        assert "  Total: $120.00 / budget $100.00 (120%)" in alert
+        for text in (summarized[0].message, split[0].message, alert):
+            assert not JAPANESE.search(text)
+
+
+@pytest.mark.unit
+class TestChannelRenderers:
+    """Tests for the Slack, Teams, HTML and CSV renderers"""
+
+    def test_slack_blocks(self, mock_cost_response, mock_resource_data):
+        """Test the Block Kit payload and its limits"""
+        from renderers import SLACK_MAX_BLOCKS, SLACK_MAX_TEXT, render
+
+        sections = [(f"section {i}", ["x" * 5000]) for i in range(60)]
+        report = _report(mock_cost_response, mock_resource_data, sections)
+
+        payload = json.loads(render(report, "slack"))
+
+        assert payload["text"] == "AWS 日次レポート"
+        assert payload["blocks"][0]["type"] == "header"
+        assert len(payload["blocks"]) == SLACK_MAX_BLOCKS
+        texts = [
+            block["text"]["text"]
+            for block in payload["blocks"]
+            if block["type"] == "section" and "text" in block
+        ]
+        assert all(len(text) <= SLACK_MAX_TEXT for text in texts)
+        assert all(text.count("```") % 2 == 0 for text in texts)
+        assert texts[-1].endswith("x```")
+        assert "EC2 インスタンス: 総数 3, 稼働中 2" in json.dumps(
+            payload, ensure_ascii=False
+        )
+
+    def test_teams_card(self, mock_cost_response, mock_resource_data):
+        """Test the Adaptive Card payload"""
+        from renderers import render
+
+        payload = json.loads(
+            render(_report(mock_cost_response, mock_resource_data), "teams", "en")
+        )
+
+        attachment = payload["attachments"][0]
+        assert attachment["contentType"] == "application/vnd.microsoft.card.adaptive"
+        body = attachment["content"]["body"]
+        assert body[0]["text"] == "AWS Daily Report"
+        fact_sets = [block for block in body if block["type"] == "FactSet"]
+        assert any(
+            {"title": "Running", "value": "2"} in block["facts"] for block in fact_sets
+        )
+
+    def test_html_escapes_values(self, mock_resource_data):
+        """Test that report values cannot inject markup"""
+        from renderers import build_report, render
+
+        cost_data = {
+            "ResultsByTime": [
+                {
+                    "TimePeriod": {"Start": "2024-01-01", "End": "2024-01-02"},
+                    "Groups": [
+                        {
+                            "Keys": ["<script>alert(1)</script>"],
+                            "Metrics": {"UnblendedCost": {"Amount": "5.00"}},
+                        }
+                    ],
+                }
+            ]
+        }
+        report = build_report(cost_data, mock_resource_data, 1, [("<b>", ["a & b"])])
+
+        page = render(report, "html")
+
+        assert page.startswith("<!DOCTYPE html>")
+        assert "<script>" not in page
+        assert "&lt;script&gt;alert(1)&lt;/script&gt;" in page
+        assert "<pre>a &amp; b</pre>" in page
+
+    def test_csv_rows(self, mock_cost_response, mock_resource_data):
+        """Test that the CSV holds every figure of the report"""
+        from renderers import render
+
+        rows = list(
+            csv.reader(
+                io.StringIO(
+                    render(_report(mock_cost_response, mock_resource_data), "csv")
+                )
+            )
+        )
+
+        assert rows[0] == ["record", "key", "detail", "value"]
+        assert ["total", "7", "", "27.25"] in rows
+        assert ["resource", "EC2", "running", "2"] in rows
+        assert sum(1 for row in rows if row[0] == "daily") == 2
+
+    def test_partial_report(self):
+        """Test that every format renders without costs and resources"""
+        from renderers import RENDERERS, build_report, render_all
+
+        outputs = render_all(build_report(None, None, 7), list(RENDERERS), "en")
+
+        assert "Failed to fetch the cost data." in outputs["text"]
+        assert "Failed to fetch the resource information." in outputs["html"]
+        assert outputs["csv"] == "record,key,detail,value\n"
+
+
+@pytest.mark.integration
+class TestSendToChannels:
+    """Tests for sending the report to the configured channels"""
+
+    def test_webhooks_and_stored_formats(
+        self, monkeypatch, mock_cost_response, mock_resource_data
+    ):
+        """Test that one report is posted and stored in every format"""
+        from cost_notifier import send_to_channels
+
+        monkeypatch.setenv("SLACK_WEBHOOK_URL", "https://hooks.slack.com/x")
+        monkeypatch.setenv("TEAMS_WEBHOOK_URL", "https://teams.example.com/x")
+        monkeypatch.setenv("REPORT_BUCKET", "report-bucket")
+        monkeypatch.setenv("REPORT_FORMATS", "html,csv")
+        s3 = Mock()
+        post = Mock(side_effect=[Exception("invalid_token"), 200])
+
+        with patch("cost_notifier.s3_client", s3), patch(
+            "cost_notifier.post_webhook", post
+        ):
+            send_to_channels(_report(mock_cost_response, mock_resource_data))
+
+        urls = [call.args[0] for call in post.call_args_list]
+        assert urls == ["https://hooks.slack.com/x", "https://teams.example.com/x"]
+        stored = {
+            call.kwargs["Key"].rsplit(".", 1)[1]: call.kwargs["ContentType"]
+            for call in s3.put_object.call_args_list
+        }
+        assert stored == {
+            "html": "text/html; charset=utf-8",
+            "csv": "text/csv; charset=utf-8",
+        }
+
+    def test_slack_and_teams_stored_apart(
+        self, monkeypatch, mock_cost_response, mock_resource_data
+    ):
+        """Test that the two JSON renderings are stored under their own keys"""
+        from cost_notifier import send_to_channels
+
+        monkeypatch.setenv("REPORT_BUCKET", "report-bucket")
+        monkeypatch.setenv("REPORT_FORMATS", "slack,teams")
+        s3 = Mock()
+
+        with patch("cost_notifier.s3_client", s3):
+            send_to_channels(_report(mock_cost_response, mock_resource_data))
+
+        keys = [call.kwargs["Key"] for call in s3.put_object.call_args_list]
+        assert len(keys) == 2
+        assert keys[0].endswith(".slack.json")
+        assert keys[1].endswith(".teams.json")
+
+    def test_unsupported_language_falls_back(
+        self, monkeypatch, capsys, mock_environment, mock_sns_client
+    ):
+        """Test that an invalid REPORT_LANGUAGE still sends the Japanese report"""
+        import cost_notifier
+        from inventory import REGISTRY
+
+        monkeypatch.setenv("REPORT_LANGUAGE", "fr")
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.get_cost_data", return_value=None
+        ), patch("cost_notifier.get_resource_counts", return_value=REGISTRY.defaults()):
+            response = cost_notifier.lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        message = mock_sns_client.publish.call_args.kwargs["Message"]
+        assert message.startswith("=== AWS 日次レポート ===")
+        assert "Unsupported REPORT_LANGUAGE 'fr', using ja" in capsys.readouterr().out
+
+    def test_english_notification(
+        self, monkeypatch, mock_environment, mock_sns_client, mock_cost_response
+    ):
+        """Test REPORT_LANGUAGE in lambda_handler"""
+        import cost_notifier
+        from inventory import REGISTRY
+
+        monkeypatch.setenv("REPORT_LANGUAGE", "en")
+
+        with patch("cost_notifier.sns_client", mock_sns_client), patch(
+            "cost_notifier.get_cost_data", return_value=mock_cost_response
+        ), patch("cost_notifier.get_resource_counts", return_value=REGISTRY.defaults()):
+            response = cost_notifier.lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        message = mock_sns_client.publish.call_args.kwargs["Message"]
+        assert message.startswith("=== AWS Daily Report ===")
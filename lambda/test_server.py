@@ -0,0 +1,205 @@
+"""
+Unit tests for the local report server.
+Backend calls go to the simulated account of simulated_aws.
+"""
+
+import asyncio
+import json
+import pytest
+
+
+def _backend(**overrides):
+    """Simulated account with a little latency, so that requests overlap"""
+    from simulated_aws import SimulatedBackend, SimulationConfig
+
+    settings = dict(services=5, latency=0.05, latency_jitter=0)
+    settings.update(overrides)
+    return SimulatedBackend(SimulationConfig(**settings))
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    import clients
+
+    backend = _backend()
+    monkeypatch.setattr(clients, "registry", backend.registry())
+    return backend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _get(port, target, method="GET"):
+    """Send one request; returns (status, headers, body)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:])
+    return int(lines[0].split()[1]), headers, body.decode("utf-8")
+
+
+def _serve(server, *targets):
+    """Start the server on a free port and send the requests concurrently"""
+
+    async def run():
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            return await asyncio.gather(*(_get(port, t) for t in targets))
+
+    return asyncio.run(run())
+
+
+@pytest.mark.unit
+class TestTTLCache:
+    """Tests for the TTL cache and request coalescing"""
+
+    def test_concurrent_requests_share_one_fetch(self):
+        """Test that callers of an entry being fetched wait for that fetch"""
+        from server import TTLCache
+
+        cache = TTLCache()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        async def run():
+            return await asyncio.gather(*(cache.get("k", fetch) for _ in range(10)))
+
+        assert asyncio.run(run()) == ["value"] * 10
+        assert len(calls) == 1
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["coalesced"] == 9
+
+    def test_entries_expire(self):
+        """Test that an entry is fetched again after the TTL"""
+        from server import TTLCache
+
+        clock = FakeClock()
+        cache = TTLCache(ttl=60, clock=clock)
+        values = iter(["first", "second"])
+
+        async def fetch():
+            return next(values)
+
+        async def get():
+            return await cache.get("k", fetch)
+
+        assert asyncio.run(get()) == "first"
+        clock.now = 59
+        assert asyncio.run(get()) == "first"
+        clock.now = 60
+        assert asyncio.run(get()) == "second"
+        assert cache.hits == 1
+
+    def test_failures_are_not_cached(self):
+        """Test that every waiting caller sees the error and the next one retries"""
+        from server import TTLCache
+
+        cache = TTLCache()
+        outcomes = iter([RuntimeError("throttled"), "value"])
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        async def run():
+            return await asyncio.gather(
+                cache.get("k", fetch), cache.get("k", fetch), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert asyncio.run(cache.get("k", fetch)) == "value"
+
+
+@pytest.mark.integration
+class TestReportServer:
+    """Tests for the HTTP endpoints"""
+
+    def test_concurrent_reports_fetch_once(self, backend, mock_environment):
+        """Test that concurrent requests for a window cause one backend fetch"""
+        from server import ReportServer
+
+        server = ReportServer()
+        responses = _serve(
+            server,
+            *["/report?days=7"] * 5,
+            *["/costs?days=7"] * 5,
+            "/report?days=7&format=html&lang=en",
+        )
+
+        assert [status for status, _, _ in responses] == [200] * 11
+        assert backend.calls["ce.GetCostAndUsage"] == 1
+        inventory_calls = backend.calls["ec2.DescribeInstances"]
+        assert "=== AWS 日次レポート ===" in responses[0][2]
+        costs = json.loads(responses[5][2])
+        assert costs["days"] == 7
+        assert len(costs["daily"]) == 7
+        assert responses[-1][1]["Content-Type"] == "text/html; charset=utf-8"
+
+        # Served from the cache until the entries expire
+        _serve(server, "/report?days=7", "/resources")
+        assert backend.calls["ce.GetCostAndUsage"] == 1
+        assert backend.calls["ec2.DescribeInstances"] == inventory_calls
+        _serve(server, "/costs?days=30")
+        assert backend.calls["ce.GetCostAndUsage"] == 2
+
+    def test_errors(self, backend, mock_environment):
+        """Test the responses to bad requests"""
+        from server import ReportServer
+
+        responses = _serve(
+            ReportServer(),
+            "/report?days=abc",
+            "/report?days=1000",
+            "/report?format=pdf",
+            "/report?lang=fr",
+            "/unknown",
+            "/healthz",
+        )
+
+        assert [status for status, _, _ in responses] == [400, 400, 400, 400, 404, 200]
+        assert "ce.GetCostAndUsage" not in backend.calls
+
+    def test_method_not_allowed(self):
+        """Test that only GET is served"""
+        from server import ReportServer
+
+        status, _, _ = asyncio.run(ReportServer().respond("POST", "/report"))
+
+        assert status == 405
+
+    def test_failed_fetch_is_retried(self, backend, mock_environment, monkeypatch):
+        """Test that a failed cost fetch is a 502 and is not cached"""
+        import cost_notifier
+        from server import ReportServer
+
+        get_cost_data = cost_notifier.get_cost_data
+        failures = [None]
+        monkeypatch.setattr(
+            cost_notifier,
+            "get_cost_data",
+            lambda **kwargs: failures.pop() if failures else get_cost_data(**kwargs),
+        )
+        server = ReportServer()
+
+        assert _serve(server, "/costs")[0][0] == 502
+        assert _serve(server, "/costs")[0][0] == 200
+        stats = json.loads(_serve(server, "/stats")[0][2])
+        assert stats["entries"] == 2
@@ -0,0 +1,158 @@
+"""
+Unit tests for the simulated AWS backend used by the benchmarks.
+"""
+
+import pytest
+from datetime import date
+from botocore.exceptions import ClientError
+
+
+def _backend(**overrides):
+    """Small, fast simulated account"""
+    from simulated_aws import SimulatedBackend, SimulationConfig
+
+    settings = dict(
+        services=20,
+        ec2_instances=250,
+        rds_instances=30,
+        s3_buckets=7,
+        lambda_functions=120,
+        latency=0,
+        latency_jitter=0,
+    )
+    settings.update(overrides)
+    return SimulatedBackend(SimulationConfig(**settings))
+
+
+@pytest.mark.unit
+class TestSimulatedCostExplorer:
+    """Tests for SimulatedCostExplorer"""
+
+    def test_pages_cover_every_group_once(self):
+        """Test that groups are split across pages without gaps or repeats"""
+        ce = _backend(ce_page_size=7).client("ce")
+        kwargs = {
+            "TimePeriod": {"Start": "2024-01-01", "End": "2024-01-11"},
+            "Granularity": "DAILY",
+            "Metrics": ["UnblendedCost"],
+            "GroupBy": [{"Type": "DIMENSION", "Key": "SERVICE"}],
+        }
+
+        cells = []
+        pages = 0
+        while True:
+            response = ce.get_cost_and_usage(**kwargs)
+            pages += 1
+            cells += [
+                (result["TimePeriod"]["Start"], group["Keys"][0])
+                for result in response["ResultsByTime"]
+                for group in result["Groups"]
+            ]
+            if "NextPageToken" not in response:
+                break
+            kwargs["NextPageToken"] = response["NextPageToken"]
+
+        assert pages == -(-200 // 7)
+        assert len(cells) == len(set(cells)) == 200
+
+    def test_costs_are_deterministic(self):
+        """Test that the same seed gives the same costs"""
+        kwargs = {
+            "TimePeriod": {"Start": "2024-01-01", "End": "2024-01-03"},
+            "Granularity": "DAILY",
+            "Metrics": ["UnblendedCost"],
+            "GroupBy": [{"Type": "DIMENSION", "Key": "SERVICE"}],
+        }
+
+        first = _backend().client("ce").get_cost_and_usage(**kwargs)
+        second = _backend().client("ce").get_cost_and_usage(**kwargs)
+
+        assert first == second
+
+    def test_throttling(self):
+        """Test that throttled calls raise ThrottlingException"""
+        ce = _backend(throttle_rate=1.0).client("ce")
+
+        with pytest.raises(ClientError) as excinfo:
+            ce.get_cost_forecast(
+                TimePeriod={"Start": "2024-01-15", "End": "2024-02-01"},
+                Metric="UNBLENDED_COST",
+                Granularity="MONTHLY",
+            )
+
+        assert excinfo.value.response["Error"]["Code"] == "ThrottlingException"
+
+    def test_get_cost_data_recovers_from_throttling(self):
+        """Test that the report's fetch path completes under throttling"""
+        from cost_notifier import AdaptiveBackoff, get_cost_data
+
+        backend = _backend(throttle_rate=0.3, ce_page_size=100)
+
+        result = get_cost_data(
+            days=60,
+            ce=backend.client("ce"),
+            shard_days=15,
+            backoff=AdaptiveBackoff(base_delay=0.001, max_attempts=30),
+        )
+
+        assert len(result["ResultsByTime"]) == 60
+        assert all(len(r["Groups"]) == 20 for r in result["ResultsByTime"])
+
+    def test_month_to_date_and_forecast(self):
+        """Test the ungrouped and forecast responses used by the forecast"""
+        from forecast import get_cost_forecast
+
+        result = get_cost_forecast(_backend().client("ce"), today=date(2024, 1, 15))
+
+        assert result.month_to_date > 0
+        assert result.lower_bound < result.forecast < result.upper_bound
+
+
+@pytest.mark.unit
+class TestSimulatedResources:
+    """Tests for the simulated resource APIs"""
+
+    def test_get_resource_counts(self):
+        """Test that the collectors page through every resource"""
+        from cost_notifier import get_resource_counts
+        from inventory import REGISTRY
+
+        backend = _backend()
+
+        resources = get_resource_counts(
+            clients={name: backend.client(name) for name in REGISTRY.services()}
+        )
+
+        assert resources["EC2"]["total"] == 250
+        assert 0 < resources["EC2"]["running"] < 250
+        assert resources["RDS"]["total"] == 30
+        assert resources["S3"]["total_buckets"] == 7
+        assert resources["Lambda"]["total_functions"] == 120
+        assert backend.calls["lambda.ListFunctions"] == 3
+
+    def test_registry_serves_simulated_clients(self):
+        """Test that the backend plugs into the client registry"""
+        from simulated_aws import SimulatedSNS
+
+        backend = _backend()
+        registry = backend.registry()
+
+        sns = registry.client("sns")
+        sns.publish(TopicArn="arn", Message="hello")
+
+        assert isinstance(sns, SimulatedSNS)
+        assert backend.client("sns").messages == ["hello"]
+
+    def test_calls_are_instrumented(self):
+        """Test that simulated calls report pages and bytes"""
+        import instrumentation
+
+        ec2 = _backend(ec2_page_size=100).client("ec2")
+
+        with instrumentation.invocation(enabled=True) as recorder:
+            with instrumentation.stage("resources"):
+                list(ec2.get_paginator("describe_instances").paginate())
+
+        measurement = recorder.api_calls["ec2.DescribeInstances"]
+        assert measurement.pages == 3
+        assert measurement.bytes_received > 250 * 500
@@ -0,0 +1,271 @@
+"""
+Unit tests for report snapshots and day-over-day diffing.
+"""
+
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+
+
+def _cost_data(days):
+    """Build ResultsByTime from {date: {service: amount}}"""
+    return {
+        "ResultsByTime": [
+            {
+                "TimePeriod": {"Start": day, "End": day},
+                "Groups": [
+                    {
+                        "Keys": [service],
+                        "Metrics": {"UnblendedCost": {"Amount": amount, "Unit": "USD"}},
+                    }
+                    for service, amount in services.items()
+                ],
+            }
+            for day, services in days.items()
+        ]
+    }
+
+
+class RecordingBackend:
+    """In-memory cache backend that counts reads"""
+
+    def __init__(self):
+        self.values = {}
+        self.reads = 0
+
+    def get(self, key):
+        self.reads += 1
+        return self.values.get(key)
+
+    def put(self, key, value):
+        self.values[key] = value
+
+
+@pytest.mark.unit
+class TestSnapshot:
+    """Tests for taking, storing and loading snapshots"""
+
+    def test_take_snapshot_uses_latest_day(self, mock_resource_data):
+        """Test that only the most recent day's significant costs are kept"""
+        from snapshots import take_snapshot
+
+        snapshot = take_snapshot(
+            _cost_data(
+                {
+                    "2024-01-01": {"AmazonEC2": "5.00"},
+                    "2024-01-02": {"AmazonEC2": "7.50", "Tax": "0.001"},
+                }
+            ),
+            mock_resource_data,
+        )
+
+        assert snapshot.day == "2024-01-02"
+        assert snapshot.costs == {"AmazonEC2": Decimal("7.50")}
+        assert snapshot.resources["EC2"] == {"total": 3, "running": 2}
+
+    def test_stored_compressed_and_versioned(self):
+        """Test the round trip through the backend's JSON values"""
+        from snapshots import (
+            LATEST_KEY,
+            SNAPSHOT_VERSION,
+            Snapshot,
+            load_previous,
+            save_snapshot,
+        )
+
+        backend = RecordingBackend()
+        costs = {f"Service {i}": Decimal("1.25") for i in range(300)}
+        snapshot = Snapshot("2024-01-02", costs, {"EC2": {"total": 4}})
+
+        save_snapshot(backend, snapshot)
+
+        entry = backend.values[LATEST_KEY]
+        assert entry["version"] == SNAPSHOT_VERSION
+        assert entry["encoding"] == "gzip"
+        assert len(entry["data"]) < 2000
+        assert load_previous(backend, "2024-01-03") == snapshot
+
+    def test_unknown_version_is_ignored(self):
+        """Test that snapshots of another format version are not read"""
+        from snapshots import LATEST_KEY, load_previous
+
+        backend = RecordingBackend()
+        backend.put(LATEST_KEY, {"version": 0, "data": ""})
+
+        assert load_previous(backend, "2024-01-03") is None
+
+    def test_same_day_rerun_compares_with_previous_day(self):
+        """Test that the previous day's snapshot survives a second run"""
+        from snapshots import Snapshot, load_previous, save_snapshot
+
+        backend = RecordingBackend()
+        save_snapshot(backend, Snapshot("2024-01-01", {"A": Decimal("1")}))
+        save_snapshot(backend, Snapshot("2024-01-02", {"A": Decimal("2")}))
+        save_snapshot(backend, Snapshot("2024-01-02", {"A": Decimal("3")}))
+
+        previous = load_previous(backend, "2024-01-02")
+
+        assert previous.day == "2024-01-01"
+        assert load_previous(backend, "2024-01-03").costs == {"A": Decimal("3")}
+
+    def test_load_is_independent_of_history(self):
+        """Test that loading reads a constant number of keys"""
+        from snapshots import Snapshot, load_previous, save_snapshot
+
+        backend = RecordingBackend()
+        for day in range(1, 31):
+            save_snapshot(backend, Snapshot(f"2024-01-{day:02d}"))
+        backend.reads = 0
+
+        load_previous(backend, "2024-01-31")
+
+        assert backend.reads == 1
+        assert len(backend.values) == 2
+
+
+@pytest.mark.unit
+class TestDiffSnapshots:
+    """Tests for diff_snapshots and the report section"""
+
+    def _diff(self, **kwargs):
+        from snapshots import Snapshot, diff_snapshots
+
+        previous = Snapshot(
+            "2024-01-01",
+            {"AmazonEC2": Decimal("10"), "AmazonS3": Decimal("2"), "Old": Decimal("3")},
+            {"EC2": {"total": 12, "running": 12}, "S3": {"total_buckets": 4}},
+        )
+        current = Snapshot(
+            "2024-01-02",
+            {
+                "AmazonEC2": Decimal("30"),
+                "AmazonS3": Decimal("2.10"),
+                "New": Decimal("1"),
+            },
+            {"EC2": {"total": 40, "running": 40}, "S3": {"total_buckets": 5}},
+        )
+        return diff_snapshots(previous, current, **kwargs)
+
+    def test_changes_and_highlights(self):
+        """Test deltas, their order and which are highlighted"""
+        diff = self._diff()
+
+        assert [change.name for change in diff.services] == [
+            "AmazonEC2",
+            "Old",
+            "New",
+            "AmazonS3",
+        ]
+        assert [change.significant for change in diff.services] == [
+            True,
+            True,
+            True,
+            False,
+        ]
+        assert diff.total.before == Decimal("15")
+        assert diff.total.after == Decimal("33.10")
+        running = diff.resources[1]
+        assert running.name == ("EC2", "running")
+        assert (running.delta, running.significant) == (28, True)
+        assert diff.resources[2].significant is False
+
+    def test_top_n(self):
+        """Test that only the largest service changes are kept"""
+        diff = self._diff(top_n=1)
+
+        assert [change.name for change in diff.services] == ["AmazonEC2"]
+
+    def test_format_section(self):
+        """Test the rendered lines"""
+        from inventory import REGISTRY
+        from snapshots import format_diff_section
+
+        title, lines = format_diff_section(self._diff(), labels=REGISTRY.labels())
+
+        assert title == "📈 前日比"
+        assert "比較対象: 2024-01-01 → 2024-01-02" in lines
+        assert "💰 日次コスト: $15.00 → $33.10 (+$18.10, +120.7%) ⚠️" in lines
+        assert "  AmazonEC2: $10.00 → $30.00 (+$20.00, +200.0%) ⚠️" in lines
+        assert "  Old: $3.00 → $0.00 (-$3.00, -100.0%) ⚠️" in lines
+        assert "  New: $0.00 → $1.00 (+$1.00) ⚠️" in lines
+        assert "  EC2 稼働中: 12 → 40 (+28) ⚠️" in lines
+        assert "  S3 総数: 4 → 5 (+1)" in lines
+
+    def test_format_without_previous_snapshot(self):
+        """Test the first run"""
+        from snapshots import format_diff_section
+
+        _, lines = format_diff_section(None)
+
+        assert lines == ["前回のスナップショットがないため、次回から比較します。"]
+
+
+@pytest.mark.integration
+class TestSnapshotDiffInHandler:
+    """Tests for ENABLE_SNAPSHOT_DIFF in lambda_handler"""
+
+    def _run(self, cost_notifier, sns, cost_data, resources):
+        with patch("cost_notifier.sns_client", sns), patch(
+            "cost_notifier.get_cost_data", return_value=cost_data
+        ), patch("cost_notifier.get_resource_counts", return_value=resources):
+            response = cost_notifier.lambda_handler({}, None)
+        assert response["statusCode"] == 200
+        return sns.publish.call_args[1]["Message"]
+
+    def test_consecutive_runs(
+        self, mock_environment, monkeypatch, tmp_path, mock_sns_client
+    ):
+        """Test that the second day's report shows the overnight change"""
+        import cost_notifier
+        from inventory import REGISTRY
+
+        monkeypatch.setenv("ENABLE_SNAPSHOT_DIFF", "true")
+        monkeypatch.setenv("COST_CACHE_DIR", str(tmp_path))
+        monkeypatch.delenv("COST_CACHE_BUCKET", raising=False)
+        monkeypatch.setattr(cost_notifier, "_cache_backend", None)
+        monkeypatch.setattr(cost_notifier, "_cost_cache", None)
+        before = REGISTRY.defaults()
+        before["EC2"] = {"total": 12, "running": 12}
+        after = REGISTRY.defaults()
+        after["EC2"] = {"total": 40, "running": 40}
+
+        first = self._run(
+            cost_notifier,
+            mock_sns_client,
+            _cost_data({"2024-01-01": {"AmazonEC2": "10.00"}}),
+            before,
+        )
+        second = self._run(
+            cost_notifier,
+            mock_sns_client,
+            _cost_data(
+                {
+                    "2024-01-01": {"AmazonEC2": "10.00"},
+                    "2024-01-02": {"AmazonEC2": "30.00"},
+                }
+            ),
+            after,
+        )
+
+        assert "前回のスナップショットがないため" in first
+        assert "📈 前日比" in second
+        assert "  EC2 稼働中: 12 → 40 (+28) ⚠️" in second
+        assert "  AmazonEC2: $10.00 → $30.00 (+$20.00, +200.0%) ⚠️" in second
+
+    def test_skipped_without_storage(
+        self, mock_environment, monkeypatch, mock_sns_client, mock_cost_response
+    ):
+        """Test that the report is sent without the section"""
+        import cost_notifier
+        from inventory import REGISTRY
+
+        monkeypatch.setenv("ENABLE_SNAPSHOT_DIFF", "true")
+        monkeypatch.delenv("COST_CACHE_DIR", raising=False)
+        monkeypatch.delenv("COST_CACHE_BUCKET", raising=False)
+        monkeypatch.setattr(cost_notifier, "_cache_backend", None)
+
+        message = self._run(
+            cost_notifier, mock_sns_client, mock_cost_response, REGISTRY.defaults()
+        )
+
+        assert "📈 前日比" not in message
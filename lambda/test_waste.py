@@ -0,0 +1,203 @@
+"""
+Unit tests for idle resource detection.
+Metrics come from the simulated CloudWatch of simulated_aws.
+"""
+
+import math
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+NOW = datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _backend(**overrides):
+    """Simulated account without latency"""
+    from simulated_aws import SimulatedBackend, SimulationConfig
+
+    settings = dict(services=5, latency=0, latency_jitter=0)
+    settings.update(overrides)
+    return SimulatedBackend(SimulationConfig(**settings))
+
+
+def _cloudwatch(values):
+    """CloudWatch mock answering every query with the values of its instance"""
+    cloudwatch = Mock()
+
+    def get_metric_data(MetricDataQueries, **kwargs):
+        return {
+            "MetricDataResults": [
+                {
+                    "Id": query["Id"],
+                    "Values": values[
+                        query["MetricStat"]["Metric"]["Dimensions"][0]["Value"]
+                    ],
+                }
+                for query in MetricDataQueries
+            ]
+        }
+
+    cloudwatch.get_metric_data.side_effect = get_metric_data
+    return cloudwatch
+
+
+@pytest.mark.unit
+class TestFindIdleInstances:
+    """Tests for find_idle_instances"""
+
+    def test_thousands_of_instances_in_few_calls(self):
+        """Test that metrics are fetched in batches of 500 queries"""
+        from waste import MAX_QUERIES_PER_REQUEST, collect_waste
+
+        backend = _backend(ec2_instances=5000, rds_instances=200)
+
+        report = collect_waste(
+            backend.client("ec2"), backend.client("rds"), backend.client("cloudwatch")
+        )
+
+        calls = backend.calls["cloudwatch.GetMetricData"]
+        assert report.checked > 4000
+        assert calls == math.ceil(report.checked / MAX_QUERIES_PER_REQUEST)
+        assert calls <= 10
+        assert report.requests == calls
+        assert 0.05 < len(report.idle) / report.checked < 0.15
+        assert {item.instance.kind for item in report.idle} == {"EC2", "RDS"}
+
+    def test_fake_rejects_oversized_requests(self):
+        """Test that the simulated CloudWatch enforces the query limit"""
+        from botocore.exceptions import ClientError
+        from waste import Instance, metric_query
+
+        cloudwatch = _backend().client("cloudwatch")
+        queries = [
+            metric_query(f"q{i}", Instance("EC2", f"i-{i}", "t3.micro"))
+            for i in range(501)
+        ]
+
+        with pytest.raises(ClientError, match="greater than 500"):
+            cloudwatch.get_metric_data(
+                MetricDataQueries=queries, StartTime=NOW, EndTime=NOW
+            )
+
+    def test_follows_next_token(self):
+        """Test that results continued on later pages are used"""
+        from waste import collect_waste
+
+        paged = _backend(ec2_instances=600, metric_datapoints_per_call=1400)
+        single = _backend(ec2_instances=600)
+
+        reports = [
+            collect_waste(
+                backend.client("ec2"),
+                backend.client("rds"),
+                backend.client("cloudwatch"),
+            )
+            for backend in (paged, single)
+        ]
+
+        assert paged.calls["cloudwatch.GetMetricData"] > 2
+        assert single.calls["cloudwatch.GetMetricData"] == 2
+        assert [i.instance for i in reports[0].idle] == [
+            i.instance for i in reports[1].idle
+        ]
+
+    def test_idle_instances_and_savings(self):
+        """Test the threshold, the data requirement and the estimate"""
+        from waste import HOURS_PER_MONTH, Instance, find_idle_instances
+
+        instances = [
+            Instance("EC2", "i-idle", "m5.large"),
+            Instance("EC2", "i-busy", "m5.large"),
+            Instance("EC2", "i-new", "m5.large"),
+            Instance("RDS", "db-idle", "db.t3.medium", multiplier=2),
+            Instance("EC2", "i-exotic", "x9.mega"),
+        ]
+        cloudwatch = _cloudwatch(
+            {
+                "i-idle": [1.0] * 14,
+                "i-busy": [40.0] * 14,
+                "i-new": [0.5] * 3,
+                "db-idle": [2.0] * 14,
+                "i-exotic": [0.1] * 14,
+            }
+        )
+
+        report = find_idle_instances(cloudwatch, instances, days=14, now=NOW)
+
+        assert [item.instance.resource_id for item in report.idle] == [
+            "db-idle",
+            "i-idle",
+            "i-exotic",
+        ]
+        assert report.monthly_savings == pytest.approx(
+            (0.068 * 2 + 0.096) * HOURS_PER_MONTH
+        )
+        query = cloudwatch.get_metric_data.call_args.kwargs
+        assert query["EndTime"] == datetime(2024, 3, 1, tzinfo=timezone.utc)
+        assert (query["EndTime"] - query["StartTime"]).days == 14
+
+    def test_format_section(self):
+        """Test the report section"""
+        from waste import (
+            IdleInstance,
+            Instance,
+            WasteReport,
+            format_waste_section,
+        )
+
+        report = WasteReport(14, 5.0, checked=3)
+        report.idle = [
+            IdleInstance(Instance("EC2", "i-1", "m5.large"), 1.25),
+            IdleInstance(Instance("EC2", "i-2", "x9.mega"), 0.5),
+        ]
+
+        title, lines = format_waste_section(report)
+
+        assert title == "💤 アイドルリソース"
+        assert lines[0] == (
+            "過去14日間の平均 CPU 使用率が 5% 未満のインスタンス: 2 件 (確認 3 件)"
+        )
+        assert "💰 推定削減額: $70.08/月" in lines
+        assert "  EC2 i-1 (m5.large): CPU 1.2%, $70.08/月" in lines
+        assert "  EC2 i-2 (x9.mega): CPU 0.5%, 削減額不明" in lines
+
+
+@pytest.mark.integration
+class TestWasteDetectionInHandler:
+    """Tests for ENABLE_WASTE_DETECTION in lambda_handler"""
+
+    def test_section_in_report(self, monkeypatch, mock_environment):
+        """Test that idle instances are reported"""
+        import clients
+        import cost_notifier
+
+        backend = _backend(ec2_instances=300, rds_instances=20)
+        monkeypatch.setattr(clients, "registry", backend.registry())
+        monkeypatch.setenv("ENABLE_WASTE_DETECTION", "true")
+        monkeypatch.setenv("WASTE_LOOKBACK_DAYS", "7")
+
+        response = cost_notifier.lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        message = backend.client("sns").messages[-1]
+        assert "💤 アイドルリソース" in message
+        assert "過去7日間の平均 CPU 使用率" in message
+        assert backend.calls["cloudwatch.GetMetricData"] == 1
+
+    def test_metric_failure_omits_section(self, monkeypatch, mock_environment):
+        """Test that the report is sent without the section"""
+        import clients
+        import cost_notifier
+
+        backend = _backend(ec2_instances=30)
+        cloudwatch = backend.client("cloudwatch")
+        monkeypatch.setattr(
+            cloudwatch, "get_metric_data", Mock(side_effect=Exception("AccessDenied"))
+        )
+        monkeypatch.setattr(clients, "registry", backend.registry())
+        monkeypatch.setenv("ENABLE_WASTE_DETECTION", "true")
+
+        response = cost_notifier.lambda_handler({}, None)
+
+        assert response["statusCode"] == 200
+        assert "💤 アイドルリソース" not in backend.client("sns").messages[-1]
@@ -0,0 +1,264 @@
+"""
+Idle resource detection from CloudWatch CPU utilization.
+
+Running EC2 instances and available RDS instances are listed, and the daily
+average CPUUtilization of all of them over the lookback window is fetched
+with GetMetricData. One request carries up to 500 metric queries, so
+thousands of instances take a handful of calls instead of one
+GetMetricStatistics call per resource. Instances whose average stays below
+the threshold are reported as idle, with the on-demand cost that stopping or
+downsizing them would save.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+import instrumentation
+from renderers import STRINGS
+
+LOOKBACK_DAYS = 14
+
+# Average CPU utilization (%) below which an instance counts as idle
+CPU_THRESHOLD = 5.0
+
+# Days of data an instance needs before it is judged, so that instances
+# launched during the window are not reported
+MIN_DATAPOINTS = 7
+
+# GetMetricData accepts at most this many queries per request
+MAX_QUERIES_PER_REQUEST = 500
+
+METRIC_WORKERS = 4
+
+TOP_IDLE = 10
+
+HOURS_PER_MONTH = 730
+
+# Approximate on-demand prices (USD per hour, us-east-1, Linux / single-AZ).
+# Instances of other types are reported without a savings estimate.
+HOURLY_PRICES = {
+    "t3.nano": 0.0052,
+    "t3.micro": 0.0104,
+    "t3.small": 0.0208,
+    "t3.medium": 0.0416,
+    "t3.large": 0.0832,
+    "t3.xlarge": 0.1664,
+    "m5.large": 0.096,
+    "m5.xlarge": 0.192,
+    "m5.2xlarge": 0.384,
+    "m6i.large": 0.096,
+    "m6i.xlarge": 0.192,
+    "c5.large": 0.085,
+    "c5.xlarge": 0.17,
+    "c5.2xlarge": 0.34,
+    "r5.large": 0.126,
+    "r5.xlarge": 0.252,
+    "db.t3.micro": 0.017,
+    "db.t3.small": 0.034,
+    "db.t3.medium": 0.068,
+    "db.t3.large": 0.136,
+    "db.m5.large": 0.171,
+    "db.m5.xlarge": 0.342,
+    "db.r5.large": 0.24,
+    "db.r5.xlarge": 0.48,
+}
+
+NAMESPACES = {
+    "EC2": ("AWS/EC2", "InstanceId"),
+    "RDS": ("AWS/RDS", "DBInstanceIdentifier"),
+}
+
+
+@dataclass
+class Instance:
+    """A running instance whose CPU utilization is checked"""
+
+    kind: str
+    resource_id: str
+    instance_type: str
+    # RDS Multi-AZ instances run (and cost) twice
+    multiplier: int = 1
+
+    @property
+    def monthly_cost(self):
+        """On-demand cost per month, or None for unknown types"""
+        price = HOURLY_PRICES.get(self.instance_type)
+        if price is None:
+            return None
+        return price * self.multiplier * HOURS_PER_MONTH
+
+
+@dataclass
+class IdleInstance:
+    """An instance whose CPU stayed below the threshold"""
+
+    instance: Instance
+    average_cpu: float
+
+
+@dataclass
+class WasteReport:
+    """Idle instances among the checked ones"""
+
+    days: int
+    threshold: float
+    checked: int = 0
+    idle: list = field(default_factory=list)
+    requests: int = 0
+
+    @property
+    def monthly_savings(self):
+        """Estimated savings per month of stopping every idle instance"""
+        return sum(item.instance.monthly_cost or 0.0 for item in self.idle)
+
+
+def list_running_instances(ec2):
+    """Yield the running EC2 instances"""
+    paginator = ec2.get_paginator("describe_instances")
+    for page in paginator.paginate(
+        Filters=[{"Name": "instance-state-name", "Values": ["running"]}]
+    ):
+        for reservation in page["Reservations"]:
+            for instance in reservation["Instances"]:
+                if instance["State"]["Name"] == "running":
+                    yield Instance(
+                        "EC2", instance["InstanceId"], instance["InstanceType"]
+                    )
+
+
+def list_available_databases(rds):
+    """Yield the available RDS instances"""
+    for page in rds.get_paginator("describe_db_instances").paginate():
+        for db in page["DBInstances"]:
+            if db["DBInstanceStatus"] == "available":
+                yield Instance(
+                    "RDS",
+                    db["DBInstanceIdentifier"],
+                    db["DBInstanceClass"],
+                    2 if db.get("MultiAZ") else 1,
+                )
+
+
+def metric_query(query_id, instance):
+    """GetMetricData query of an instance's daily average CPU utilization"""
+    namespace, dimension = NAMESPACES[instance.kind]
+    return {
+        "Id": query_id,
+        "MetricStat": {
+            "Metric": {
+                "Namespace": namespace,
+                "MetricName": "CPUUtilization",
+                "Dimensions": [{"Name": dimension, "Value": instance.resource_id}],
+            },
+            "Period": 86400,
+            "Stat": "Average",
+        },
+        "ReturnData": True,
+    }
+
+
+def _batches(items, size):
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def _fetch_batch(cloudwatch, queries, start, end):
+    """Run one batch of queries, following NextToken; returns (values, calls)"""
+    values = {}
+    calls = 0
+    kwargs = {"MetricDataQueries": queries, "StartTime": start, "EndTime": end}
+    while True:
+        response = cloudwatch.get_metric_data(**kwargs)
+        calls += 1
+        for result in response["MetricDataResults"]:
+            values.setdefault(result["Id"], []).extend(result["Values"])
+        token = response.get("NextToken")
+        if not token:
+            return values, calls
+        kwargs["NextToken"] = token
+
+
+def find_idle_instances(
+    cloudwatch,
+    instances,
+    days=LOOKBACK_DAYS,
+    threshold=CPU_THRESHOLD,
+    now=None,
+    max_workers=METRIC_WORKERS,
+):
+    """Fetch the CPU utilization of the instances and find the idle ones
+
+    Queries are sent in batches of MAX_QUERIES_PER_REQUEST, concurrently.
+    """
+    end = (now or datetime.now(timezone.utc)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    start = end - timedelta(days=days)
+    instances = list(instances)
+    queries = [
+        metric_query(f"q{index}", instance) for index, instance in enumerate(instances)
+    ]
+
+    report = WasteReport(days, threshold, checked=len(instances))
+    values = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                instrumentation.propagate(_fetch_batch), cloudwatch, batch, start, end
+            )
+            for batch in _batches(queries, MAX_QUERIES_PER_REQUEST)
+        ]
+        for future in futures:
+            batch_values, calls = future.result()
+            values.update(batch_values)
+            report.requests += calls
+
+    for index, instance in enumerate(instances):
+        datapoints = values.get(f"q{index}", [])
+        if len(datapoints) < min(MIN_DATAPOINTS, days):
+            continue
+        average = sum(datapoints) / len(datapoints)
+        if average < threshold:
+            report.idle.append(IdleInstance(instance, average))
+
+    report.idle.sort(
+        key=lambda item: (-(item.instance.monthly_cost or 0.0), item.average_cpu)
+    )
+    return report
+
+
+def collect_waste(ec2, rds, cloudwatch, days=LOOKBACK_DAYS, threshold=CPU_THRESHOLD):
+    """List the running instances and find the idle ones"""
+    instances = list(list_running_instances(ec2))
+    instances.extend(list_available_databases(rds))
+    return find_idle_instances(cloudwatch, instances, days=days, threshold=threshold)
+
+
+def format_waste_section(report, top_n=TOP_IDLE, language="ja"):
+    """Build the idle resource report section"""
+    s = STRINGS[language]
+    lines = [
+        s["waste_summary"].format(
+            days=report.days,
+            threshold=f"{report.threshold:g}",
+            idle=len(report.idle),
+            checked=report.checked,
+        ),
+    ]
+    if report.idle:
+        lines.append(s["waste_savings"].format(amount=f"{report.monthly_savings:.2f}"))
+        lines.append("")
+        lines.append(s["waste_top"].format(count=top_n))
+        for item in report.idle[:top_n]:
+            instance = item.instance
+            cost = instance.monthly_cost
+            estimate = (
+                s["waste_monthly"].format(amount=f"{cost:.2f}")
+                if cost is not None
+                else s["waste_unknown"]
+            )
+            lines.append(
+                f"  {instance.kind} {instance.resource_id} ({instance.instance_type}): "
+                f"CPU {item.average_cpu:.1f}%, {estimate}"
+            )
+    return (s["waste_title"], lines)
@@ -28,3 +28,38 @@ resource "aws_lambda_permission" "allow_eventbridge" {
   source_arn    = aws_cloudwatch_event_rule.daily_trigger.arn
 }
 
+
+# EventBridge rule to check the budgets hourly
+resource "aws_cloudwatch_event_rule" "budget_alert_trigger" {
+  count = var.budget_total > 0 || length(var.service_budgets) > 0 ? 1 : 0
+
+  name                = "${var.project_name}-budget-alert-trigger"
+  description         = "Trigger the budget check on today's costs"
+  schedule_expression = var.budget_alert_schedule
+
+  tags = merge(
+    local.common_tags,
+    {
+      Name = "${var.environment}-${var.system_name}-budget-alert-trigger"
+    }
+  )
+}
+
+resource "aws_cloudwatch_event_target" "budget_alert_target" {
+  count = length(aws_cloudwatch_event_rule.budget_alert_trigger)
+
+  rule      = aws_cloudwatch_event_rule.budget_alert_trigger[0].name
+  target_id = "CostNotifierBudgetAlert"
+  arn       = aws_lambda_function.cost_notifier.arn
+  input     = jsonencode({ mode = "budget_alert" })
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_budget_alert" {
+  count = length(aws_cloudwatch_event_rule.budget_alert_trigger)
+
+  statement_id  = "AllowBudgetAlertFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.cost_notifier.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.budget_alert_trigger[0].arn
+}
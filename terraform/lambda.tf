@@ -51,6 +51,7 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Effect = "Allow"
         Action = [
           "ce:GetCostAndUsage",
+          "ce:GetCostAndUsageWithResources",
           "ce:GetCostForecast"
         ]
         Resource = "*"
@@ -62,7 +63,12 @@ resource "aws_iam_role_policy" "lambda_policy" {
           "rds:Describe*",
           "s3:ListAllMyBuckets",
           "lambda:ListFunctions",
+          "elasticloadbalancing:DescribeLoadBalancers",
+          "eks:ListClusters",
+          "dynamodb:ListTables",
+          "elasticache:DescribeCacheClusters",
           "cloudwatch:GetMetricStatistics",
+          "cloudwatch:GetMetricData",
           "cloudwatch:ListMetrics"
         ]
         Resource = "*"
@@ -78,6 +84,99 @@ resource "aws_iam_role_policy" "lambda_policy" {
   })
 }
 
+# IAM policy allowing the Lambda function to assume roles in target accounts
+resource "aws_iam_role_policy" "lambda_assume_target_roles" {
+  count = length(var.target_role_arns) > 0 ? 1 : 0
+
+  name = "${var.project_name}-lambda-assume-target-roles"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "sts:AssumeRole"
+        Resource = var.target_role_arns
+      }
+    ]
+  })
+}
+
+# IAM policy for the Cost Explorer result cache bucket
+resource "aws_iam_role_policy" "lambda_cost_cache" {
+  count = var.cost_cache_bucket != "" ? 1 : 0
+
+  name = "${var.project_name}-lambda-cost-cache"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "s3:ListBucket"
+        Resource = "arn:aws:s3:::${var.cost_cache_bucket}"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+          "s3:DeleteObject"
+        ]
+        Resource = "arn:aws:s3:::${var.cost_cache_bucket}/cost-cache/*"
+      }
+    ]
+  })
+}
+
+# IAM policy for reading Cost and Usage Report files
+resource "aws_iam_role_policy" "lambda_cur" {
+  count = var.cur_bucket != "" ? 1 : 0
+
+  name = "${var.project_name}-lambda-cur"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "s3:ListBucket"
+        Resource = "arn:aws:s3:::${var.cur_bucket}"
+      },
+      {
+        Effect   = "Allow"
+        Action   = "s3:GetObject"
+        Resource = "arn:aws:s3:::${var.cur_bucket}/${var.cur_prefix}*"
+      }
+    ]
+  })
+}
+
+# IAM policy for storing the full report
+resource "aws_iam_role_policy" "lambda_report" {
+  count = var.report_bucket != "" ? 1 : 0
+
+  name = "${var.project_name}-lambda-report"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject"
+        ]
+        Resource = "arn:aws:s3:::${var.report_bucket}/reports/*"
+      }
+    ]
+  })
+}
+
 # Lambda function
 resource "aws_lambda_function" "cost_notifier" {
   filename         = data.archive_file.lambda_zip.output_path
@@ -86,13 +185,33 @@ resource "aws_lambda_function" "cost_notifier" {
   handler          = "cost_notifier.lambda_handler"
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
   runtime          = "python3.11"
-  timeout          = 300
-  memory_size      = 256
+  timeout          = var.lambda_timeout
+  memory_size      = var.lambda_memory_size
 
   environment {
     variables = {
-      SNS_TOPIC_ARN = aws_sns_topic.cost_notification.arn
-      DAYS_TO_CHECK = var.days_to_check
+      SNS_TOPIC_ARN                 = aws_sns_topic.cost_notification.arn
+      DAYS_TO_CHECK                 = var.days_to_check
+      TARGET_ROLE_ARNS              = join(",", var.target_role_arns)
+      TARGET_REGIONS                = join(",", var.target_regions)
+      FAN_OUT_CONCURRENCY           = var.fan_out_concurrency
+      COST_CACHE_BUCKET             = var.cost_cache_bucket
+      COST_SHARD_DAYS               = var.cost_shard_days
+      ENABLE_COST_FORECAST          = tostring(var.enable_cost_forecast)
+      ENABLE_INSTRUMENTATION        = tostring(var.enable_instrumentation)
+      ENABLE_ASYNC_ENGINE           = tostring(var.enable_async_engine)
+      ENABLE_WASTE_DETECTION        = tostring(var.enable_waste_detection)
+      ATTRIBUTION_TAGS              = join(",", var.attribution_tags)
+      ATTRIBUTION_RESOURCE_SERVICES = join(",", var.attribution_resource_services)
+      DEADLINE_RESERVE_SECONDS      = var.deadline_reserve_seconds
+      REPORT_BUCKET                 = var.report_bucket
+      REPORT_LANGUAGE               = var.report_language
+      REPORT_FORMATS                = join(",", var.report_formats)
+      SLACK_WEBHOOK_URL             = var.slack_webhook_url
+      TEAMS_WEBHOOK_URL             = var.teams_webhook_url
+      BUDGET_TOTAL                  = var.budget_total
+      BUDGET_SERVICES               = jsonencode(var.service_budgets)
+      CUR_PATH                      = var.cur_bucket != "" ? "s3://${var.cur_bucket}/${var.cur_prefix}" : ""
     }
   }
 
@@ -27,6 +27,152 @@ variable "days_to_check" {
   default     = 7
 }
 
+variable "target_role_arns" {
+  description = "IAM role ARNs to assume for multi-account reports (empty: report on this account only)"
+  type        = list(string)
+  default     = []
+}
+
+variable "target_regions" {
+  description = "Regions to collect resource counts from in multi-account mode (empty: Lambda region)"
+  type        = list(string)
+  default     = []
+}
+
+variable "fan_out_concurrency" {
+  description = "Maximum number of account/region targets collected in parallel"
+  type        = number
+  default     = 8
+}
+
+variable "cost_cache_bucket" {
+  description = "Existing S3 bucket for caching settled Cost Explorer days (empty: no cache)"
+  type        = string
+  default     = ""
+}
+
+variable "cost_shard_days" {
+  description = "Split the Cost Explorer window into shards of this many days fetched in parallel (0: no sharding)"
+  type        = number
+  default     = 0
+}
+
+variable "enable_cost_forecast" {
+  description = "Add the month-end cost forecast (GetCostForecast) to the report"
+  type        = bool
+  default     = true
+}
+
+variable "enable_instrumentation" {
+  description = "Log per-stage and per-API-call timings as a CloudWatch EMF line on every run"
+  type        = bool
+  default     = false
+}
+
+variable "attribution_tags" {
+  description = "Cost allocation tag keys to list the top spenders for (must be activated in Billing)"
+  type        = list(string)
+  default     = []
+}
+
+variable "attribution_resource_services" {
+  description = "Services to list the top resources for via GetCostAndUsageWithResources (requires resource-level data in Cost Explorer)"
+  type        = list(string)
+  default     = []
+}
+
+variable "cur_bucket" {
+  description = "Existing bucket with Cost and Usage Report Parquet files to read costs from instead of Cost Explorer (empty: Cost Explorer)"
+  type        = string
+  default     = ""
+}
+
+variable "cur_prefix" {
+  description = "Key prefix of the CUR Parquet files in cur_bucket"
+  type        = string
+  default     = ""
+}
+
+variable "enable_async_engine" {
+  description = "Run the AWS calls on the asyncio engine (requires aiobotocore in a Lambda layer)"
+  type        = bool
+  default     = false
+}
+
+variable "lambda_timeout" {
+  description = "Timeout of the Lambda function in seconds; the report is cut short to be sent within it"
+  type        = number
+  default     = 300
+}
+
+variable "lambda_memory_size" {
+  description = "Memory size of the Lambda function in MB"
+  type        = number
+  default     = 256
+}
+
+variable "deadline_reserve_seconds" {
+  description = "Seconds kept before the Lambda timeout for formatting and sending a partial report"
+  type        = number
+  default     = 5
+}
+
+variable "report_bucket" {
+  description = "Existing S3 bucket for the full gzip-compressed report, linked from the notification (empty: not stored)"
+  type        = string
+  default     = ""
+}
+
+variable "report_language" {
+  description = "Language of the report: ja or en"
+  type        = string
+  default     = "ja"
+}
+
+variable "report_formats" {
+  description = "Extra report formats stored in report_bucket (html, csv, slack, teams)"
+  type        = list(string)
+  default     = []
+}
+
+variable "slack_webhook_url" {
+  description = "Slack incoming webhook URL to post the report to (empty: disabled)"
+  type        = string
+  default     = ""
+  sensitive   = true
+}
+
+variable "teams_webhook_url" {
+  description = "Microsoft Teams incoming webhook URL to post the report to (empty: disabled)"
+  type        = string
+  default     = ""
+  sensitive   = true
+}
+
+variable "enable_waste_detection" {
+  description = "Report running EC2 and RDS instances with low CPU utilization"
+  type        = bool
+  default     = false
+}
+
+variable "budget_total" {
+  description = "Daily budget (USD) of the total cost, checked hourly (0: disabled)"
+  type        = number
+  default     = 0
+}
+
+variable "service_budgets" {
+  description = "Daily budgets (USD) of single services, checked hourly, e.g. { \"Amazon Elastic Compute Cloud - Compute\" = 50 }"
+  type        = map(number)
+  default     = {}
+}
+
+variable "budget_alert_schedule" {
+  description = "EventBridge schedule expression of the budget check"
+  type        = string
+  default     = "rate(1 hour)"
+}
+
 variable "environment" {
   description = "Environment name (e.g., dev, prod)"
   type        = string